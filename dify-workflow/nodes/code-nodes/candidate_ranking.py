@@ -0,0 +1,118 @@
+"""
+QQ 音乐搜索候选评分（find_qqmusic_match 节点和代理的 /track 端点共用）
+
+匹配分两步:
+1. 廉价过滤：时长相差超过 DURATION_TOLERANCE 秒、或版本标签（Live / Remix / 伴奏等）
+   与目标不一致的候选直接淘汰
+2. 相似度评分：只对通过过滤的候选计算规范化后（text_normalize）的标题 / 艺术家相似度；
+   标题和艺术家规范化后完全一致时直接采用，不再比较其余候选
+
+打包到 Dify 时由 scripts/build_dify_bundle.py 内联到使用它的节点中；
+代理镜像构建时复制到应用目录（见 services/qqmusic-api/workflow_shared.py）
+"""
+
+import re
+from difflib import SequenceMatcher
+
+from text_normalize import fold, normalize_title, split_artists
+
+# 目标时长与候选时长允许的误差（秒）
+DURATION_TOLERANCE = 5
+# 标题权重，其余为艺术家权重（没有目标艺术家时只看标题）
+TITLE_WEIGHT = 0.6
+
+# 版本标签 → 标题中的关键词（英文按单词匹配，中文按子串匹配）
+VERSION_TAGS = {
+    "live": ["live", "现场"],
+    "remix": ["remix", "混音"],
+    "instrumental": ["伴奏", "纯音乐", "instrumental", "karaoke", "off vocal"],
+    "piano": ["钢琴版", "piano"],
+    "acoustic": ["acoustic", "不插电"],
+    "dj": ["dj版"],
+    "demo": ["demo"],
+}
+_TAG_PATTERNS = {
+    tag: re.compile(
+        "|".join(
+            rf"\b{re.escape(word)}\b" if word.isascii() else re.escape(word)
+            for word in words
+        )
+    )
+    for tag, words in VERSION_TAGS.items()
+}
+
+
+def version_tags(title: str) -> frozenset:
+    """标题中的版本标签，例如 "晴天 (Live)" → {"live"}"""
+    folded = fold(title)
+    return frozenset(
+        tag for tag, pattern in _TAG_PATTERNS.items() if pattern.search(folded)
+    )
+
+
+def _similarity(a: str, b: str) -> float:
+    if a == b:
+        return 1.0
+    if not a or not b:
+        return 0.0
+    return SequenceMatcher(None, a, b).ratio()
+
+
+def rank_candidates(results: list, title: str, artists, duration_ms: int = 0) -> dict:
+    """
+    给搜索结果打分，返回 {"best", "score", "margin", "filtered", "scored"}
+    best 为 None 表示没有候选通过过滤；同分时保留搜索排序靠前的候选
+    """
+    target_title = normalize_title(title)
+    target_artists = split_artists(artists)
+    target_tags = version_tags(title)
+    duration = (duration_ms or 0) / 1000
+
+    best, best_score, second_score = None, -1.0, 0.0
+    filtered = scored = 0
+    for candidate in results:
+        # 1. 廉价过滤
+        interval = candidate.get("interval") or 0
+        if duration and interval and abs(interval - duration) > DURATION_TOLERANCE:
+            filtered += 1
+            continue
+        candidate_title = candidate.get("songname", "")
+        if version_tags(candidate_title) != target_tags:
+            filtered += 1
+            continue
+
+        # 2. 相似度评分
+        scored += 1
+        candidate_artists = split_artists(
+            [
+                s.get("name", "")
+                for s in candidate.get("singer", [])
+                if isinstance(s, dict)
+            ]
+        )
+        title_score = _similarity(normalize_title(candidate_title), target_title)
+        if target_artists:
+            artist_score = sum(
+                max((_similarity(a, c) for c in candidate_artists), default=0.0)
+                for a in target_artists
+            ) / len(target_artists)
+            score = TITLE_WEIGHT * title_score + (1 - TITLE_WEIGHT) * artist_score
+        else:
+            score = title_score
+
+        if score > best_score:
+            best, best_score, second_score = candidate, score, max(best_score, 0.0)
+        elif score > second_score:
+            second_score = score
+
+        # 标题和艺术家完全一致：不会有更高分的候选
+        if title_score == 1.0 and set(target_artists) == set(candidate_artists):
+            break
+
+    return {
+        "best": best,
+        "score": round(max(best_score, 0.0), 3),
+        "margin": round(best_score - second_score, 3) if best is not None else 0.0,
+        "filtered": filtered,
+        "scored": scored,
+    }
@@ -22,9 +22,12 @@
 import re
 from difflib import SequenceMatcher
 from typing import Dict, Any, Optional, List
+from instrumentation import instrumented
 from models import ConsolidateOutput
+from text_normalize import normalize_title_strict, same_artists
 
 
+@instrumented("consolidate")
 def main(
     netease_data: Dict[str, Any],
     qqmusic_track_name: str = "",
@@ -49,7 +52,10 @@ def main(
         fields["title"] = {"value": netease_title, "status": "未查到"}
 
         if qqmusic_track_name:
-            if qqmusic_track_name.lower() == netease_title.lower():
+            # 版本说明不同（"晴天" 与 "晴天 (Live)"）不算确认
+            if normalize_title_strict(qqmusic_track_name) == normalize_title_strict(
+                netease_title
+            ):
                 fields["title"]["status"] = "确认"
                 fields["title"]["confirmed_by"] = ["QQ Music"]
 
@@ -72,7 +78,7 @@ def main(
                 )
 
             qqmusic_artists = [s.get("name", "") for s in track_info.get("singer", [])]
-            if qqmusic_artists and set(qqmusic_artists) == set(netease_artists):
+            if same_artists(qqmusic_artists, netease_artists):
                 fields["artists"]["status"] = "确认"
                 fields["artists"]["confirmed_by"] = ["QQ Music"]
 
@@ -81,7 +87,9 @@ def main(
         fields["album"] = {"value": netease_album, "status": "未查到"}
 
         if qqmusic_album_name:
-            if qqmusic_album_name.lower() == netease_album.lower():
+            if normalize_title_strict(qqmusic_album_name) == normalize_title_strict(
+                netease_album
+            ):
                 fields["album"]["status"] = "确认"
                 fields["album"]["confirmed_by"] = ["QQ Music"]
 
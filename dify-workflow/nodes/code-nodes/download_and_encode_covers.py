@@ -5,6 +5,8 @@
 输入变量:
 - netease_cover_url: str - 网易云封面图 URL
 - qqmusic_cover_url: str - QQ 音乐封面图 URL
+- cover_proxy_host: str - 可选，QQ 音乐代理地址（例如 http://localhost:3001），
+  设置后通过代理的 /cover/image 下载，重复核验同一封面时命中代理的本地缓存
 
 输出变量:
 - netease_cover_base64: str - 网易云封面图 base64
@@ -15,11 +17,27 @@
 
 import base64
 import requests
+from instrumentation import instrumented
 from models import DownloadAndEncodeCoversOutput
 
 
+def download(url: str, cover_proxy_host: str = "") -> bytes:
+    """下载图片，设置了代理地址时经由代理的 /cover/image"""
+    if cover_proxy_host:
+        response = requests.get(
+            f"{cover_proxy_host.rstrip('/')}/cover/image",
+            params={"url": url},
+            timeout=10,
+        )
+    else:
+        response = requests.get(url, timeout=10)
+    response.raise_for_status()
+    return response.content
+
+
+@instrumented("download_and_encode_covers")
 def main(
-    netease_cover_url: str, qqmusic_cover_url: str
+    netease_cover_url: str, qqmusic_cover_url: str, cover_proxy_host: str = ""
 ) -> DownloadAndEncodeCoversOutput:
     """
     下载封面图并转换为 base64 编码
@@ -27,14 +45,12 @@ def main(
     """
     try:
         # 1. 下载网易云封面图
-        netease_response = requests.get(netease_cover_url, timeout=10)
-        netease_response.raise_for_status()
-        netease_base64 = base64.b64encode(netease_response.content).decode("utf-8")
+        netease_content = download(netease_cover_url, cover_proxy_host)
+        netease_base64 = base64.b64encode(netease_content).decode("utf-8")
 
         # 2. 下载 QQ 音乐封面图
-        qqmusic_response = requests.get(qqmusic_cover_url, timeout=10)
-        qqmusic_response.raise_for_status()
-        qqmusic_base64 = base64.b64encode(qqmusic_response.content).decode("utf-8")
+        qqmusic_content = download(qqmusic_cover_url, cover_proxy_host)
+        qqmusic_base64 = base64.b64encode(qqmusic_content).decode("utf-8")
 
         output = DownloadAndEncodeCoversOutput(
             netease_cover_base64=netease_base64,
@@ -1,36 +1,53 @@
 """
 找到 QQ 音乐匹配节点
-从搜索结果中找到最佳匹配
+对搜索结果中的每个候选打分，选出最佳匹配
+
+过滤和评分规则见 candidate_ranking.py（与代理的 /track 端点共用同一份实现）：
+时长与网易云相差超过容差、或版本标签（Live / Remix / 伴奏等）不一致的候选直接淘汰，
+其余按规范化后的标题 / 艺术家相似度打分
 
 输入变量:
 - search_results: str - QQ Music 搜索结果
 - target_title: str - 目标歌曲标题
-- target_artists: str - 目标艺术家
+- target_artists: str | list - 目标艺术家
+- netease_duration_ms: int - 网易云时长（毫秒，可选，0 表示不按时长过滤）
 
 输出变量:
 - match_id: str - 匹配的歌曲 MID
 - match_name: str - 匹配的歌曲名称
 - match_album: str - 匹配的专辑名称
 - match_found: bool - 是否找到匹配
+- match_score: float - 最佳候选得分（0~1）
+- match_margin: float - 最佳候选领先第二名的分数（只有一个候选时等于得分）
 - error: str - 错误信息
 """
 
 import json
+import logging
+from candidate_ranking import rank_candidates
+from instrumentation import get_logger, instrumented
 from models import FindQQMusicMatchOutput
 
+logger = get_logger("find_qqmusic_match")
+
 
+@instrumented("find_qqmusic_match")
 def main(
-    qqmusic_search_results, netease_title: str, netease_artist: str
+    qqmusic_search_results,
+    netease_title: str,
+    netease_artist,
+    netease_duration_ms: int = 0,
 ) -> FindQQMusicMatchOutput:
     """
     从搜索结果中找到最佳匹配
     """
     try:
-        # 调试：输出输入类型
-        print(f"[DEBUG] qqmusic_search_results 类型: {type(qqmusic_search_results)}")
-        print(
-            f"[DEBUG] qqmusic_search_results 前100字符: {str(qqmusic_search_results)[:100]}"
-        )
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug(
+                "qqmusic_search_results 类型: %s，前100字符: %s",
+                type(qqmusic_search_results),
+                str(qqmusic_search_results)[:100],
+            )
 
         # QQ Music API 返回的 body 可能是 JSON 字符串或已解析的 dict
         if isinstance(qqmusic_search_results, str):
@@ -38,28 +55,13 @@ def main(
         else:
             search_data = qqmusic_search_results
 
-        # 调试：输出数据结构的键
-        print(f"[DEBUG] search_data 类型: {type(search_data)}")
-        print(
-            f"[DEBUG] search_data 顶层键: {list(search_data.keys()) if isinstance(search_data, dict) else 'NOT A DICT'}"
-        )
-
         # 提取搜索结果列表
         # ⚠️ 注意：代理服务器已经提取了 response.data，所以直接访问 song.list
         # 上游 API: response.data.song.list
         # 代理返回: song.list (已去除 response.data 层级)
         song = search_data.get("song", {})
-        print(
-            f"[DEBUG] song 键: {list(song.keys()) if isinstance(song, dict) else 'NOT A DICT'}"
-        )
-
         results = song.get("list", [])
-        print(f"[DEBUG] 搜索结果数量: {len(results)}")
-
-        if results:
-            print(
-                f"[DEBUG] 第一个结果: {json.dumps(results[0], ensure_ascii=False)[:200]}"
-            )
+        logger.debug("搜索结果数量: %d", len(results))
 
         if not results:
             output = FindQQMusicMatchOutput(
@@ -67,25 +69,55 @@ def main(
                 match_name="",
                 match_album="",
                 match_found=False,
+                match_score=0.0,
+                match_margin=0.0,
                 error="搜索无结果",
             )
             return output
 
-        # 简单匹配：取第一个结果
-        # TODO: 实现更复杂的匹配算法（比较歌名和艺术家相似度）
-        best_match = results[0]
+        ranking = rank_candidates(
+            results, netease_title, netease_artist, netease_duration_ms
+        )
+        logger.debug(
+            "过滤 %d 个候选，评分 %d 个，最高分 %s，领先 %s",
+            ranking["filtered"],
+            ranking["scored"],
+            ranking["score"],
+            ranking["margin"],
+        )
+
+        best_match = ranking["best"]
+        if best_match is None:
+            output = FindQQMusicMatchOutput(
+                match_id="",
+                match_name="",
+                match_album="",
+                match_found=False,
+                match_score=0.0,
+                match_margin=0.0,
+                error=f"{len(results)} 个搜索结果的时长或版本均与目标不符",
+            )
+            return output
 
         output = FindQQMusicMatchOutput(
             match_id=best_match.get("songmid", ""),
             match_name=best_match.get("songname", ""),
             match_album=best_match.get("albumname", ""),
             match_found=True,
+            match_score=ranking["score"],
+            match_margin=ranking["margin"],
             error="",
         )
         return output
 
     except Exception as e:
         output = FindQQMusicMatchOutput(
-            match_id="", match_name="", match_album="", match_found=False, error=str(e)
+            match_id="",
+            match_name="",
+            match_album="",
+            match_found=False,
+            match_score=0.0,
+            match_margin=0.0,
+            error=str(e),
         )
         return output
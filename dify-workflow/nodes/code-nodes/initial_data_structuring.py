@@ -11,9 +11,11 @@
 """
 
 import json
+from instrumentation import instrumented
 from models import InitialDataStructuringOutput
 
 
+@instrumented("initial_data_structuring")
 def main(netease_song_detail: str, netease_lyric: str) -> InitialDataStructuringOutput:
     """
     从网易云音乐 API 响应中提取并结构化元数据
@@ -0,0 +1,102 @@
+"""
+代码节点的计时和日志（所有节点共用）
+
+- @instrumented("节点名") 装饰 main()：调用时传入 _instrument=True（或设置环境变量
+  NODE_INSTRUMENT=1）后，输出中增加 _timings，记录耗时、输入 / 输出序列化后的字节数
+  和调用期间的内存分配峰值；默认关闭，不产生任何额外开销
+- get_logger()：按 NODE_LOG_LEVEL 环境变量（默认 WARNING）过滤的日志，
+  替代无条件的 print 调试输出
+
+在 Dify 中启用计时：给节点增加常量输入 _instrument = true，并声明 object 类型的输出 _timings
+
+打包到 Dify 时由 scripts/build_dify_bundle.py 内联到使用它的节点中
+"""
+
+import functools
+import json
+import logging
+import os
+import sys
+import time
+import tracemalloc
+from typing import Any, Callable, TypedDict
+
+
+class NodeTimings(TypedDict):
+    """_timings 输出"""
+
+    node: str
+    wall_ms: float
+    input_bytes: int
+    output_bytes: int
+    peak_alloc_bytes: int
+
+
+def get_logger(name: str) -> logging.Logger:
+    """节点日志（写 stderr），级别由 NODE_LOG_LEVEL 控制"""
+    logger = logging.getLogger(f"code_nodes.{name}")
+    if not logger.handlers:
+        handler = logging.StreamHandler(sys.stderr)
+        handler.setFormatter(logging.Formatter("[%(levelname)s] %(name)s: %(message)s"))
+        logger.addHandler(handler)
+        logger.propagate = False
+    logger.setLevel(os.getenv("NODE_LOG_LEVEL", "WARNING").upper())
+    return logger
+
+
+def payload_size(value: Any) -> int:
+    """值按 JSON 序列化后的 UTF-8 字节数（字符串按原文计算）"""
+    if value is None:
+        return 0
+    if isinstance(value, (bytes, bytearray)):
+        return len(value)
+    if not isinstance(value, str):
+        value = json.dumps(value, ensure_ascii=False, default=str)
+    return len(value.encode("utf-8"))
+
+
+def instrumented(node: str) -> Callable[[Callable[..., dict]], Callable[..., dict]]:
+    """
+    为节点 main() 增加可选的 _timings 输出
+    节点名显式传入：内联到 Dify 后 main 所在模块名不再可用
+    """
+    return functools.partial(_instrument_main, node=node)
+
+
+def _instrument_main(main: Callable[..., dict], node: str) -> Callable[..., dict]:
+    @functools.wraps(main)
+    def wrapper(*args, _instrument: bool = False, **kwargs):
+        if not (_instrument or os.getenv("NODE_INSTRUMENT") == "1"):
+            return main(*args, **kwargs)
+
+        input_bytes = sum(payload_size(v) for v in args) + sum(
+            payload_size(v) for v in kwargs.values()
+        )
+        # 已在追踪（例如外层也启用了计时）时只重置峰值，不停止追踪
+        started_tracing = not tracemalloc.is_tracing()
+        if started_tracing:
+            tracemalloc.start()
+        else:
+            tracemalloc.reset_peak()
+        baseline = tracemalloc.get_traced_memory()[0]
+        start = time.perf_counter()
+        try:
+            output = main(*args, **kwargs)
+        finally:
+            wall = time.perf_counter() - start
+            peak = tracemalloc.get_traced_memory()[1] - baseline
+            if started_tracing:
+                tracemalloc.stop()
+
+        if isinstance(output, dict):
+            output = dict(output)
+            output["_timings"] = NodeTimings(
+                node=node,
+                wall_ms=round(wall * 1000, 3),
+                input_bytes=input_bytes,
+                output_bytes=payload_size(output),
+                peak_alloc_bytes=max(peak, 0),
+            )
+        return output
+
+    return wrapper
@@ -30,6 +30,8 @@ class FindQQMusicMatchOutput(TypedDict):
     match_name: str
     match_album: str
     match_found: bool
+    match_score: float
+    match_margin: float
     success: bool
     error: str
 
@@ -12,9 +12,11 @@
 """
 
 import json
+from instrumentation import instrumented
 from models import ParseCoverUrlOutput
 
 
+@instrumented("parse_cover_url")
 def main(qqmusic_cover_response) -> ParseCoverUrlOutput:
     """
     解析 QQ 音乐封面图 API 响应
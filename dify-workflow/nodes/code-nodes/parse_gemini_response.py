@@ -17,9 +17,11 @@
 
 import json
 import re
+from instrumentation import instrumented
 from models import ParseGeminiResponseOutput
 
 
+@instrumented("parse_gemini_response")
 def main(gemini_response) -> ParseGeminiResponseOutput:
     """
     解析 Gemini Vision API 响应
@@ -19,9 +19,11 @@
 """
 
 import json
+from instrumentation import instrumented
 from models import ParseQQMusicResponseOutput
 
 
+@instrumented("parse_qqmusic_response")
 def main(qqmusic_response) -> ParseQQMusicResponseOutput:
     """
     解析 QQ 音乐响应并平铺输出字段
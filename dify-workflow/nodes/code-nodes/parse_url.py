@@ -10,9 +10,11 @@ URL 解析节点
 """
 
 from urllib.parse import urlparse, parse_qs
+from instrumentation import instrumented
 from models import ParseUrlOutput
 
 
+@instrumented("parse_url")
 def main(song_url: str) -> ParseUrlOutput:
     """
     从网易云音乐 URL 中提取歌曲 ID
@@ -0,0 +1,149 @@
+"""
+中文文本规范化（find_qqmusic_match / consolidate 共用）
+比较标题、艺术家、专辑前统一写法:
+- 繁体 → 简体、全角 → 半角：合并为一张映射表，str.translate 一次完成
+- 大小写折叠，去掉标点和空白
+- 标题去掉括号内的版本说明、feat. 后缀和 " - xxx版" 后缀（用于搜索排序）；
+  核验时用 normalize_title_strict，只去掉 feat.，Live / 伴奏 / Remix 等版本说明仍参与比较
+- 艺术家按 / 、 , & ; feat. 等拆分
+
+繁简映射只收录歌名、歌手名中常见的繁体字，以 "繁简繁简..." 字符串保存，导入时构建映射表；
+规范化结果按输入缓存，批量匹配时重复出现的标题和歌手名只计算一次
+
+打包到 Dify 时由 scripts/build_dify_bundle.py 内联到使用它的节点中
+"""
+
+import re
+from functools import lru_cache
+from typing import Iterable, Tuple, Union
+
+CACHE_SIZE = 4096
+
+# fmt: off
+# 繁体字 + 对应简体字，两两一组
+_T2S_PAIRS = (
+    "萬万與与醜丑專专業业叢丛東东絲丝兩两嚴严喪丧個个豐丰臨临為为麗丽舉举義义烏乌樂乐喬乔習习鄉乡書书買买亂乱爭争於于虧亏雲云"
+    "亞亚產产畝亩親亲億亿僅仅從从侖仑倉仓儀仪們们價价眾众衆众優优會会傘伞偉伟傳传傷伤倫伦偽伪體体餘余傭佣俠侠侶侣偵侦側侧僑侨"
+    "儂侬倆俩儷俪儉俭債债傾倾償偿儲储兒儿兌兑黨党蘭兰關关興兴養养獸兽內内岡冈冊册寫写軍军農农馮冯沖冲衝冲決决況况凍冻淨净涼凉"
+    "減减湊凑凜凛幾几鳳凤憑凭凱凯擊击鑿凿劃划劉刘則则剛刚創创刪删別别劑剂劍剑剝剥劇剧勸劝辦办務务動动勵励勁劲勞劳勢势勳勋勻匀"
+    "區区醫医華华協协單单賣卖盧卢衛卫卻却廠厂廳厅歷历厲厉壓压厭厌廁厕廂厢廈厦廚厨縣县參参雙双發发髮发變变敘叙疊叠葉叶號号嘆叹"
+    "嚇吓呂吕嗎吗噸吨聽听啟启吳吴唄呗員员嗆呛嗚呜詠咏嚨咙響响啞哑嘩哗喲哟嘮唠喚唤嘯啸噴喷噓嘘囑嘱團团園园圍围圖图圓圆國国聖圣"
+    "場场壞坏塊块堅坚壇坛壩坝墳坟墜坠壘垒墊垫牆墙壯壮聲声殼壳壺壶處处備备復复後后夠够頭头誇夸夾夹奪夺奮奋獎奖奧奥妝妆婦妇媽妈"
+    "嫵妩婁娄嬌娇娛娱嫻娴嬰婴嬋婵孫孙學学寧宁寶宝實实寵宠審审憲宪宮宫寬宽賓宾對对尋寻導导將将爾尔塵尘嘗尝堯尧盡尽層层屆届屬属"
+    "嶼屿歲岁豈岂崗岗嵐岚島岛嶺岭峽峡幣币帥帅師师帳帐簾帘帶带幫帮莊庄慶庆廬庐庫库應应廟庙龐庞廢废開开異异棄弃張张彌弥瀰弥彎弯"
+    "彈弹強强歸归當当錄录彥彦徹彻徑径憶忆憂忧懷怀態态悵怅憐怜總总戀恋懇恳惡恶惱恼悅悦懸悬憫悯驚惊懼惧慘惨慚惭慣惯憤愤願愿懶懒"
+    "戲戏戰战戶户紮扎撲扑執执擴扩掃扫揚扬擾扰撫抚拋抛搶抢護护報报擔担擬拟擁拥攔拦擇择掛挂摯挚擋挡揮挥撈捞損损撿捡換换據据擲掷"
+    "攬揽擱搁攜携攝摄擺摆搖摇攤摊撐撑擠挤敵敌數数齋斋鬥斗斬斩斷断無无舊旧時时曠旷晝昼顯显晉晋曬晒曉晓暈晕暉晖暫暂機机殺杀雜杂"
+    "權权條条來来楊杨傑杰極极構构樞枢棗枣槍枪楓枫櫃柜檸柠標标棟栋欄栏樹树棲栖樣样橋桥樺桦夢梦檢检樓楼欖榄橫横櫻樱櫥橱歡欢歐欧"
+    "殘残毀毁畢毕斃毙氣气匯汇彙汇漢汉湯汤溝沟沒没淪沦滄沧滬沪淚泪瀉泻潑泼澤泽潔洁灑洒淺浅漿浆澆浇濁浊測测濟济瀏浏渾浑濃浓濤涛"
+    "漣涟渦涡潤润漲涨澀涩澱淀淵渊漸渐漁渔瀋沈滲渗溫温灣湾濕湿潰溃濺溅滾滚滯滞滿满濾滤濫滥濱滨灘滩瀟潇潛潜瀾澜瀨濑滅灭燈灯靈灵"
+    "災灾燦灿爐炉點点煉炼熾炽爍烁爛烂燭烛煙烟煩烦燒烧燙烫熱热煥焕愛爱爺爷牽牵犧牺狀状猶犹獨独狹狭獅狮獄狱獵猎豬猪貓猫獻献瑪玛"
+    "環环現现璽玺瓏珑瑣琐瓊琼瑤瑶電电畫画暢畅療疗瘋疯癢痒癡痴癱瘫癮瘾皺皱盞盏鹽盐監监蓋盖盜盗盤盘矚瞩睜睁瞞瞒礦矿碼码磚砖碩硕"
+    "確确礎础礙碍禮礼禱祷禍祸離离禿秃種种積积稱称穩稳窩窝窮穷竊窃窯窑窺窥豎竖競竞筆笔筍笋籌筹簽签簡简籃篮築筑節节範范籬篱籠笼"
+    "類类糧粮粵粤緊紧糾纠紀纪約约紅红紋纹納纳紐纽純纯紗纱紙纸級级紛纷紡纺細细終终組组紹绍經经綁绑絨绒結结繞绕給给絢绚絡络絕绝"
+    "統统繡绣絹绢綜综綻绽綠绿綴缀緒绪續续綺绮緋绯綽绰繃绷綢绸維维綿绵網网綱纲緞缎締缔緣缘編编緩缓緯纬練练縛缚緻致縈萦縫缝縮缩"
+    "縱纵縷缕績绩纏缠繩绳繪绘繼继纜缆線线罰罚罵骂罷罢羅罗翹翘聳耸聶聂職职聯联聰聪肅肃腸肠膚肤腫肿脹胀膽胆勝胜朧胧臉脸膠胶脈脉"
+    "髒脏臟脏腦脑膩腻騰腾臘腊艦舰艱艰豔艳藝艺蘆芦蘇苏蘋苹莖茎薦荐萊莱蓮莲獲获瑩莹鶯莺營营蕭萧薩萨藥药蘊蕴藍蓝蕩荡蔣蒋蒼苍蔭荫"
+    "葦苇虜虏慮虑虛虚蟲虫雖虽蝦虾螞蚂蟻蚁蠶蚕螢萤蠟蜡蠻蛮蝸蜗銜衔補补襯衬裝装褲裤襪袜裡里裏里見见觀观規规覓觅視视覽览覺觉觸触"
+    "訂订計计認认討讨讓让訓训議议訊讯記记講讲許许論论設设訪访訣诀證证評评識识詐诈訴诉診诊詞词譯译試试詩诗誠诚話话誕诞詭诡詢询"
+    "該该詳详語语誤误誘诱說说誦诵請请諸诸諾诺讀读課课誰谁調调談谈誼谊謀谋謊谎謎谜謙谦謝谢謠谣謹谨譜谱讚赞貝贝負负貞贞貢贡財财"
+    "責责賢贤敗败賬账貨货質质販贩貪贪貧贫購购貫贯貴贵費费賀贺貼贴貿贸資资賊贼賭赌賜赐賞赏賠赔賴赖贈赠贊赞贏赢趕赶趙赵趨趋躍跃"
+    "蹤踪輕轻車车軌轨轉转輪轮軟软載载輔辅輝辉輩辈邊边遼辽達达遷迁過过邁迈運运還还這这進进遠远違违連连遲迟適适選选遺遗遙遥鄭郑"
+    "鄧邓鄒邹鄰邻醞酝釀酿釋释鑒鉴針针釘钉釣钓鈔钞鈴铃鉛铅銀银銅铜鋼钢錢钱錯错鍵键鍾钟鐘钟鐵铁鑰钥鑽钻鋒锋銳锐鏡镜錦锦鎖锁鏈链"
+    "長长門门閃闪閉闭問问閒闲間间閱阅闊阔闆板闖闯鬧闹悶闷閻阎陣阵陰阴陳陈陸陆陽阳階阶際际隊队隨随險险隱隐難难雞鸡霧雾靜静韋韦"
+    "韓韩頁页頂顶項项順顺須须預预領领頻频題题額额顏颜顧顾頌颂穎颖風风颱台臺台檯台飄飘飛飞飯饭飲饮飽饱餓饿館馆馬马駕驾驗验騎骑"
+    "驅驱驕骄鬆松鬱郁魚鱼鮮鲜鳥鸟鳴鸣鴻鸿鵝鹅鶴鹤麥麦麵面麼么黃黄齊齐齒齿龍龙龔龚龜龟譚谭週周準准僕仆佔占誌志製制係系繫系捨舍"
+    "穀谷鹹咸隻只夥伙嚮向"
+)
+# fmt: on
+
+
+def _build_table() -> dict:
+    table = {ord(t): s for t, s in zip(_T2S_PAIRS[0::2], _T2S_PAIRS[1::2], strict=True)}
+    # 全角 ASCII（！到～）→ 半角，全角空格 → 空格
+    table.update({code: code - 0xFEE0 for code in range(0xFF01, 0xFF5F)})
+    table[0x3000] = 0x20
+    return table
+
+
+_TABLE = _build_table()
+
+_NON_WORD = re.compile(r"[\W_]+")
+# 括号内容（版本说明，如 "(Live)"、"【伴奏】"），全角括号已转为半角
+_BRACKETS = re.compile(r"[(\[【].*?[)\]】]")
+# 标题中的合作歌手后缀: "xxx feat. A"、"xxx ft. A"
+_FEAT_SUFFIX = re.compile(r"\s+(?:feat|ft|featuring)\b.*$")
+# 标题中的版本后缀: "xxx - 钢琴版"
+_DASH_SUFFIX = re.compile(r"\s+-\s+.*$")
+# 合作歌手说明: "xxx (feat. A)"，或到下一个括号为止的 "xxx feat. A"，后面的 "(Live)" 保留
+_FEAT_CREDIT = re.compile(
+    r"[(\[【]\s*(?:feat|ft|featuring)\b.*?[)\]】]|\s+(?:feat|ft|featuring)\b[^(\[【]*"
+)
+_ARTIST_SEPARATORS = re.compile(
+    r"\s*(?:[,、/&;+]|\s(?:feat|ft|featuring)\b\.?|\sx\s)\s*"
+)
+
+
+@lru_cache(maxsize=CACHE_SIZE)
+def fold(text: str) -> str:
+    """繁体 → 简体、全角 → 半角、大小写折叠（保留标点和空白）"""
+    return (text or "").translate(_TABLE).casefold()
+
+
+@lru_cache(maxsize=CACHE_SIZE)
+def normalize_text(text: str) -> str:
+    """fold 后去掉标点和空白，例如 ＢＵＴＴＥＲ－ＦＬＹ → butterfly"""
+    return _NON_WORD.sub("", fold(text))
+
+
+@lru_cache(maxsize=CACHE_SIZE)
+def normalize_title(title: str) -> str:
+    """
+    标题 / 专辑名规范化：再去掉括号内容、feat. 后缀和 " - " 后缀
+    例如 "晴天 (Live)"、"晴天 - 钢琴版"、"晴天 feat. 某人" → "晴天"
+    去掉后为空时（整个标题都在括号里）退回 normalize_text
+    """
+    folded = _BRACKETS.sub(" ", fold(title))
+    folded = _DASH_SUFFIX.sub("", _FEAT_SUFFIX.sub("", folded))
+    return _NON_WORD.sub("", folded) or normalize_text(title)
+
+
+@lru_cache(maxsize=CACHE_SIZE)
+def normalize_title_strict(title: str) -> str:
+    """
+    核验用的标题 / 专辑名规范化：只去掉 feat. 说明，版本说明仍参与比较
+    例如 "晴天 feat. 某人"、"晴天（feat. 某人）" → "晴天"，"晴天 (Live)" → "晴天live"
+    """
+    return _NON_WORD.sub("", _FEAT_CREDIT.sub(" ", fold(title)))
+
+
+@lru_cache(maxsize=CACHE_SIZE)
+def _split_artist_string(artists: str) -> Tuple[str, ...]:
+    names = (
+        _NON_WORD.sub("", name) for name in _ARTIST_SEPARATORS.split(fold(artists))
+    )
+    return tuple(dict.fromkeys(name for name in names if name))
+
+
+def split_artists(artists: Union[str, Iterable[str], None]) -> Tuple[str, ...]:
+    """
+    拆分并规范化艺术家，去重后保持顺序
+    接受 "周杰伦/费玉清" 这样的字符串，或 ["周杰倫", "A feat. B"] 这样的列表
+    """
+    if not artists:
+        return ()
+    if isinstance(artists, str):
+        return _split_artist_string(artists)
+    names = []
+    for item in artists:
+        if isinstance(item, str):
+            names.extend(_split_artist_string(item))
+    return tuple(dict.fromkeys(names))
+
+
+def same_artists(
+    a: Union[str, Iterable[str], None], b: Union[str, Iterable[str], None]
+) -> bool:
+    """两组艺术家规范化后完全相同（忽略顺序），任一方为空时返回 False"""
+    left, right = set(split_artists(a)), set(split_artists(b))
+    return bool(left) and left == right
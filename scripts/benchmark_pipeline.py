@@ -0,0 +1,738 @@
+#!/usr/bin/env python3
+"""
+核验链路端到端基准测试
+在本地替身上游上驱动完整链路，测量吞吐量（首/秒）和各阶段延迟:
+    网易云详情 + 歌词 → initial_data_structuring → QQ 搜索 / 匹配 / 详情 → 封面 → consolidate
+
+- 网易云 API 由本脚本内置的替身提供，QQ 音乐上游使用 services/qqmusic-api/mock_upstream.py，
+  两者来自同一个按种子生成的曲库，每首网易云歌曲在 QQ 曲库中都有对应歌曲
+- QQ 音乐代理默认在本进程内启动（缓存为空，出站限流关闭），也可以用 --proxy 压测已部署的代理
+- 代码节点直接调用 dify-workflow/nodes/code-nodes 中的 main()，与 Dify 中运行的代码相同
+- Gemini 封面比较和 OCR 依赖外部模型，不在测试范围内
+- cold: 缓存为空的第一轮；warm: 按相同顺序重跑同一批歌曲（--duration 模式下
+  超出 cold 轮范围的歌曲仍会未命中）
+
+结果输出 p50 / p95 / p99（毫秒），--output 写入 JSON，便于对比不同版本
+
+用法:
+    python scripts/benchmark_pipeline.py --songs 200 --concurrency 8
+    python scripts/benchmark_pipeline.py --duration 30 --concurrency 16 --output bench.json
+    python scripts/benchmark_pipeline.py --mode track --latency "fixed:seconds=0.05"
+
+    # 压测已启动的代理：代理的上游须为相同 MOCK_SEED / MOCK_CATALOG_SIZE 的 mock_upstream.py，
+    # 且 mock 设置 MOCK_IMAGE_BASE=http://<mock 地址>/__mock/image（封面图不访问外网）
+    python scripts/benchmark_pipeline.py --proxy http://localhost:3001 --passes warm
+"""
+
+import argparse
+import contextlib
+import importlib.util
+import itertools
+import json
+import logging
+import math
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional
+
+import requests
+from flask import Flask, Response, jsonify, request
+from werkzeug.serving import make_server
+
+sys.path.insert(
+    0, str(Path(__file__).resolve().parent.parent / "services" / "qqmusic-api")
+)
+sys.path.insert(
+    0,
+    str(
+        Path(__file__).resolve().parent.parent
+        / "dify-workflow"
+        / "nodes"
+        / "code-nodes"
+    ),
+)
+
+import consolidate
+import download_and_encode_covers
+import find_qqmusic_match
+import initial_data_structuring
+import parse_cover_url
+import parse_qqmusic_response
+from mock_upstream import (
+    Catalog,
+    LatencyDistribution,
+    MockConfig,
+    create_app,
+    fake_image,
+)
+
+ROOT = Path(__file__).resolve().parent.parent
+SERVICE_DIR = ROOT / "services" / "qqmusic-api"
+CODE_NODES_DIR = ROOT / "dify-workflow" / "nodes" / "code-nodes"
+
+# 各模式下的阶段（按执行顺序）
+STAGES = {
+    "nodes": [
+        "netease",
+        "structure",
+        "qq_search",
+        "qq_detail",
+        "covers",
+        "consolidate",
+    ],
+    "track": ["netease", "structure", "qq_track", "covers", "consolidate"],
+}
+# 网易云替身的歌曲 ID = 基数 + 曲库下标
+NETEASE_ID_BASE = 1800000
+PERCENTILES = (50, 95, 99)
+
+
+class StageError(Exception):
+    """某个阶段失败（HTTP 错误或节点返回 success=False）"""
+
+    def __init__(self, stage: str, message: str):
+        super().__init__(message)
+        self.stage = stage
+
+
+# ---------------------------------------------------------------------------
+# 本地替身服务
+# ---------------------------------------------------------------------------
+
+
+class LocalServer:
+    """在后台线程中运行的 WSGI 服务（端口由系统分配）"""
+
+    def __init__(self, app):
+        self.server = make_server("127.0.0.1", 0, app, threaded=True)
+        self.url = f"http://127.0.0.1:{self.server.server_port}"
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+
+    def close(self) -> None:
+        self.server.shutdown()
+
+
+def netease_song(song: Dict[str, Any], index: int, host_url: str) -> Dict[str, Any]:
+    """曲库歌曲 → 网易云 /song/detail 中的一首歌"""
+    album = song["album"]
+    published = datetime.strptime(song["time_public"], "%Y-%m-%d")
+    return {
+        "id": NETEASE_ID_BASE + index,
+        "name": song["name"],
+        "ar": [{"id": s["id"], "name": s["name"]} for s in song["singer"]],
+        "al": {
+            "id": album["id"],
+            "name": album["name"],
+            "picUrl": f"{host_url}img/{album['mid']}.jpg",
+            "publishTime": int(published.replace(tzinfo=timezone.utc).timestamp())
+            * 1000,
+        },
+        "dt": song["interval"] * 1000,
+    }
+
+
+def create_netease_app(
+    catalog: Catalog, latency: LatencyDistribution, seed: int, image_bytes: int
+) -> Flask:
+    """网易云 API 替身：/song/detail、/lyric 和封面图，歌曲与 QQ mock 曲库一一对应"""
+    app = Flask("netease_stub")
+    app.json.ensure_ascii = False
+    lock = threading.Lock()
+    rng = random.Random(seed)
+
+    def wait() -> None:
+        with lock:
+            delay = latency.sample(rng)
+        if delay > 0:
+            time.sleep(delay)
+
+    def lookup(raw: str) -> Optional[int]:
+        index = int(raw) - NETEASE_ID_BASE if raw.strip().isdigit() else -1
+        return index if 0 <= index < len(catalog.songs) else None
+
+    @app.route("/song/detail")
+    def song_detail():
+        wait()
+        indexes = [lookup(raw) for raw in request.args.get("ids", "").split(",")]
+        songs = [
+            netease_song(catalog.songs[index], index, request.host_url)
+            for index in indexes
+            if index is not None
+        ]
+        return jsonify({"songs": songs, "code": 200})
+
+    @app.route("/lyric")
+    def lyric():
+        wait()
+        index = lookup(request.args.get("id", ""))
+        if index is None:
+            return jsonify({"code": 404})
+        song = catalog.songs[index]
+        lines = "\n".join(
+            f"[{minute:02d}:00.00]{song['name']} 第 {minute + 1} 段"
+            for minute in range(song["interval"] // 60)
+        )
+        return jsonify({"lrc": {"lyric": lines}, "tlyric": {"lyric": ""}, "code": 200})
+
+    @app.route("/img/<name>")
+    def image(name: str):
+        return Response(fake_image(name, image_bytes), content_type="image/jpeg")
+
+    return app
+
+
+@contextlib.contextmanager
+def patched_env(values: Dict[str, str]) -> Iterator[None]:
+    """临时设置环境变量（代理在导入时读取配置）"""
+    saved = {name: os.environ.get(name) for name in values}
+    os.environ.update(values)
+    try:
+        yield
+    finally:
+        for name, value in saved.items():
+            if value is None:
+                os.environ.pop(name, None)
+            else:
+                os.environ[name] = value
+
+
+def proxy_env(upstream_url: str, workdir: Path, args) -> Dict[str, str]:
+    """本进程内代理的配置（缓存为空；部分配置在请求时读取，整个测试期间保持）"""
+    env = {
+        "QQMUSIC_API_BASE": upstream_url,
+        "DISK_CACHE_PATH": str(workdir / "cache.db") if args.disk_cache else "",
+        "COVER_IMAGE_CACHE_DIR": str(workdir / "covers") if args.cover_proxy else "",
+        "CROSSWALK_PATH": str(workdir / "crosswalk.db") if args.crosswalk else "",
+        "COVER_IMAGE_HOSTS": "127.0.0.1",
+        "LOG_LEVEL": os.getenv("LOG_LEVEL", "WARNING"),
+    }
+    # 基准测试测的是链路本身，默认关闭出站限流（可用环境变量覆盖）
+    for bucket in ("SEARCH", "DETAIL", "COVER"):
+        env[f"QQMUSIC_RATE_{bucket}"] = os.getenv(f"QQMUSIC_RATE_{bucket}", "0")
+    return env
+
+
+def load_proxy() -> Any:
+    """在本进程内导入 server-proxy.py"""
+    spec = importlib.util.spec_from_file_location(
+        "benchmark_server_proxy", SERVICE_DIR / "server-proxy.py"
+    )
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+# ---------------------------------------------------------------------------
+# 单首歌曲的链路
+# ---------------------------------------------------------------------------
+
+
+class Pipeline:
+    """按工作流顺序执行一首歌曲的各个阶段，记录每个阶段的耗时"""
+
+    def __init__(
+        self,
+        catalog: Catalog,
+        netease_url: str,
+        proxy_url: str,
+        mode: str,
+        cover_proxy: bool,
+        timeout: float,
+        local_search: bool = False,
+    ):
+        self.catalog = catalog
+        self.netease_url = netease_url
+        self.proxy_url = proxy_url
+        self.mode = mode
+        self.cover_proxy_host = proxy_url if cover_proxy else ""
+        self.timeout = timeout
+        self.local_search = local_search
+        # 每个工作线程一个连接池（requests.Session 不保证线程安全）
+        self._local = threading.local()
+
+    def _get(self, stage: str, url: str, params: Dict[str, Any]) -> str:
+        session = getattr(self._local, "session", None)
+        if session is None:
+            session = self._local.session = requests.Session()
+        try:
+            response = session.get(url, params=params, timeout=self.timeout)
+            response.raise_for_status()
+        except requests.RequestException as e:
+            raise StageError(stage, str(e)) from e
+        return response.text
+
+    @staticmethod
+    def _check(stage: str, output: Dict[str, Any]) -> Dict[str, Any]:
+        if output.get("error") or output.get("success") is False:
+            raise StageError(stage, output.get("error") or "节点执行失败")
+        return output
+
+    def run(self, index: int) -> Dict[str, Any]:
+        """返回 {"stages": {阶段: 秒}, "total", "error", "failed_stage", "matched"}"""
+        song = self.catalog.songs[index]
+        stages: Dict[str, float] = {}
+        result: Dict[str, Any] = {"stages": stages, "error": "", "matched": False}
+        current = {"name": ""}
+
+        @contextlib.contextmanager
+        def stage(name: str):
+            current["name"] = name
+            start = time.perf_counter()
+            yield
+            stages[name] = time.perf_counter() - start
+
+        start = time.perf_counter()
+        try:
+            with stage("netease"):
+                song_id = NETEASE_ID_BASE + index
+                detail = self._get(
+                    "netease", f"{self.netease_url}/song/detail", {"ids": song_id}
+                )
+                lyric = self._get(
+                    "netease", f"{self.netease_url}/lyric", {"id": song_id}
+                )
+
+            with stage("structure"):
+                structured = self._check(
+                    "structure", initial_data_structuring.main(detail, lyric)
+                )
+                metadata = structured["metadata"]
+
+            if self.mode == "track":
+                qq = self._run_track(stage, metadata)
+            else:
+                qq = self._run_nodes(stage, metadata)
+            result["matched"] = qq["match_id"] == song["mid"]
+
+            with stage("covers"):
+                self._check(
+                    "covers",
+                    download_and_encode_covers.main(
+                        metadata["cover_art_url"],
+                        qq["cover_url"],
+                        self.cover_proxy_host,
+                    ),
+                )
+            stages["covers"] += qq["cover_seconds"]
+
+            with stage("consolidate"):
+                self._check(
+                    "consolidate",
+                    consolidate.main(
+                        netease_data=metadata,
+                        qqmusic_track_name=qq["track_name"],
+                        qqmusic_interval=qq["interval"],
+                        qqmusic_album_name=qq["album_name"],
+                        qqmusic_parsed_data=qq["parsed_data"],
+                    ),
+                )
+        except StageError as e:
+            result["error"] = str(e)
+            result["failed_stage"] = e.stage
+        except Exception as e:
+            result["error"] = f"{type(e).__name__}: {e}"
+            result["failed_stage"] = current["name"]
+        result["total"] = time.perf_counter() - start
+        return result
+
+    def _run_nodes(self, stage, metadata: Dict[str, Any]) -> Dict[str, Any]:
+        """搜索 → find_qqmusic_match → 详情 → parse_qqmusic_response → 封面 URL"""
+        title = metadata["song_title"]
+        artist = metadata["artists"][0] if metadata["artists"] else ""
+
+        with stage("qq_search"):
+            body = self._get(
+                "qq_search",
+                f"{self.proxy_url}/search",
+                {
+                    "key": f"{title} {artist}",
+                    "pageSize": 10,
+                    "pageNo": 1,
+                    "fields": "workflow",
+                    **({"local": 1} if self.local_search else {}),
+                },
+            )
+            match = find_qqmusic_match.main(
+                body, title, metadata["artists"], metadata["duration_ms"]
+            )
+            if not match["match_found"]:
+                raise StageError("qq_search", match["error"] or "未找到匹配")
+
+        with stage("qq_detail"):
+            body = self._get(
+                "qq_detail",
+                f"{self.proxy_url}/song",
+                {"songmid": match["match_id"], "fields": "workflow"},
+            )
+            parsed = self._check("qq_detail", parse_qqmusic_response.main(body))
+
+        # 封面阶段包括封面 URL 查询、解析和下载（下载在 run() 中计时）
+        start = time.perf_counter()
+        body = self._get(
+            "covers", f"{self.proxy_url}/cover", {"id": parsed["album_pmid"]}
+        )
+        cover = self._check("covers", parse_cover_url.main(body))
+        cover_seconds = time.perf_counter() - start
+
+        return {
+            "match_id": match["match_id"],
+            "track_name": parsed["track_name"],
+            "interval": parsed["interval"],
+            "album_name": parsed["album_name"],
+            "parsed_data": parsed["parsed_data"],
+            "cover_url": cover["cover_url"],
+            "cover_seconds": cover_seconds,
+        }
+
+    def _run_track(self, stage, metadata: Dict[str, Any]) -> Dict[str, Any]:
+        """/track 组合查询（搜索、匹配、详情、封面 URL 一次完成）"""
+        with stage("qq_track"):
+            body = self._get(
+                "qq_track",
+                f"{self.proxy_url}/track",
+                {
+                    "title": metadata["song_title"],
+                    "artists": ",".join(metadata["artists"]),
+                    "duration": metadata["duration_ms"] // 1000,
+                    "netease_id": metadata["song_id"],
+                    "fields": "workflow",
+                },
+            )
+            track = json.loads(body)
+            if not track.get("match_found"):
+                raise StageError("qq_track", track.get("error") or "未找到匹配")
+        return dict(track, cover_seconds=0.0)
+
+
+# ---------------------------------------------------------------------------
+# 统计
+# ---------------------------------------------------------------------------
+
+
+def percentile(samples: List[float], q: float) -> float:
+    """最近邻法分位数（samples 已排序且非空）"""
+    rank = max(1, math.ceil(q / 100.0 * len(samples)))
+    return samples[min(rank, len(samples)) - 1]
+
+
+def summarize(durations: List[float]) -> Dict[str, Any]:
+    """耗时（秒）→ 毫秒统计"""
+    if not durations:
+        return {"count": 0}
+    samples = sorted(durations)
+    summary = {"count": len(samples), "mean": sum(samples) / len(samples)}
+    summary.update({f"p{q}": percentile(samples, q) for q in PERCENTILES})
+    summary["max"] = samples[-1]
+    return {
+        key: value if key == "count" else round(value * 1000, 2)
+        for key, value in summary.items()
+    }
+
+
+def summarize_pass(
+    name: str, results: List[Dict[str, Any]], wall: float, stages: List[str]
+) -> Dict[str, Any]:
+    ok = [r for r in results if not r["error"]]
+    failed = [r for r in results if r["error"]]
+    errors: Dict[str, int] = {}
+    for r in failed:
+        errors[r["failed_stage"]] = errors.get(r["failed_stage"], 0) + 1
+    return {
+        "name": name,
+        "songs": len(results),
+        "succeeded": len(ok),
+        "failed": len(failed),
+        "errors_by_stage": errors,
+        "sample_errors": [r["error"] for r in failed[:5]],
+        "match_accuracy": (
+            round(sum(r["matched"] for r in ok) / len(ok), 4) if ok else None
+        ),
+        "wall_seconds": round(wall, 3),
+        "songs_per_second": round(len(ok) / wall, 2) if wall > 0 else 0.0,
+        "overall_ms": summarize([r["total"] for r in ok]),
+        "stages_ms": {
+            stage: summarize(
+                [r["stages"][stage] for r in results if stage in r["stages"]]
+            )
+            for stage in stages
+        },
+    }
+
+
+# ---------------------------------------------------------------------------
+# 驱动
+# ---------------------------------------------------------------------------
+
+
+def run_pass(pipeline: Pipeline, args) -> tuple:
+    """以 args.concurrency 个线程执行一轮，返回 (结果列表, 墙钟秒数)"""
+    counter = itertools.count()
+    counter_lock = threading.Lock()
+    results: List[Dict[str, Any]] = []
+    results_lock = threading.Lock()
+    start = time.perf_counter()
+    deadline = start + args.duration if args.duration else None
+    catalog_size = len(pipeline.catalog.songs)
+
+    def worker() -> None:
+        while True:
+            with counter_lock:
+                i = next(counter)
+            if deadline is not None:
+                if time.perf_counter() >= deadline:
+                    return
+            elif i >= args.songs:
+                return
+            result = pipeline.run(i % catalog_size)
+            with results_lock:
+                results.append(result)
+
+    # 代码节点的 [DEBUG] 输出不计入报告
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        with ThreadPoolExecutor(max_workers=args.concurrency) as executor:
+            for future in [executor.submit(worker) for _ in range(args.concurrency)]:
+                future.result()
+    return results, time.perf_counter() - start
+
+
+def fetch_json(url: str, method: str = "GET") -> Optional[Any]:
+    try:
+        response = requests.request(method, url, timeout=10)
+        response.raise_for_status()
+        return response.json()
+    except (requests.RequestException, ValueError):
+        return None
+
+
+def git_revision() -> str:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=ROOT,
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return ""
+
+
+def run_benchmark(args) -> Dict[str, Any]:
+    """启动替身服务、依次执行各轮并返回完整报告（JSON 可序列化）"""
+    logging.getLogger("werkzeug").setLevel(logging.ERROR)
+    catalog = Catalog(size=args.catalog_size, seed=args.seed)
+    servers: List[LocalServer] = []
+    mock_url = ""
+    proxy = None
+    tmp = tempfile.TemporaryDirectory(prefix="qqmusic-bench-")
+    env = contextlib.ExitStack()
+
+    try:
+        netease = LocalServer(
+            create_netease_app(
+                catalog,
+                LatencyDistribution(args.netease_latency),
+                catalog.seed,
+                args.image_bytes,
+            )
+        )
+        servers.append(netease)
+
+        if args.proxy:
+            proxy_url = args.proxy.rstrip("/")
+        else:
+            config = MockConfig({"latency": args.latency} if args.latency else None)
+            config.image_bytes = args.image_bytes
+            mock = LocalServer(create_app(config=config, catalog=catalog))
+            servers.append(mock)
+            mock_url = mock.url
+            config.update({"image_base": f"{mock_url}/__mock/image"})
+
+            env.enter_context(patched_env(proxy_env(mock_url, Path(tmp.name), args)))
+            proxy = load_proxy()
+            proxy_server = LocalServer(proxy.app)
+            servers.append(proxy_server)
+            proxy_url = proxy_server.url
+
+        pipeline = Pipeline(
+            catalog,
+            netease.url,
+            proxy_url,
+            args.mode,
+            args.cover_proxy,
+            args.timeout,
+            args.local_search,
+        )
+        report: Dict[str, Any] = {
+            "version": 1,
+            "started_at": datetime.now(timezone.utc).isoformat(),
+            "environment": {
+                "git_revision": git_revision(),
+                "python": platform.python_version(),
+                "platform": platform.platform(),
+                "cpu_count": os.cpu_count(),
+            },
+            "config": {
+                "mode": args.mode,
+                "concurrency": args.concurrency,
+                "songs": None if args.duration else args.songs,
+                "duration": args.duration,
+                "passes": args.passes,
+                "seed": catalog.seed,
+                "catalog_size": catalog.size,
+                "proxy": args.proxy or "in-process",
+                "cover_proxy": args.cover_proxy,
+                "disk_cache": args.disk_cache,
+                "crosswalk": args.crosswalk,
+                "local_search": args.local_search,
+                "netease_latency": args.netease_latency,
+                "upstream": fetch_json(f"{mock_url}/__mock/config")
+                if mock_url
+                else None,
+            },
+            "passes": [],
+        }
+
+        for name in args.passes:
+            if mock_url:
+                fetch_json(f"{mock_url}/__mock/reset", method="POST")
+            results, wall = run_pass(pipeline, args)
+            summary = summarize_pass(name, results, wall, STAGES[args.mode])
+            if mock_url:
+                stats = fetch_json(f"{mock_url}/__mock/stats") or {}
+                summary["upstream_requests"] = {
+                    endpoint: counts["requests"]
+                    for endpoint, counts in stats.get("endpoints", {}).items()
+                }
+            summary["proxy_cache"] = fetch_json(f"{proxy_url}/cache/stats")
+            report["passes"].append(summary)
+            print_pass(summary, STAGES[args.mode])
+        return report
+    finally:
+        for server in reversed(servers):
+            server.close()
+        if proxy is not None:
+            proxy.disk_cache.close()
+            proxy.crosswalk.close()
+        env.close()
+        tmp.cleanup()
+
+
+def print_pass(summary: Dict[str, Any], stages: List[str]) -> None:
+    icon = "🧊" if summary["name"] == "cold" else "🔥"
+    accuracy = summary["match_accuracy"]
+    print(
+        f"\n{icon} {summary['name']}: {summary['succeeded']}/{summary['songs']} 首成功，"
+        f"{summary['wall_seconds']}s，{summary['songs_per_second']} 首/秒"
+        + (f"，匹配正确率 {accuracy:.1%}" if accuracy is not None else "")
+    )
+    if summary.get("upstream_requests"):
+        print(f"   上游请求: {summary['upstream_requests']}")
+    if summary["failed"]:
+        print(f"   ⚠️  失败阶段: {summary['errors_by_stage']}")
+        for error in summary["sample_errors"]:
+            print(f"      {error[:160]}")
+
+    print(f"   {'阶段 (ms)':<14}{'p50':>10}{'p95':>10}{'p99':>10}{'max':>10}")
+    rows = [(stage, summary["stages_ms"][stage]) for stage in stages]
+    rows.append(("overall", summary["overall_ms"]))
+    for stage, stats in rows:
+        if not stats["count"]:
+            continue
+        print(
+            f"   {stage:<14}"
+            + "".join(f"{stats[key]:>10.1f}" for key in ("p50", "p95", "p99", "max"))
+        )
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description="核验链路端到端吞吐量和延迟基准测试")
+    parser.add_argument("--songs", type=int, default=100, help="每轮歌曲数 (默认 100)")
+    parser.add_argument(
+        "--duration", type=float, default=0, help="每轮持续秒数，设置后忽略 --songs"
+    )
+    parser.add_argument("--concurrency", type=int, default=8, help="并发数 (默认 8)")
+    parser.add_argument(
+        "--passes",
+        type=lambda raw: [p.strip() for p in raw.split(",") if p.strip()],
+        default=["cold", "warm"],
+        help="依次执行的轮次，逗号分隔 (默认 cold,warm)",
+    )
+    parser.add_argument(
+        "--mode",
+        choices=sorted(STAGES),
+        default="nodes",
+        help="nodes: 搜索 / 匹配 / 详情 / 封面分开调用；track: /track 组合查询 (默认 nodes)",
+    )
+    parser.add_argument(
+        "--latency", help="QQ 上游延迟分布，同 MOCK_LATENCY (默认使用 mock 的配置)"
+    )
+    parser.add_argument(
+        "--netease-latency",
+        default="lognormal:median=0.05,sigma=0.5",
+        help="网易云替身延迟分布 (默认 lognormal:median=0.05,sigma=0.5)",
+    )
+    parser.add_argument("--seed", type=int, help="曲库种子 (默认 MOCK_SEED 或 42)")
+    parser.add_argument(
+        "--catalog-size", type=int, help="曲库大小 (默认 MOCK_CATALOG_SIZE 或 1000)"
+    )
+    parser.add_argument(
+        "--image-bytes", type=int, default=20000, help="封面图字节数 (默认 20000)"
+    )
+    parser.add_argument(
+        "--cover-proxy",
+        action="store_true",
+        help="封面图经由代理的 /cover/image 下载（默认直接下载）",
+    )
+    parser.add_argument(
+        "--disk-cache", action="store_true", help="启用代理的磁盘缓存（临时目录）"
+    )
+    parser.add_argument(
+        "--crosswalk",
+        action="store_true",
+        help="启用代理的网易云 → QQ 音乐对照表（临时目录，track 模式下 warm 轮跳过搜索）",
+    )
+    parser.add_argument(
+        "--local-search",
+        action="store_true",
+        help="nodes 模式的搜索使用代理的本地索引（/search?local=1）",
+    )
+    parser.add_argument("--proxy", help="压测已启动的代理，例如 http://localhost:3001")
+    parser.add_argument("--timeout", type=float, default=15, help="HTTP 超时秒数")
+    parser.add_argument("--output", help="结果 JSON 文件路径")
+    return parser
+
+
+def main():
+    """主函数"""
+    args = build_parser().parse_args()
+    if args.concurrency < 1 or (args.songs < 1 and not args.duration):
+        print("❌ --concurrency 和 --songs 必须大于 0")
+        sys.exit(2)
+
+    print("=" * 60)
+    print("核验链路基准测试")
+    print("=" * 60)
+    limit = f"{args.duration}s" if args.duration else f"{args.songs} 首"
+    print(f"模式: {args.mode}，并发: {args.concurrency}，每轮: {limit}")
+
+    report = run_benchmark(args)
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f"\n✅ 结果已写入 {args.output}")
+
+
+if __name__ == "__main__":
+    main()
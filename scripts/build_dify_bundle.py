@@ -22,81 +22,77 @@ def load_code_file(file_path: Path) -> str:
         return f.read()
 
 
-def inline_models_import(code: str, models_file: Path) -> str:
+# 代码节点共用的本地模块（Dify 代码节点只能是单个文件，打包时内联）
+# candidate_ranking 自身导入 text_normalize，需排在它前面，内联后的导入才会被替换
+LOCAL_MODULES = ("models", "candidate_ranking", "text_normalize", "instrumentation")
+
+
+def strip_module_docstring(source: str) -> str:
+    """去掉模块开头的文档字符串，保留其余代码（包括导入语句）"""
+    import ast
+
+    body = ast.parse(source).body
+    if (
+        body
+        and isinstance(body[0], ast.Expr)
+        and isinstance(body[0].value, ast.Constant)
+        and isinstance(body[0].value.value, str)
+    ):
+        source = "\n".join(source.split("\n")[body[0].end_lineno :])
+    return source.strip("\n")
+
+
+def inline_local_imports(code: str, code_dir: Path) -> str:
     """
-    将 'from models import ...' 替换为 models.py 的实际内容
+    将 'from models import ...'、'from text_normalize import ...' 等本地模块导入
+    替换为模块的实际内容（每个模块只内联一次）
+    支持单行和带括号的多行导入；其他写法（import text_normalize、函数内导入等）
+    无法内联，打包后的节点会在 Dify 中导入失败，因此直接报错
 
     Args:
         code: 原始代码
-        models_file: models.py 文件路径
+        code_dir: 代码节点目录（本地模块所在目录）
 
     Returns:
-        处理后的代码，models.py 内容已内联
+        处理后的代码，本地模块内容已内联
+
+    Raises:
+        ValueError: 仍有未内联的本地模块导入
     """
     import re
 
-    # 检查是否有 from models import
-    if "from models import" not in code:
-        return code
-
-    # 读取 models.py 内容
-    if not models_file.exists():
-        print("    ⚠️  警告: models.py 不存在，无法内联")
-        return code
-
-    models_content = load_code_file(models_file)
-
-    # 提取 models.py 中的导入语句（需要保留）
-    models_imports = []
-    for line in models_content.split("\n"):
-        if line.strip().startswith("from ") or line.strip().startswith("import "):
-            if "models" not in line:  # 排除自引用
-                models_imports.append(line)
-
-    # 提取 models.py 中的实际代码（去除文档字符串和导入）
-    lines = models_content.split("\n")
-    code_lines = []
-    in_docstring = False
-    _skip_next = False
-
-    for i, line in enumerate(lines):
-        # 跳过文件开头的文档字符串
-        if i < 10 and '"""' in line:
-            if in_docstring:
-                in_docstring = False
-                continue
-            else:
-                in_docstring = True
-                continue
-        if in_docstring:
-            continue
-
-        # 跳过导入语句
-        if line.strip().startswith("from ") or line.strip().startswith("import "):
+    for module in LOCAL_MODULES:
+        import_pattern = re.compile(
+            rf"^from {module} import (?:\([^)]*\)|[^\n(]+)$\n?", flags=re.MULTILINE
+        )
+        first = import_pattern.search(code)
+        if first is None:
             continue
 
-        # 保留其他代码
-        if line.strip():  # 非空行
-            code_lines.append(line)
-
-    models_code = "\n".join(code_lines)
-
-    # 在原代码中找到 from models import 的位置
-    import_pattern = r"from models import [^\n]+"
-    match = re.search(import_pattern, code)
+        module_file = code_dir / f"{module}.py"
+        if not module_file.exists():
+            raise ValueError(f"{module}.py 不存在，无法内联")
 
-    if match:
-        # 构建替换内容
-        replacement = f"""# ===== Inlined from models.py =====
-{chr(10).join(models_imports)}
-
-{models_code}
-# ===== End of models.py =====
+        module_code = strip_module_docstring(load_code_file(module_file))
+        replacement = f"""# ===== Inlined from {module}.py =====
+{module_code}
+# ===== End of {module}.py =====
 """
-        # 替换导入语句
-        code = re.sub(import_pattern, replacement, code)
-        print("    ✅ 已内联 models.py")
+        # 替换第一处导入，其余重复导入直接删除
+        code = (
+            code[: first.start()]
+            + replacement
+            + import_pattern.sub("", code[first.end() :])
+        )
+        print(f"    ✅ 已内联 {module}.py")
 
+    leftover = re.search(
+        rf"^[ \t]*(?:from|import) (?:{'|'.join(LOCAL_MODULES)})\b.*$",
+        code,
+        flags=re.MULTILINE,
+    )
+    if leftover:
+        raise ValueError(f"无法内联的本地模块导入: {leftover.group().strip()}")
     return code
 
 
@@ -116,9 +112,9 @@ def process_code_node(node: Dict[str, Any], base_dir: Path) -> Dict[str, Any]:
                 # 读取代码文件内容
                 code_content = load_code_file(code_file_path)
 
-                # 处理 models.py 导入
-                models_file = base_dir / "nodes" / "code-nodes" / "models.py"
-                code_content = inline_models_import(code_content, models_file)
+                # 处理本地模块导入（LOCAL_MODULES）
+                code_dir = base_dir / "nodes" / "code-nodes"
+                code_content = inline_local_imports(code_content, code_dir)
 
                 # 替换 code_file 为 code
                 del config["code_file"]
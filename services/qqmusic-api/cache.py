@@ -0,0 +1,295 @@
+"""
+进程内响应缓存
+按 TTL 和总字节数双重约束的 LRU 缓存，支持 stale-while-revalidate
+
+- 新鲜期 (ttl) 内直接命中
+- 过期但仍在 stale_ttl 窗口内：立即返回旧值，同时在后台刷新
+  （同步模式使用最多 refresh_workers 个线程的线程池，每个 key 同时只有一个刷新）
+- 超出 stale_ttl：视为未命中，同步加载
+- 总字节数超过 max_bytes 时按 LRU 顺序淘汰
+- 可选的 backing 层（例如 SQLite 磁盘缓存）：内存未命中时先查 backing，
+  加载和刷新的结果同时写入 backing
+"""
+
+import asyncio
+import json
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+# 缓存查询结果状态
+HIT = "HIT"
+STALE = "STALE"
+MISS = "MISS"
+# 内存未命中、从 backing 层（磁盘）读到
+DISK = "DISK"
+
+
+def payload_size(value: Any) -> int:
+    """估算缓存值的字节数（按 JSON 序列化后的 UTF-8 长度）"""
+    if isinstance(value, (bytes, bytearray)):
+        return len(value)
+    return len(json.dumps(value, ensure_ascii=False).encode("utf-8"))
+
+
+class _Entry:
+    __slots__ = ("value", "size", "stored_at")
+
+    def __init__(self, value: Any, size: int, stored_at: float):
+        self.value = value
+        self.size = size
+        self.stored_at = stored_at
+
+
+class TTLCache:
+    """
+    TTL + 字节上限的 LRU 缓存（线程安全）
+
+    参数:
+        ttl: 新鲜期秒数，<= 0 时禁用缓存
+        stale_ttl: 过期后仍可返回旧值的秒数
+        max_bytes: 所有条目的总字节上限
+        sizeof: 计算条目大小的函数
+        backing: 可选的第二层缓存，需要提供 get(key) / set(key, value)
+        refresh_workers: 同步模式后台刷新的最大线程数
+    """
+
+    def __init__(
+        self,
+        ttl: float,
+        stale_ttl: float = 0,
+        max_bytes: int = 64 * 1024 * 1024,
+        sizeof: Callable[[Any], int] = payload_size,
+        clock: Callable[[], float] = time.monotonic,
+        backing: Optional[Any] = None,
+        refresh_workers: int = 4,
+    ):
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self.max_bytes = max_bytes
+        self.sizeof = sizeof
+        self.clock = clock
+        self.backing = backing
+
+        self._entries: "OrderedDict[str, _Entry]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        # 排队或正在刷新的 key，同一 key 不会重复提交
+        self._refreshing: set = set()
+        self._tasks: set = set()
+        self.refresh_workers = refresh_workers
+        self._refresh_executor: Optional[ThreadPoolExecutor] = None
+
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.refresh_errors = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.ttl > 0 and self.max_bytes > 0
+
+    def lookup(self, key: str) -> Tuple[Optional[Any], str]:
+        """
+        查询缓存，返回 (值, 状态)
+        状态为 HIT / STALE / MISS，MISS 时值为 None（不查 backing 层）
+        """
+        if not self.enabled:
+            return None, MISS
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None, MISS
+
+            age = self.clock() - entry.stored_at
+            if age <= self.ttl:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry.value, HIT
+
+            if age <= self.ttl + self.stale_ttl:
+                self._entries.move_to_end(key)
+                self.stale_hits += 1
+                return entry.value, STALE
+
+            # 超出 stale 窗口，删除过期条目
+            self._remove(key)
+            self.expirations += 1
+            self.misses += 1
+            return None, MISS
+
+    def set(self, key: str, value: Any) -> None:
+        """写入缓存，超出字节上限时淘汰最久未使用的条目"""
+        if not self.enabled:
+            return
+
+        size = self.sizeof(value)
+        if size > self.max_bytes:
+            # 单条超过总上限，不缓存
+            return
+
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = _Entry(value, size, self.clock())
+            self._bytes += size
+
+            while self._bytes > self.max_bytes and self._entries:
+                oldest_key = next(iter(self._entries))
+                self._remove(oldest_key)
+                self.evictions += 1
+
+    def invalidate(self, key: str) -> None:
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def get_or_load(self, key: str, loader: Callable[[], Any]) -> Tuple[Any, str]:
+        """
+        读取缓存，未命中时调用 loader 加载并写入
+        命中 stale 条目时立即返回旧值，并在后台线程池中调用 loader 刷新
+        loader 抛出的异常在同步加载时向上传播
+        """
+        value, state = self.lookup(key)
+        if state == HIT:
+            return value, state
+        if state == STALE:
+            self._refresh_in_background(key, loader)
+            return value, state
+
+        value = self._backing_get(key)
+        if value is not None:
+            self.set(key, value)
+            return value, DISK
+
+        value = loader()
+        self._store(key, value)
+        return value, MISS
+
+    async def get_or_load_async(
+        self, key: str, loader: Callable[[], Awaitable[Any]]
+    ) -> Tuple[Any, str]:
+        """get_or_load 的异步版本，stale 条目通过后台 asyncio 任务刷新"""
+        value, state = self.lookup(key)
+        if state == HIT:
+            return value, state
+        if state == STALE:
+            self._refresh_task(key, loader)
+            return value, state
+
+        # backing 层（SQLite）是阻塞调用，在线程池中执行
+        value = await self._backing_get_async(key)
+        if value is not None:
+            self.set(key, value)
+            return value, DISK
+
+        value = await loader()
+        await self._store_async(key, value)
+        return value, MISS
+
+    def _backing_get(self, key: str) -> Optional[Any]:
+        if self.backing is None or not self.enabled:
+            return None
+        return self.backing.get(key)
+
+    async def _backing_get_async(self, key: str) -> Optional[Any]:
+        if self.backing is None or not self.enabled:
+            return None
+        return await asyncio.to_thread(self.backing.get, key)
+
+    def _store(self, key: str, value: Any) -> None:
+        """写入内存和 backing 层"""
+        self.set(key, value)
+        if self.backing is not None and self.enabled:
+            self.backing.set(key, value)
+
+    async def _store_async(self, key: str, value: Any) -> None:
+        """_store 的异步版本，backing 层在线程池中写入"""
+        self.set(key, value)
+        if self.backing is not None and self.enabled:
+            await asyncio.to_thread(self.backing.set, key, value)
+
+    def _refresh_task(self, key: str, loader: Callable[[], Awaitable[Any]]) -> None:
+        with self._lock:
+            if key in self._refreshing:
+                return
+            self._refreshing.add(key)
+
+        async def refresh():
+            try:
+                await self._store_async(key, await loader())
+            except Exception:
+                with self._lock:
+                    self.refresh_errors += 1
+            finally:
+                with self._lock:
+                    self._refreshing.discard(key)
+
+        # 保存任务引用，避免被垃圾回收
+        task = asyncio.ensure_future(refresh())
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    def _refresh_in_background(self, key: str, loader: Callable[[], Any]) -> None:
+        with self._lock:
+            if key in self._refreshing:
+                return
+            self._refreshing.add(key)
+
+        def refresh():
+            try:
+                self._store(key, loader())
+            except Exception:
+                # 刷新失败时保留旧值，等待下一次 stale 命中重试
+                with self._lock:
+                    self.refresh_errors += 1
+            finally:
+                with self._lock:
+                    self._refreshing.discard(key)
+
+        with self._lock:
+            # 第一次需要刷新时才创建（gunicorn 预加载时主进程中不会有线程）
+            if self._refresh_executor is None:
+                self._refresh_executor = ThreadPoolExecutor(
+                    max_workers=self.refresh_workers,
+                    thread_name_prefix="cache-refresh",
+                )
+            executor = self._refresh_executor
+        executor.submit(refresh)
+
+    def _remove(self, key: str) -> None:
+        entry = self._entries.pop(key)
+        self._bytes -= entry.size
+
+    def stats(self) -> Dict[str, Any]:
+        """命中/未命中/淘汰计数"""
+        with self._lock:
+            lookups = self.hits + self.stale_hits + self.misses
+            return {
+                "enabled": self.enabled,
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "ttl": self.ttl,
+                "stale_ttl": self.stale_ttl,
+                "hits": self.hits,
+                "stale_hits": self.stale_hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "refresh_errors": self.refresh_errors,
+                "hit_ratio": (self.hits + self.stale_hits) / lookups
+                if lookups
+                else 0.0,
+            }
@@ -0,0 +1,252 @@
+"""
+网易云歌曲 ID → QQ 音乐 songmid 对照表（SQLite）
+/track 带 netease_id 时先查对照表，命中高置信度的匹配就跳过搜索，直接获取详情和封面
+
+- 只记录得分不低于 CROSSWALK_MIN_SCORE 的匹配（与 /track 的匹配打分相同）
+- 命中后用返回的歌曲详情重新打分，低于阈值（上游数据或网易云元数据变化）时作废并重新搜索
+- 超过 CROSSWALK_MAX_AGE 的条目不再直接使用，重新搜索后覆盖
+- SQLite 出错时记录日志并按未命中处理，不影响请求
+
+环境变量:
+- CROSSWALK_PATH: SQLite 文件路径，为空时禁用 (默认空)
+- CROSSWALK_MIN_SCORE: 记录和使用匹配的最低得分 (默认 0.9)
+- CROSSWALK_MAX_AGE: 条目有效秒数，0 表示不过期 (默认 2592000，即 30 天)
+"""
+
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Callable, Dict, Optional
+
+logger = logging.getLogger("qqmusic_proxy")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS crosswalk (
+    netease_id TEXT PRIMARY KEY,
+    songmid TEXT NOT NULL,
+    score REAL NOT NULL,
+    match TEXT NOT NULL,
+    matched_at REAL NOT NULL
+);
+"""
+
+# stats() 中条目数的缓存秒数：COUNT(*) 要扫描整张表，/metrics 每次抓取不必重新统计
+ENTRIES_COUNT_TTL = 30.0
+
+# 保存的搜索结果字段（flatten_track 和核验打分需要的部分）
+MATCH_FIELDS = ("songmid", "songname", "albumname", "albummid", "interval", "singer")
+
+
+class Crosswalk:
+    """
+    对照表（线程安全，单连接 + 锁）
+
+    参数:
+        path: 数据库文件路径，为空时禁用
+        min_score: 记录和使用匹配的最低得分
+        max_age: 条目有效秒数，<= 0 表示不过期
+        clock: 墙上时钟（需要跨进程重启比较，不能用 monotonic）
+    """
+
+    def __init__(
+        self,
+        path: Optional[str] = None,
+        min_score: Optional[float] = None,
+        max_age: Optional[float] = None,
+        clock: Callable[[], float] = time.time,
+    ):
+        self.path = os.getenv("CROSSWALK_PATH", "") if path is None else path
+        self.min_score = (
+            float(os.getenv("CROSSWALK_MIN_SCORE", 0.9))
+            if min_score is None
+            else min_score
+        )
+        self.max_age = (
+            float(os.getenv("CROSSWALK_MAX_AGE", 30 * 86400))
+            if max_age is None
+            else max_age
+        )
+        self.clock = clock
+        self._lock = threading.Lock()
+        self._conn: Optional[sqlite3.Connection] = None
+
+        self.hits = 0
+        self.misses = 0
+        self.writes = 0
+        self.invalidations = 0
+        self.errors = 0
+        # 最近一次统计的条目数和统计时间（monotonic）
+        self._entries = 0
+        self._entries_at = float("-inf")
+
+        if self.path:
+            self._open()
+
+    @property
+    def enabled(self) -> bool:
+        return self._conn is not None
+
+    def _open(self) -> None:
+        try:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            conn = sqlite3.connect(self.path, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.executescript(_SCHEMA)
+            self._conn = conn
+        except (OSError, sqlite3.Error) as e:
+            logger.warning("对照表不可用 (%s): %s", self.path, e)
+            self._conn = None
+
+    def get(self, netease_id: str) -> Optional[Dict[str, Any]]:
+        """
+        读取可直接使用的匹配（搜索结果格式，附带 score），
+        不存在、得分低于阈值或已超过有效期时返回 None
+        """
+        if not self.enabled or not netease_id:
+            return None
+        try:
+            with self._lock:
+                row = self._conn.execute(
+                    "SELECT score, match, matched_at FROM crosswalk "
+                    "WHERE netease_id = ?",
+                    (netease_id,),
+                ).fetchone()
+                fresh = row is not None and row[0] >= self.min_score
+                if fresh and self.max_age > 0:
+                    fresh = self.clock() - row[2] < self.max_age
+                if not fresh:
+                    self.misses += 1
+                    return None
+                self.hits += 1
+            return {**json.loads(row[1]), "score": row[0]}
+        except (sqlite3.Error, ValueError) as e:
+            self._record_error("读取", e)
+            return None
+
+    def record(self, netease_id: str, match: Dict[str, Any]) -> bool:
+        """记录 /track 的匹配结果，得分低于阈值时不记录；返回是否写入"""
+        score = match.get("score", 0.0)
+        if not self.enabled or not netease_id or score < self.min_score:
+            return False
+        stored = {field: match[field] for field in MATCH_FIELDS if field in match}
+        try:
+            payload = json.dumps(stored, ensure_ascii=False)
+            with self._lock:
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO crosswalk "
+                    "(netease_id, songmid, score, match, matched_at) "
+                    "VALUES (?, ?, ?, ?, ?)",
+                    (
+                        netease_id,
+                        match.get("songmid", ""),
+                        score,
+                        payload,
+                        self.clock(),
+                    ),
+                )
+                self._conn.commit()
+                self.writes += 1
+            return True
+        except (sqlite3.Error, TypeError, ValueError) as e:
+            self._record_error("写入", e)
+            return False
+
+    def invalidate(self, netease_id: str) -> bool:
+        """作废条目（核验不通过或工作流发现不一致），返回条目是否存在"""
+        if not self.enabled:
+            return False
+        try:
+            with self._lock:
+                cursor = self._conn.execute(
+                    "DELETE FROM crosswalk WHERE netease_id = ?", (netease_id,)
+                )
+                self._conn.commit()
+                removed = cursor.rowcount > 0
+                if removed:
+                    self.invalidations += 1
+                    self._entries = max(0, self._entries - 1)
+            return removed
+        except sqlite3.Error as e:
+            self._record_error("删除", e)
+            return False
+
+    def lookup(self, netease_id: str) -> Optional[Dict[str, Any]]:
+        """查看条目（不论得分和有效期，不计入命中统计）"""
+        if not self.enabled:
+            return None
+        try:
+            with self._lock:
+                row = self._conn.execute(
+                    "SELECT songmid, score, match, matched_at FROM crosswalk "
+                    "WHERE netease_id = ?",
+                    (netease_id,),
+                ).fetchone()
+        except sqlite3.Error as e:
+            self._record_error("读取", e)
+            return None
+        if row is None:
+            return None
+        return {
+            "netease_id": netease_id,
+            "songmid": row[0],
+            "score": row[1],
+            "match": json.loads(row[2]),
+            "matched_at": row[3],
+        }
+
+    def after_fork(self) -> None:
+        """gunicorn 预加载应用后在每个 worker 中调用，重新打开 SQLite 连接"""
+        self._lock = threading.Lock()
+        self._conn = None
+        if self.path:
+            self._open()
+
+    def close(self) -> None:
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+    def _record_error(self, action: str, error: Exception) -> None:
+        with self._lock:
+            self.errors += 1
+        logger.warning("对照表%s失败: %s", action, error)
+
+    def _count_entries(self) -> int:
+        """条目数，最多每 ENTRIES_COUNT_TTL 秒统计一次（期间只按作废的条目扣减）"""
+        now = time.monotonic()
+        if not self.enabled or now - self._entries_at < ENTRIES_COUNT_TTL:
+            return self._entries
+        try:
+            with self._lock:
+                self._entries = self._conn.execute(
+                    "SELECT COUNT(*) FROM crosswalk"
+                ).fetchone()[0]
+                self._entries_at = now
+        except sqlite3.Error:
+            pass
+        return self._entries
+
+    def stats(self) -> Dict[str, Any]:
+        entries = self._count_entries()
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "enabled": self.enabled,
+                "path": self.path,
+                "entries": entries,
+                "min_score": self.min_score,
+                "max_age": self.max_age,
+                "hits": self.hits,
+                "misses": self.misses,
+                "writes": self.writes,
+                "invalidations": self.invalidations,
+                "errors": self.errors,
+                "hit_ratio": self.hits / lookups if lookups else 0.0,
+            }
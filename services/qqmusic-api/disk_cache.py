@@ -0,0 +1,498 @@
+"""
+磁盘缓存层（SQLite）
+进程内缓存之下的第二层，容器重启后仍能直接返回热点歌曲，不必重新请求上游
+
+- 键为 上游端点 + 参数（与 singleflight 的合并键相同：只规范化搜索关键词，
+  songmid、封面 ID 区分大小写原样使用）
+- WAL 模式，读写互不阻塞
+- 每个端点独立的 TTL，过期条目由后台线程定期清理
+- SQLite 出错时记录日志并按未命中处理，不影响请求
+- settings 表保存运行时调整的配置（例如出站限流），warm_jobs 表保存预热任务状态和心跳，
+  多个 worker 通过它们共享
+
+环境变量:
+- DISK_CACHE_PATH: SQLite 文件路径，为空时禁用 (默认空)
+- DISK_CACHE_TTL_SEARCH: /getSearchByKey 结果 TTL 秒数 (默认 3600)
+- DISK_CACHE_TTL_SONG: /getSongInfo 结果 TTL 秒数 (默认 604800)
+- DISK_CACHE_TTL_COVER: /getImageUrl 结果 TTL 秒数 (默认 604800)
+- DISK_CACHE_COMPACT_INTERVAL: 后台清理间隔秒数 (默认 600)
+"""
+
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from singleflight import normalize_key
+
+logger = logging.getLogger("qqmusic_proxy")
+
+ENDPOINT_TTL_ENV = {
+    "getSearchByKey": ("DISK_CACHE_TTL_SEARCH", 3600),
+    "getSongInfo": ("DISK_CACHE_TTL_SONG", 7 * 86400),
+    "getImageUrl": ("DISK_CACHE_TTL_COVER", 7 * 86400),
+}
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS entries (
+    key TEXT PRIMARY KEY,
+    endpoint TEXT NOT NULL,
+    value TEXT NOT NULL,
+    stored_at REAL NOT NULL,
+    expires_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS entries_expires_at ON entries (expires_at);
+CREATE TABLE IF NOT EXISTS settings (
+    name TEXT PRIMARY KEY,
+    value TEXT NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS warm_jobs (
+    id TEXT PRIMARY KEY,
+    state TEXT NOT NULL,
+    status TEXT NOT NULL,
+    created_at REAL NOT NULL,
+    cancel_requested INTEGER NOT NULL DEFAULT 0,
+    heartbeat_at REAL NOT NULL DEFAULT 0
+);
+"""
+
+# 已结束的预热任务状态
+_FINISHED_WARM_STATES = ("done", "cancelled")
+# 心跳超时的未结束任务（执行它的 worker 已退出）读取时的状态
+ABANDONED_WARM_STATE = "abandoned"
+
+# stats() 中条目数的缓存秒数：COUNT(*) 要扫描整张表，/metrics 每次抓取不必重新统计
+ENTRIES_COUNT_TTL = 30.0
+
+# 键格式版本（PRAGMA user_version）；旧版本的键把 songmid 等标识转成了小写，
+# 大小写不同的歌曲会共用一个条目，打开时整体清空（只是缓存）
+KEY_VERSION = 2
+
+
+def endpoint_ttls(overrides: Optional[Dict[str, float]] = None) -> Dict[str, float]:
+    """读取每个端点的 TTL，overrides 优先"""
+    ttls = {
+        endpoint: float(os.getenv(name, default))
+        for endpoint, (name, default) in ENDPOINT_TTL_ENV.items()
+    }
+    ttls.update(overrides or {})
+    return ttls
+
+
+class DiskCache:
+    """
+    SQLite 磁盘缓存（线程安全，单连接 + 锁）
+
+    参数:
+        path: 数据库文件路径，为空时禁用
+        ttls: 端点 → TTL 秒数，未列出或 <= 0 的端点不缓存
+        clock: 墙上时钟（需要跨进程重启比较，不能用 monotonic）
+    """
+
+    def __init__(
+        self,
+        path: Optional[str] = None,
+        ttls: Optional[Dict[str, float]] = None,
+        clock: Callable[[], float] = time.time,
+    ):
+        self.path = os.getenv("DISK_CACHE_PATH", "") if path is None else path
+        self.ttls = endpoint_ttls(ttls)
+        self.clock = clock
+        self._lock = threading.Lock()
+        self._conn: Optional[sqlite3.Connection] = None
+        self._stop = threading.Event()
+        self._compactor: Optional[threading.Thread] = None
+
+        self.hits = 0
+        self.misses = 0
+        self.writes = 0
+        self.errors = 0
+        self.compacted = 0
+        # 最近一次统计的条目数和统计时间（monotonic）
+        self._entries = 0
+        self._entries_at = float("-inf")
+
+        if self.path:
+            self._open()
+
+    @property
+    def enabled(self) -> bool:
+        return self._conn is not None
+
+    def _open(self) -> None:
+        try:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            conn = sqlite3.connect(self.path, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.executescript(_SCHEMA)
+            warm_columns = {
+                row[1] for row in conn.execute("PRAGMA table_info(warm_jobs)")
+            }
+            if "heartbeat_at" not in warm_columns:
+                # 旧版本的表没有心跳列，其中未结束的任务按心跳超时处理
+                conn.execute(
+                    "ALTER TABLE warm_jobs "
+                    "ADD COLUMN heartbeat_at REAL NOT NULL DEFAULT 0"
+                )
+                conn.commit()
+            if conn.execute("PRAGMA user_version").fetchone()[0] < KEY_VERSION:
+                removed = conn.execute("DELETE FROM entries").rowcount
+                conn.execute(f"PRAGMA user_version = {KEY_VERSION}")
+                conn.commit()
+                if removed:
+                    logger.info("磁盘缓存键格式已更新，清空旧条目 %d 条", removed)
+            self._conn = conn
+        except (OSError, sqlite3.Error) as e:
+            logger.warning("磁盘缓存不可用 (%s): %s", self.path, e)
+            self._conn = None
+
+    def get(self, endpoint: str, params: Dict[str, Any]) -> Optional[Any]:
+        """读取未过期的条目，不存在或已过期时返回 None"""
+        if not self.enabled or self.ttls.get(endpoint, 0) <= 0:
+            return None
+
+        key = normalize_key(endpoint, params)
+        try:
+            with self._lock:
+                row = self._conn.execute(
+                    "SELECT value FROM entries WHERE key = ? AND expires_at > ?",
+                    (key, self.clock()),
+                ).fetchone()
+                if row is None:
+                    self.misses += 1
+                    return None
+                self.hits += 1
+            return json.loads(row[0])
+        except (sqlite3.Error, ValueError) as e:
+            self._record_error("读取", e)
+            return None
+
+    def set(self, endpoint: str, params: Dict[str, Any], value: Any) -> None:
+        """写入条目，TTL 按端点配置"""
+        ttl = self.ttls.get(endpoint, 0)
+        if not self.enabled or ttl <= 0:
+            return
+
+        key = normalize_key(endpoint, params)
+        now = self.clock()
+        try:
+            payload = json.dumps(value, ensure_ascii=False)
+            with self._lock:
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO entries "
+                    "(key, endpoint, value, stored_at, expires_at) "
+                    "VALUES (?, ?, ?, ?, ?)",
+                    (key, endpoint, payload, now, now + ttl),
+                )
+                self._conn.commit()
+                self.writes += 1
+        except (sqlite3.Error, TypeError, ValueError) as e:
+            self._record_error("写入", e)
+
+    def delete(self, endpoint: str, params: Dict[str, Any]) -> None:
+        if not self.enabled:
+            return
+        try:
+            with self._lock:
+                self._conn.execute(
+                    "DELETE FROM entries WHERE key = ?",
+                    (normalize_key(endpoint, params),),
+                )
+                self._conn.commit()
+        except sqlite3.Error as e:
+            self._record_error("删除", e)
+
+    def get_setting(self, name: str) -> Optional[Tuple[Any, float]]:
+        """读取共享配置，返回 (值, 更新时间)；不存在或未启用时返回 None"""
+        if not self.enabled:
+            return None
+        try:
+            with self._lock:
+                row = self._conn.execute(
+                    "SELECT value, updated_at FROM settings WHERE name = ?", (name,)
+                ).fetchone()
+            if row is None:
+                return None
+            return json.loads(row[0]), row[1]
+        except (sqlite3.Error, ValueError) as e:
+            self._record_error("读取配置", e)
+            return None
+
+    def set_setting(self, name: str, value: Any) -> Optional[float]:
+        """写入共享配置，返回更新时间；未启用或失败时返回 None"""
+        if not self.enabled:
+            return None
+        now = self.clock()
+        try:
+            payload = json.dumps(value, ensure_ascii=False)
+            with self._lock:
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO settings (name, value, updated_at) "
+                    "VALUES (?, ?, ?)",
+                    (name, payload, now),
+                )
+                self._conn.commit()
+            return now
+        except (sqlite3.Error, TypeError, ValueError) as e:
+            self._record_error("写入配置", e)
+            return None
+
+    def save_warm_job(
+        self, status: Dict[str, Any], keep: int, stale_after: float
+    ) -> None:
+        """
+        写入预热任务状态并更新心跳，只保留最近 keep 个已结束的任务
+        （心跳超过 stale_after 秒未更新的未结束任务也算已结束）
+        """
+        if not self.enabled:
+            return
+        now = self.clock()
+        try:
+            payload = json.dumps(status, ensure_ascii=False)
+            with self._lock:
+                self._conn.execute(
+                    "INSERT INTO warm_jobs (id, state, status, created_at, heartbeat_at) "
+                    "VALUES (?, ?, ?, ?, ?) ON CONFLICT (id) DO UPDATE SET "
+                    "state = excluded.state, status = excluded.status, "
+                    "heartbeat_at = excluded.heartbeat_at",
+                    (status["id"], status["state"], payload, status["created_at"], now),
+                )
+                self._conn.execute(
+                    "DELETE FROM warm_jobs WHERE (state IN (?, ?) OR heartbeat_at < ?) "
+                    "AND id NOT IN (SELECT id FROM warm_jobs "
+                    "WHERE state IN (?, ?) OR heartbeat_at < ? "
+                    "ORDER BY created_at DESC LIMIT ?)",
+                    (
+                        *_FINISHED_WARM_STATES,
+                        now - stale_after,
+                        *_FINISHED_WARM_STATES,
+                        now - stale_after,
+                        keep,
+                    ),
+                )
+                self._conn.commit()
+        except (sqlite3.Error, TypeError, ValueError) as e:
+            self._record_error("写入预热任务", e)
+
+    def touch_warm_jobs(self, job_ids: List[str]) -> None:
+        """只更新心跳（排队中、状态没有变化的任务）"""
+        if not self.enabled or not job_ids:
+            return
+        try:
+            with self._lock:
+                self._conn.execute(
+                    "UPDATE warm_jobs SET heartbeat_at = ? "
+                    f"WHERE id IN ({', '.join('?' * len(job_ids))})",
+                    (self.clock(), *job_ids),
+                )
+                self._conn.commit()
+        except sqlite3.Error as e:
+            self._record_error("写入预热任务", e)
+
+    def load_warm_job(
+        self, job_id: str, stale_after: float
+    ) -> Optional[Dict[str, Any]]:
+        """
+        读取预热任务状态，不存在时返回 None
+        心跳超过 stale_after 秒未更新的未结束任务状态为 abandoned
+        """
+        jobs = self._query_warm_jobs("WHERE id = ?", (job_id,), stale_after)
+        return jobs[0] if jobs else None
+
+    def recent_warm_jobs(self, limit: int, stale_after: float) -> List[Dict[str, Any]]:
+        """最近的 limit 个预热任务状态（按创建时间从早到晚），abandoned 同 load_warm_job"""
+        jobs = self._query_warm_jobs(
+            "ORDER BY created_at DESC LIMIT ?", (limit,), stale_after
+        )
+        return jobs[::-1]
+
+    def _query_warm_jobs(
+        self, clause: str, params: Tuple, stale_after: float
+    ) -> List[Dict[str, Any]]:
+        if not self.enabled:
+            return []
+        try:
+            with self._lock:
+                rows = self._conn.execute(
+                    "SELECT status, cancel_requested, heartbeat_at "
+                    f"FROM warm_jobs {clause}",
+                    params,
+                ).fetchall()
+            stale_before = self.clock() - stale_after
+            jobs = []
+            for status, cancel_requested, heartbeat_at in rows:
+                job = json.loads(status)
+                if job["state"] not in _FINISHED_WARM_STATES:
+                    if heartbeat_at < stale_before:
+                        job["state"] = ABANDONED_WARM_STATE
+                    elif cancel_requested:
+                        job["cancel_requested"] = True
+                jobs.append(job)
+            return jobs
+        except (sqlite3.Error, ValueError) as e:
+            self._record_error("读取预热任务", e)
+            return []
+
+    def request_warm_cancel(self, job_id: str) -> bool:
+        """标记取消预热任务（由执行任务的 worker 处理），任务不存在时返回 False"""
+        if not self.enabled:
+            return False
+        try:
+            with self._lock:
+                cursor = self._conn.execute(
+                    "UPDATE warm_jobs SET cancel_requested = 1 WHERE id = ?", (job_id,)
+                )
+                self._conn.commit()
+            return cursor.rowcount > 0
+        except sqlite3.Error as e:
+            self._record_error("取消预热任务", e)
+            return False
+
+    def warm_cancel_requested(self, job_id: str) -> bool:
+        if not self.enabled:
+            return False
+        try:
+            with self._lock:
+                row = self._conn.execute(
+                    "SELECT cancel_requested FROM warm_jobs WHERE id = ?", (job_id,)
+                ).fetchone()
+            return bool(row and row[0])
+        except sqlite3.Error as e:
+            self._record_error("读取预热任务", e)
+            return False
+
+    def tier(self, endpoint: str, to_params: Callable[[str], Dict[str, Any]]):
+        """
+        以单个字符串为键的视图，作为 TTLCache 的 backing 层使用
+        例如 disk_cache.tier("getSongInfo", lambda mid: {"songmid": mid})
+        """
+        return _DiskTier(self, endpoint, to_params)
+
+    def compact(self) -> int:
+        """删除过期条目并截断 WAL，返回删除的条目数"""
+        if not self.enabled:
+            return 0
+        try:
+            with self._lock:
+                cursor = self._conn.execute(
+                    "DELETE FROM entries WHERE expires_at <= ?", (self.clock(),)
+                )
+                self._conn.commit()
+                self._conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+                removed = cursor.rowcount
+                self.compacted += removed
+                self._entries = max(0, self._entries - removed)
+            return removed
+        except sqlite3.Error as e:
+            self._record_error("清理", e)
+            return 0
+
+    def start_compaction(self, interval: Optional[float] = None) -> None:
+        """
+        启动后台清理线程（重复调用无效）
+        gunicorn 预加载时不要在导入阶段调用（线程会留在主进程），在 worker 中启动
+        """
+        if not self.enabled or self._compactor is not None:
+            return
+        interval = (
+            interval
+            if interval is not None
+            else float(os.getenv("DISK_CACHE_COMPACT_INTERVAL", 600))
+        )
+
+        def run():
+            while not self._stop.wait(interval):
+                removed = self.compact()
+                if removed:
+                    logger.info("磁盘缓存清理过期条目 %d 条", removed)
+
+        self._compactor = threading.Thread(
+            target=run, name="disk-cache-compact", daemon=True
+        )
+        self._compactor.start()
+
+    def after_fork(self) -> None:
+        """
+        gunicorn 预加载应用后在每个 worker 中调用
+        SQLite 连接不能跨 fork 使用，重新打开连接并重启清理线程
+        """
+        restart_compaction = self._compactor is not None
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._compactor = None
+        self._conn = None
+        if self.path:
+            self._open()
+        if restart_compaction:
+            self.start_compaction()
+
+    def close(self) -> None:
+        self._stop.set()
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+    def _record_error(self, action: str, error: Exception) -> None:
+        with self._lock:
+            self.errors += 1
+        logger.warning("磁盘缓存%s失败: %s", action, error)
+
+    def _count_entries(self) -> int:
+        """条目数，最多每 ENTRIES_COUNT_TTL 秒统计一次（期间只按清理删除的条目数扣减）"""
+        now = time.monotonic()
+        if not self.enabled or now - self._entries_at < ENTRIES_COUNT_TTL:
+            return self._entries
+        try:
+            with self._lock:
+                self._entries = self._conn.execute(
+                    "SELECT COUNT(*) FROM entries"
+                ).fetchone()[0]
+                self._entries_at = now
+        except sqlite3.Error:
+            pass
+        return self._entries
+
+    def stats(self) -> Dict[str, Any]:
+        entries = self._count_entries()
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "enabled": self.enabled,
+                "path": self.path,
+                "entries": entries,
+                "ttls": dict(self.ttls),
+                "hits": self.hits,
+                "misses": self.misses,
+                "writes": self.writes,
+                "errors": self.errors,
+                "compacted": self.compacted,
+                "hit_ratio": self.hits / lookups if lookups else 0.0,
+            }
+
+
+class _DiskTier:
+    """DiskCache 上按端点固定的 get(key) / set(key, value) 视图"""
+
+    def __init__(
+        self,
+        disk: DiskCache,
+        endpoint: str,
+        to_params: Callable[[str], Dict[str, Any]],
+    ):
+        self.disk = disk
+        self.endpoint = endpoint
+        self.to_params = to_params
+
+    def get(self, key: str) -> Optional[Any]:
+        return self.disk.get(self.endpoint, self.to_params(key))
+
+    def set(self, key: str, value: Any) -> None:
+        self.disk.set(self.endpoint, self.to_params(key), value)
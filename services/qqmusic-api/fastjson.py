@@ -0,0 +1,70 @@
+"""
+JSON 快速路径
+- 编码 / 解码优先使用 orjson，未安装时回退到标准库 json
+- 从上游响应体中只提取需要的子树（例如 response.data）：
+  响应体较大且安装了 ijson 的 C 后端 (yajl2_c) 时增量解析，只构建目标子树；
+  否则整体解析后取子树
+
+环境变量:
+- FASTJSON_STREAM_MIN_BYTES: 超过该字节数才使用增量解析 (默认 262144)
+"""
+
+import io
+import json
+import os
+from typing import Any, Sequence, Union
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - 可选依赖
+    orjson = None
+
+try:
+    # 纯 Python 后端比整体解析还慢，只使用 C 后端
+    import ijson.backends.yajl2_c as ijson_backend
+except ImportError:  # pragma: no cover - 可选依赖
+    ijson_backend = None
+
+STREAM_MIN_BYTES = int(os.getenv("FASTJSON_STREAM_MIN_BYTES", 256 * 1024))
+
+Body = Union[bytes, bytearray, str]
+
+
+def backend() -> str:
+    """当前使用的 JSON 实现（用于健康检查展示）"""
+    encoder = "orjson" if orjson is not None else "json"
+    return f"{encoder}+ijson" if ijson_backend is not None else encoder
+
+
+def loads(body: Body) -> Any:
+    if orjson is not None:
+        return orjson.loads(body)
+    return json.loads(body)
+
+
+def dumps(value: Any) -> bytes:
+    """编码为 UTF-8 JSON 字节（不转义中文）"""
+    if orjson is not None:
+        return orjson.dumps(value)
+    return json.dumps(value, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+def extract(body: Body, path: Sequence[str]) -> Any:
+    """
+    从 JSON 响应体中提取 path 指向的子树，例如 ("response", "data")
+    路径不存在时抛出 KeyError（与整体解析后逐层取值的行为一致）
+    """
+    if (
+        ijson_backend is not None
+        and isinstance(body, (bytes, bytearray))
+        and len(body) >= STREAM_MIN_BYTES
+    ):
+        prefix = ".".join(path)
+        for item in ijson_backend.items(io.BytesIO(body), prefix, use_float=True):
+            return item
+        raise KeyError(prefix)
+
+    value = loads(body)
+    for key in path:
+        value = value[key]
+    return value
@@ -0,0 +1,100 @@
+"""
+gunicorn 生产配置（Dockerfile 默认使用）
+    gunicorn -c gunicorn.conf.py
+
+- 预加载应用（preload_app）：父进程导入一次，worker fork 后共享只读内存，启动更快
+- worker 数按可用 CPU 核数计算
+- 与客户端保持 keep-alive
+- 每个 worker 处理 max_requests（加随机抖动）个请求后平滑重启，
+  避免所有 worker 同时重启
+- /metrics 汇总所有 worker 的指标（metrics.py 多进程模式，默认使用临时目录），
+  worker 重启不会让计数回退
+
+SERVER_MODE 选择应用（与 python server-proxy.py 相同）:
+- flask (默认): server-proxy:app，gthread worker（每个 worker 多线程等待上游）
+- asgi: server_async:app，uvicorn worker
+
+环境变量:
+- PORT: 监听端口 (默认 3001)
+- GUNICORN_APP: 覆盖应用路径，例如 server:app（mock 数据）
+- GUNICORN_WORKERS: worker 数量 (默认 flask 为 CPU 核数 * 2 + 1，asgi 为 CPU 核数)
+- GUNICORN_THREADS: flask 模式每个 worker 的线程数 (默认 8)
+- GUNICORN_KEEPALIVE: 客户端 keep-alive 秒数 (默认 5)
+- GUNICORN_TIMEOUT: worker 无响应多少秒后被重启 (默认 60)
+- GUNICORN_GRACEFUL_TIMEOUT: 平滑重启时等待进行中请求的秒数 (默认 30)
+- GUNICORN_MAX_REQUESTS: 每个 worker 处理多少请求后重启，0 表示不重启 (默认 2000)
+- GUNICORN_MAX_REQUESTS_JITTER: 重启阈值的随机抖动 (默认 200)
+- METRICS_MULTIPROC_DIR: 多进程指标目录，启动时清空 (默认新建的临时目录)
+"""
+
+import importlib
+import os
+import shutil
+import tempfile
+
+ASGI = os.getenv("SERVER_MODE", "flask").lower() == "asgi"
+
+
+def _cpu_count() -> int:
+    # 只统计本进程可用的核（容器 cpuset 限制）
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:  # pragma: no cover - 非 Linux
+        return os.cpu_count() or 1
+
+
+wsgi_app = os.getenv("GUNICORN_APP", "server_async:app" if ASGI else "server-proxy:app")
+bind = f"0.0.0.0:{os.getenv('PORT', 3001)}"
+preload_app = True
+
+if ASGI:
+    worker_class = "uvicorn.workers.UvicornWorker"
+    workers = int(os.getenv("GUNICORN_WORKERS", 0)) or _cpu_count()
+else:
+    worker_class = "gthread"
+    threads = int(os.getenv("GUNICORN_THREADS", 8))
+    workers = int(os.getenv("GUNICORN_WORKERS", 0)) or _cpu_count() * 2 + 1
+
+keepalive = int(os.getenv("GUNICORN_KEEPALIVE", 5))
+timeout = int(os.getenv("GUNICORN_TIMEOUT", 60))
+graceful_timeout = int(os.getenv("GUNICORN_GRACEFUL_TIMEOUT", 30))
+max_requests = int(os.getenv("GUNICORN_MAX_REQUESTS", 2000))
+max_requests_jitter = int(os.getenv("GUNICORN_MAX_REQUESTS_JITTER", 200))
+
+# 在预加载应用之前设置，worker 继承；自己创建的临时目录在主进程退出时删除
+_metrics_tmpdir = None
+if not os.getenv("METRICS_MULTIPROC_DIR"):
+    _metrics_tmpdir = tempfile.mkdtemp(prefix="qqmusic-proxy-metrics-")
+    os.environ["METRICS_MULTIPROC_DIR"] = _metrics_tmpdir
+
+# 访问日志由应用自己的指标和日志负责，这里只输出 gunicorn 自身日志
+accesslog = None
+errorlog = "-"
+
+
+def post_fork(server, worker):
+    """预加载时父进程启动的后台线程和 SQLite 连接不能跨 fork 使用，在 worker 中重建"""
+    module = importlib.import_module(wsgi_app.partition(":")[0])
+    after_fork = getattr(module, "after_fork", None)
+    if after_fork is not None:
+        after_fork()
+
+
+def on_starting(server):
+    """清空上次运行留下的指标文件（METRICS_MULTIPROC_DIR 指向持久目录时）"""
+    importlib.import_module("metrics").clear_multiprocess_dir()
+
+
+def worker_exit(server, worker):
+    """平滑退出的 worker 写入最后一次指标"""
+    importlib.import_module("metrics").write_snapshot()
+
+
+def child_exit(server, worker):
+    """worker 退出（包括崩溃）后把它的计数归档，gauge 不再输出"""
+    importlib.import_module("metrics").mark_process_dead(worker.pid)
+
+
+def on_exit(server):
+    if _metrics_tmpdir is not None:
+        shutil.rmtree(_metrics_tmpdir, ignore_errors=True)
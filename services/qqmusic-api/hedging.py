@@ -0,0 +1,215 @@
+"""
+上游对冲请求（hedged requests）
+Rain120 上游偶尔卡顿数秒，p50 很快但 p99 被少数慢请求拖高：
+主请求超过该端点近期耗时的某个分位数仍未返回时，再发出一个相同的请求，
+先成功返回的结果生效，另一个被取消
+
+只在异步模式（AsyncUpstreamClient）中启用：同步请求无法中途取消，
+落败的请求会继续占用连接、并发名额和上游负载，同步模式不做对冲
+
+对冲请求受全局预算限制：每个主请求为预算积累 budget_ratio 个令牌，
+每次对冲消耗一个，对冲最多增加约 budget_ratio 比例的上游负载
+
+环境变量:
+- QQMUSIC_HEDGE_ENDPOINTS: 启用对冲的上游端点（逗号分隔），为空时禁用 (默认空)
+  例如 getSongInfo,getSearchByKey
+- QQMUSIC_HEDGE_PERCENTILE: 对冲延迟取近期耗时的分位数 (默认 95)
+- QQMUSIC_HEDGE_MIN_DELAY: 对冲延迟下限秒数 (默认 0.05)
+- QQMUSIC_HEDGE_MIN_SAMPLES: 样本数不足时不对冲 (默认 20)
+- QQMUSIC_HEDGE_WINDOW: 每个端点保留的耗时样本数 (默认 200)
+- QQMUSIC_HEDGE_BUDGET_RATIO: 对冲请求占主请求的比例上限 (默认 0.05)
+- QQMUSIC_HEDGE_BUDGET_BURST: 预算最多积累的令牌数 (默认 10)
+"""
+
+import math
+import os
+import threading
+from collections import deque
+from typing import Any, Callable, Dict, Iterable, Optional
+
+
+def _env_float(name: str, default: float) -> float:
+    return float(os.getenv(name, default))
+
+
+def _env_endpoints() -> Iterable[str]:
+    raw = os.getenv("QQMUSIC_HEDGE_ENDPOINTS", "")
+    return [name.strip() for name in raw.split(",") if name.strip()]
+
+
+class LatencyWindow:
+    """最近 size 次成功调用的耗时（线程安全）"""
+
+    def __init__(self, size: int):
+        self._samples: deque = deque(maxlen=size)
+        self._lock = threading.Lock()
+
+    def record(self, duration: float) -> None:
+        with self._lock:
+            self._samples.append(duration)
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._samples)
+
+    def percentile(self, q: float) -> Optional[float]:
+        """最近邻法计算分位数，没有样本时返回 None"""
+        with self._lock:
+            samples = sorted(self._samples)
+        if not samples:
+            return None
+        rank = max(1, math.ceil(q / 100.0 * len(samples)))
+        return samples[min(rank, len(samples)) - 1]
+
+
+class HedgeBudget:
+    """
+    对冲预算（线程安全）
+    每个主请求存入 ratio 个令牌（最多 burst 个），每次对冲取出一个
+    """
+
+    def __init__(self, ratio: float, burst: float):
+        self.ratio = ratio
+        self.burst = max(burst, 1.0)
+        self._tokens = 0.0
+        self._lock = threading.Lock()
+
+    def deposit(self) -> None:
+        with self._lock:
+            self._tokens = min(self.burst, self._tokens + self.ratio)
+
+    def withdraw(self) -> bool:
+        with self._lock:
+            if self._tokens < 1.0:
+                return False
+            self._tokens -= 1.0
+            return True
+
+    def refund(self) -> None:
+        """退回 withdraw 取出但没有用上的令牌"""
+        with self._lock:
+            self._tokens = min(self.burst, self._tokens + 1.0)
+
+    @property
+    def tokens(self) -> float:
+        with self._lock:
+            return self._tokens
+
+
+class HedgePolicy:
+    """
+    对冲策略：哪些端点对冲、等多久再对冲、预算是否允许
+
+    参数:
+        endpoints: 启用对冲的上游端点，为空时禁用
+        percentile: 对冲延迟取近期耗时的分位数
+        min_delay: 对冲延迟下限秒数
+        min_samples: 样本数不足时不对冲
+        window: 每个端点保留的耗时样本数
+        budget_ratio / budget_burst: 全局对冲预算
+    """
+
+    def __init__(
+        self,
+        endpoints: Optional[Iterable[str]] = None,
+        percentile: Optional[float] = None,
+        min_delay: Optional[float] = None,
+        min_samples: Optional[int] = None,
+        window: Optional[int] = None,
+        budget_ratio: Optional[float] = None,
+        budget_burst: Optional[float] = None,
+    ):
+        self.endpoints = frozenset(
+            endpoints if endpoints is not None else _env_endpoints()
+        )
+        self.percentile = percentile or _env_float("QQMUSIC_HEDGE_PERCENTILE", 95.0)
+        self.min_delay = (
+            min_delay
+            if min_delay is not None
+            else _env_float("QQMUSIC_HEDGE_MIN_DELAY", 0.05)
+        )
+        self.min_samples = min_samples or int(
+            _env_float("QQMUSIC_HEDGE_MIN_SAMPLES", 20)
+        )
+        self.window = window or int(_env_float("QQMUSIC_HEDGE_WINDOW", 200))
+        self.budget = HedgeBudget(
+            ratio=(
+                budget_ratio
+                if budget_ratio is not None
+                else _env_float("QQMUSIC_HEDGE_BUDGET_RATIO", 0.05)
+            ),
+            burst=budget_burst or _env_float("QQMUSIC_HEDGE_BUDGET_BURST", 10.0),
+        )
+        self._latencies: Dict[str, LatencyWindow] = {
+            endpoint: LatencyWindow(self.window) for endpoint in self.endpoints
+        }
+        self._lock = threading.Lock()
+
+        self.primaries = 0
+        self.hedged = 0
+        self.hedge_wins = 0
+        self.budget_exhausted = 0
+        self.rate_limited = 0
+
+    def enabled_for(self, endpoint: str) -> bool:
+        return endpoint in self.endpoints
+
+    def delay_for(self, endpoint: str) -> Optional[float]:
+        """主请求发出后等多久再对冲；未启用或样本不足时返回 None"""
+        latencies = self._latencies.get(endpoint)
+        if latencies is None or len(latencies) < self.min_samples:
+            return None
+        return max(self.min_delay, latencies.percentile(self.percentile))
+
+    def record_primary(self) -> None:
+        """每个主请求调用一次，为预算积累令牌"""
+        self.budget.deposit()
+        with self._lock:
+            self.primaries += 1
+
+    def record_latency(self, endpoint: str, duration: float) -> None:
+        latencies = self._latencies.get(endpoint)
+        if latencies is not None:
+            latencies.record(duration)
+
+    def try_hedge(self, admit: Callable[[], bool]) -> bool:
+        """
+        预算和 admit（出站限流的 try_acquire）都允许时占用一个对冲名额
+        admit 拒绝时退回预算令牌；对冲请求发出后再调用 record_hedge 计数
+        """
+        if not self.budget.withdraw():
+            with self._lock:
+                self.budget_exhausted += 1
+            return False
+        if not admit():
+            self.budget.refund()
+            with self._lock:
+                self.rate_limited += 1
+            return False
+        return True
+
+    def record_hedge(self) -> None:
+        """对冲请求已发出"""
+        with self._lock:
+            self.hedged += 1
+
+    def record_win(self) -> None:
+        """对冲请求先于主请求成功返回"""
+        with self._lock:
+            self.hedge_wins += 1
+
+    def stats(self) -> Dict[str, Any]:
+        delays = {endpoint: self.delay_for(endpoint) for endpoint in self.endpoints}
+        with self._lock:
+            return {
+                "enabled": bool(self.endpoints),
+                "endpoints": sorted(self.endpoints),
+                "percentile": self.percentile,
+                "delays": delays,
+                "primaries": self.primaries,
+                "hedged": self.hedged,
+                "hedge_wins": self.hedge_wins,
+                "budget_exhausted": self.budget_exhausted,
+                "rate_limited": self.rate_limited,
+                "budget_tokens": round(self.budget.tokens, 3),
+            }
@@ -0,0 +1,153 @@
+"""
+HTTP 响应压缩与缓存协商
+- 按 Accept-Encoding 协商 br / gzip 压缩（未安装 brotli 时只用 gzip）
+- 按响应内容计算强 ETag，If-None-Match 命中时返回 304
+- 按路由设置 Cache-Control，供 nginx 和客户端缓存
+
+Flask 和 ASGI 两种模式共用这里的纯函数
+
+环境变量:
+- HTTP_COMPRESS_MIN_BYTES: 小于该字节数的响应不压缩 (默认 1024)
+- HTTP_GZIP_LEVEL: gzip 压缩级别 1~9 (默认 6)
+- HTTP_BROTLI_QUALITY: brotli 质量 0~11 (默认 5)
+- HTTP_MAX_AGE_SONG: /song /songs /track 的 max-age 秒数 (默认 3600)
+- HTTP_MAX_AGE_SEARCH: /search 的 max-age 秒数 (默认 300)
+- HTTP_MAX_AGE_COVER: /cover 和 /cover/image 的 max-age 秒数 (默认 86400)
+"""
+
+import gzip
+import hashlib
+import os
+from typing import Dict, Optional
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover - 可选依赖
+    brotli = None
+
+COMPRESS_MIN_BYTES = int(os.getenv("HTTP_COMPRESS_MIN_BYTES", 1024))
+GZIP_LEVEL = int(os.getenv("HTTP_GZIP_LEVEL", 6))
+BROTLI_QUALITY = int(os.getenv("HTTP_BROTLI_QUALITY", 5))
+
+NO_STORE = "no-store"
+
+
+def _max_age(name: str, default: int) -> str:
+    return f"public, max-age={int(os.getenv(name, default))}"
+
+
+# 路由 → Cache-Control（只用于 200 响应；其他状态码一律 no-store）
+CACHE_CONTROL: Dict[str, str] = {
+    "/song": _max_age("HTTP_MAX_AGE_SONG", 3600),
+    "/songs": _max_age("HTTP_MAX_AGE_SONG", 3600),
+    "/track": _max_age("HTTP_MAX_AGE_SONG", 3600),
+    "/search": _max_age("HTTP_MAX_AGE_SEARCH", 300),
+    "/cover": _max_age("HTTP_MAX_AGE_COVER", 86400),
+    "/cover/image": _max_age("HTTP_MAX_AGE_COVER", 86400),
+}
+
+
+def cache_control_for(route: str, status: int) -> str:
+    """返回路由对应的 Cache-Control，未配置的路由和非 200 响应不缓存"""
+    if status != 200:
+        return NO_STORE
+    return CACHE_CONTROL.get(route, NO_STORE)
+
+
+def compute_etag(body: bytes) -> str:
+    """按响应内容计算强 ETag"""
+    return '"' + hashlib.blake2b(body, digest_size=16).hexdigest() + '"'
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """
+    判断 If-None-Match 是否命中
+    支持 * 和逗号分隔的多个值；忽略 W/ 前缀（If-None-Match 使用弱比较）
+    """
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    for candidate in if_none_match.split(","):
+        candidate = candidate.strip()
+        if candidate.startswith("W/"):
+            candidate = candidate[2:]
+        if candidate == etag:
+            return True
+    return False
+
+
+def choose_encoding(accept_encoding: Optional[str]) -> Optional[str]:
+    """
+    按 Accept-Encoding 选择压缩方式，优先 br，其次 gzip
+    q=0 表示客户端不接受该编码
+    """
+    accepted = {}
+    for part in (accept_encoding or "").split(","):
+        name, _, params = part.strip().partition(";")
+        name = name.strip().lower()
+        if not name:
+            continue
+        quality = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                quality = float(params[2:])
+            except ValueError:
+                quality = 0.0
+        accepted[name] = quality
+
+    def ok(encoding: str) -> bool:
+        return accepted.get(encoding, accepted.get("*", 0.0)) > 0
+
+    if brotli is not None and ok("br"):
+        return "br"
+    if ok("gzip"):
+        return "gzip"
+    return None
+
+
+def compress(body: bytes, encoding: str) -> bytes:
+    if encoding == "br":
+        return brotli.compress(body, quality=BROTLI_QUALITY)
+    return gzip.compress(body, compresslevel=GZIP_LEVEL, mtime=0)
+
+
+def representation_etag(etag: str, encoding: Optional[str]) -> str:
+    """压缩后的表示使用不同的强 ETag（"<hash>-gzip"），与未压缩版本区分"""
+    if not encoding:
+        return etag
+    return etag[:-1] + f"-{encoding}" + '"'
+
+
+def negotiate(
+    body: bytes,
+    route: str,
+    accept_encoding: Optional[str],
+    if_none_match: Optional[str],
+):
+    """
+    对 200 的 JSON 响应做缓存协商和压缩
+    返回 (状态码, 响应体, 需要设置的响应头)
+    """
+    encoding = None
+    if len(body) >= COMPRESS_MIN_BYTES:
+        encoding = choose_encoding(accept_encoding)
+
+    etag = compute_etag(body)
+    headers = {
+        "Cache-Control": cache_control_for(route, 200),
+        "Vary": "Accept-Encoding",
+        "ETag": representation_etag(etag, encoding),
+    }
+
+    # 未压缩和压缩版本的 ETag 都视为命中（客户端换了 Accept-Encoding 也能 304）
+    if etag_matches(if_none_match, etag) or etag_matches(
+        if_none_match, headers["ETag"]
+    ):
+        return 304, b"", headers
+
+    if encoding:
+        body = compress(body, encoding)
+        headers["Content-Encoding"] = encoding
+    return 200, body, headers
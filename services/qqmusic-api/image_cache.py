@@ -0,0 +1,345 @@
+"""
+封面图片磁盘缓存（内容寻址）
+/cover/image 把 CDN 图片边下载边转发给客户端，同时写入本地缓存，
+之后同一封面直接从本地磁盘读取，不再访问 CDN
+
+目录结构:
+    blobs/<sha256 前两位>/<sha256>   图片内容，文件名即内容的 SHA-256
+    refs/<sha256(来源 URL)>          "<内容 sha256> <Content-Type>"，来源 URL → 内容
+相同内容的不同 URL 共用一个 blob；按 blob 总字节数做 LRU 淘汰，
+被淘汰 blob 的 ref 在下次查询时清理
+
+多个 worker 共用同一个目录，以文件系统为准:
+- 命中时更新 blob 的 mtime，LRU 顺序对所有 worker 一致
+- 查询时按 blob 文件是否存在判断 ref 是否失效，不依赖进程内的索引
+- 进程内索引只是磁盘的快照，写入后估算超过上限或距上次扫描超过
+  COVER_IMAGE_CACHE_RESCAN 秒时重新扫描目录，再按 mtime 淘汰
+
+环境变量:
+- COVER_IMAGE_CACHE_DIR: 缓存目录，为空时只转发不缓存 (默认空)
+- COVER_IMAGE_CACHE_MAX_BYTES: blob 总字节上限 (默认 512MB)
+- COVER_IMAGE_MAX_BYTES: 单张图片上限，超过时只转发不缓存 (默认 10MB)
+- COVER_IMAGE_HOSTS: 允许代理的图片域名（逗号分隔，匹配域名后缀）
+- COVER_IMAGE_CACHE_RESCAN: 重新扫描目录的间隔秒数 (默认 60)
+"""
+
+import hashlib
+import logging
+import os
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Optional, Tuple
+from urllib.parse import urljoin, urlparse
+
+logger = logging.getLogger("qqmusic_proxy")
+
+# 流式转发和读写磁盘的块大小
+CHUNK_SIZE = 64 * 1024
+
+DEFAULT_IMAGE_HOSTS = "y.gtimg.cn,y.qq.com,qpic.cn,music.126.net"
+
+# CDN 偶尔会重定向到其他节点；HTTP 客户端自动跟随会绕过白名单，改为手动跟随并逐跳校验
+MAX_IMAGE_REDIRECTS = 3
+
+# 超过这个时间的临时文件视为进程退出时的残留（其他 worker 可能正在写入较新的）
+STALE_TEMP_SECONDS = 3600
+
+
+def allowed_hosts() -> Tuple[str, ...]:
+    raw = os.getenv("COVER_IMAGE_HOSTS", DEFAULT_IMAGE_HOSTS)
+    return tuple(host.strip().lower() for host in raw.split(",") if host.strip())
+
+
+def is_allowed_image_url(url: str) -> bool:
+    """只代理 http(s) 且域名在白名单内的图片，避免被当作开放代理"""
+    parsed = urlparse(url)
+    if parsed.scheme not in ("http", "https") or not parsed.hostname:
+        return False
+    hostname = parsed.hostname.lower()
+    return any(
+        hostname == host or hostname.endswith("." + host) for host in allowed_hosts()
+    )
+
+
+class ImageRedirectError(Exception):
+    """图片重定向到白名单以外的地址，或者重定向次数过多"""
+
+
+def redirect_target(url: str, location: str) -> str:
+    """解析重定向的目标地址（相对地址按当前地址补全），不在白名单内时抛出 ImageRedirectError"""
+    target = urljoin(url, location)
+    if not location or not is_allowed_image_url(target):
+        raise ImageRedirectError("封面图重定向到不允许代理的地址")
+    return target
+
+
+def _touch(path: str) -> None:
+    """更新 mtime 为当前时间（纳秒精度，内核默认时间戳精度只有几毫秒，LRU 会出现并列）"""
+    now = time.time_ns()
+    os.utime(path, ns=(now, now))
+
+
+def _sha256(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+class ImageCache:
+    """
+    内容寻址的图片缓存（线程安全）
+
+    参数:
+        directory: 缓存目录，为空时禁用
+        max_bytes: blob 总字节上限
+        max_item_bytes: 单张图片上限
+        rescan_interval: 重新扫描目录的间隔秒数
+    """
+
+    def __init__(
+        self,
+        directory: Optional[str] = None,
+        max_bytes: Optional[int] = None,
+        max_item_bytes: Optional[int] = None,
+        rescan_interval: Optional[float] = None,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.directory = (
+            os.getenv("COVER_IMAGE_CACHE_DIR", "") if directory is None else directory
+        )
+        self.max_bytes = max_bytes or int(
+            os.getenv("COVER_IMAGE_CACHE_MAX_BYTES", 512 * 1024 * 1024)
+        )
+        self.max_item_bytes = max_item_bytes or int(
+            os.getenv("COVER_IMAGE_MAX_BYTES", 10 * 1024 * 1024)
+        )
+        self.rescan_interval = (
+            float(os.getenv("COVER_IMAGE_CACHE_RESCAN", 60))
+            if rescan_interval is None
+            else rescan_interval
+        )
+        self.clock = clock
+        self._lock = threading.Lock()
+        # 内容 sha256 → 字节数，按最近使用排序（最近一次扫描的快照 + 本进程的写入）
+        self._blobs: "OrderedDict[str, int]" = OrderedDict()
+        self._bytes = 0
+        self._scanned_at = float("-inf")
+
+        self.hits = 0
+        self.misses = 0
+        self.stored = 0
+        self.evictions = 0
+
+        if self.directory:
+            self._load()
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.directory)
+
+    def _blob_path(self, digest: str) -> str:
+        return os.path.join(self.directory, "blobs", digest[:2], digest)
+
+    def _ref_path(self, key: str) -> str:
+        return os.path.join(self.directory, "refs", _sha256(key))
+
+    def _load(self) -> None:
+        """启动时扫描已有 blob，按修改时间恢复 LRU 顺序"""
+        os.makedirs(os.path.join(self.directory, "blobs"), exist_ok=True)
+        os.makedirs(os.path.join(self.directory, "refs"), exist_ok=True)
+        with self._lock:
+            self._scan()
+            self._evict()
+
+    def _scan(self) -> None:
+        """按磁盘上的 blob 重建索引（包括其他 worker 写入的），调用方持有锁"""
+        found = []
+        now = time.time()
+        for root, _, files in os.walk(os.path.join(self.directory, "blobs")):
+            for name in files:
+                path = os.path.join(root, name)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    # 扫描期间被其他 worker 淘汰
+                    continue
+                if name.startswith("."):
+                    if now - stat.st_mtime > STALE_TEMP_SECONDS:
+                        # 进程退出时残留的临时文件
+                        try:
+                            os.unlink(path)
+                        except OSError:
+                            pass
+                    continue
+                found.append((stat.st_mtime, name, stat.st_size))
+        self._blobs.clear()
+        self._bytes = 0
+        for _, digest, size in sorted(found):
+            self._blobs[digest] = size
+            self._bytes += size
+        self._scanned_at = self.clock()
+
+    def lookup(self, key: str) -> Optional[Dict[str, Any]]:
+        """
+        按来源 URL 查询，命中时返回 {"path", "digest", "content_type", "size"}
+        blob 文件已被（任一 worker）淘汰时清理 ref 并返回 None
+        """
+        if not self.enabled:
+            return None
+
+        ref_path = self._ref_path(key)
+        try:
+            with open(ref_path, encoding="utf-8") as f:
+                digest, _, content_type = f.read().strip().partition(" ")
+        except OSError:
+            with self._lock:
+                self.misses += 1
+            return None
+
+        path = self._blob_path(digest)
+        try:
+            # 更新最近使用时间：所有 worker 和重启后都按 mtime 恢复 LRU 顺序
+            _touch(path)
+            size = os.stat(path).st_size
+        except OSError:
+            with self._lock:
+                self.misses += 1
+            try:
+                os.unlink(ref_path)
+            except OSError:
+                pass
+            return None
+
+        with self._lock:
+            if digest not in self._blobs:
+                # 其他 worker 写入的 blob
+                self._bytes += size
+            self._blobs[digest] = size
+            self._blobs.move_to_end(digest)
+            self.hits += 1
+        return {
+            "path": path,
+            "digest": digest,
+            "content_type": content_type or "application/octet-stream",
+            "size": size,
+        }
+
+    def writer(self, key: str, content_type: str) -> "_BlobWriter":
+        """创建一个边下载边写入的 writer，下载完成后调用 commit()"""
+        return _BlobWriter(self, key, content_type)
+
+    def _commit(
+        self, key: str, content_type: str, temp_path: str, digest: str, size: int
+    ):
+        blob_path = self._blob_path(digest)
+        os.makedirs(os.path.dirname(blob_path), exist_ok=True)
+        with self._lock:
+            if os.path.exists(blob_path):
+                # 相同内容已存在（可能由其他 worker 写入），丢弃临时文件
+                os.unlink(temp_path)
+            else:
+                os.replace(temp_path, blob_path)
+                self.stored += 1
+            _touch(blob_path)
+            if digest not in self._blobs:
+                self._bytes += size
+            self._blobs[digest] = size
+            self._blobs.move_to_end(digest)
+
+            # 临时文件名带进程号，避免多个 worker 同时写同一个 ref 时互相覆盖
+            ref_path = self._ref_path(key)
+            temp_ref = f"{ref_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with open(temp_ref, "w", encoding="utf-8") as f:
+                f.write(f"{digest} {content_type}")
+            os.replace(temp_ref, ref_path)
+
+            if (
+                self._bytes > self.max_bytes
+                or self.clock() - self._scanned_at >= self.rescan_interval
+            ):
+                # 本进程的索引只是快照，淘汰前按磁盘重建，按所有 worker 共同的 mtime 排序
+                self._scan()
+            self._evict()
+
+    def _evict(self) -> None:
+        while self._bytes > self.max_bytes and self._blobs:
+            digest, size = self._blobs.popitem(last=False)
+            self._bytes -= size
+            self.evictions += 1
+            try:
+                os.unlink(self._blob_path(digest))
+            except OSError:
+                pass
+
+    def stats(self) -> Dict[str, Any]:
+        """entries / bytes 为本进程最近一次扫描后的估算值"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "enabled": self.enabled,
+                "entries": len(self._blobs),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "stored": self.stored,
+                "evictions": self.evictions,
+                "hit_ratio": self.hits / lookups if lookups else 0.0,
+            }
+
+
+class _BlobWriter:
+    """
+    下载过程中写入临时文件并计算 SHA-256
+    commit() 时按内容哈希落盘；未 commit（下载失败、客户端断开、超过大小上限）
+    时调用 abort() 删除临时文件
+    """
+
+    def __init__(self, cache: ImageCache, key: str, content_type: str):
+        self.cache = cache
+        self.key = key
+        self.content_type = content_type
+        self.size = 0
+        self._hash = hashlib.sha256()
+        self._file = None
+        self._temp_path = ""
+        self.committed = False
+
+        if cache.enabled:
+            fd, self._temp_path = tempfile.mkstemp(
+                prefix=".", dir=os.path.join(cache.directory, "blobs")
+            )
+            self._file = os.fdopen(fd, "wb")
+
+    def write(self, chunk: bytes) -> None:
+        if self._file is None:
+            return
+        self.size += len(chunk)
+        if self.size > self.cache.max_item_bytes:
+            self.abort()
+            return
+        self._hash.update(chunk)
+        self._file.write(chunk)
+
+    def commit(self) -> Optional[str]:
+        """落盘并返回内容 sha256；未启用或已放弃时返回 None"""
+        if self._file is None:
+            return None
+        self._file.close()
+        self._file = None
+        digest = self._hash.hexdigest()
+        self.cache._commit(
+            self.key, self.content_type, self._temp_path, digest, self.size
+        )
+        self.committed = True
+        return digest
+
+    def abort(self) -> None:
+        if self._file is None:
+            return
+        self._file.close()
+        self._file = None
+        try:
+            os.unlink(self._temp_path)
+        except OSError:
+            pass
@@ -0,0 +1,490 @@
+"""
+代理服务指标（Prometheus 文本格式）
+无第三方依赖的最小实现：Counter / Gauge / Histogram，按标签分组，线程安全
+
+GET /metrics 输出 render() 的结果
+
+多进程（gunicorn 多 worker）：设置 METRICS_MULTIPROC_DIR 后，每个 worker 定期把自己的指标
+写入该目录下的 <pid>.prom，render() 汇总所有 worker，抓取由哪个 worker 处理结果都一样:
+- counter / histogram 按标签相加；退出的 worker 的值由主进程合并进 archive.prom，
+  计数不会因 worker 重启而回退
+- gauge（包括各组件 stats 导出的 gauge）加上 worker="<pid>" 标签分别输出，
+  退出的 worker 的 gauge 随之消失
+gunicorn.conf.py 默认启用（临时目录）；单进程运行时不需要
+
+环境变量:
+- METRICS_MULTIPROC_DIR: 多进程指标目录，为空时只输出本进程 (默认空，gunicorn 下为临时目录)
+- METRICS_FLUSH_INTERVAL: worker 写入指标文件的间隔秒数 (默认 5)
+"""
+
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+logger = logging.getLogger("qqmusic_proxy")
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+LabelValues = Tuple[str, ...]
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    pairs = [
+        f'{name}="{_escape(value)}"' for name, value in zip(names, values, strict=True)
+    ]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+class _Metric:
+    type_name = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, str]) -> LabelValues:
+        return tuple(str(labels.get(name, "")) for name in self.labelnames)
+
+    def header(self) -> List[str]:
+        return [
+            f"# HELP {self.name} {self.documentation}",
+            f"# TYPE {self.name} {self.type_name}",
+        ]
+
+
+class Counter(_Metric):
+    type_name = "counter"
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._values: Dict[LabelValues, float] = {}
+
+    def inc(self, amount: float = 1, **labels: str) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels: str) -> float:
+        with self._lock:
+            return self._values.get(self._key(labels), 0)
+
+    def render(self) -> List[str]:
+        with self._lock:
+            items = sorted(self._values.items())
+        lines = self.header()
+        for key, value in items:
+            labels = _format_labels(self.labelnames, key)
+            lines.append(f"{self.name}{labels} {_format_value(value)}")
+        return lines
+
+
+class Gauge(Counter):
+    type_name = "gauge"
+
+    def dec(self, amount: float = 1, **labels: str) -> None:
+        self.inc(-amount, **labels)
+
+    def set(self, value: float, **labels: str) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+
+class Histogram(_Metric):
+    type_name = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str] = (),
+        buckets: Iterable[float] = DEFAULT_BUCKETS,
+    ):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # 标签 → (各桶计数, 总和, 总数)
+        self._series: Dict[LabelValues, List] = {}
+
+    def observe(self, value: float, **labels: str) -> None:
+        key = self._key(labels)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = [[0] * len(self.buckets), 0.0, 0]
+                self._series[key] = series
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[0][i] += 1
+                    break
+            series[1] += value
+            series[2] += 1
+
+    def count(self, **labels: str) -> int:
+        with self._lock:
+            series = self._series.get(self._key(labels))
+            return series[2] if series else 0
+
+    def render(self) -> List[str]:
+        with self._lock:
+            items = sorted(
+                (key, (list(s[0]), s[1], s[2])) for key, s in self._series.items()
+            )
+        lines = self.header()
+        for key, (bucket_counts, total, count) in items:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, bucket_counts, strict=True):
+                cumulative += bucket_count
+                labels = _format_labels(
+                    self.labelnames, key, f'le="{_format_value(bound)}"'
+                )
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            labels = _format_labels(self.labelnames, key, 'le="+Inf"')
+            lines.append(f"{self.name}_bucket{labels} {count}")
+            labels = _format_labels(self.labelnames, key)
+            lines.append(f"{self.name}_sum{labels} {_format_value(total)}")
+            lines.append(f"{self.name}_count{labels} {count}")
+        return lines
+
+
+class Registry:
+    """指标注册表，collectors 用于在渲染时导出其他组件的统计（例如缓存计数）"""
+
+    def __init__(self):
+        self._metrics: List[_Metric] = []
+        self._collectors: Dict[str, Callable[[], List[str]]] = {}
+
+    def register(self, metric: _Metric) -> _Metric:
+        self._metrics.append(metric)
+        return metric
+
+    def add_collector(self, name: str, collector: Callable[[], List[str]]) -> None:
+        """按名称注册（同名覆盖）"""
+        self._collectors[name] = collector
+
+    def render(self) -> str:
+        lines: List[str] = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        for collector in self._collectors.values():
+            lines.extend(collector())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+REQUESTS = REGISTRY.register(
+    Counter(
+        "qqmusic_proxy_requests_total",
+        "Proxy requests by route and HTTP status",
+        ("route", "status"),
+    )
+)
+REQUEST_ERRORS = REGISTRY.register(
+    Counter(
+        "qqmusic_proxy_request_errors_total",
+        "Proxy responses with status >= 400 by route and HTTP status",
+        ("route", "status"),
+    )
+)
+REQUEST_LATENCY = REGISTRY.register(
+    Histogram(
+        "qqmusic_proxy_request_duration_seconds",
+        "Proxy request latency by route",
+        ("route",),
+    )
+)
+IN_FLIGHT = REGISTRY.register(
+    Gauge("qqmusic_proxy_in_flight_requests", "Proxy requests currently in progress")
+)
+UPSTREAM_LATENCY = REGISTRY.register(
+    Histogram(
+        "qqmusic_proxy_upstream_duration_seconds",
+        "Upstream (Rain120) call latency by endpoint",
+        ("endpoint",),
+    )
+)
+UPSTREAM_REQUESTS = REGISTRY.register(
+    Counter(
+        "qqmusic_proxy_upstream_requests_total",
+        "Upstream (Rain120) calls by endpoint and outcome",
+        ("endpoint", "outcome"),
+    )
+)
+UPSTREAM_IN_FLIGHT = REGISTRY.register(
+    Gauge(
+        "qqmusic_proxy_upstream_in_flight",
+        "Upstream (Rain120) calls currently in progress by endpoint",
+        ("endpoint",),
+    )
+)
+
+
+@contextmanager
+def track_upstream(endpoint: str):
+    """记录一次上游调用的耗时、结果和进行中数量"""
+    UPSTREAM_IN_FLIGHT.inc(endpoint=endpoint)
+    start = time.perf_counter()
+    outcome = "error"
+    try:
+        yield
+        outcome = "success"
+    finally:
+        UPSTREAM_IN_FLIGHT.dec(endpoint=endpoint)
+        UPSTREAM_LATENCY.observe(time.perf_counter() - start, endpoint=endpoint)
+        UPSTREAM_REQUESTS.inc(endpoint=endpoint, outcome=outcome)
+
+
+def record_request(route: str, status: int, duration: float) -> None:
+    """记录一次代理请求"""
+    REQUESTS.inc(route=route, status=str(status))
+    if status >= 400:
+        REQUEST_ERRORS.inc(route=route, status=str(status))
+    REQUEST_LATENCY.observe(duration, route=route)
+
+
+def stats_collector(prefix: str, stats: Callable[[], Dict[str, float]]):
+    """
+    将组件的 stats() 字典导出为 gauge
+    例如 stats_collector("qqmusic_proxy_song_cache", song_cache.stats)
+    """
+
+    def collect() -> List[str]:
+        lines = []
+        for key, value in stats().items():
+            if isinstance(value, bool) or not isinstance(value, (int, float)):
+                continue
+            name = f"{prefix}_{key}"
+            lines.append(f"# TYPE {name} gauge")
+            lines.append(f"{name} {_format_value(value)}")
+        return lines
+
+    return collect
+
+
+def labeled_stats_collector(
+    prefix: str, label: str, stats: Callable[[], Dict[str, Dict[str, float]]]
+):
+    """
+    将 {标签值: stats 字典} 导出为带标签的 gauge
+    例如熔断器按端点: {"getSongInfo": {"open": 0, "rejected": 3}}
+    """
+
+    def collect() -> List[str]:
+        series: Dict[str, List[str]] = {}
+        for label_value, values in sorted(stats().items()):
+            for key, value in values.items():
+                if isinstance(value, bool) or not isinstance(value, (int, float)):
+                    continue
+                labels = _format_labels((label,), (label_value,))
+                series.setdefault(f"{prefix}_{key}", []).append(
+                    f"{prefix}_{key}{labels} {_format_value(value)}"
+                )
+        lines = []
+        for name, samples in series.items():
+            lines.append(f"# TYPE {name} gauge")
+            lines.extend(samples)
+        return lines
+
+    return collect
+
+
+# 多进程汇总：已退出 worker 的 counter / histogram 归档
+ARCHIVE_FILE = "archive.prom"
+_LOCK_FILE = ".lock"
+# 按标签相加的指标类型；其余（gauge）按 worker 分别输出
+_SUMMED_TYPES = ("counter", "histogram")
+
+# 指标族名 → [类型, HELP 行, {样本（名称 + 标签）: 值}]
+Families = Dict[str, List]
+
+
+def multiprocess_dir() -> str:
+    return os.getenv("METRICS_MULTIPROC_DIR", "")
+
+
+@contextmanager
+def _dir_lock(directory: str):
+    """汇总读取与归档退出 worker 互斥，避免同一份计数被读到两次或一次都没读到"""
+    import fcntl  # 多进程汇总只在 gunicorn（Unix）下使用
+
+    with open(os.path.join(directory, _LOCK_FILE), "a") as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock, fcntl.LOCK_UN)
+
+
+def _parse(text: str) -> Families:
+    """解析 render() 输出的文本（样本紧跟在所属指标族的 # TYPE 之后）"""
+    families: Families = {}
+    family: Optional[List] = None
+    help_lines: Dict[str, str] = {}
+    for line in text.splitlines():
+        if line.startswith("# HELP "):
+            help_lines[line.split(" ", 3)[2]] = line
+        elif line.startswith("# TYPE "):
+            _, _, name, type_name = line.split(" ", 3)
+            family = families.setdefault(name, [type_name, help_lines.get(name), {}])
+        elif line and family is not None:
+            sample, _, value = line.rpartition(" ")
+            family[2][sample] = float(value)
+    return families
+
+
+def _with_worker(sample: str, worker: str) -> str:
+    label = f'worker="{_escape(worker)}"'
+    name, brace, rest = sample.partition("{")
+    if not brace:
+        return f"{name}{{{label}}}"
+    return f"{name}{{{label},{rest}"
+
+
+def _merge(target: Families, families: Families, worker: Optional[str]) -> None:
+    """
+    把一个进程的指标并入 target：counter / histogram 相加，
+    gauge 加上 worker 标签（worker 为 None 时丢弃 gauge，用于归档）
+    """
+    for name, (type_name, help_line, samples) in families.items():
+        summed = type_name in _SUMMED_TYPES
+        if not summed and worker is None:
+            continue
+        family = target.setdefault(name, [type_name, help_line, {}])
+        merged = family[2]
+        for sample, value in samples.items():
+            if summed:
+                merged[sample] = merged.get(sample, 0.0) + value
+            else:
+                merged[_with_worker(sample, worker)] = value
+
+
+def _render_families(families: Families) -> str:
+    lines: List[str] = []
+    for name, (type_name, help_line, samples) in families.items():
+        if help_line:
+            lines.append(help_line)
+        lines.append(f"# TYPE {name} {type_name}")
+        lines.extend(
+            f"{sample} {_format_value(value)}" for sample, value in samples.items()
+        )
+    return "\n".join(lines) + "\n"
+
+
+def _read(path: str) -> Families:
+    try:
+        with open(path, encoding="utf-8") as f:
+            return _parse(f.read())
+    except FileNotFoundError:
+        return {}
+
+
+def _write(path: str, text: str) -> None:
+    """先写临时文件再替换，读取方不会读到写了一半的文件"""
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        f.write(text)
+    os.replace(tmp, path)
+
+
+def write_snapshot(directory: Optional[str] = None, pid: Optional[int] = None) -> None:
+    """把本进程的指标写入 <directory>/<pid>.prom"""
+    directory = directory or multiprocess_dir()
+    if not directory:
+        return
+    _write(
+        os.path.join(directory, f"{pid or os.getpid()}.prom"),
+        REGISTRY.render(),
+    )
+
+
+def render_multiprocess(directory: str) -> str:
+    """写入本进程的最新指标后汇总目录中所有 worker 和已退出 worker 的归档"""
+    write_snapshot(directory)
+    merged: Families = {}
+    with _dir_lock(directory):
+        _merge(merged, _read(os.path.join(directory, ARCHIVE_FILE)), None)
+        for filename in sorted(os.listdir(directory)):
+            worker, ext = os.path.splitext(filename)
+            if ext == ".prom" and filename != ARCHIVE_FILE:
+                _merge(merged, _read(os.path.join(directory, filename)), worker)
+    return _render_families(merged)
+
+
+def render() -> str:
+    """GET /metrics：启用多进程目录时汇总所有 worker，否则只输出本进程"""
+    directory = multiprocess_dir()
+    if directory:
+        return render_multiprocess(directory)
+    return REGISTRY.render()
+
+
+def mark_process_dead(pid: int, directory: Optional[str] = None) -> None:
+    """
+    worker 退出后由 gunicorn 主进程调用（child_exit）：
+    把它的 counter / histogram 合并进归档文件，删除它的指标文件
+    """
+    directory = directory or multiprocess_dir()
+    if not directory:
+        return
+    path = os.path.join(directory, f"{pid}.prom")
+    with _dir_lock(directory):
+        if not os.path.exists(path):
+            return
+        archive_path = os.path.join(directory, ARCHIVE_FILE)
+        archive = _read(archive_path)
+        _merge(archive, _read(path), None)
+        _write(archive_path, _render_families(archive))
+        os.remove(path)
+
+
+def clear_multiprocess_dir(directory: Optional[str] = None) -> None:
+    """主进程启动时清空上次运行留下的指标文件"""
+    directory = directory or multiprocess_dir()
+    if not directory:
+        return
+    os.makedirs(directory, exist_ok=True)
+    for filename in os.listdir(directory):
+        if filename.endswith((".prom", ".tmp")):
+            os.remove(os.path.join(directory, filename))
+
+
+def start_flusher(interval: Optional[float] = None) -> None:
+    """
+    gunicorn worker 中启动后台线程定期写入指标文件（见 after_fork），
+    其他 worker 处理的抓取最多读到 interval 秒前的值
+    """
+    directory = multiprocess_dir()
+    if not directory:
+        return
+    interval = interval or float(os.getenv("METRICS_FLUSH_INTERVAL", 5))
+
+    def flush() -> None:
+        while True:
+            try:
+                write_snapshot(directory)
+            except Exception as e:
+                logger.warning("写入指标文件失败: %s", e)
+            time.sleep(interval)
+
+    threading.Thread(target=flush, name="metrics-flusher", daemon=True).start()
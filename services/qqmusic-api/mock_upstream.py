@@ -0,0 +1,496 @@
+#!/usr/bin/env python3
+"""
+Rain120/qq-music-api 的本地替身（压测和离线基准测试用）
+实现 /getSearchByKey、/getSongInfo、/getImageUrl，响应嵌套结构与真实上游一致
+（response.data、response.songinfo.data），数据来自按种子生成的曲库，
+并可注入延迟、错误、慢尾和大响应体
+
+    python mock_upstream.py                      # 默认监听 3200，与真实上游相同
+    QQMUSIC_API_BASE=http://localhost:3200 python server-proxy.py
+
+环境变量:
+- PORT: 监听端口 (默认 3200)
+- MOCK_SEED: 随机种子，相同种子生成相同的曲库和故障序列 (默认 42)
+- MOCK_CATALOG_SIZE: 曲库歌曲数量 (默认 1000)
+- MOCK_LATENCY: 所有端点的延迟分布 (默认 lognormal:median=0.08,sigma=0.5)
+- MOCK_LATENCY_SEARCH / MOCK_LATENCY_SONG / MOCK_LATENCY_COVER: 单个端点的延迟分布
+- MOCK_ERROR_RATE: 返回错误状态码的比例 0~1 (默认 0)
+- MOCK_ERROR_STATUS: 错误状态码 (默认 500)
+- MOCK_SLOW_RATE: 慢尾比例 0~1，命中时额外等待 MOCK_SLOW_SECONDS (默认 0)
+- MOCK_SLOW_SECONDS: 慢尾额外延迟秒数 (默认 3)
+- MOCK_SONG_PAYLOAD_BYTES: 歌曲详情响应的最小字节数，不足时用填充字段补齐 (默认 0)
+- MOCK_SEARCH_PAYLOAD_BYTES: 搜索结果中每首歌的最小字节数 (默认 0)
+- MOCK_IMAGE_BASE: /getImageUrl 返回的封面图地址前缀 (默认 https://y.gtimg.cn/music/photo_new)，
+  设为 http://localhost:3200/__mock/image 时封面图也由本服务返回，完全离线
+- MOCK_IMAGE_BYTES: /__mock/image 返回的图片字节数 (默认 20000)
+
+延迟分布格式 <类型>:<参数>=<值>,...
+- none
+- fixed:seconds=0.05
+- uniform:low=0.02,high=0.2
+- lognormal:median=0.08,sigma=0.5
+- exponential:mean=0.1
+
+运行时调整（只影响处理该请求的进程）:
+- POST /__mock/config  JSON，键为环境变量名去掉 MOCK_ 后的小写形式，
+  例如 {"error_rate": 0.1, "latency_song": "fixed:seconds=1"}
+- GET /__mock/stats    各端点请求数、错误数、慢尾数
+- POST /__mock/reset   清零统计并按种子重置故障序列
+- GET /__mock/image/<文件名>  按文件名生成的固定图片内容（不注入延迟和错误）
+"""
+
+import json
+import math
+import os
+import random
+import string
+import threading
+import time
+from typing import Any, Dict, Optional
+
+from flask import Flask, Response, jsonify, request
+
+PORT = int(os.getenv("PORT", 3200))
+
+# 上游端点 → 配置中的端点名
+ENDPOINTS = {
+    "getSearchByKey": "search",
+    "getSongInfo": "song",
+    "getImageUrl": "cover",
+}
+
+# fmt: off
+TITLE_WORDS = [
+    "晴天", "夜曲", "稻香", "后来", "光年", "平凡", "演员", "告白", "幸运", "风筝",
+    "海阔天空", "星空", "年少", "远方", "春风", "落日", "心跳", "旅行", "月光", "雨季",
+    "不将就", "小情歌", "时间", "城市", "回忆", "约定", "夏天", "孤独", "梦想", "彩虹",
+]
+TITLE_SUFFIXES = ["", "", "", "", " (Live)", "（伴奏）", " - 钢琴版", " (Remix)"]
+SURNAMES = ["周", "李", "陈", "林", "王", "张", "刘", "杨", "吴", "孙", "邓", "薛"]
+GIVEN_NAMES = [
+    "杰伦", "荣浩", "奕迅", "俊杰", "菲", "学友",
+    "若昀", "紫棋", "之谦", "宇春", "健", "雨",
+]
+# fmt: on
+
+
+class LatencyDistribution:
+    """延迟分布（秒），由 "<类型>:<参数>=<值>,..." 解析"""
+
+    KINDS = ("none", "fixed", "uniform", "lognormal", "exponential")
+
+    def __init__(self, spec: str):
+        kind, _, raw = spec.strip().partition(":")
+        kind = kind.strip().lower() or "none"
+        if kind not in self.KINDS:
+            raise ValueError(f"未知的延迟分布: {spec}")
+        params = {}
+        for part in raw.split(","):
+            if not part.strip():
+                continue
+            name, _, value = part.partition("=")
+            params[name.strip()] = float(value)
+        self.spec = spec
+        self.kind = kind
+        self.params = params
+
+    def sample(self, rng: random.Random) -> float:
+        p = self.params
+        if self.kind == "fixed":
+            return p.get("seconds", 0.0)
+        if self.kind == "uniform":
+            return rng.uniform(p.get("low", 0.0), p.get("high", 0.1))
+        if self.kind == "lognormal":
+            median = p.get("median", 0.08)
+            return rng.lognormvariate(math.log(median), p.get("sigma", 0.5))
+        if self.kind == "exponential":
+            return rng.expovariate(1.0 / p.get("mean", 0.1))
+        return 0.0
+
+
+class MockConfig:
+    """故障注入和响应体大小配置（环境变量 + 运行时覆盖）"""
+
+    def __init__(self, overrides: Optional[Dict[str, Any]] = None):
+        default_latency = os.getenv("MOCK_LATENCY", "lognormal:median=0.08,sigma=0.5")
+        self.latency = {
+            name: LatencyDistribution(
+                os.getenv(f"MOCK_LATENCY_{name.upper()}", default_latency)
+            )
+            for name in ENDPOINTS.values()
+        }
+        self.error_rate = float(os.getenv("MOCK_ERROR_RATE", 0))
+        self.error_status = int(os.getenv("MOCK_ERROR_STATUS", 500))
+        self.slow_rate = float(os.getenv("MOCK_SLOW_RATE", 0))
+        self.slow_seconds = float(os.getenv("MOCK_SLOW_SECONDS", 3))
+        self.song_payload_bytes = int(os.getenv("MOCK_SONG_PAYLOAD_BYTES", 0))
+        self.search_payload_bytes = int(os.getenv("MOCK_SEARCH_PAYLOAD_BYTES", 0))
+        self.image_base = os.getenv(
+            "MOCK_IMAGE_BASE", "https://y.gtimg.cn/music/photo_new"
+        ).rstrip("/")
+        self.image_bytes = int(os.getenv("MOCK_IMAGE_BYTES", 20000))
+        if overrides:
+            self.update(overrides)
+
+    def update(self, settings: Dict[str, Any]) -> None:
+        """
+        运行时更新，例如 {"latency": "fixed:seconds=0", "error_rate": 0.1}
+        latency 同时设置所有端点，latency_<端点> 只设置一个端点；
+        未知的键或无效的值抛出 ValueError（不会部分生效）
+        """
+        latency = dict(self.latency)
+        values = {}
+        for key, value in settings.items():
+            if key == "latency":
+                for name in latency:
+                    latency[name] = LatencyDistribution(str(value))
+            elif key.startswith("latency_") and key[8:] in latency:
+                latency[key[8:]] = LatencyDistribution(str(value))
+            elif key in ("error_rate", "slow_rate", "slow_seconds"):
+                values[key] = float(value)
+            elif key in (
+                "error_status",
+                "song_payload_bytes",
+                "search_payload_bytes",
+                "image_bytes",
+            ):
+                values[key] = int(value)
+            elif key == "image_base":
+                values[key] = str(value).rstrip("/")
+            else:
+                raise ValueError(f"未知的配置项: {key}")
+        self.latency = latency
+        for key, value in values.items():
+            setattr(self, key, value)
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            **{f"latency_{name}": dist.spec for name, dist in self.latency.items()},
+            "error_rate": self.error_rate,
+            "error_status": self.error_status,
+            "slow_rate": self.slow_rate,
+            "slow_seconds": self.slow_seconds,
+            "song_payload_bytes": self.song_payload_bytes,
+            "search_payload_bytes": self.search_payload_bytes,
+            "image_base": self.image_base,
+            "image_bytes": self.image_bytes,
+        }
+
+
+def _mid(rng: random.Random, prefix: str = "00") -> str:
+    """QQ 音乐风格的 14 位 mid"""
+    alphabet = string.ascii_letters + string.digits
+    return prefix + "".join(rng.choice(alphabet) for _ in range(12))
+
+
+def _pad(value: Dict[str, Any], min_bytes: int) -> Dict[str, Any]:
+    """按 JSON 编码后的字节数补齐到 min_bytes"""
+    if min_bytes <= 0:
+        return value
+    size = len(
+        json.dumps(value, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+    )
+    # 填充字段本身的键名和引号约 20 字节
+    if size + 20 < min_bytes:
+        value = dict(value, _mock_padding="x" * (min_bytes - size - 20))
+    return value
+
+
+class Catalog:
+    """按种子生成的曲库，歌手和专辑在歌曲之间共享"""
+
+    def __init__(self, size: Optional[int] = None, seed: Optional[int] = None):
+        self.size = size or int(os.getenv("MOCK_CATALOG_SIZE", 1000))
+        self.seed = seed if seed is not None else int(os.getenv("MOCK_SEED", 42))
+        rng = random.Random(self.seed)
+
+        # 姓 × 名 的组合，最多 144 位歌手
+        names = [surname + given for given in GIVEN_NAMES for surname in SURNAMES]
+        self.singers = [
+            {"id": 1000 + i, "mid": _mid(rng), "name": name}
+            for i, name in enumerate(names[: max(self.size // 10, 1)])
+        ]
+        self.albums = [
+            {"id": 2000 + i, "mid": _mid(rng), "name": self._title(rng)}
+            for i in range(max(self.size // 8, 1))
+        ]
+        self.songs = [self._song(rng, i) for i in range(self.size)]
+        self.by_mid = {song["mid"]: song for song in self.songs}
+        # 搜索用的小写文本：歌名 + 歌手 + 专辑
+        self._haystacks = [
+            " ".join(
+                [song["name"], song["album"]["name"]]
+                + [singer["name"] for singer in song["singer"]]
+            ).lower()
+            for song in self.songs
+        ]
+
+    @staticmethod
+    def _title(rng: random.Random) -> str:
+        first, second = rng.sample(TITLE_WORDS, 2)
+        return first if rng.random() < 0.4 else first + second
+
+    def _song(
+        self, rng: random.Random, index: int, mid: Optional[str] = None
+    ) -> Dict[str, Any]:
+        album = rng.choice(self.albums)
+        singers = rng.sample(self.singers, 2 if rng.random() < 0.15 else 1)
+        name = self._title(rng) + rng.choice(TITLE_SUFFIXES)
+        year, month, day = (
+            rng.randint(2000, 2024),
+            rng.randint(1, 12),
+            rng.randint(1, 28),
+        )
+        return {
+            "id": 100000 + index,
+            "mid": mid or _mid(rng),
+            "name": name,
+            "interval": rng.randint(120, 360),
+            "album": album,
+            "singer": singers,
+            "time_public": f"{year}-{month:02d}-{day:02d}",
+        }
+
+    def get(self, songmid: str) -> Dict[str, Any]:
+        """按 mid 查找；曲库外的 mid 按 mid 生成一首固定的歌曲（便于用随机 mid 压测）"""
+        song = self.by_mid.get(songmid)
+        if song is None:
+            song = self._song(random.Random(f"{self.seed}:{songmid}"), -1, mid=songmid)
+        return song
+
+    def search(self, keyword: str, page_size: int, page_no: int):
+        """按关键词命中的词数排序，返回 (当前页歌曲, 总数)"""
+        tokens = [t for t in keyword.lower().split() if t]
+        scored = []
+        for index, haystack in enumerate(self._haystacks):
+            score = sum(1 for token in tokens if token in haystack)
+            if score:
+                scored.append((-score, index))
+        scored.sort()
+        start = max(page_no - 1, 0) * page_size
+        page = [self.songs[index] for _, index in scored[start : start + page_size]]
+        return page, len(scored)
+
+
+def fake_image(name: str, size: int) -> bytes:
+    """按名称生成的固定图片内容（JPEG 文件头 + 伪随机字节）"""
+    return b"\xff\xd8\xff\xe0" + random.Random(name).randbytes(max(size - 4, 0))
+
+
+def search_item(song: Dict[str, Any], min_bytes: int = 0) -> Dict[str, Any]:
+    """搜索结果中的一首歌（字段与 Rain120 /getSearchByKey 一致）"""
+    item = {
+        "songid": song["id"],
+        "songmid": song["mid"],
+        "songname": song["name"],
+        "albumid": song["album"]["id"],
+        "albummid": song["album"]["mid"],
+        "albumname": song["album"]["name"],
+        "interval": song["interval"],
+        "singer": [
+            {"id": s["id"], "mid": s["mid"], "name": s["name"]} for s in song["singer"]
+        ],
+        "pay": {"payplay": 0, "paydownload": 1},
+        "size128": song["interval"] * 16000,
+        "size320": song["interval"] * 40000,
+        "strMediaMid": song["mid"],
+    }
+    return _pad(item, min_bytes)
+
+
+def song_detail(song: Dict[str, Any], min_bytes: int = 0) -> Dict[str, Any]:
+    """歌曲详情（Rain120 /getSongInfo 的 response.songinfo.data）"""
+    album = song["album"]
+    track_info = {
+        "id": song["id"],
+        "type": 0,
+        "mid": song["mid"],
+        "name": song["name"],
+        "title": song["name"],
+        "subtitle": "",
+        "singer": [
+            {
+                "id": s["id"],
+                "mid": s["mid"],
+                "name": s["name"],
+                "title": s["name"],
+                "type": 0,
+            }
+            for s in song["singer"]
+        ],
+        "album": {
+            "id": album["id"],
+            "mid": album["mid"],
+            "name": album["name"],
+            "title": album["name"],
+            "subtitle": "",
+            "time_public": song["time_public"],
+            "pmid": album["mid"],
+        },
+        "interval": song["interval"],
+        "time_public": song["time_public"],
+        "language": 0,
+        "genre": 1,
+        "file": {
+            "media_mid": song["mid"],
+            "size_128mp3": song["interval"] * 16000,
+            "size_320mp3": song["interval"] * 40000,
+            "size_flac": song["interval"] * 110000,
+        },
+        "pay": {"pay_month": 0, "price_track": 200, "pay_play": 0},
+        "action": {"switch": 636675, "msgid": 14, "alert": 2},
+    }
+    data = {
+        "track_info": track_info,
+        "info": {"company": {"title": "公司", "content": [{"value": "模拟唱片"}]}},
+        "extras": {"name": song["name"], "transname": "", "subtitle": ""},
+    }
+    return _pad(data, min_bytes)
+
+
+def create_app(
+    config: Optional[MockConfig] = None,
+    catalog: Optional[Catalog] = None,
+    sleep=time.sleep,
+) -> Flask:
+    """创建 mock 上游应用（测试时可注入配置、曲库和 sleep）"""
+    app = Flask(__name__)
+    app.json.ensure_ascii = False
+
+    config = config or MockConfig()
+    catalog = catalog or Catalog()
+    lock = threading.Lock()
+    state: Dict[str, Any] = {"rng": random.Random(catalog.seed)}
+    stats: Dict[str, Dict[str, int]] = {}
+
+    def reset():
+        state["rng"] = random.Random(catalog.seed)
+        stats.clear()
+        for name in ENDPOINTS.values():
+            stats[name] = {"requests": 0, "errors": 0, "slow": 0}
+
+    reset()
+
+    def inject(endpoint: str):
+        """按配置等待并决定是否返回错误，返回错误响应或 None"""
+        name = ENDPOINTS[endpoint]
+        with lock:
+            rng = state["rng"]
+            delay = config.latency[name].sample(rng)
+            slow = rng.random() < config.slow_rate
+            failed = rng.random() < config.error_rate
+            stats[name]["requests"] += 1
+            stats[name]["slow"] += slow
+            stats[name]["errors"] += failed
+        if slow:
+            delay += config.slow_seconds
+        if delay > 0:
+            sleep(delay)
+        if failed:
+            return (
+                jsonify({"response": {"code": -1, "msg": "mock injected error"}}),
+                config.error_status,
+            )
+        return None
+
+    @app.route("/getSearchByKey")
+    def get_search_by_key():
+        error = inject("getSearchByKey")
+        if error:
+            return error
+        keyword = request.args.get("key", "")
+        page_size = int(request.args.get("pageSize", 10))
+        page_no = int(request.args.get("pageNo", 1))
+        page, total = catalog.search(keyword, page_size, page_no)
+        items = [search_item(song, config.search_payload_bytes) for song in page]
+        return jsonify(
+            {
+                "response": {
+                    "code": 0,
+                    "data": {
+                        "keyword": keyword,
+                        "song": {
+                            "curnum": len(items),
+                            "curpage": page_no,
+                            "list": items,
+                            "totalnum": total,
+                        },
+                    },
+                }
+            }
+        )
+
+    @app.route("/getSongInfo")
+    def get_song_info():
+        error = inject("getSongInfo")
+        if error:
+            return error
+        song = catalog.get(request.args.get("songmid", ""))
+        data = song_detail(song, config.song_payload_bytes)
+        return jsonify({"response": {"code": 0, "songinfo": {"code": 0, "data": data}}})
+
+    @app.route("/getImageUrl")
+    def get_image_url():
+        error = inject("getImageUrl")
+        if error:
+            return error
+        album_mid = request.args.get("id", "")
+        size = request.args.get("size", "300x300")
+        url = f"{config.image_base}/T002R{size}M000{album_mid}.jpg"
+        return jsonify({"response": {"code": 0, "data": {"imageUrl": url}}})
+
+    @app.route("/__mock/image/<name>")
+    def mock_image(name: str):
+        return Response(fake_image(name, config.image_bytes), content_type="image/jpeg")
+
+    @app.route("/__mock/config", methods=["GET", "POST"])
+    def mock_config():
+        if request.method == "POST":
+            settings = request.get_json(silent=True)
+            if not isinstance(settings, dict):
+                return jsonify({"error": "请求体必须是 JSON 对象"}), 400
+            try:
+                with lock:
+                    config.update(settings)
+            except (TypeError, ValueError) as e:
+                return jsonify({"error": str(e)}), 400
+        return jsonify(config.as_dict())
+
+    @app.route("/__mock/stats")
+    def mock_stats():
+        with lock:
+            return jsonify({"catalog_size": catalog.size, "endpoints": stats})
+
+    @app.route("/__mock/reset", methods=["POST"])
+    def mock_reset():
+        with lock:
+            reset()
+        return jsonify({"status": "ok"})
+
+    @app.route("/__mock/catalog")
+    def mock_catalog():
+        """曲库中的歌曲（基准测试用来生成请求），limit 默认 100"""
+        limit = int(request.args.get("limit", 100))
+        return jsonify(
+            [
+                {
+                    "songmid": song["mid"],
+                    "name": song["name"],
+                    "artists": [s["name"] for s in song["singer"]],
+                    "album_mid": song["album"]["mid"],
+                    "interval": song["interval"],
+                }
+                for song in catalog.songs[:limit]
+            ]
+        )
+
+    return app
+
+
+app = create_app()
+
+
+if __name__ == "__main__":
+    print(f"Mock QQ Music upstream starting on port {PORT}...")
+    # 多线程处理，注入的延迟不会阻塞其他请求
+    app.run(host="0.0.0.0", port=PORT, debug=False, threaded=True)
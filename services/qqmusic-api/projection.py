@@ -0,0 +1,103 @@
+"""
+响应字段投影（fields= 参数）
+只返回调用方需要的字段，减少工作流各节点之间传递的数据量
+
+fields 取值:
+- 逗号分隔的点路径，例如 track_info.name,track_info.album.pmid
+  路径经过列表时对每个元素投影，例如 track_info.singer.name
+- 预设名称，例如 workflow（工作流实际使用的字段）
+- 为空或 all：返回完整数据
+"""
+
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+Path = Tuple[str, ...]
+
+# 与 parse_qqmusic_response / consolidate 使用的字段一致
+SONG_WORKFLOW_FIELDS = (
+    "track_info.mid",
+    "track_info.name",
+    "track_info.title",
+    "track_info.interval",
+    "track_info.lyric",
+    "track_info.album.id",
+    "track_info.album.mid",
+    "track_info.album.name",
+    "track_info.album.pmid",
+    "track_info.singer.mid",
+    "track_info.singer.name",
+)
+
+# 与 find_qqmusic_match 使用的字段一致
+SEARCH_WORKFLOW_FIELDS = (
+    "song.list.songmid",
+    "song.list.songname",
+    "song.list.albumname",
+    "song.list.albummid",
+    "song.list.interval",
+    "song.list.singer.name",
+)
+
+SONG_PROFILES = {"workflow": SONG_WORKFLOW_FIELDS}
+SEARCH_PROFILES = {"workflow": SEARCH_WORKFLOW_FIELDS}
+
+
+def parse_fields(
+    raw: Optional[str], profiles: Optional[Dict[str, Sequence[str]]] = None
+) -> Optional[List[Path]]:
+    """
+    解析 fields 参数，返回路径列表；为空或 all 时返回 None（不投影）
+    路径中有空段时抛出 ValueError
+    """
+    raw = (raw or "").strip()
+    if not raw or raw == "all":
+        return None
+
+    if profiles and raw in profiles:
+        specs: Sequence[str] = profiles[raw]
+    else:
+        specs = [spec.strip() for spec in raw.split(",") if spec.strip()]
+
+    paths = []
+    for spec in specs:
+        parts = tuple(spec.split("."))
+        if not all(parts):
+            raise ValueError(f"无效的字段路径: {spec}")
+        paths.append(parts)
+    return paths
+
+
+def _build_tree(paths: List[Path]) -> Dict[str, Any]:
+    """路径列表 → 前缀树，叶子为 None（保留整个子树）"""
+    tree: Dict[str, Any] = {}
+    for path in paths:
+        node = tree
+        for i, key in enumerate(path):
+            last = i == len(path) - 1
+            if last:
+                node[key] = None
+            elif node.get(key, {}) is None:
+                # 已经保留了整个子树，更深的路径不再需要
+                break
+            else:
+                node = node.setdefault(key, {})
+    return tree
+
+
+def _apply(value: Any, tree: Dict[str, Any]) -> Any:
+    if isinstance(value, list):
+        return [_apply(item, tree) for item in value]
+    if not isinstance(value, dict):
+        return value
+    result = {}
+    for key, subtree in tree.items():
+        if key in value:
+            result[key] = value[key] if subtree is None else _apply(value[key], subtree)
+    return result
+
+
+def project(value: Any, paths: Optional[List[Path]]) -> Any:
+    """按路径列表投影，paths 为 None 时原样返回；不存在的路径直接忽略"""
+    if paths is None:
+        return value
+    return _apply(value, _build_tree(paths))
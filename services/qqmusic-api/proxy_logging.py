@@ -0,0 +1,99 @@
+"""
+代理服务日志
+日志记录通过 QueueHandler 放入队列，由后台 QueueListener 线程写入 stderr，
+请求线程不等待 I/O
+
+环境变量:
+- LOG_LEVEL: 日志级别 (默认 INFO)，DEBUG 时记录上游响应体
+- LOG_PAYLOAD_SAMPLE_RATE: 记录上游响应体的采样比例 0~1 (默认 1.0)
+- LOG_PAYLOAD_MAX_CHARS: 响应体截断长度 (默认 500)
+"""
+
+import atexit
+import logging
+import os
+import queue
+import random
+import sys
+from logging.handlers import QueueHandler, QueueListener
+from typing import Union
+
+LOGGER_NAME = "qqmusic_proxy"
+
+_listener = None
+
+
+def setup_logging() -> logging.Logger:
+    """
+    配置代理日志（重复调用时直接返回已配置的 logger）
+    """
+    global _listener
+
+    logger = logging.getLogger(LOGGER_NAME)
+    if _listener is not None:
+        return logger
+
+    level = os.getenv("LOG_LEVEL", "INFO").upper()
+    logger.setLevel(level)
+    logger.propagate = False
+
+    stream_handler = logging.StreamHandler(sys.stderr)
+    stream_handler.setFormatter(
+        logging.Formatter("%(asctime)s %(levelname)s [QQ Music API] %(message)s")
+    )
+
+    log_queue: "queue.Queue" = queue.Queue(-1)
+    logger.addHandler(QueueHandler(log_queue))
+
+    _listener = QueueListener(log_queue, stream_handler, respect_handler_level=True)
+    _listener.start()
+    atexit.register(_listener.stop)
+
+    return logger
+
+
+def restart_after_fork() -> None:
+    """
+    gunicorn 预加载应用后 fork 出的 worker 没有父进程的后台线程，
+    用同一个队列和 handler 重新启动写日志线程
+    """
+    global _listener
+
+    if _listener is None:
+        return
+    atexit.unregister(_listener.stop)
+    _listener = QueueListener(
+        _listener.queue, *_listener.handlers, respect_handler_level=True
+    )
+    _listener.start()
+    atexit.register(_listener.stop)
+
+
+def get_logger() -> logging.Logger:
+    return setup_logging()
+
+
+def log_payload(logger: logging.Logger, label: str, body: Union[str, bytes]) -> None:
+    """
+    以 DEBUG 级别记录上游响应体（按采样比例，截断到 LOG_PAYLOAD_MAX_CHARS）
+    body 传原始响应文本或字节，避免为了日志再次序列化；
+    字节只在需要记录时才解码截断后的部分
+    """
+    if not logger.isEnabledFor(logging.DEBUG):
+        return
+
+    sample_rate = float(os.getenv("LOG_PAYLOAD_SAMPLE_RATE", 1.0))
+    if sample_rate < 1.0 and random.random() >= sample_rate:
+        return
+
+    max_chars = int(os.getenv("LOG_PAYLOAD_MAX_CHARS", 500))
+    if isinstance(body, (bytes, bytearray)):
+        total = len(body)
+        # UTF-8 每个字符最多 4 字节
+        body = bytes(body[: max_chars * 4]).decode("utf-8", errors="ignore")
+        if total > max_chars * 4 or len(body) > max_chars:
+            body = f"{body[:max_chars]}... ({total} bytes)"
+    elif len(body) > max_chars:
+        body = f"{body[:max_chars]}... ({len(body)} chars)"
+
+    logger.debug("%s: %s", label, body)
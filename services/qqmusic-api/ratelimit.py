@@ -0,0 +1,307 @@
+"""
+上游出站限流（令牌桶）
+搜索 / 详情 / 封面各一个桶，超出速率的调用排队等待，
+预计等待超过 max_wait 时直接拒绝（代理返回 503）
+
+速率可在运行时通过 POST /admin/ratelimit 调整，无需重启。
+传入共享存储（磁盘缓存，DISK_CACHE_PATH）时，调整结果写入 SQLite，
+其他 worker（包括之后重启的 worker）最多 sync_interval 秒后同步生效；
+调整会一直保留到下次修改，重启容器不会恢复环境变量中的值。
+未配置共享存储时只影响处理该请求的 worker。
+速率按每个 worker 计算，多 worker 部署时上游实际速率为 速率 × worker 数
+
+环境变量:
+- QQMUSIC_RATE_SEARCH / QQMUSIC_BURST_SEARCH: 搜索每秒请求数 / 突发容量 (默认 5 / 10)
+- QQMUSIC_RATE_DETAIL / QQMUSIC_BURST_DETAIL: 详情每秒请求数 / 突发容量 (默认 10 / 20)
+- QQMUSIC_RATE_COVER / QQMUSIC_BURST_COVER: 封面每秒请求数 / 突发容量 (默认 10 / 20)
+- QQMUSIC_RATE_MAX_WAIT: 最长排队秒数 (默认 10)
+速率设为 0 表示不限流
+"""
+
+import logging
+import os
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from resilience import UpstreamUnavailable
+
+logger = logging.getLogger("qqmusic_proxy")
+
+# 共享存储中的配置名
+SHARED_SETTING = "ratelimit"
+
+# 上游端点 → 限流桶
+ENDPOINT_BUCKETS = {
+    "getSearchByKey": "search",
+    "getSongInfo": "detail",
+    "getImageUrl": "cover",
+}
+
+BUCKET_DEFAULTS = {
+    "search": (5.0, 10.0),
+    "detail": (10.0, 20.0),
+    "cover": (10.0, 20.0),
+}
+
+
+def _to_float(name: str, value: Any) -> Optional[float]:
+    """校验配置数值（None 表示不修改），非数字或负数抛出 ValueError"""
+    if value is None:
+        return None
+    if isinstance(value, bool) or not isinstance(value, (int, float)) or value < 0:
+        raise ValueError(f"无效的限流配置: {name}={value!r}")
+    return float(value)
+
+
+class RateLimited(UpstreamUnavailable):
+    """排队等待时间超过上限"""
+
+    def __init__(self, endpoint: str, retry_after: float):
+        super().__init__(endpoint, "rate_limited", retry_after)
+
+
+class TokenBucket:
+    """
+    令牌桶（线程安全）
+    reserve() 预占一个令牌并返回需要等待的秒数，令牌余额可以为负，
+    负数部分即排在前面的等待者，保证先到先得
+    """
+
+    def __init__(
+        self,
+        rate: float,
+        burst: float,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.clock = clock
+        self._lock = threading.Lock()
+        self.rate = rate
+        self.burst = max(burst, 1.0)
+        self._tokens = self.burst
+        self._updated = clock()
+
+        self.granted = 0
+        self.rejected = 0
+        self.waited_seconds = 0.0
+
+    def _refill(self) -> None:
+        now = self.clock()
+        if self.rate > 0:
+            self._tokens = min(
+                self.burst, self._tokens + (now - self._updated) * self.rate
+            )
+        self._updated = now
+
+    def reserve(self, max_wait: float) -> Tuple[bool, float]:
+        """
+        预占一个令牌，返回 (是否预占成功, 需等待的秒数)
+        等待时间超过 max_wait 时不预占
+        """
+        with self._lock:
+            if self.rate <= 0:
+                self.granted += 1
+                return True, 0.0
+
+            self._refill()
+            wait = 0.0 if self._tokens >= 1 else (1 - self._tokens) / self.rate
+            if wait > max_wait:
+                self.rejected += 1
+                return False, wait
+
+            self._tokens -= 1
+            self.granted += 1
+            self.waited_seconds += wait
+            return True, wait
+
+    def configure(
+        self, rate: Optional[float] = None, burst: Optional[float] = None
+    ) -> None:
+        """运行时调整速率和突发容量"""
+        with self._lock:
+            self._refill()
+            if rate is not None:
+                self.rate = float(rate)
+            if burst is not None:
+                self.burst = max(float(burst), 1.0)
+                self._tokens = min(self._tokens, self.burst)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "rate": self.rate,
+                "burst": self.burst,
+                "granted": self.granted,
+                "rejected": self.rejected,
+                "waited_seconds": round(self.waited_seconds, 3),
+            }
+
+
+# (桶, 新速率, 新突发容量)，None 表示不修改
+_BucketUpdate = Tuple[TokenBucket, Optional[float], Optional[float]]
+
+
+class UpstreamRateLimiter:
+    """
+    按上游端点分桶的出站限流器
+
+    参数:
+        max_wait: 最长排队秒数
+        store: 共享配置存储（提供 get_setting / set_setting，例如 DiskCache）
+        sync_interval: 从共享存储同步配置的最小间隔秒数
+    """
+
+    def __init__(
+        self,
+        max_wait: Optional[float] = None,
+        store: Optional[Any] = None,
+        sync_interval: float = 1.0,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.max_wait = (
+            max_wait
+            if max_wait is not None
+            else float(os.getenv("QQMUSIC_RATE_MAX_WAIT", 10))
+        )
+        self.store = store
+        self.sync_interval = sync_interval
+        self.clock = clock
+        self._sync_lock = threading.Lock()
+        self._synced_at = float("-inf")
+        # 已应用的共享配置的更新时间
+        self._shared_version = 0.0
+        self.buckets: Dict[str, TokenBucket] = {}
+        for name, (rate, burst) in BUCKET_DEFAULTS.items():
+            suffix = name.upper()
+            self.buckets[name] = TokenBucket(
+                rate=float(os.getenv(f"QQMUSIC_RATE_{suffix}", rate)),
+                burst=float(os.getenv(f"QQMUSIC_BURST_{suffix}", burst)),
+            )
+
+    def reserve(self, endpoint: str) -> float:
+        """
+        预占令牌，返回需要等待的秒数（调用方负责 sleep）
+        超过 max_wait 时抛出 RateLimited
+        """
+        self.sync()
+        bucket = self.buckets.get(ENDPOINT_BUCKETS.get(endpoint, ""))
+        if bucket is None:
+            return 0.0
+        granted, wait = bucket.reserve(self.max_wait)
+        if not granted:
+            raise RateLimited(endpoint, retry_after=wait - self.max_wait)
+        return wait
+
+    def try_acquire(self, endpoint: str) -> bool:
+        """不排队：有空闲令牌时取出一个并返回 True（用于对冲请求，不同步共享配置）"""
+        bucket = self.buckets.get(ENDPOINT_BUCKETS.get(endpoint, ""))
+        if bucket is None:
+            return True
+        granted, _ = bucket.reserve(0.0)
+        return granted
+
+    def wait(self, endpoint: str) -> None:
+        """同步模式：阻塞等待到可以发出请求"""
+        delay = self.reserve(endpoint)
+        if delay > 0:
+            time.sleep(delay)
+
+    def configure(self, settings: Dict[str, Any]) -> None:
+        """
+        运行时更新配置，例如:
+            {"search": {"rate": 3, "burst": 5}, "max_wait": 5}
+        未知的桶名或无效的数值抛出 ValueError，此时不做任何修改
+        配置了共享存储时同时写入，其他 worker 随后同步
+        """
+        pending = self._validate(settings)
+        # 先同步其他 worker 的修改，写入的完整配置才不会覆盖它们
+        self.sync(force=True)
+        self._apply(*pending)
+        if self.shared:
+            version = self.store.set_setting(SHARED_SETTING, self.settings())
+            if version is not None:
+                with self._sync_lock:
+                    self._shared_version = max(self._shared_version, version)
+
+    def _validate(
+        self, settings: Dict[str, Any]
+    ) -> Tuple[Optional[float], List[_BucketUpdate]]:
+        max_wait = None
+        updates = []
+        # 先校验全部配置，再统一生效，避免只应用了一部分
+        for name, value in settings.items():
+            if name == "max_wait":
+                max_wait = _to_float(name, value)
+                continue
+            bucket = self.buckets.get(name)
+            if bucket is None or not isinstance(value, dict):
+                raise ValueError(f"未知的限流配置: {name}")
+            unknown = set(value) - {"rate", "burst"}
+            if unknown:
+                raise ValueError(f"未知的限流配置: {name}.{sorted(unknown)[0]}")
+            updates.append(
+                (
+                    bucket,
+                    _to_float(f"{name}.rate", value.get("rate")),
+                    _to_float(f"{name}.burst", value.get("burst")),
+                )
+            )
+        return max_wait, updates
+
+    def _apply(
+        self,
+        max_wait: Optional[float],
+        updates: List[_BucketUpdate],
+    ) -> None:
+        if max_wait is not None:
+            self.max_wait = max_wait
+        for bucket, rate, burst in updates:
+            bucket.configure(rate=rate, burst=burst)
+
+    @property
+    def shared(self) -> bool:
+        return self.store is not None and getattr(self.store, "enabled", True)
+
+    def settings(self) -> Dict[str, Any]:
+        """当前生效的完整配置（与 configure 的参数格式相同）"""
+        settings: Dict[str, Any] = {"max_wait": self.max_wait}
+        for name, bucket in self.buckets.items():
+            settings[name] = {"rate": bucket.rate, "burst": bucket.burst}
+        return settings
+
+    def sync_due(self) -> bool:
+        """距上次同步已超过 sync_interval（异步调用方据此先在线程池中同步）"""
+        return self.shared and self.clock() - self._synced_at >= self.sync_interval
+
+    def sync(self, force: bool = False) -> None:
+        """
+        从共享存储同步其他 worker 写入的配置
+        距上次同步不足 sync_interval 秒时直接返回（force 除外），
+        请求路径上每个 worker 最多每秒一次 SQLite 读取
+        """
+        if not self.shared:
+            return
+        with self._sync_lock:
+            now = self.clock()
+            if not force and now - self._synced_at < self.sync_interval:
+                return
+            self._synced_at = now
+        shared = self.store.get_setting(SHARED_SETTING)
+        if shared is None:
+            return
+        settings, version = shared
+        with self._sync_lock:
+            if version <= self._shared_version:
+                return
+            self._shared_version = version
+        try:
+            self._apply(*self._validate(settings))
+        except (TypeError, ValueError) as e:
+            logger.warning("忽略无效的共享限流配置: %s", e)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "shared": self.shared,
+            "max_wait": self.max_wait,
+            "buckets": {name: b.stats() for name, b in self.buckets.items()},
+        }
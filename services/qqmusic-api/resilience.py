@@ -0,0 +1,305 @@
+"""
+上游容错：熔断器 + AIMD 自适应并发上限
+
+上游降级时，不再让每个请求都等满超时再返回 502：
+- 每个上游端点一个熔断器，错误率或慢调用比例超过阈值时打开，
+  打开期间直接拒绝（代理返回 503），到期后放行一个探测请求（半开）
+- 所有端点共享一个自适应并发上限：调用成功且耗时低于目标时缓慢加一，
+  失败或变慢时减半（AIMD），超出上限的调用直接拒绝
+
+环境变量:
+- QQMUSIC_BREAKER_WINDOW: 统计窗口内的调用数 (默认 20)
+- QQMUSIC_BREAKER_MIN_CALLS: 窗口内至少多少次调用才判断 (默认 10)
+- QQMUSIC_BREAKER_ERROR_RATE: 打开熔断的错误率 (默认 0.5)
+- QQMUSIC_BREAKER_SLOW_CALL_SECONDS: 慢调用阈值秒数 (默认 5)
+- QQMUSIC_BREAKER_SLOW_RATE: 打开熔断的慢调用比例 (默认 0.8)
+- QQMUSIC_BREAKER_OPEN_SECONDS: 熔断打开持续秒数 (默认 30)
+- QQMUSIC_LIMIT_INITIAL: 初始并发上限 (默认 32)
+- QQMUSIC_LIMIT_MIN: 最小并发上限 (默认 2)
+- QQMUSIC_LIMIT_MAX: 最大并发上限 (默认 256)
+- QQMUSIC_LIMIT_LATENCY_TARGET: 目标耗时秒数，超过视为拥塞 (默认 2)
+"""
+
+import asyncio
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Optional
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+def _env_int(name: str, default: int) -> int:
+    return int(os.getenv(name, default))
+
+
+def _env_float(name: str, default: float) -> float:
+    return float(os.getenv(name, default))
+
+
+class UpstreamUnavailable(Exception):
+    """
+    上游被熔断或并发已满时抛出（不发出上游请求）
+    reason: circuit_open / concurrency_limit / rate_limited
+    retry_after: 建议重试间隔秒数
+    """
+
+    def __init__(self, endpoint: str, reason: str, retry_after: float = 1.0):
+        self.endpoint = endpoint
+        self.reason = reason
+        self.retry_after = retry_after
+        super().__init__(f"上游 {endpoint} 暂不可用 ({reason})")
+
+
+def is_upstream_failure(error: BaseException) -> bool:
+    """
+    判断异常是否计为上游故障
+    上游返回 4xx 属于请求问题，不计入熔断统计
+    """
+    response = getattr(error, "response", None)
+    status = getattr(response, "status_code", None)
+    if status is not None and status < 500:
+        return False
+    return True
+
+
+class CircuitBreaker:
+    """按滑动窗口错误率和慢调用比例判断的熔断器（线程安全）"""
+
+    def __init__(
+        self,
+        name: str,
+        window: Optional[int] = None,
+        min_calls: Optional[int] = None,
+        error_rate: Optional[float] = None,
+        slow_call_seconds: Optional[float] = None,
+        slow_rate: Optional[float] = None,
+        open_seconds: Optional[float] = None,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.name = name
+        self.window = window or _env_int("QQMUSIC_BREAKER_WINDOW", 20)
+        self.min_calls = min_calls or _env_int("QQMUSIC_BREAKER_MIN_CALLS", 10)
+        self.error_rate = error_rate or _env_float("QQMUSIC_BREAKER_ERROR_RATE", 0.5)
+        self.slow_call_seconds = slow_call_seconds or _env_float(
+            "QQMUSIC_BREAKER_SLOW_CALL_SECONDS", 5.0
+        )
+        self.slow_rate = slow_rate or _env_float("QQMUSIC_BREAKER_SLOW_RATE", 0.8)
+        self.open_seconds = open_seconds or _env_float(
+            "QQMUSIC_BREAKER_OPEN_SECONDS", 30.0
+        )
+        self.clock = clock
+
+        self.state = CLOSED
+        self._opened_at = 0.0
+        self._probe_in_flight = False
+        # 每次调用记录 (是否失败, 是否慢)
+        self._outcomes: deque = deque(maxlen=self.window)
+        self._lock = threading.Lock()
+
+        self.rejected = 0
+        self.opened = 0
+
+    def allow(self) -> None:
+        """调用前检查，熔断打开时抛出 UpstreamUnavailable"""
+        with self._lock:
+            if self.state == OPEN:
+                remaining = self._opened_at + self.open_seconds - self.clock()
+                if remaining > 0:
+                    self.rejected += 1
+                    raise UpstreamUnavailable(self.name, "circuit_open", remaining)
+                self.state = HALF_OPEN
+                self._probe_in_flight = False
+
+            if self.state == HALF_OPEN:
+                if self._probe_in_flight:
+                    self.rejected += 1
+                    raise UpstreamUnavailable(self.name, "circuit_open", 1.0)
+                self._probe_in_flight = True
+
+    def check(self) -> None:
+        """
+        只检查不占用探测名额：熔断打开且未到期时抛出 UpstreamUnavailable
+        用于排队等待限流令牌之前，避免为注定被拒绝的调用等待
+        """
+        with self._lock:
+            if self.state != OPEN:
+                return
+            remaining = self._opened_at + self.open_seconds - self.clock()
+            if remaining > 0:
+                self.rejected += 1
+                raise UpstreamUnavailable(self.name, "circuit_open", remaining)
+
+    def cancel(self) -> None:
+        """allow() 之后未实际调用时释放半开探测名额"""
+        with self._lock:
+            self._probe_in_flight = False
+
+    def record(self, duration: float, failed: bool) -> None:
+        """记录调用结果"""
+        slow = duration >= self.slow_call_seconds
+        with self._lock:
+            if self.state == HALF_OPEN:
+                self._probe_in_flight = False
+                if failed or slow:
+                    self._open()
+                else:
+                    self.state = CLOSED
+                    self._outcomes.clear()
+                return
+
+            self._outcomes.append((failed, slow))
+            if self.state == CLOSED and len(self._outcomes) >= self.min_calls:
+                total = len(self._outcomes)
+                failures = sum(1 for f, _ in self._outcomes if f)
+                slow_calls = sum(1 for _, s in self._outcomes if s)
+                if (
+                    failures / total >= self.error_rate
+                    or slow_calls / total >= self.slow_rate
+                ):
+                    self._open()
+
+    def _open(self) -> None:
+        self.state = OPEN
+        self._opened_at = self.clock()
+        self._outcomes.clear()
+        self.opened += 1
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "state": self.state,
+                "open": 1 if self.state == OPEN else 0,
+                "opened": self.opened,
+                "rejected": self.rejected,
+            }
+
+
+class AdaptiveLimiter:
+    """
+    AIMD 自适应并发上限（线程安全）
+    成功且耗时 <= latency_target：limit += 1 / limit（约每轮加一）
+    失败或耗时 > latency_target：limit *= backoff（冷却期内只减一次）
+    """
+
+    def __init__(
+        self,
+        initial: Optional[int] = None,
+        minimum: Optional[int] = None,
+        maximum: Optional[int] = None,
+        latency_target: Optional[float] = None,
+        backoff: float = 0.5,
+        cooldown: float = 1.0,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.minimum = minimum or _env_int("QQMUSIC_LIMIT_MIN", 2)
+        self.maximum = maximum or _env_int("QQMUSIC_LIMIT_MAX", 256)
+        self.limit = float(initial or _env_int("QQMUSIC_LIMIT_INITIAL", 32))
+        self.latency_target = latency_target or _env_float(
+            "QQMUSIC_LIMIT_LATENCY_TARGET", 2.0
+        )
+        self.backoff = backoff
+        self.cooldown = cooldown
+        self.clock = clock
+
+        self.in_flight = 0
+        self.rejected = 0
+        self._last_decrease = float("-inf")
+        self._lock = threading.Lock()
+
+    def acquire(self, endpoint: str) -> None:
+        with self._lock:
+            if self.in_flight >= int(self.limit):
+                self.rejected += 1
+                raise UpstreamUnavailable(endpoint, "concurrency_limit", 1.0)
+            self.in_flight += 1
+
+    def release(self, duration: float, failed: bool) -> None:
+        with self._lock:
+            self.in_flight -= 1
+            if failed or duration > self.latency_target:
+                now = self.clock()
+                if now - self._last_decrease >= self.cooldown:
+                    self.limit = max(self.minimum, self.limit * self.backoff)
+                    self._last_decrease = now
+            else:
+                self.limit = min(self.maximum, self.limit + 1.0 / self.limit)
+
+    def cancel(self) -> None:
+        """调用被取消（例如对冲请求的落败方）：只释放名额，不调整上限"""
+        with self._lock:
+            self.in_flight -= 1
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "limit": int(self.limit),
+                "in_flight": self.in_flight,
+                "rejected": self.rejected,
+            }
+
+
+class UpstreamGuard:
+    """每个端点一个熔断器 + 共享的自适应并发上限"""
+
+    def __init__(self, limiter: Optional[AdaptiveLimiter] = None, **breaker_options):
+        self.limiter = limiter or AdaptiveLimiter()
+        self._breaker_options = breaker_options
+        self._breakers: Dict[str, CircuitBreaker] = {}
+        self._lock = threading.Lock()
+
+    def breaker(self, endpoint: str) -> CircuitBreaker:
+        with self._lock:
+            breaker = self._breakers.get(endpoint)
+            if breaker is None:
+                breaker = CircuitBreaker(endpoint, **self._breaker_options)
+                self._breakers[endpoint] = breaker
+            return breaker
+
+    def check(self, endpoint: str) -> None:
+        """熔断打开时抛出 UpstreamUnavailable（不占用并发和探测名额）"""
+        self.breaker(endpoint).check()
+
+    @contextmanager
+    def call(self, endpoint: str):
+        """
+        包裹一次上游调用
+        熔断打开或并发已满时抛出 UpstreamUnavailable，不执行调用
+        """
+        breaker = self.breaker(endpoint)
+        breaker.allow()
+        try:
+            self.limiter.acquire(endpoint)
+        except UpstreamUnavailable:
+            breaker.cancel()
+            raise
+
+        start = time.perf_counter()
+        try:
+            yield
+        except asyncio.CancelledError:
+            # 被取消的调用没有结果，不计入熔断和 AIMD 统计
+            self.limiter.cancel()
+            breaker.cancel()
+            raise
+        except BaseException as e:
+            self._finish(breaker, start, is_upstream_failure(e))
+            raise
+        self._finish(breaker, start, False)
+
+    def _finish(self, breaker: CircuitBreaker, start: float, failed: bool) -> None:
+        duration = time.perf_counter() - start
+        self.limiter.release(duration, failed)
+        breaker.record(duration, failed)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            breakers = dict(self._breakers)
+        return {
+            "limiter": self.limiter.stats(),
+            "breakers": {name: b.stats() for name, b in breakers.items()},
+        }
@@ -0,0 +1,212 @@
+"""
+本地搜索索引（进程内倒排索引）
+把上游搜索结果中见过的 song.list 条目按 标题 / 艺术家 建立索引，
+/search?local=1 时先在本地检索，置信度足够时不请求上游
+
+- 达标的条目不足一页时仍返回本地结果，响应头 X-Search-Source 为 LOCAL-PARTIAL
+  （上游可能还有置信度不够或没见过的歌曲）；local=full 时不足一页就请求上游
+
+- 索引项: 规范化（text_normalize.fold：繁简、全角半角、大小写，与 /track 和工作流节点相同）
+  后的词，以及每个词的字符二元组（单字词为单字），
+  中文没有空格分词，二元组保证 "周杰伦" 能被 "周杰" "杰伦" 命中
+- 置信度: 查询与条目索引项集合的 Dice 系数（2|Q∩D| / (|Q|+|D|)），
+  标题多出 "Live" 等版本说明或查询只有标题时都会降低置信度
+- 条目按 songmid 去重，超过上限时淘汰最久未见的条目
+- 只在内存中，多 worker 部署时各 worker 独立积累
+
+环境变量:
+- SEARCH_INDEX_MAX_ENTRIES: 最多索引的歌曲数，0 表示禁用 (默认 50000)
+- SEARCH_INDEX_MIN_SCORE: 本地结果直接返回所需的最低置信度 (默认 0.8)
+"""
+
+import os
+import re
+import threading
+from collections import Counter, OrderedDict
+from typing import Any, Dict, FrozenSet, List, Optional, Tuple
+
+from workflow_shared import text_normalize
+
+_WORD = re.compile(r"[^\W_]+")
+
+# X-Search-Source 响应头
+LOCAL = "LOCAL"
+LOCAL_PARTIAL = "LOCAL-PARTIAL"
+UPSTREAM = "UPSTREAM"
+
+# (条目, 索引项, 最近一次见到的序号)
+_Entry = Tuple[Dict[str, Any], FrozenSet[str], int]
+
+
+def index_terms(text: str) -> FrozenSet[str]:
+    """文本的索引项：规范化后的词 + 每个词的字符二元组"""
+    terms = set()
+    for word in _WORD.findall(text_normalize.fold(text or "")):
+        terms.add(word)
+        terms.update(word[i : i + 2] for i in range(len(word) - 1))
+    return frozenset(terms)
+
+
+def entry_terms(item: Dict[str, Any]) -> FrozenSet[str]:
+    """搜索结果条目的索引项（标题 + 所有艺术家）"""
+    singers = " ".join(
+        s.get("name", "") for s in item.get("singer", []) if isinstance(s, dict)
+    )
+    return index_terms(f"{item.get('songname', '')} {singers}")
+
+
+class SearchIndex:
+    """
+    线程安全的倒排索引
+
+    参数:
+        max_entries: 最多索引的歌曲数，<= 0 表示禁用
+        min_score: lookup 返回结果所需的最低置信度
+    """
+
+    def __init__(
+        self, max_entries: Optional[int] = None, min_score: Optional[float] = None
+    ):
+        self.max_entries = (
+            int(os.getenv("SEARCH_INDEX_MAX_ENTRIES", 50000))
+            if max_entries is None
+            else max_entries
+        )
+        self.min_score = (
+            float(os.getenv("SEARCH_INDEX_MIN_SCORE", 0.8))
+            if min_score is None
+            else min_score
+        )
+        self._lock = threading.Lock()
+        # songmid → 条目，按最近一次见到的顺序排列
+        self._entries: "OrderedDict[str, _Entry]" = OrderedDict()
+        self._postings: Dict[str, set] = {}
+        self._seq = 0
+
+        self.indexed = 0
+        self.evictions = 0
+        self.hits = 0
+        self.misses = 0
+        self.partial_hits = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_entries > 0
+
+    def add(self, data: Dict[str, Any]) -> int:
+        """把一次搜索结果（response.data）中的条目加入索引，返回新增或更新的条目数"""
+        if not self.enabled:
+            return 0
+        items = (data or {}).get("song", {}).get("list", [])
+        changed = 0
+        with self._lock:
+            for item in items:
+                songmid = item.get("songmid") if isinstance(item, dict) else None
+                if not songmid:
+                    continue
+                self._seq += 1
+                existing = self._entries.pop(songmid, None)
+                if existing is not None and existing[0] == item:
+                    self._entries[songmid] = (item, existing[1], self._seq)
+                    continue
+                if existing is not None:
+                    self._unlink(songmid, existing[1])
+                terms = entry_terms(item)
+                self._entries[songmid] = (item, terms, self._seq)
+                for term in terms:
+                    self._postings.setdefault(term, set()).add(songmid)
+                changed += 1
+            self.indexed += changed
+            while len(self._entries) > self.max_entries:
+                songmid, (_, terms, _) = self._entries.popitem(last=False)
+                self._unlink(songmid, terms)
+                self.evictions += 1
+        return changed
+
+    def _unlink(self, songmid: str, terms: FrozenSet[str]) -> None:
+        for term in terms:
+            posting = self._postings.get(term)
+            if posting is not None:
+                posting.discard(songmid)
+                if not posting:
+                    del self._postings[term]
+
+    def search(
+        self, keyword: str, limit: int = 10
+    ) -> List[Tuple[float, Dict[str, Any]]]:
+        """按置信度从高到低返回 [(置信度, 条目)]，同分时最近见过的在前"""
+        query = index_terms(keyword)
+        if not self.enabled or not query:
+            return []
+        with self._lock:
+            overlap: Counter = Counter()
+            for term in query:
+                overlap.update(self._postings.get(term, ()))
+            scored = []
+            for songmid, shared in overlap.items():
+                item, terms, seq = self._entries[songmid]
+                scored.append((2 * shared / (len(query) + len(terms)), seq, item))
+        scored.sort(key=lambda entry: (-entry[0], -entry[1]))
+        return [(score, item) for score, _, item in scored[:limit]]
+
+    def lookup(
+        self,
+        keyword: str,
+        page_size: int = 10,
+        page_no: int = 1,
+        full_page: bool = False,
+    ) -> Optional[Dict[str, Any]]:
+        """
+        置信度足够时返回与上游 response.data 相同结构的结果，否则返回 None（需要请求上游）
+        只返回置信度达标的条目，可能不足 page_size 条；full_page 时不足一页也返回 None
+        """
+        matches = [
+            item
+            for score, item in self.search(keyword, limit=page_size * page_no)
+            if score >= self.min_score
+        ]
+        page = matches[(page_no - 1) * page_size : page_no * page_size]
+        with self._lock:
+            if not page or (full_page and len(page) < page_size):
+                self.misses += 1
+                return None
+            self.hits += 1
+            if len(page) < page_size:
+                self.partial_hits += 1
+        return {
+            "song": {
+                "curnum": len(page),
+                "curpage": page_no,
+                "list": page,
+                "totalnum": len(matches),
+            }
+        }
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._postings.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "enabled": self.enabled,
+                "entries": len(self._entries),
+                "terms": len(self._postings),
+                "max_entries": self.max_entries,
+                "min_score": self.min_score,
+                "indexed": self.indexed,
+                "evictions": self.evictions,
+                "hits": self.hits,
+                "partial_hits": self.partial_hits,
+                "misses": self.misses,
+                "hit_ratio": self.hits / lookups if lookups else 0.0,
+            }
+
+
+def search_source(data: Optional[Dict[str, Any]], page_size: int) -> str:
+    """/search?local=1 的 X-Search-Source：data 为 lookup 的结果（None 表示请求了上游）"""
+    if data is None:
+        return UPSTREAM
+    return LOCAL if data["song"]["curnum"] >= page_size else LOCAL_PARTIAL
@@ -2,14 +2,53 @@
 """
 QQ 音乐 API 代理服务器（转发到 Rain120/qq-music-api）
 将请求转发到实际的 QQ 音乐 API 服务
+
+启动模式由 SERVER_MODE 环境变量选择:
+- flask (默认): 本文件中的同步 Flask 应用
+- asgi: server_async.py 中的异步应用（httpx + uvicorn）
 """
 
+import math
 import os
 import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
 import requests
-from flask import Flask, request, jsonify
+from flask import Flask, Response, g, request, jsonify
 from flask_cors import CORS
 
+import fastjson
+import http_cache
+import metrics
+from cache import TTLCache
+from crosswalk import Crosswalk
+from disk_cache import DiskCache
+from image_cache import (
+    CHUNK_SIZE,
+    MAX_IMAGE_REDIRECTS,
+    ImageCache,
+    ImageRedirectError,
+    is_allowed_image_url,
+    redirect_target,
+)
+from projection import SEARCH_PROFILES, SONG_PROFILES, parse_fields, project
+from proxy_logging import get_logger, log_payload, restart_after_fork
+from ratelimit import UpstreamRateLimiter
+from resilience import UpstreamGuard, UpstreamUnavailable
+from search_index import SearchIndex, search_source
+from singleflight import SingleFlight, normalize_key
+from track import (
+    detail_candidate,
+    empty_track,
+    flatten_track,
+    pick_best_match,
+    score_candidate,
+    split_artists,
+)
+from upstream import UpstreamClient
+from warmer import CacheWarmer
+
 app = Flask(__name__)
 CORS(app)
 
@@ -17,6 +56,182 @@ PORT = int(os.getenv("PORT", 3001))
 # Rain120/qq-music-api 的实际地址
 QQMUSIC_API_BASE = os.getenv("QQMUSIC_API_BASE", "http://localhost:3200")
 
+# 日志异步写入 stderr（Docker 容器可见），LOG_LEVEL=DEBUG 时记录上游响应体
+logger = get_logger()
+
+# 上游熔断（每个端点）+ 自适应并发上限（所有端点共享）
+guard = UpstreamGuard()
+
+# 磁盘缓存层（SQLite，DISK_CACHE_PATH 为空时禁用），重启后仍可命中
+# 后台清理线程在 worker 中启动（after_fork / 单进程入口），不在预加载的主进程中运行
+disk_cache = DiskCache()
+
+# 出站令牌桶限流（搜索 / 详情 / 封面分桶），可通过 /admin/ratelimit 运行时调整，
+# 调整写入磁盘缓存数据库，所有 worker 同步生效（未启用磁盘缓存时只影响当前 worker）
+rate_limiter = UpstreamRateLimiter(store=disk_cache)
+
+# 所有路由共享的上游客户端（连接池 + keep-alive）；对冲请求只在异步模式启用
+upstream = UpstreamClient(QQMUSIC_API_BASE, guard=guard, rate_limiter=rate_limiter)
+
+# 管理端点令牌（设置后 /admin/* 需要 X-Admin-Token 请求头）
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN", "")
+
+# 进行中的上游请求去重（相同参数的并发请求共享一次上游调用）
+flights = SingleFlight()
+
+# 网易云歌曲 ID → songmid 对照表（CROSSWALK_PATH 为空时禁用），/track 命中时跳过搜索
+crosswalk = Crosswalk()
+
+# /song 响应缓存（按 songmid），SONG_CACHE_TTL=0 禁用；内存未命中时查磁盘缓存
+# stale 条目在有界线程池中刷新；加载函数经过 flights，刷新与同一歌曲的未命中请求共用一次上游调用
+song_cache = TTLCache(
+    ttl=float(os.getenv("SONG_CACHE_TTL", 6 * 3600)),
+    stale_ttl=float(os.getenv("SONG_CACHE_STALE_TTL", 3600)),
+    max_bytes=int(os.getenv("SONG_CACHE_MAX_BYTES", 64 * 1024 * 1024)),
+    backing=disk_cache.tier("getSongInfo", lambda songmid: {"songmid": songmid}),
+    refresh_workers=int(os.getenv("SONG_CACHE_REFRESH_WORKERS", 4)),
+)
+
+# /songs 批量接口：单次最多 songmid 数量，以及所有批量请求共享的上游并发上限
+# （/track 的详情 + 封面并发请求也使用这个线程池）
+SONGS_BATCH_MAX = int(os.getenv("SONGS_BATCH_MAX", 50))
+SONGS_BATCH_CONCURRENCY = int(os.getenv("SONGS_BATCH_CONCURRENCY", 8))
+batch_executor = ThreadPoolExecutor(
+    max_workers=SONGS_BATCH_CONCURRENCY, thread_name_prefix="songs-batch"
+)
+
+
+metrics.REGISTRY.add_collector(
+    "song_cache", metrics.stats_collector("qqmusic_proxy_song_cache", song_cache.stats)
+)
+# 封面图片缓存（内容寻址，COVER_IMAGE_CACHE_DIR 为空时只转发不缓存）
+image_cache = ImageCache()
+# 下载 CDN 图片用的连接池（与 Rain120 上游分开）
+image_session = requests.Session()
+COVER_IMAGE_TIMEOUT = float(os.getenv("COVER_IMAGE_TIMEOUT", 10))
+
+metrics.REGISTRY.add_collector(
+    "image_cache",
+    metrics.stats_collector("qqmusic_proxy_image_cache", image_cache.stats),
+)
+metrics.REGISTRY.add_collector(
+    "disk_cache",
+    metrics.stats_collector("qqmusic_proxy_disk_cache", disk_cache.stats),
+)
+# 见过的搜索结果的本地倒排索引，/search?local=1 时置信度足够则不请求上游
+search_index = SearchIndex()
+
+metrics.REGISTRY.add_collector(
+    "search_index",
+    metrics.stats_collector("qqmusic_proxy_search_index", search_index.stats),
+)
+metrics.REGISTRY.add_collector(
+    "crosswalk", metrics.stats_collector("qqmusic_proxy_crosswalk", crosswalk.stats)
+)
+metrics.REGISTRY.add_collector(
+    "singleflight", metrics.stats_collector("qqmusic_proxy_singleflight", flights.stats)
+)
+metrics.REGISTRY.add_collector(
+    "limiter",
+    metrics.stats_collector(
+        "qqmusic_proxy_upstream_limiter", lambda: guard.stats()["limiter"]
+    ),
+)
+metrics.REGISTRY.add_collector(
+    "breakers",
+    metrics.labeled_stats_collector(
+        "qqmusic_proxy_upstream_breaker", "endpoint", lambda: guard.stats()["breakers"]
+    ),
+)
+metrics.REGISTRY.add_collector(
+    "rate_limit",
+    metrics.labeled_stats_collector(
+        "qqmusic_proxy_rate_limit", "bucket", lambda: rate_limiter.stats()["buckets"]
+    ),
+)
+
+
+@app.before_request
+def start_request_timer():
+    if request.path == "/metrics":
+        return
+    g.request_start = time.perf_counter()
+    metrics.IN_FLIGHT.inc()
+
+
+@app.after_request
+def record_request_metrics(response):
+    start = g.get("request_start")
+    if start is not None:
+        route = request.url_rule.rule if request.url_rule else "unmatched"
+        metrics.record_request(route, response.status_code, time.perf_counter() - start)
+    return response
+
+
+@app.after_request
+def apply_http_caching(response):
+    """
+    ETag / 304 协商、Cache-Control 和响应压缩
+    （after_request 按注册的逆序执行，这里先于指标记录，指标里记录的是最终状态码）
+    """
+    route = request.url_rule.rule if request.url_rule else ""
+    if (
+        request.method != "GET"
+        or response.status_code != 200
+        or response.direct_passthrough
+        or response.mimetype != "application/json"
+    ):
+        response.headers.setdefault(
+            "Cache-Control", http_cache.cache_control_for(route, response.status_code)
+        )
+        return response
+
+    status, body, headers = http_cache.negotiate(
+        response.get_data(),
+        route,
+        request.headers.get("Accept-Encoding"),
+        request.headers.get("If-None-Match"),
+    )
+    response.status_code = status
+    response.set_data(body)
+    response.headers.update(headers)
+    if status == 304:
+        response.headers.pop("Content-Type", None)
+    return response
+
+
+@app.teardown_request
+def finish_request(exc):
+    # teardown 总会执行，保证进行中计数在异常时也能回落
+    if g.pop("request_start", None) is not None:
+        metrics.IN_FLIGHT.dec()
+
+
+def json_response(data) -> Response:
+    """用 fastjson 编码的 JSON 响应（数据路由使用，错误响应仍用 jsonify）"""
+    return Response(fastjson.dumps(data), mimetype="application/json")
+
+
+def upstream_error_message(e: Exception) -> str:
+    return f"上游 API 调用失败: {str(e)}"
+
+
+def upstream_error_response(e: Exception):
+    logger.warning(upstream_error_message(e))
+    return jsonify(
+        {"error": upstream_error_message(e), "upstream": QQMUSIC_API_BASE}
+    ), 502
+
+
+def upstream_unavailable_response(e: UpstreamUnavailable):
+    """熔断打开或并发已满：立即返回 503，不等待上游超时"""
+    response = jsonify(
+        {"error": str(e), "reason": e.reason, "upstream": QQMUSIC_API_BASE}
+    )
+    response.status_code = 503
+    response.headers["Retry-After"] = str(max(1, math.ceil(e.retry_after)))
+    return response
+
 
 @app.route("/")
 def index():
@@ -27,10 +242,85 @@ def index():
             "service": "QQ Music API Proxy",
             "version": "1.0.0",
             "upstream": QQMUSIC_API_BASE,
+            "upstream_pool": upstream.pool_info(),
+            "json_backend": fastjson.backend(),
         }
     )
 
 
+@app.route("/metrics")
+def metrics_endpoint():
+    """Prometheus 指标"""
+    return Response(metrics.render(), content_type=metrics.CONTENT_TYPE)
+
+
+@app.route("/admin/ratelimit", methods=["GET", "POST"])
+def admin_ratelimit():
+    """
+    查看或运行时调整出站限流
+    POST 请求体示例:
+        {"search": {"rate": 3, "burst": 5}, "detail": {"rate": 8}, "max_wait": 5}
+    """
+    if ADMIN_TOKEN and request.headers.get("X-Admin-Token") != ADMIN_TOKEN:
+        return jsonify({"error": "无效的管理令牌"}), 403
+
+    if request.method == "POST":
+        settings = request.get_json(silent=True)
+        if not isinstance(settings, dict):
+            return jsonify({"error": "请求体必须是 JSON 对象"}), 400
+        try:
+            rate_limiter.configure(settings)
+        except (TypeError, ValueError) as e:
+            return jsonify({"error": str(e)}), 400
+        logger.info("限流配置已更新: %s", settings)
+    else:
+        # 返回其他 worker 最新写入的配置
+        rate_limiter.sync(force=True)
+
+    return jsonify(rate_limiter.stats())
+
+
+@app.route("/cache/stats")
+def cache_stats():
+    """缓存命中/未命中/淘汰计数"""
+    return jsonify(
+        {
+            "song": song_cache.stats(),
+            "disk": disk_cache.stats(),
+            "crosswalk": crosswalk.stats(),
+            "search_index": search_index.stats(),
+            "image": image_cache.stats(),
+            "singleflight": flights.stats(),
+            "upstream": guard.stats(),
+            "rate_limit": rate_limiter.stats(),
+        }
+    )
+
+
+def fetch_search_data(keyword: str, page_size: int, page_no: int) -> dict:
+    """从上游搜索歌曲并提取 response.data（并发的相同搜索合并为一次上游调用）"""
+    # 转发到 Rain120 API
+    # Rain120 使用 /getSearchByKey 端点
+    params = {"key": keyword, "pageSize": page_size, "pageNo": page_no}
+    cached = disk_cache.get("getSearchByKey", params)
+    if cached is not None:
+        search_index.add(cached)
+        return cached
+
+    def load():
+        response = upstream.get("getSearchByKey", params)
+        body = response.content
+        log_payload(logger, "Search Response", body)
+
+        data = fastjson.extract(body, ("response", "data"))
+        disk_cache.set("getSearchByKey", params, data)
+        search_index.add(data)
+        return data
+
+    data, _ = flights.do(normalize_key("getSearchByKey", params), load)
+    return data
+
+
 @app.route("/search")
 def search():
     """
@@ -39,6 +329,12 @@ def search():
         key: 搜索关键词
         pageSize: 每页数量 (默认 10)
         pageNo: 页码 (默认 1)
+        fields: 字段投影（可选，点路径列表或预设 workflow）
+        local: 为 1 时先查本地索引，置信度足够直接返回，否则请求上游；
+            为 full 时本地达标的歌曲不足 pageSize 首也请求上游
+    响应头:
+        X-Search-Source: LOCAL / LOCAL-PARTIAL（本地结果不足 pageSize 首）/ UPSTREAM
+            （传 local 时）
     """
     try:
         keyword = request.args.get("key", "")
@@ -47,70 +343,188 @@ def search():
 
         if not keyword:
             return jsonify({"error": "缺少搜索关键词"}), 400
+        try:
+            fields = parse_fields(request.args.get("fields"), SEARCH_PROFILES)
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
 
-        # 转发到 Rain120 API
-        # Rain120 使用 /getSearchByKey 端点
-        url = f"{QQMUSIC_API_BASE}/getSearchByKey"
-        params = {"key": keyword, "pageSize": page_size, "pageNo": page_no}
-
-        response = requests.get(url, params=params, timeout=10)
-        response.raise_for_status()
-
-        # 日志输出到 stderr（Docker 容器可见）
-        print(
-            f"[QQ Music API] Search Response: {response.json()}",
-            file=sys.stderr,
-            flush=True,
+        local_mode = request.args.get("local", "")
+        local = local_mode in ("1", "true", "full")
+        data = (
+            search_index.lookup(
+                keyword, page_size, page_no, full_page=local_mode == "full"
+            )
+            if local
+            else None
         )
+        source = search_source(data, page_size)
+        if data is None:
+            data = fetch_search_data(keyword, page_size, page_no)
+        response = json_response(project(data, fields))
+        if local:
+            response.headers["X-Search-Source"] = source
+        return response
 
-        # 使用 jsonify 返回，Dify 会自动包装
-        return jsonify(response.json()["response"]["data"])
-
+    except UpstreamUnavailable as e:
+        return upstream_unavailable_response(e)
     except requests.RequestException as e:
-        return jsonify(
-            {"error": f"上游 API 调用失败: {str(e)}", "upstream": QQMUSIC_API_BASE}
-        ), 502
+        return upstream_error_response(e)
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
 
+def fetch_song_data(songmid: str) -> dict:
+    """从上游获取歌曲详情并提取 songinfo.data（并发的相同请求合并为一次上游调用）"""
+    # 转发到 Rain120 API
+    # Rain120 使用 /getSongInfo 端点
+    params = {"songmid": songmid}
+
+    def load():
+        response = upstream.get("getSongInfo", params)
+        body = response.content
+        log_payload(logger, "Response", body)
+
+        return fastjson.extract(body, ("response", "songinfo", "data"))
+
+    data, _ = flights.do(normalize_key("getSongInfo", params), load)
+    return data
+
+
+def load_song(songmid: str):
+    """读取歌曲详情（先查缓存），返回 (数据, 缓存状态)"""
+    return song_cache.get_or_load(songmid, lambda: fetch_song_data(songmid))
+
+
 @app.route("/song")
 def get_song():
     """
     获取歌曲详情
     参数:
         songmid: 歌曲 MID
+        fields: 字段投影（可选，点路径列表或预设 workflow）
+    响应头:
+        X-Cache: HIT / STALE / DISK / MISS
     """
     try:
         songmid = request.args.get("songmid", "")
 
         if not songmid:
             return jsonify({"error": "缺少歌曲 MID"}), 400
+        try:
+            fields = parse_fields(request.args.get("fields"), SONG_PROFILES)
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+
+        data, cache_state = load_song(songmid)
+
+        # 缓存中保存完整数据，按请求的字段投影后返回
+        response = json_response(project(data, fields))
+        response.headers["X-Cache"] = cache_state
+        return response
 
-        # 转发到 Rain120 API
-        # Rain120 使用 /getSongInfo 端点
-        url = f"{QQMUSIC_API_BASE}/getSongInfo"
-        params = {"songmid": songmid}
+    except UpstreamUnavailable as e:
+        return upstream_unavailable_response(e)
+    except requests.RequestException as e:
+        return upstream_error_response(e)
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
 
-        response = requests.get(url, params=params, timeout=10)
-        response.raise_for_status()
 
-        # 日志输出到 stderr（Docker 容器可见）
-        print(
-            f"[QQ Music API] Response: {response.json()}", file=sys.stderr, flush=True
+@app.route("/songs")
+def get_songs():
+    """
+    批量获取歌曲详情（并发请求上游）
+    参数:
+        songmids: 逗号分隔的歌曲 MID，例如 a,b,c
+        fields: 每首歌曲 data 的字段投影（可选，同 /song）
+    返回:
+        songs: 以 songmid 为键，每项包含 success / data / error / cache
+        success_count / error_count: 成功和失败数量
+    单个歌曲失败不影响其他歌曲，失败原因记录在对应项的 error 中
+    """
+    try:
+        raw = request.args.get("songmids", "")
+        # 去重并保持顺序
+        songmids = list(
+            dict.fromkeys(mid.strip() for mid in raw.split(",") if mid.strip())
         )
 
-        # 使用 jsonify 返回，Dify 会自动包装
-        return jsonify(response.json()["response"]["songinfo"]["data"])
+        if not songmids:
+            return jsonify({"error": "缺少歌曲 MID 列表"}), 400
+        if len(songmids) > SONGS_BATCH_MAX:
+            return jsonify({"error": f"单次最多查询 {SONGS_BATCH_MAX} 首歌曲"}), 400
+        try:
+            fields = parse_fields(request.args.get("fields"), SONG_PROFILES)
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+
+        futures = {mid: batch_executor.submit(load_song, mid) for mid in songmids}
+
+        songs = {}
+        for mid, future in futures.items():
+            try:
+                data, cache_state = future.result()
+                songs[mid] = {
+                    "success": True,
+                    "data": project(data, fields),
+                    "error": "",
+                    "cache": cache_state,
+                }
+            except UpstreamUnavailable as e:
+                songs[mid] = {
+                    "success": False,
+                    "data": None,
+                    "error": str(e),
+                    "cache": "MISS",
+                }
+            except requests.RequestException as e:
+                songs[mid] = {
+                    "success": False,
+                    "data": None,
+                    "error": upstream_error_message(e),
+                    "cache": "MISS",
+                }
+            except Exception as e:
+                songs[mid] = {
+                    "success": False,
+                    "data": None,
+                    "error": str(e),
+                    "cache": "MISS",
+                }
+
+        success_count = sum(1 for item in songs.values() if item["success"])
+        return json_response(
+            {
+                "songs": songs,
+                "success_count": success_count,
+                "error_count": len(songs) - success_count,
+            }
+        )
 
-    except requests.RequestException as e:
-        return jsonify(
-            {"error": f"上游 API 调用失败: {str(e)}", "upstream": QQMUSIC_API_BASE}
-        ), 502
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
 
+def fetch_cover_data(cover_id: str, size: str = "") -> dict:
+    """从上游获取封面图 URL 并提取 response.data"""
+    # 转发到 Rain120 API
+    # Rain120 使用 /getImageUrl 端点
+    params = {"id": cover_id}
+    if size:
+        params["size"] = size
+    cached = disk_cache.get("getImageUrl", params)
+    if cached is not None:
+        return cached
+
+    response = upstream.get("getImageUrl", params)
+    body = response.content
+    log_payload(logger, "Cover Response", body)
+
+    data = fastjson.extract(body, ("response", "data"))
+    disk_cache.set("getImageUrl", params, data)
+    return data
+
+
 @app.route("/cover")
 def get_cover():
     """
@@ -129,35 +543,358 @@ def get_cover():
         if not cover_id:
             return jsonify({"error": "缺少封面图 ID"}), 400
 
-        # 转发到 Rain120 API
-        # Rain120 使用 /getImageUrl 端点
-        url = f"{QQMUSIC_API_BASE}/getImageUrl"
-        params = {"id": cover_id}
-        if size:
-            params["size"] = size
-
-        response = requests.get(url, params=params, timeout=10)
-        response.raise_for_status()
-
-        # 日志输出到 stderr（Docker 容器可见）
-        print(
-            f"[QQ Music API] Cover Response: {response.json()}",
-            file=sys.stderr,
-            flush=True,
+        # 返回完整响应
+        return json_response(fetch_cover_data(cover_id, size))
+
+    except UpstreamUnavailable as e:
+        return upstream_unavailable_response(e)
+    except requests.RequestException as e:
+        return upstream_error_response(e)
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+
+def read_file_chunks(path: str):
+    with open(path, "rb") as f:
+        while True:
+            chunk = f.read(CHUNK_SIZE)
+            if not chunk:
+                return
+            yield chunk
+
+
+def stream_and_cache(image_response, writer):
+    """边转发边写入缓存；下载中断或客户端断开时丢弃未完成的缓存文件"""
+    try:
+        for chunk in image_response.iter_content(CHUNK_SIZE):
+            writer.write(chunk)
+            yield chunk
+        writer.commit()
+    finally:
+        writer.abort()
+        image_response.close()
+
+
+@app.route("/cover/image")
+def get_cover_image():
+    """
+    流式返回封面图片（先查本地缓存，未命中时从 CDN 边下载边转发并缓存）
+    参数（二选一）:
+        id: 封面图 ID (album pmid)，配合 size 选择尺寸（例如 300x300）
+        url: 图片 URL（仅限 COVER_IMAGE_HOSTS 内的域名，例如网易云封面）
+    响应头:
+        X-Cache: HIT / MISS
+        ETag: 图片内容的 SHA-256（缓存命中时）
+    """
+    try:
+        cover_id = request.args.get("id", "")
+        size = request.args.get("size", "")
+        image_url = request.args.get("url", "")
+
+        if cover_id:
+            image_url = fetch_cover_data(cover_id, size).get("imageUrl", "")
+            if not image_url:
+                return jsonify({"error": "上游未返回封面图 URL"}), 502
+        elif not image_url:
+            return jsonify({"error": "缺少封面图 ID 或 URL"}), 400
+
+        if not is_allowed_image_url(image_url):
+            return jsonify({"error": "不允许代理该图片地址"}), 400
+
+        cache_control = http_cache.cache_control_for("/cover/image", 200)
+        cached = image_cache.lookup(image_url)
+        if cached is not None:
+            etag = f'"{cached["digest"]}"'
+            headers = {"ETag": etag, "Cache-Control": cache_control, "X-Cache": "HIT"}
+            if http_cache.etag_matches(request.headers.get("If-None-Match"), etag):
+                return Response(status=304, headers=headers)
+            headers["Content-Length"] = str(cached["size"])
+            return Response(
+                read_file_chunks(cached["path"]),
+                content_type=cached["content_type"],
+                headers=headers,
+            )
+
+        with metrics.track_upstream("coverImage"):
+            image_response = open_cover_image(image_url)
+            if not image_response.ok:
+                image_response.close()
+            image_response.raise_for_status()
+
+        content_type = image_response.headers.get("Content-Type", "image/jpeg")
+        headers = {"Cache-Control": cache_control, "X-Cache": "MISS"}
+        if "Content-Length" in image_response.headers:
+            headers["Content-Length"] = image_response.headers["Content-Length"]
+        writer = image_cache.writer(image_url, content_type)
+        return Response(
+            stream_and_cache(image_response, writer),
+            content_type=content_type,
+            headers=headers,
         )
 
-        # 返回完整响应
-        return jsonify(response.json()["response"]["data"])
+    except UpstreamUnavailable as e:
+        return upstream_unavailable_response(e)
+    except ImageRedirectError as e:
+        return jsonify({"error": str(e)}), 502
+    except requests.RequestException as e:
+        return upstream_error_response(e)
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+
+def open_cover_image(image_url: str):
+    """下载封面图（流式），手动跟随重定向并逐跳校验域名白名单"""
+    url = image_url
+    for _ in range(MAX_IMAGE_REDIRECTS + 1):
+        response = image_session.get(
+            url,
+            stream=True,
+            timeout=(3, COVER_IMAGE_TIMEOUT),
+            allow_redirects=False,
+        )
+        if not response.is_redirect:
+            return response
+        response.close()
+        url = redirect_target(url, response.headers.get("Location", ""))
+    raise ImageRedirectError("封面图重定向次数过多")
+
+
+def load_cover_url(cover_id: str, size: str = ""):
+    """读取封面图 URL，返回 (url, 错误信息)；封面失败不影响 /track 其他字段"""
+    try:
+        return fetch_cover_data(cover_id, size).get("imageUrl", ""), ""
+    except requests.RequestException as e:
+        return "", upstream_error_message(e)
+    except Exception as e:
+        return "", str(e)
+
+
+def load_track_details(match: dict, size: str = ""):
+    """并发获取匹配歌曲的详情和封面图，返回 (歌曲详情, 缓存状态, 封面 URL, 封面错误)"""
+    # 搜索结果里的 albummid 通常就是封面图 ID，先和详情并发请求；
+    # 详情返回的 album.pmid 不同时再补一次封面请求
+    guessed_cover_id = match.get("albummid", "")
+    song_future = batch_executor.submit(load_song, match.get("songmid", ""))
+    cover_future = (
+        batch_executor.submit(load_cover_url, guessed_cover_id, size)
+        if guessed_cover_id
+        else None
+    )
 
+    song_data, cache_state = song_future.result()
+    cover_url, cover_error = cover_future.result() if cover_future else ("", "")
+
+    pmid = song_data.get("track_info", {}).get("album", {}).get("pmid", "")
+    if pmid and pmid != guessed_cover_id:
+        cover_url, cover_error = load_cover_url(pmid, size)
+    return song_data, cache_state, cover_url, cover_error
+
+
+@app.route("/track")
+def get_track():
+    """
+    组合查询：搜索 → 选出最佳匹配 → 并发获取歌曲详情和封面图
+    一次调用替代工作流中的 搜索 / 匹配 / 详情 / 封面 四个节点
+    参数:
+        title: 歌曲标题
+        artists: 艺术家（可选，多个用逗号分隔）
+        duration: 时长秒数（可选，用于区分同名版本）
+        size: 封面图尺寸（可选，格式: 500x500）
+        fields: parsed_data 的字段投影（可选，同 /song）
+        netease_id: 网易云歌曲 ID（可选，同时传 artists 时先查对照表，命中则跳过搜索）
+    返回:
+        与 parse_qqmusic_response / parse_cover_url 相同的平铺字段，
+        外加 match_found / match_id / match_name / match_album / match_score
+    响应头:
+        X-Cache: 歌曲详情的缓存状态（同 /song）
+        X-Crosswalk: HIT / MISS / INVALIDATED（传 netease_id 且启用对照表时）
+    搜索无结果时返回 200 且 match_found=false
+    """
+    try:
+        title = request.args.get("title", "").strip()
+        artists = split_artists(request.args.get("artists", ""))
+        size = request.args.get("size", "")
+        netease_id = request.args.get("netease_id", "").strip()
+
+        if not title:
+            return jsonify({"error": "缺少歌曲标题"}), 400
+        try:
+            duration = int(request.args.get("duration") or 0)
+        except ValueError:
+            return jsonify({"error": "duration 必须是整数秒"}), 400
+        try:
+            fields = parse_fields(request.args.get("fields"), SONG_PROFILES)
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+
+        # 对照表命中时用歌曲详情重新打分核验（没有艺术家无法核验，不查对照表）
+        use_crosswalk = bool(netease_id and artists and crosswalk.enabled)
+        crosswalk_state = "MISS"
+        match = crosswalk.get(netease_id) if use_crosswalk else None
+        if match is not None:
+            details = load_track_details(match, size)
+            verified = score_candidate(
+                detail_candidate(details[0]), title, artists, duration
+            )
+            if verified >= crosswalk.min_score:
+                crosswalk_state = "HIT"
+                match = {**match, "score": round(verified, 3)}
+            else:
+                crosswalk.invalidate(netease_id)
+                logger.info(
+                    "对照表条目 %s → %s 核验不通过 (%.3f)，重新搜索",
+                    netease_id,
+                    match.get("songmid", ""),
+                    verified,
+                )
+                crosswalk_state = "INVALIDATED"
+                match = None
+
+        if match is None:
+            keyword = " ".join([title] + artists)
+            search_data = fetch_search_data(keyword, 10, 1)
+            results = search_data.get("song", {}).get("list", [])
+
+            match = pick_best_match(results, title, artists, duration)
+            if match is None:
+                error = "没有版本和时长一致的搜索结果" if results else "搜索无结果"
+                return json_response(empty_track(error))
+            details = load_track_details(match, size)
+            if use_crosswalk:
+                crosswalk.record(netease_id, match)
+
+        song_data, cache_state, cover_url, cover_error = details
+        track = flatten_track(match, song_data, cover_url, cover_error)
+        # 平铺字段来自完整数据，投影只作用于 parsed_data
+        track["parsed_data"] = project(song_data, fields)
+        response = json_response(track)
+        response.headers["X-Cache"] = cache_state
+        if use_crosswalk:
+            response.headers["X-Crosswalk"] = crosswalk_state
+        return response
+
+    except UpstreamUnavailable as e:
+        return upstream_unavailable_response(e)
     except requests.RequestException as e:
-        return jsonify(
-            {"error": f"上游 API 调用失败: {str(e)}", "upstream": QQMUSIC_API_BASE}
-        ), 502
+        return upstream_error_response(e)
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
 
+@app.route("/crosswalk/<netease_id>", methods=["GET", "DELETE"])
+def crosswalk_entry(netease_id):
+    """
+    查看 (GET) 或作废 (DELETE) 对照表条目
+    工作流整合后发现 QQ 音乐数据与网易云不一致时可调用 DELETE，下次 /track 重新搜索
+    """
+    if not crosswalk.enabled:
+        return jsonify({"error": "未启用对照表 (CROSSWALK_PATH)"}), 404
+    if request.method == "DELETE":
+        if ADMIN_TOKEN and request.headers.get("X-Admin-Token") != ADMIN_TOKEN:
+            return jsonify({"error": "无效的管理令牌"}), 403
+        if not crosswalk.invalidate(netease_id):
+            return jsonify({"error": "对照表条目不存在"}), 404
+        return jsonify({"netease_id": netease_id, "invalidated": True})
+
+    entry = crosswalk.lookup(netease_id)
+    if entry is None:
+        return jsonify({"error": "对照表条目不存在"}), 404
+    return jsonify(entry)
+
+
+# 预热搜索使用的分页参数，与工作流搜索节点一致
+WARM_SEARCH_PAGE_SIZE = 10
+WARM_SEARCH_PAGE_NO = 1
+
+
+def warm_search(keyword: str) -> bool:
+    """预热搜索结果（写入磁盘缓存），返回是否请求了上游"""
+    params = {
+        "key": keyword,
+        "pageSize": WARM_SEARCH_PAGE_SIZE,
+        "pageNo": WARM_SEARCH_PAGE_NO,
+    }
+    if disk_cache.get("getSearchByKey", params) is not None:
+        return False
+    fetch_search_data(keyword, WARM_SEARCH_PAGE_SIZE, WARM_SEARCH_PAGE_NO)
+    return True
+
+
+def warm_song(songmid: str) -> bool:
+    """预热歌曲详情（写入 /song 缓存），返回是否请求了上游"""
+    _, cache_state = load_song(songmid)
+    return cache_state == "MISS"
+
+
+# 后台缓存预热（POST /warm），任务逐个执行，速率由 WARM_RATE 控制；
+# 任务状态写入磁盘缓存数据库，任意 worker 都能查询和取消
+warmer = CacheWarmer({"search": warm_search, "song": warm_song}, store=disk_cache)
+
+
+@app.route("/warm", methods=["GET", "POST"])
+def warm():
+    """
+    提交缓存预热任务 (POST) / 查看所有任务 (GET)
+    POST 请求体示例:
+        {"keys": ["晴天 周杰伦"], "songmids": ["002w3cVJ4baewp"], "rate": 5}
+    返回 202 和任务状态，进度见 GET /warm/<job_id>
+    """
+    if request.method == "GET":
+        return jsonify(warmer.stats())
+
+    if ADMIN_TOKEN and request.headers.get("X-Admin-Token") != ADMIN_TOKEN:
+        return jsonify({"error": "无效的管理令牌"}), 403
+    try:
+        items, rate = warmer.parse(request.get_json(silent=True))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    # 搜索结果只保存在磁盘缓存中（进程内只缓存 /song）
+    if not disk_cache.enabled and any(kind == "search" for kind, _ in items):
+        return jsonify({"error": "预热搜索需要启用磁盘缓存 (DISK_CACHE_PATH)"}), 400
+
+    job = warmer.submit(items, rate)
+    logger.info("缓存预热任务 %s 已提交: %d 个条目", job.id, len(items))
+    response = jsonify(job.status())
+    response.status_code = 202
+    response.headers["Location"] = f"/warm/{job.id}"
+    return response
+
+
+@app.route("/warm/<job_id>", methods=["GET", "DELETE"])
+def warm_status(job_id):
+    """查看 (GET) 或取消 (DELETE) 预热任务"""
+    if request.method == "DELETE":
+        if ADMIN_TOKEN and request.headers.get("X-Admin-Token") != ADMIN_TOKEN:
+            return jsonify({"error": "无效的管理令牌"}), 403
+        status = warmer.request_cancel(job_id)
+    else:
+        status = warmer.lookup(job_id)
+
+    if status is None:
+        return jsonify({"error": "预热任务不存在"}), 404
+    return jsonify(status)
+
+
+def after_fork() -> None:
+    """gunicorn 预加载应用后在每个 worker 中调用（见 gunicorn.conf.py）"""
+    restart_after_fork()
+    disk_cache.after_fork()
+    disk_cache.start_compaction()
+    crosswalk.after_fork()
+    metrics.start_flusher()
+
+
 if __name__ == "__main__":
+    # SERVER_MODE=asgi 使用异步模式（server_async.py），默认 Flask
+    if os.getenv("SERVER_MODE", "flask").lower() == "asgi":
+        import server_async
+
+        server_async.run()
+        sys.exit(0)
+
     print(f"QQ Music API Proxy starting on port {PORT}...")
     print(f"Forwarding to: {QQMUSIC_API_BASE}")
+    print(f"Upstream pool: {upstream.pool_info()}")
+    disk_cache.start_compaction()
+    # 开发用单进程服务器；生产环境使用 gunicorn -c gunicorn.conf.py
     app.run(host="0.0.0.0", port=PORT, debug=False)
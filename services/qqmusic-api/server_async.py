@@ -0,0 +1,954 @@
+#!/usr/bin/env python3
+"""
+QQ 音乐 API 代理服务器 - 异步 (ASGI) 模式
+与 server-proxy.py 提供相同的端点和响应格式，上游调用使用 httpx.AsyncClient，
+单进程内可同时挂起数百个上游请求而不占用工作线程
+
+启动方式:
+    SERVER_MODE=asgi python server-proxy.py
+    或 uvicorn server_async:app --host 0.0.0.0 --port 3001
+
+磁盘缓存、对照表（SQLite）和封面图片缓存（文件读写）是阻塞调用，
+通过 run_in_threadpool 在线程池中执行，不阻塞事件循环
+"""
+
+import asyncio
+import math
+import os
+import time
+from contextlib import asynccontextmanager
+
+import httpx
+from starlette.applications import Starlette
+from starlette.middleware import Middleware
+from starlette.middleware.cors import CORSMiddleware
+from starlette.background import BackgroundTask
+from starlette.concurrency import run_in_threadpool
+from starlette.responses import FileResponse, JSONResponse, Response, StreamingResponse
+from starlette.routing import Route
+
+import fastjson
+import http_cache
+import metrics
+from cache import TTLCache
+from crosswalk import Crosswalk
+from disk_cache import DiskCache
+from hedging import HedgePolicy
+from image_cache import (
+    CHUNK_SIZE,
+    MAX_IMAGE_REDIRECTS,
+    ImageCache,
+    ImageRedirectError,
+    is_allowed_image_url,
+    redirect_target,
+)
+from projection import SEARCH_PROFILES, SONG_PROFILES, parse_fields, project
+from proxy_logging import get_logger, log_payload, restart_after_fork
+from ratelimit import UpstreamRateLimiter
+from resilience import UpstreamGuard, UpstreamUnavailable
+from search_index import SearchIndex, search_source
+from singleflight import AsyncSingleFlight, normalize_key
+from track import (
+    detail_candidate,
+    empty_track,
+    flatten_track,
+    pick_best_match,
+    score_candidate,
+    split_artists,
+)
+from upstream import AsyncUpstreamClient
+from warmer import AsyncCacheWarmer
+
+PORT = int(os.getenv("PORT", 3001))
+# Rain120/qq-music-api 的实际地址
+QQMUSIC_API_BASE = os.getenv("QQMUSIC_API_BASE", "http://localhost:3200")
+
+# 日志异步写入 stderr（Docker 容器可见），LOG_LEVEL=DEBUG 时记录上游响应体
+logger = get_logger()
+
+# 上游熔断（每个端点）+ 自适应并发上限（所有端点共享）
+guard = UpstreamGuard()
+
+# 磁盘缓存层（SQLite，与同步模式使用相同的环境变量）
+# 读写会等待 WAL 锁、fsync 和其他 worker 的写入，一律通过 run_in_threadpool 调用
+# 后台清理线程在 lifespan 启动时开始（每个 worker 各自启动），不在预加载的主进程中运行
+disk_cache = DiskCache()
+
+# 出站令牌桶限流（搜索 / 详情 / 封面分桶），可通过 /admin/ratelimit 运行时调整，
+# 调整写入磁盘缓存数据库，所有 worker 同步生效（未启用磁盘缓存时只影响当前 worker）
+rate_limiter = UpstreamRateLimiter(store=disk_cache)
+
+# 对冲请求：主请求超过近期耗时分位数仍未返回时再发一个（QQMUSIC_HEDGE_ENDPOINTS 启用）
+hedge_policy = HedgePolicy()
+
+# 所有路由共享的异步上游客户端
+upstream = AsyncUpstreamClient(
+    QQMUSIC_API_BASE, guard=guard, rate_limiter=rate_limiter, hedge=hedge_policy
+)
+
+# 管理端点令牌（设置后 /admin/* 需要 X-Admin-Token 请求头）
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN", "")
+
+# 进行中的上游请求去重
+flights = AsyncSingleFlight()
+
+# 网易云歌曲 ID → songmid 对照表（与同步模式使用相同的环境变量）
+crosswalk = Crosswalk()
+
+# /song 响应缓存（与同步模式使用相同的环境变量），内存未命中时查磁盘缓存
+song_cache = TTLCache(
+    ttl=float(os.getenv("SONG_CACHE_TTL", 6 * 3600)),
+    stale_ttl=float(os.getenv("SONG_CACHE_STALE_TTL", 3600)),
+    max_bytes=int(os.getenv("SONG_CACHE_MAX_BYTES", 64 * 1024 * 1024)),
+    backing=disk_cache.tier("getSongInfo", lambda songmid: {"songmid": songmid}),
+)
+
+SONGS_BATCH_MAX = int(os.getenv("SONGS_BATCH_MAX", 50))
+SONGS_BATCH_CONCURRENCY = int(os.getenv("SONGS_BATCH_CONCURRENCY", 8))
+batch_semaphore = asyncio.Semaphore(SONGS_BATCH_CONCURRENCY)
+
+metrics.REGISTRY.add_collector(
+    "song_cache", metrics.stats_collector("qqmusic_proxy_song_cache", song_cache.stats)
+)
+# 封面图片缓存（与同步模式使用相同的环境变量）
+image_cache = ImageCache()
+# 下载 CDN 图片用的连接池（与 Rain120 上游分开）
+# 不自动跟随重定向，由 open_cover_image 逐跳校验白名单
+image_client = httpx.AsyncClient(
+    timeout=httpx.Timeout(float(os.getenv("COVER_IMAGE_TIMEOUT", 10)), connect=3.0),
+    follow_redirects=False,
+)
+
+metrics.REGISTRY.add_collector(
+    "image_cache",
+    metrics.stats_collector("qqmusic_proxy_image_cache", image_cache.stats),
+)
+metrics.REGISTRY.add_collector(
+    "disk_cache",
+    metrics.stats_collector("qqmusic_proxy_disk_cache", disk_cache.stats),
+)
+# 见过的搜索结果的本地倒排索引，/search?local=1 时置信度足够则不请求上游
+search_index = SearchIndex()
+
+metrics.REGISTRY.add_collector(
+    "search_index",
+    metrics.stats_collector("qqmusic_proxy_search_index", search_index.stats),
+)
+metrics.REGISTRY.add_collector(
+    "crosswalk", metrics.stats_collector("qqmusic_proxy_crosswalk", crosswalk.stats)
+)
+metrics.REGISTRY.add_collector(
+    "singleflight", metrics.stats_collector("qqmusic_proxy_singleflight", flights.stats)
+)
+metrics.REGISTRY.add_collector(
+    "limiter",
+    metrics.stats_collector(
+        "qqmusic_proxy_upstream_limiter", lambda: guard.stats()["limiter"]
+    ),
+)
+metrics.REGISTRY.add_collector(
+    "breakers",
+    metrics.labeled_stats_collector(
+        "qqmusic_proxy_upstream_breaker", "endpoint", lambda: guard.stats()["breakers"]
+    ),
+)
+metrics.REGISTRY.add_collector(
+    "rate_limit",
+    metrics.labeled_stats_collector(
+        "qqmusic_proxy_rate_limit", "bucket", lambda: rate_limiter.stats()["buckets"]
+    ),
+)
+metrics.REGISTRY.add_collector(
+    "hedge", metrics.stats_collector("qqmusic_proxy_hedge", hedge_policy.stats)
+)
+
+
+class FastJSONResponse(JSONResponse):
+    """用 fastjson 编码的 JSON 响应（数据路由使用）"""
+
+    def render(self, content) -> bytes:
+        return fastjson.dumps(content)
+
+
+def upstream_error_message(e: Exception) -> str:
+    return f"上游 API 调用失败: {str(e)}"
+
+
+def upstream_error_response(e: Exception) -> JSONResponse:
+    logger.warning(upstream_error_message(e))
+    return JSONResponse(
+        {"error": upstream_error_message(e), "upstream": QQMUSIC_API_BASE},
+        status_code=502,
+    )
+
+
+def upstream_unavailable_response(e: UpstreamUnavailable) -> JSONResponse:
+    """熔断打开或并发已满：立即返回 503，不等待上游超时"""
+    return JSONResponse(
+        {"error": str(e), "reason": e.reason, "upstream": QQMUSIC_API_BASE},
+        status_code=503,
+        headers={"Retry-After": str(max(1, math.ceil(e.retry_after)))},
+    )
+
+
+def error_response(message: str, status_code: int) -> JSONResponse:
+    return JSONResponse({"error": message}, status_code=status_code)
+
+
+async def index(request):
+    """健康检查端点"""
+    return JSONResponse(
+        {
+            "status": "ok",
+            "service": "QQ Music API Proxy",
+            "version": "1.0.0",
+            "mode": "asgi",
+            "upstream": QQMUSIC_API_BASE,
+            "upstream_pool": upstream.pool_info(),
+            "json_backend": fastjson.backend(),
+        }
+    )
+
+
+async def metrics_endpoint(request):
+    """Prometheus 指标"""
+    # 磁盘缓存和对照表的采集器会查询 SQLite，多 worker 时还要读写指标文件
+    body = await run_in_threadpool(metrics.render)
+    return Response(body, media_type=metrics.CONTENT_TYPE)
+
+
+async def admin_ratelimit(request):
+    """查看或运行时调整出站限流（请求体格式同 Flask 模式）"""
+    if ADMIN_TOKEN and request.headers.get("X-Admin-Token") != ADMIN_TOKEN:
+        return error_response("无效的管理令牌", 403)
+
+    if request.method == "POST":
+        try:
+            settings = await request.json()
+        except ValueError:
+            settings = None
+        if not isinstance(settings, dict):
+            return error_response("请求体必须是 JSON 对象", 400)
+        try:
+            await run_in_threadpool(rate_limiter.configure, settings)
+        except (TypeError, ValueError) as e:
+            return error_response(str(e), 400)
+        logger.info("限流配置已更新: %s", settings)
+    else:
+        # 返回其他 worker 最新写入的配置
+        await run_in_threadpool(rate_limiter.sync, True)
+
+    return JSONResponse(rate_limiter.stats())
+
+
+async def cache_stats(request):
+    """缓存命中/未命中/淘汰计数"""
+    disk_stats, crosswalk_stats = await run_in_threadpool(
+        lambda: (disk_cache.stats(), crosswalk.stats())
+    )
+    return JSONResponse(
+        {
+            "song": song_cache.stats(),
+            "disk": disk_stats,
+            "crosswalk": crosswalk_stats,
+            "search_index": search_index.stats(),
+            "image": image_cache.stats(),
+            "singleflight": flights.stats(),
+            "upstream": guard.stats(),
+            "rate_limit": rate_limiter.stats(),
+            "hedge": hedge_policy.stats(),
+        }
+    )
+
+
+async def fetch_search_data(keyword: str, page_size: int, page_no: int) -> dict:
+    """从上游搜索歌曲并提取 response.data"""
+    params = {"key": keyword, "pageSize": page_size, "pageNo": page_no}
+    cached = await run_in_threadpool(disk_cache.get, "getSearchByKey", params)
+    if cached is not None:
+        search_index.add(cached)
+        return cached
+
+    async def load():
+        response = await upstream.get("getSearchByKey", params)
+        body = response.content
+        log_payload(logger, "Search Response", body)
+
+        data = fastjson.extract(body, ("response", "data"))
+        await run_in_threadpool(disk_cache.set, "getSearchByKey", params, data)
+        search_index.add(data)
+        return data
+
+    data, _ = await flights.do(normalize_key("getSearchByKey", params), load)
+    return data
+
+
+async def search(request):
+    """
+    搜索歌曲（代理到 Rain120 API）
+    参数:
+        key: 搜索关键词
+        pageSize: 每页数量 (默认 10)
+        pageNo: 页码 (默认 1)
+        fields: 字段投影（可选，点路径列表或预设 workflow）
+        local: 为 1 时先查本地索引，置信度足够直接返回，否则请求上游；
+            为 full 时本地达标的歌曲不足 pageSize 首也请求上游
+    响应头:
+        X-Search-Source: LOCAL / LOCAL-PARTIAL（本地结果不足 pageSize 首）/ UPSTREAM
+            （传 local 时）
+    """
+    try:
+        keyword = request.query_params.get("key", "")
+        page_size = int(request.query_params.get("pageSize", 10))
+        page_no = int(request.query_params.get("pageNo", 1))
+
+        if not keyword:
+            return error_response("缺少搜索关键词", 400)
+        try:
+            fields = parse_fields(request.query_params.get("fields"), SEARCH_PROFILES)
+        except ValueError as e:
+            return error_response(str(e), 400)
+
+        local_mode = request.query_params.get("local", "")
+        local = local_mode in ("1", "true", "full")
+        data = (
+            search_index.lookup(
+                keyword, page_size, page_no, full_page=local_mode == "full"
+            )
+            if local
+            else None
+        )
+        source = search_source(data, page_size)
+        if data is None:
+            data = await fetch_search_data(keyword, page_size, page_no)
+        headers = {"X-Search-Source": source} if local else None
+        return FastJSONResponse(project(data, fields), headers=headers)
+
+    except UpstreamUnavailable as e:
+        return upstream_unavailable_response(e)
+    except httpx.HTTPError as e:
+        return upstream_error_response(e)
+    except Exception as e:
+        return error_response(str(e), 500)
+
+
+async def fetch_song_data(songmid: str) -> dict:
+    """从上游获取歌曲详情并提取 songinfo.data"""
+    params = {"songmid": songmid}
+
+    async def load():
+        response = await upstream.get("getSongInfo", params)
+        body = response.content
+        log_payload(logger, "Response", body)
+
+        return fastjson.extract(body, ("response", "songinfo", "data"))
+
+    data, _ = await flights.do(normalize_key("getSongInfo", params), load)
+    return data
+
+
+async def load_song(songmid: str):
+    """读取歌曲详情（先查缓存），返回 (数据, 缓存状态)"""
+    return await song_cache.get_or_load_async(songmid, lambda: fetch_song_data(songmid))
+
+
+async def get_song(request):
+    """
+    获取歌曲详情
+    参数:
+        songmid: 歌曲 MID
+        fields: 字段投影（可选，点路径列表或预设 workflow）
+    响应头:
+        X-Cache: HIT / STALE / DISK / MISS
+    """
+    try:
+        songmid = request.query_params.get("songmid", "")
+
+        if not songmid:
+            return error_response("缺少歌曲 MID", 400)
+        try:
+            fields = parse_fields(request.query_params.get("fields"), SONG_PROFILES)
+        except ValueError as e:
+            return error_response(str(e), 400)
+
+        data, cache_state = await load_song(songmid)
+        return FastJSONResponse(project(data, fields), headers={"X-Cache": cache_state})
+
+    except UpstreamUnavailable as e:
+        return upstream_unavailable_response(e)
+    except httpx.HTTPError as e:
+        return upstream_error_response(e)
+    except Exception as e:
+        return error_response(str(e), 500)
+
+
+async def load_song_item(songmid: str, fields=None) -> dict:
+    """批量接口的单项结果"""
+    try:
+        async with batch_semaphore:
+            data, cache_state = await load_song(songmid)
+        return {
+            "success": True,
+            "data": project(data, fields),
+            "error": "",
+            "cache": cache_state,
+        }
+    except UpstreamUnavailable as e:
+        return {"success": False, "data": None, "error": str(e), "cache": "MISS"}
+    except httpx.HTTPError as e:
+        return {
+            "success": False,
+            "data": None,
+            "error": upstream_error_message(e),
+            "cache": "MISS",
+        }
+    except Exception as e:
+        return {"success": False, "data": None, "error": str(e), "cache": "MISS"}
+
+
+async def get_songs(request):
+    """
+    批量获取歌曲详情（并发请求上游）
+    参数:
+        songmids: 逗号分隔的歌曲 MID，例如 a,b,c
+        fields: 每首歌曲 data 的字段投影（可选，同 /song）
+    """
+    try:
+        raw = request.query_params.get("songmids", "")
+        songmids = list(
+            dict.fromkeys(mid.strip() for mid in raw.split(",") if mid.strip())
+        )
+
+        if not songmids:
+            return error_response("缺少歌曲 MID 列表", 400)
+        if len(songmids) > SONGS_BATCH_MAX:
+            return error_response(f"单次最多查询 {SONGS_BATCH_MAX} 首歌曲", 400)
+        try:
+            fields = parse_fields(request.query_params.get("fields"), SONG_PROFILES)
+        except ValueError as e:
+            return error_response(str(e), 400)
+
+        items = await asyncio.gather(*(load_song_item(mid, fields) for mid in songmids))
+        songs = dict(zip(songmids, items, strict=True))
+
+        success_count = sum(1 for item in items if item["success"])
+        return FastJSONResponse(
+            {
+                "songs": songs,
+                "success_count": success_count,
+                "error_count": len(songs) - success_count,
+            }
+        )
+
+    except Exception as e:
+        return error_response(str(e), 500)
+
+
+async def fetch_cover_data(cover_id: str, size: str = "") -> dict:
+    """从上游获取封面图 URL 并提取 response.data"""
+    params = {"id": cover_id}
+    if size:
+        params["size"] = size
+    cached = await run_in_threadpool(disk_cache.get, "getImageUrl", params)
+    if cached is not None:
+        return cached
+
+    response = await upstream.get("getImageUrl", params)
+    body = response.content
+    log_payload(logger, "Cover Response", body)
+
+    data = fastjson.extract(body, ("response", "data"))
+    await run_in_threadpool(disk_cache.set, "getImageUrl", params, data)
+    return data
+
+
+async def get_cover(request):
+    """
+    获取封面图 URL
+    参数:
+        id: 封面图 ID (album pmid)
+        size: 图片尺寸 (可选，默认原图，格式: 500x500)
+    """
+    try:
+        cover_id = request.query_params.get("id", "")
+        size = request.query_params.get("size", "")
+
+        if not cover_id:
+            return error_response("缺少封面图 ID", 400)
+
+        return FastJSONResponse(await fetch_cover_data(cover_id, size))
+
+    except UpstreamUnavailable as e:
+        return upstream_unavailable_response(e)
+    except httpx.HTTPError as e:
+        return upstream_error_response(e)
+    except Exception as e:
+        return error_response(str(e), 500)
+
+
+async def stream_and_cache(image_response, writer):
+    """边转发边写入缓存；下载中断或客户端断开时丢弃未完成的缓存文件"""
+    try:
+        async for chunk in image_response.aiter_bytes(CHUNK_SIZE):
+            await run_in_threadpool(writer.write, chunk)
+            yield chunk
+        await run_in_threadpool(writer.commit)
+    finally:
+        await run_in_threadpool(writer.abort)
+
+
+async def get_cover_image(request):
+    """
+    流式返回封面图片（参数和响应头同 Flask 模式的 /cover/image）
+    """
+    try:
+        cover_id = request.query_params.get("id", "")
+        size = request.query_params.get("size", "")
+        image_url = request.query_params.get("url", "")
+
+        if cover_id:
+            image_url = (await fetch_cover_data(cover_id, size)).get("imageUrl", "")
+            if not image_url:
+                return error_response("上游未返回封面图 URL", 502)
+        elif not image_url:
+            return error_response("缺少封面图 ID 或 URL", 400)
+
+        if not is_allowed_image_url(image_url):
+            return error_response("不允许代理该图片地址", 400)
+
+        cache_control = http_cache.cache_control_for("/cover/image", 200)
+        cached = await run_in_threadpool(image_cache.lookup, image_url)
+        if cached is not None:
+            etag = f'"{cached["digest"]}"'
+            headers = {"ETag": etag, "Cache-Control": cache_control, "X-Cache": "HIT"}
+            if http_cache.etag_matches(request.headers.get("if-none-match"), etag):
+                return Response(status_code=304, headers=headers)
+            return FileResponse(
+                cached["path"], media_type=cached["content_type"], headers=headers
+            )
+
+        with metrics.track_upstream("coverImage"):
+            image_response = await open_cover_image(image_url)
+            if image_response.is_error:
+                await image_response.aclose()
+            image_response.raise_for_status()
+
+        content_type = image_response.headers.get("content-type", "image/jpeg")
+        headers = {"Cache-Control": cache_control, "X-Cache": "MISS"}
+        if "content-length" in image_response.headers:
+            headers["Content-Length"] = image_response.headers["content-length"]
+        writer = await run_in_threadpool(image_cache.writer, image_url, content_type)
+        return StreamingResponse(
+            stream_and_cache(image_response, writer),
+            media_type=content_type,
+            headers=headers,
+            background=BackgroundTask(image_response.aclose),
+        )
+
+    except UpstreamUnavailable as e:
+        return upstream_unavailable_response(e)
+    except ImageRedirectError as e:
+        return error_response(str(e), 502)
+    except httpx.HTTPError as e:
+        return upstream_error_response(e)
+    except Exception as e:
+        return error_response(str(e), 500)
+
+
+async def open_cover_image(image_url: str) -> httpx.Response:
+    """下载封面图（流式），手动跟随重定向并逐跳校验域名白名单"""
+    url = image_url
+    for _ in range(MAX_IMAGE_REDIRECTS + 1):
+        response = await image_client.send(
+            image_client.build_request("GET", url),
+            stream=True,
+            follow_redirects=False,
+        )
+        if not response.is_redirect:
+            return response
+        await response.aclose()
+        url = redirect_target(url, response.headers.get("location", ""))
+    raise ImageRedirectError("封面图重定向次数过多")
+
+
+async def load_cover_url(cover_id: str, size: str = ""):
+    """读取封面图 URL，返回 (url, 错误信息)；封面失败不影响 /track 其他字段"""
+    if not cover_id:
+        return "", ""
+    try:
+        return (await fetch_cover_data(cover_id, size)).get("imageUrl", ""), ""
+    except httpx.HTTPError as e:
+        return "", upstream_error_message(e)
+    except Exception as e:
+        return "", str(e)
+
+
+async def load_track_details(match: dict, size: str = ""):
+    """并发获取匹配歌曲的详情和封面图，返回 (歌曲详情, 缓存状态, 封面 URL, 封面错误)"""
+    # 搜索结果里的 albummid 通常就是封面图 ID，先和详情并发请求；
+    # 详情返回的 album.pmid 不同时再补一次封面请求
+    guessed_cover_id = match.get("albummid", "")
+    (song_data, cache_state), (cover_url, cover_error) = await asyncio.gather(
+        load_song(match.get("songmid", "")),
+        load_cover_url(guessed_cover_id, size),
+    )
+
+    pmid = song_data.get("track_info", {}).get("album", {}).get("pmid", "")
+    if pmid and pmid != guessed_cover_id:
+        cover_url, cover_error = await load_cover_url(pmid, size)
+    return song_data, cache_state, cover_url, cover_error
+
+
+async def get_track(request):
+    """
+    组合查询：搜索 → 选出最佳匹配 → 并发获取歌曲详情和封面图
+    参数、返回格式和对照表的使用同 Flask 模式的 /track
+    """
+    try:
+        title = request.query_params.get("title", "").strip()
+        artists = split_artists(request.query_params.get("artists", ""))
+        size = request.query_params.get("size", "")
+        netease_id = request.query_params.get("netease_id", "").strip()
+
+        if not title:
+            return error_response("缺少歌曲标题", 400)
+        try:
+            duration = int(request.query_params.get("duration") or 0)
+        except ValueError:
+            return error_response("duration 必须是整数秒", 400)
+        try:
+            fields = parse_fields(request.query_params.get("fields"), SONG_PROFILES)
+        except ValueError as e:
+            return error_response(str(e), 400)
+
+        # 对照表命中时用歌曲详情重新打分核验（没有艺术家无法核验，不查对照表）
+        use_crosswalk = bool(netease_id and artists and crosswalk.enabled)
+        crosswalk_state = "MISS"
+        match = (
+            await run_in_threadpool(crosswalk.get, netease_id)
+            if use_crosswalk
+            else None
+        )
+        if match is not None:
+            details = await load_track_details(match, size)
+            verified = score_candidate(
+                detail_candidate(details[0]), title, artists, duration
+            )
+            if verified >= crosswalk.min_score:
+                crosswalk_state = "HIT"
+                match = {**match, "score": round(verified, 3)}
+            else:
+                await run_in_threadpool(crosswalk.invalidate, netease_id)
+                logger.info(
+                    "对照表条目 %s → %s 核验不通过 (%.3f)，重新搜索",
+                    netease_id,
+                    match.get("songmid", ""),
+                    verified,
+                )
+                crosswalk_state = "INVALIDATED"
+                match = None
+
+        if match is None:
+            keyword = " ".join([title] + artists)
+            search_data = await fetch_search_data(keyword, 10, 1)
+            results = search_data.get("song", {}).get("list", [])
+
+            match = pick_best_match(results, title, artists, duration)
+            if match is None:
+                error = "没有版本和时长一致的搜索结果" if results else "搜索无结果"
+                return FastJSONResponse(empty_track(error))
+            details = await load_track_details(match, size)
+            if use_crosswalk:
+                await run_in_threadpool(crosswalk.record, netease_id, match)
+
+        song_data, cache_state, cover_url, cover_error = details
+        track = flatten_track(match, song_data, cover_url, cover_error)
+        # 平铺字段来自完整数据，投影只作用于 parsed_data
+        track["parsed_data"] = project(song_data, fields)
+        headers = {"X-Cache": cache_state}
+        if use_crosswalk:
+            headers["X-Crosswalk"] = crosswalk_state
+        return FastJSONResponse(track, headers=headers)
+
+    except UpstreamUnavailable as e:
+        return upstream_unavailable_response(e)
+    except httpx.HTTPError as e:
+        return upstream_error_response(e)
+    except Exception as e:
+        return error_response(str(e), 500)
+
+
+class MetricsMiddleware:
+    """记录每个请求的路由、状态码、耗时和进行中数量（纯 ASGI 中间件）"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"] == "/metrics":
+            await self.app(scope, receive, send)
+            return
+
+        route = route_label(scope["path"])
+        status = 500
+        start = time.perf_counter()
+
+        async def send_with_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        metrics.IN_FLIGHT.inc()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            metrics.IN_FLIGHT.dec()
+            metrics.record_request(route, status, time.perf_counter() - start)
+
+
+class HTTPCacheMiddleware:
+    """
+    ETag / 304 协商、Cache-Control 和响应压缩（纯 ASGI 中间件）
+    只缓冲 GET 200 的 JSON 响应，其余响应原样透传
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] != "GET":
+            await self.app(scope, receive, send)
+            return
+
+        route = scope["path"]
+        request_headers = {
+            key.decode("latin-1").lower(): value.decode("latin-1")
+            for key, value in scope["headers"]
+        }
+        start_message = None
+        chunks = []
+
+        async def buffered_send(message):
+            nonlocal start_message
+            if message["type"] == "http.response.start":
+                content_type = _header(message["headers"], b"content-type")
+                if message["status"] != 200 or not content_type.startswith(
+                    "application/json"
+                ):
+                    cache_control = http_cache.cache_control_for(
+                        route, message["status"]
+                    )
+                    if not _header(message["headers"], b"cache-control"):
+                        message["headers"] = list(message["headers"]) + [
+                            (b"cache-control", cache_control.encode("latin-1"))
+                        ]
+                    await send(message)
+                    return
+                start_message = message
+                return
+
+            if start_message is None:
+                await send(message)
+                return
+
+            chunks.append(message.get("body", b""))
+            if message.get("more_body", False):
+                return
+
+            status, body, headers = http_cache.negotiate(
+                b"".join(chunks),
+                route,
+                request_headers.get("accept-encoding"),
+                request_headers.get("if-none-match"),
+            )
+            skip = {b"content-length"} | {
+                name.lower().encode("latin-1") for name in headers
+            }
+            if status == 304:
+                skip.add(b"content-type")
+            raw_headers = [
+                (key, value)
+                for key, value in start_message["headers"]
+                if key.lower() not in skip
+            ]
+            raw_headers += [
+                (name.lower().encode("latin-1"), value.encode("latin-1"))
+                for name, value in headers.items()
+            ]
+            raw_headers.append((b"content-length", str(len(body)).encode("latin-1")))
+            await send(
+                {
+                    "type": "http.response.start",
+                    "status": status,
+                    "headers": raw_headers,
+                }
+            )
+            await send({"type": "http.response.body", "body": body})
+
+        await self.app(scope, receive, buffered_send)
+
+
+def _header(headers, name: bytes) -> str:
+    for key, value in headers:
+        if key.lower() == name:
+            return value.decode("latin-1")
+    return ""
+
+
+# 预热搜索使用的分页参数，与工作流搜索节点一致
+WARM_SEARCH_PAGE_SIZE = 10
+WARM_SEARCH_PAGE_NO = 1
+
+
+async def warm_search(keyword: str) -> bool:
+    """预热搜索结果（写入磁盘缓存），返回是否请求了上游"""
+    params = {
+        "key": keyword,
+        "pageSize": WARM_SEARCH_PAGE_SIZE,
+        "pageNo": WARM_SEARCH_PAGE_NO,
+    }
+    if await run_in_threadpool(disk_cache.get, "getSearchByKey", params) is not None:
+        return False
+    await fetch_search_data(keyword, WARM_SEARCH_PAGE_SIZE, WARM_SEARCH_PAGE_NO)
+    return True
+
+
+async def warm_song(songmid: str) -> bool:
+    """预热歌曲详情（写入 /song 缓存），返回是否请求了上游"""
+    _, cache_state = await load_song(songmid)
+    return cache_state == "MISS"
+
+
+# 后台缓存预热（POST /warm），任务逐个执行，速率由 WARM_RATE 控制；
+# 任务状态写入磁盘缓存数据库，任意 worker 都能查询和取消
+warmer = AsyncCacheWarmer({"search": warm_search, "song": warm_song}, store=disk_cache)
+
+
+async def warm(request):
+    """提交缓存预热任务 (POST) / 查看所有任务 (GET)，请求体格式同 Flask 模式"""
+    if request.method == "GET":
+        return JSONResponse(await run_in_threadpool(warmer.stats))
+
+    if ADMIN_TOKEN and request.headers.get("X-Admin-Token") != ADMIN_TOKEN:
+        return error_response("无效的管理令牌", 403)
+    try:
+        payload = await request.json()
+    except ValueError:
+        payload = None
+    try:
+        items, rate = warmer.parse(payload)
+    except ValueError as e:
+        return error_response(str(e), 400)
+    # 搜索结果只保存在磁盘缓存中（进程内只缓存 /song）
+    if not disk_cache.enabled and any(kind == "search" for kind, _ in items):
+        return error_response("预热搜索需要启用磁盘缓存 (DISK_CACHE_PATH)", 400)
+
+    job = await warmer.submit(items, rate)
+    logger.info("缓存预热任务 %s 已提交: %d 个条目", job.id, len(items))
+    return JSONResponse(
+        job.status(), status_code=202, headers={"Location": f"/warm/{job.id}"}
+    )
+
+
+async def warm_status(request):
+    """查看 (GET) 或取消 (DELETE) 预热任务"""
+    job_id = request.path_params["job_id"]
+    if request.method == "DELETE":
+        if ADMIN_TOKEN and request.headers.get("X-Admin-Token") != ADMIN_TOKEN:
+            return error_response("无效的管理令牌", 403)
+        status = await run_in_threadpool(warmer.request_cancel, job_id)
+    else:
+        status = await run_in_threadpool(warmer.lookup, job_id)
+
+    if status is None:
+        return error_response("预热任务不存在", 404)
+    return JSONResponse(status)
+
+
+async def crosswalk_entry(request):
+    """查看 (GET) 或作废 (DELETE) 对照表条目"""
+    netease_id = request.path_params["netease_id"]
+    if not crosswalk.enabled:
+        return error_response("未启用对照表 (CROSSWALK_PATH)", 404)
+    if request.method == "DELETE":
+        if ADMIN_TOKEN and request.headers.get("X-Admin-Token") != ADMIN_TOKEN:
+            return error_response("无效的管理令牌", 403)
+        if not await run_in_threadpool(crosswalk.invalidate, netease_id):
+            return error_response("对照表条目不存在", 404)
+        return JSONResponse({"netease_id": netease_id, "invalidated": True})
+
+    entry = await run_in_threadpool(crosswalk.lookup, netease_id)
+    if entry is None:
+        return error_response("对照表条目不存在", 404)
+    return JSONResponse(entry)
+
+
+@asynccontextmanager
+async def lifespan(app):
+    disk_cache.start_compaction()
+    yield
+    await warmer.close()
+    await upstream.close()
+    await image_client.aclose()
+    disk_cache.close()
+    crosswalk.close()
+
+
+routes = [
+    Route("/", index),
+    Route("/metrics", metrics_endpoint),
+    Route("/cache/stats", cache_stats),
+    Route("/admin/ratelimit", admin_ratelimit, methods=["GET", "POST"]),
+    Route("/search", search),
+    Route("/song", get_song),
+    Route("/songs", get_songs),
+    Route("/cover", get_cover),
+    Route("/cover/image", get_cover_image),
+    Route("/track", get_track),
+    Route("/crosswalk/{netease_id}", crosswalk_entry, methods=["GET", "DELETE"]),
+    Route("/warm", warm, methods=["GET", "POST"]),
+    Route("/warm/{job_id}", warm_status, methods=["GET", "DELETE"]),
+]
+ROUTE_PATHS = {route.path for route in routes}
+
+
+def route_label(path: str) -> str:
+    """指标中的 route 标签：带路径参数的路由使用模板（例如 /warm/{job_id}）"""
+    if path in ROUTE_PATHS:
+        return path
+    for route in routes:
+        if route.path_regex.match(path):
+            return route.path
+    return "unmatched"
+
+
+app = Starlette(
+    routes=routes,
+    middleware=[
+        Middleware(MetricsMiddleware),
+        Middleware(HTTPCacheMiddleware),
+        Middleware(CORSMiddleware, allow_origins=["*"]),
+    ],
+    lifespan=lifespan,
+)
+
+
+def after_fork() -> None:
+    """gunicorn 预加载应用后在每个 worker 中调用（见 gunicorn.conf.py）"""
+    restart_after_fork()
+    disk_cache.after_fork()
+    crosswalk.after_fork()
+    metrics.start_flusher()
+
+
+def run():
+    import uvicorn
+
+    print(f"QQ Music API Proxy (ASGI) starting on port {PORT}...")
+    print(f"Forwarding to: {QQMUSIC_API_BASE}")
+    uvicorn.run(app, host="0.0.0.0", port=PORT, log_level="warning")
+
+
+if __name__ == "__main__":
+    run()
@@ -0,0 +1,150 @@
+"""
+Single-flight 请求合并
+相同 key 的并发调用只执行一次，其余调用等待并共享结果（或异常）
+"""
+
+import asyncio
+import threading
+from functools import partial
+from typing import Any, Awaitable, Callable, Dict, Tuple
+
+
+# 自由文本参数（搜索关键词）：去除首尾空白、合并连续空白并忽略大小写
+# 其余参数（songmid、封面 ID 等）区分大小写，必须原样比较
+FREE_TEXT_PARAMS = frozenset({"key"})
+
+
+def normalize_key(endpoint: str, params: Dict[str, Any]) -> str:
+    """
+    生成合并用的 key
+    参数按名称排序；只有 FREE_TEXT_PARAMS 中的参数做空白和大小写规范化
+    """
+    parts = []
+    for name in sorted(params):
+        value = params[name]
+        if name in FREE_TEXT_PARAMS and isinstance(value, str):
+            value = " ".join(value.split()).casefold()
+        parts.append(f"{name}={value}")
+    return f"{endpoint}?{'&'.join(parts)}"
+
+
+class _Call:
+    __slots__ = ("done", "result", "error", "waiters")
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result: Any = None
+        self.error: BaseException = None
+        self.waiters = 0
+
+
+class SingleFlight:
+    """进行中请求去重（线程安全）"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls: Dict[str, _Call] = {}
+
+        self.executed = 0
+        self.coalesced = 0
+
+    def do(self, key: str, fn: Callable[[], Any]) -> Tuple[Any, bool]:
+        """
+        执行 fn，返回 (结果, 是否共享了其他调用的结果)
+        同一 key 已有调用在进行时，等待其完成并返回相同结果；
+        该调用抛出的异常会在所有等待者中重新抛出
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            if call is not None:
+                call.waiters += 1
+                self.coalesced += 1
+                leader = False
+            else:
+                call = _Call()
+                self._calls[key] = call
+                self.executed += 1
+                leader = True
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result, True
+
+        try:
+            call.result = fn()
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+
+        return call.result, False
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "in_flight": len(self._calls),
+                "executed": self.executed,
+                "coalesced": self.coalesced,
+            }
+
+
+class _AsyncCall:
+    __slots__ = ("task", "waiters")
+
+    def __init__(self, task: asyncio.Future):
+        self.task = task
+        self.waiters = 0
+
+
+class AsyncSingleFlight:
+    """进行中请求去重（asyncio 版本，用于 ASGI 模式）"""
+
+    def __init__(self):
+        self._calls: Dict[str, _AsyncCall] = {}
+
+        self.executed = 0
+        self.coalesced = 0
+
+    async def do(self, key: str, fn: Callable[[], Awaitable[Any]]) -> Tuple[Any, bool]:
+        """
+        异步版本的 SingleFlight.do
+        fn 在 single-flight 持有的独立任务中执行，每个调用方通过 shield 等待：
+        某个调用方被取消（例如客户端断开）不影响其他调用方，
+        所有调用方都取消后才取消该任务
+        """
+        call = self._calls.get(key)
+        shared = call is not None
+        if shared:
+            self.coalesced += 1
+        else:
+            call = _AsyncCall(asyncio.ensure_future(fn()))
+            self._calls[key] = call
+            self.executed += 1
+            call.task.add_done_callback(partial(self._finish, key, call))
+
+        call.waiters += 1
+        try:
+            return await asyncio.shield(call.task), shared
+        finally:
+            call.waiters -= 1
+            if call.waiters == 0 and not call.task.done():
+                call.task.cancel()
+
+    def _finish(self, key: str, call: _AsyncCall, task: asyncio.Future) -> None:
+        if self._calls.get(key) is call:
+            del self._calls[key]
+        # 没有等待者时避免 "exception was never retrieved" 警告
+        if not task.cancelled():
+            task.exception()
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "in_flight": len(self._calls),
+            "executed": self.executed,
+            "coalesced": self.coalesced,
+        }
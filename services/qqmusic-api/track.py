@@ -0,0 +1,133 @@
+"""
+/track 组合端点的纯函数部分
+搜索结果选优，以及把歌曲详情 + 封面图平铺成工作流节点使用的字段
+（与 parse_qqmusic_response / parse_cover_url 的输出字段一致）
+
+选优直接使用 find_qqmusic_match 节点的 candidate_ranking.rank_candidates
+（版本标签 / 时长过滤 + 标题 / 艺术家相似度），同一输入在 /track 和工作流中选出同一首歌，
+得分也在同一尺度上（CROSSWALK_MIN_SCORE 按这个得分判断）
+"""
+
+import re
+from typing import Any, Dict, List, Optional
+
+from workflow_shared import candidate_ranking
+
+# 艺术家参数的分隔符: 逗号、顿号、斜杠、&
+_ARTIST_SEPARATORS = re.compile(r"\s*[,，、/&]\s*")
+
+
+def split_artists(artists: str) -> List[str]:
+    """拆分艺术家参数，例如 "周杰伦, 费玉清" → ["周杰伦", "费玉清"]"""
+    return [name for name in _ARTIST_SEPARATORS.split(artists or "") if name]
+
+
+def _rank(
+    results: List[Dict[str, Any]],
+    title: str,
+    artists: List[str],
+    duration: Optional[int],
+) -> dict:
+    return candidate_ranking.rank_candidates(
+        results, title, artists, (duration or 0) * 1000
+    )
+
+
+def score_candidate(
+    candidate: Dict[str, Any],
+    title: str,
+    artists: List[str],
+    duration: Optional[int] = None,
+) -> float:
+    """给一条搜索结果打分（0~1，duration 为秒），未通过版本标签 / 时长过滤的候选为 0"""
+    return _rank([candidate], title, artists, duration)["score"]
+
+
+def pick_best_match(
+    results: List[Dict[str, Any]],
+    title: str,
+    artists: List[str],
+    duration: Optional[int] = None,
+) -> Optional[Dict[str, Any]]:
+    """
+    返回得分最高的搜索结果（附带 score 字段），没有候选通过过滤时返回 None
+    同分时保留搜索排序靠前的结果
+    """
+    ranking = _rank(results, title, artists, duration)
+    if ranking["best"] is None:
+        return None
+    return {**ranking["best"], "score": ranking["score"]}
+
+
+def detail_candidate(song_data: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    把歌曲详情（songinfo.data）转换成搜索结果的格式，
+    用于按 score_candidate 核验对照表中的匹配是否仍然成立
+    """
+    track_info = song_data.get("track_info", {})
+    album_info = track_info.get("album", {})
+    return {
+        "songmid": track_info.get("mid", ""),
+        "songname": track_info.get("title") or track_info.get("name", ""),
+        "albumname": album_info.get("name", ""),
+        "albummid": album_info.get("mid", ""),
+        "interval": track_info.get("interval", 0),
+        "singer": [
+            {"name": s.get("name", "")}
+            for s in track_info.get("singer", [])
+            if isinstance(s, dict)
+        ],
+    }
+
+
+def empty_track(error: str) -> Dict[str, Any]:
+    """未找到匹配或失败时的平铺输出"""
+    return {
+        "match_found": False,
+        "match_id": "",
+        "match_name": "",
+        "match_album": "",
+        "match_score": 0.0,
+        "parsed_data": {},
+        "track_name": "",
+        "track_title": "",
+        "album_id": 0,
+        "album_mid": "",
+        "album_name": "",
+        "album_pmid": "",
+        "interval": 0,
+        "cover_url": "",
+        "cover_error": "",
+        "success": False,
+        "error": error,
+    }
+
+
+def flatten_track(
+    match: Dict[str, Any],
+    song_data: Dict[str, Any],
+    cover_url: str = "",
+    cover_error: str = "",
+) -> Dict[str, Any]:
+    """把匹配结果、歌曲详情（songinfo.data）和封面图 URL 平铺为一层"""
+    track_info = song_data.get("track_info", {})
+    album_info = track_info.get("album", {})
+    return {
+        "match_found": True,
+        "match_id": match.get("songmid", ""),
+        "match_name": match.get("songname", ""),
+        "match_album": match.get("albumname", ""),
+        "match_score": match.get("score", 0.0),
+        "parsed_data": song_data,
+        "track_name": track_info.get("name", ""),
+        "track_title": track_info.get("title", ""),
+        "album_id": album_info.get("id", 0),
+        "album_mid": album_info.get("mid", ""),
+        "album_name": album_info.get("name", ""),
+        "album_pmid": album_info.get("pmid", ""),
+        "interval": track_info.get("interval", 0),
+        "cover_url": cover_url,
+        "cover_error": cover_error,
+        "success": True,
+        "error": "",
+    }
@@ -0,0 +1,289 @@
+"""
+上游 QQ 音乐 API 客户端（Rain120/qq-music-api）
+共享连接池 + keep-alive，避免每次请求重新握手
+
+环境变量:
+- QQMUSIC_POOL_CONNECTIONS: 缓存的连接池数量 (默认 4)
+- QQMUSIC_POOL_MAXSIZE: 每个连接池的最大连接数 (默认 32)
+- QQMUSIC_POOL_BLOCK: 连接池耗尽时是否阻塞等待 (默认 true)
+- QQMUSIC_CONNECT_TIMEOUT: 建立连接超时秒数 (默认 3)
+- QQMUSIC_TIMEOUT_SEARCH: /getSearchByKey 读超时秒数 (默认 10)
+- QQMUSIC_TIMEOUT_SONG: /getSongInfo 读超时秒数 (默认 10)
+- QQMUSIC_TIMEOUT_COVER: /getImageUrl 读超时秒数 (默认 5)
+- QQMUSIC_ASYNC_MAX_CONNECTIONS: 异步模式最大连接数 (默认 256)
+- QQMUSIC_ASYNC_MAX_KEEPALIVE: 异步模式保持的空闲连接数 (默认 64)
+对冲请求（仅异步模式）的配置见 hedging.py
+"""
+
+import asyncio
+import os
+import time
+from typing import Any, Dict, Optional, Tuple
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from hedging import HedgePolicy
+from metrics import track_upstream
+from ratelimit import UpstreamRateLimiter
+from resilience import UpstreamGuard
+
+try:
+    import httpx
+except ImportError:  # 仅异步模式需要
+    httpx = None
+
+
+def _env_int(name: str, default: int) -> int:
+    return int(os.getenv(name, default))
+
+
+def _env_float(name: str, default: float) -> float:
+    return float(os.getenv(name, default))
+
+
+def _env_bool(name: str, default: bool) -> bool:
+    value = os.getenv(name)
+    if value is None:
+        return default
+    return value.strip().lower() in ("1", "true", "yes", "on")
+
+
+# 上游端点名 → 读超时环境变量
+ENDPOINT_TIMEOUT_ENV = {
+    "getSearchByKey": ("QQMUSIC_TIMEOUT_SEARCH", 10.0),
+    "getSongInfo": ("QQMUSIC_TIMEOUT_SONG", 10.0),
+    "getImageUrl": ("QQMUSIC_TIMEOUT_COVER", 5.0),
+}
+
+
+def endpoint_timeouts(overrides: Optional[Dict[str, float]] = None) -> Dict[str, float]:
+    """每个上游端点的读超时（环境变量 + 显式覆盖）"""
+    timeouts = {
+        endpoint: _env_float(env_name, default)
+        for endpoint, (env_name, default) in ENDPOINT_TIMEOUT_ENV.items()
+    }
+    if overrides:
+        timeouts.update(overrides)
+    return timeouts
+
+
+class UpstreamClient:
+    """
+    上游 API 客户端
+    所有路由共享同一个 requests.Session，连接在请求之间复用
+    """
+
+    def __init__(
+        self,
+        base_url: str,
+        pool_connections: Optional[int] = None,
+        pool_maxsize: Optional[int] = None,
+        pool_block: Optional[bool] = None,
+        connect_timeout: Optional[float] = None,
+        timeouts: Optional[Dict[str, float]] = None,
+        guard: Optional[UpstreamGuard] = None,
+        rate_limiter: Optional[UpstreamRateLimiter] = None,
+    ):
+        self.base_url = base_url.rstrip("/")
+        # 熔断 + 自适应并发上限
+        self.guard = guard or UpstreamGuard()
+        # 出站令牌桶限流
+        self.rate_limiter = rate_limiter or UpstreamRateLimiter()
+        # 不做对冲：同步请求无法中途取消，落败的请求会继续占用连接和并发名额，
+        # 对冲只在 AsyncUpstreamClient 中启用
+        self.pool_connections = pool_connections or _env_int(
+            "QQMUSIC_POOL_CONNECTIONS", 4
+        )
+        self.pool_maxsize = pool_maxsize or _env_int("QQMUSIC_POOL_MAXSIZE", 32)
+        self.pool_block = (
+            pool_block
+            if pool_block is not None
+            else _env_bool("QQMUSIC_POOL_BLOCK", True)
+        )
+        self.connect_timeout = connect_timeout or _env_float(
+            "QQMUSIC_CONNECT_TIMEOUT", 3.0
+        )
+
+        self.timeouts = endpoint_timeouts(timeouts)
+
+        self.session = self._build_session()
+
+    def _build_session(self) -> requests.Session:
+        session = requests.Session()
+        # 有界连接池：pool_block=True 时超出 pool_maxsize 的请求排队等待空闲连接，
+        # 而不是新建一次性连接
+        adapter = HTTPAdapter(
+            pool_connections=self.pool_connections,
+            pool_maxsize=self.pool_maxsize,
+            pool_block=self.pool_block,
+        )
+        session.mount("http://", adapter)
+        session.mount("https://", adapter)
+        session.headers.update({"Connection": "keep-alive"})
+        return session
+
+    def timeout_for(self, endpoint: str) -> Tuple[float, float]:
+        """返回 (连接超时, 读超时)"""
+        return (self.connect_timeout, self.timeouts.get(endpoint, 10.0))
+
+    def get(self, endpoint: str, params: Dict[str, Any]) -> requests.Response:
+        """
+        GET 上游端点
+        参数:
+            endpoint: 上游端点名，例如 getSearchByKey
+            params: 查询参数
+        非 2xx 响应抛出 requests.HTTPError
+        熔断打开、并发已满或限流排队超时时抛出 resilience.UpstreamUnavailable
+        """
+        # 熔断打开时直接拒绝，不为注定失败的调用排队等令牌；
+        # 先排队等令牌，再占用并发名额，等待期间不占用上游连接
+        self.guard.check(endpoint)
+        self.rate_limiter.wait(endpoint)
+        with self.guard.call(endpoint), track_upstream(endpoint):
+            response = self.session.get(
+                f"{self.base_url}/{endpoint}",
+                params=params,
+                timeout=self.timeout_for(endpoint),
+            )
+            response.raise_for_status()
+        return response
+
+    def pool_info(self) -> Dict[str, Any]:
+        """连接池配置（用于健康检查输出）"""
+        return {
+            "pool_connections": self.pool_connections,
+            "pool_maxsize": self.pool_maxsize,
+            "pool_block": self.pool_block,
+            "connect_timeout": self.connect_timeout,
+            "timeouts": dict(self.timeouts),
+        }
+
+    def close(self) -> None:
+        self.session.close()
+
+
+class AsyncUpstreamClient:
+    """
+    异步上游 API 客户端（基于 httpx.AsyncClient）
+    用于 ASGI 模式，单进程内支持数百个并发上游调用
+    """
+
+    def __init__(
+        self,
+        base_url: str,
+        max_connections: Optional[int] = None,
+        max_keepalive: Optional[int] = None,
+        connect_timeout: Optional[float] = None,
+        timeouts: Optional[Dict[str, float]] = None,
+        guard: Optional[UpstreamGuard] = None,
+        rate_limiter: Optional[UpstreamRateLimiter] = None,
+        hedge: Optional[HedgePolicy] = None,
+    ):
+        if httpx is None:
+            raise RuntimeError("异步模式需要安装 httpx: pip install httpx")
+
+        self.base_url = base_url.rstrip("/")
+        self.guard = guard or UpstreamGuard()
+        self.rate_limiter = rate_limiter or UpstreamRateLimiter()
+        self.hedge = hedge or HedgePolicy()
+        self.max_connections = max_connections or _env_int(
+            "QQMUSIC_ASYNC_MAX_CONNECTIONS", 256
+        )
+        self.max_keepalive = max_keepalive or _env_int(
+            "QQMUSIC_ASYNC_MAX_KEEPALIVE", 64
+        )
+        self.connect_timeout = connect_timeout or _env_float(
+            "QQMUSIC_CONNECT_TIMEOUT", 3.0
+        )
+        self.timeouts = endpoint_timeouts(timeouts)
+
+        self.client = httpx.AsyncClient(
+            base_url=self.base_url,
+            limits=httpx.Limits(
+                max_connections=self.max_connections,
+                max_keepalive_connections=self.max_keepalive,
+            ),
+        )
+
+    def timeout_for(self, endpoint: str) -> "httpx.Timeout":
+        return httpx.Timeout(
+            self.timeouts.get(endpoint, 10.0), connect=self.connect_timeout
+        )
+
+    async def get(self, endpoint: str, params: Dict[str, Any]) -> "httpx.Response":
+        """
+        GET 上游端点
+        非 2xx 响应抛出 httpx.HTTPStatusError
+        熔断打开、并发已满或限流排队超时时抛出 resilience.UpstreamUnavailable
+        """
+        self.guard.check(endpoint)
+        if self.rate_limiter.sync_due():
+            # 从共享存储（SQLite）同步限流配置，不在事件循环中读数据库
+            await asyncio.to_thread(self.rate_limiter.sync)
+        delay = self.rate_limiter.reserve(endpoint)
+        if delay > 0:
+            await asyncio.sleep(delay)
+        if not self.hedge.enabled_for(endpoint):
+            return await self._send(endpoint, params)
+        return await self._get_hedged(endpoint, params)
+
+    async def _send(self, endpoint: str, params: Dict[str, Any]) -> "httpx.Response":
+        start = time.perf_counter()
+        with self.guard.call(endpoint), track_upstream(endpoint):
+            response = await self.client.get(
+                f"/{endpoint}", params=params, timeout=self.timeout_for(endpoint)
+            )
+            response.raise_for_status()
+        self.hedge.record_latency(endpoint, time.perf_counter() - start)
+        return response
+
+    async def _get_hedged(
+        self, endpoint: str, params: Dict[str, Any]
+    ) -> "httpx.Response":
+        """主请求超过对冲延迟仍未返回时发出对冲请求，先成功的生效，另一个取消"""
+        self.hedge.record_primary()
+        delay = self.hedge.delay_for(endpoint)
+        if delay is None:
+            return await self._send(endpoint, params)
+
+        primary = asyncio.ensure_future(self._send(endpoint, params))
+        tasks = [primary]
+        try:
+            done, _ = await asyncio.wait(tasks, timeout=delay)
+            if done or not self.hedge.try_hedge(
+                lambda: self.rate_limiter.try_acquire(endpoint)
+            ):
+                return await primary
+
+            hedge = asyncio.ensure_future(self._send(endpoint, params))
+            tasks.append(hedge)
+            self.hedge.record_hedge()
+            pending = set(tasks)
+            error: Optional[BaseException] = None
+            while pending:
+                done, pending = await asyncio.wait(
+                    pending, return_when=asyncio.FIRST_COMPLETED
+                )
+                for task in done:
+                    if task.exception() is None:
+                        if task is hedge:
+                            self.hedge.record_win()
+                        return task.result()
+                    error = error or task.exception()
+            raise error
+        finally:
+            for task in tasks:
+                if not task.done():
+                    task.cancel()
+
+    def pool_info(self) -> Dict[str, Any]:
+        return {
+            "max_connections": self.max_connections,
+            "max_keepalive": self.max_keepalive,
+            "connect_timeout": self.connect_timeout,
+            "timeouts": dict(self.timeouts),
+        }
+
+    async def close(self) -> None:
+        await self.client.aclose()
@@ -0,0 +1,406 @@
+"""
+缓存预热
+批量核验前已知要查询哪些歌曲，通过 POST /warm 提交搜索关键词和 songmid，
+后台按限定速率逐个请求上游写入缓存，批量任务随后直接命中缓存
+
+- 任务按提交顺序逐个执行，同一时间只有一个任务访问上游
+- 只有真正请求了上游的条目才占用速率，已缓存的条目直接跳过
+- 单个条目失败（包括 503 限流 / 熔断）只记录错误，不中断任务
+- 任务在接收 POST 的 worker 中执行；传入共享存储（磁盘缓存）时任务状态写入 SQLite
+  （进度最多每秒写一次），任意 worker 都能查询和取消。取消其他 worker 的任务时只做标记，
+  执行任务的 worker 在下一次写入状态时停止
+- 执行任务的 worker 每次写入状态时同时更新心跳（按速率等待期间也照常更新）；
+  worker 被回收或崩溃后任务不会继续，心跳超过 ABANDON_AFTER 秒未更新的未结束任务
+  查询时状态为 abandoned
+
+环境变量:
+- WARM_RATE: 每秒最多预热多少个条目 (默认 2)
+- WARM_MAX_ITEMS: 单个任务最多条目数 (默认 5000)
+- WARM_MAX_JOBS: 保留的任务状态数量，超出时丢弃最早已结束的任务 (默认 20)
+"""
+
+import asyncio
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict, deque
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+CANCELLED = "cancelled"
+# 只出现在从共享存储读取的状态中：执行任务的 worker 已退出
+ABANDONED = "abandoned"
+
+# 条目类型 → 请求体中的字段名
+ITEM_KINDS = {"search": "keys", "song": "songmids"}
+
+Item = Tuple[str, str]
+
+# 共享存储中任务进度的最短写入间隔秒数（状态变化时立即写入）
+PERSIST_INTERVAL = 1.0
+# 按速率等待时单次 sleep 的最长秒数，等待期间照常更新心跳、检查取消
+PACE_STEP = 1.0
+# 心跳超过这么多秒未更新的未结束任务视为 abandoned；
+# 单个条目最长耗时约为上游超时加出站限流排队（默认 10 + 10 秒），留出余量
+ABANDON_AFTER = 60.0
+
+
+def parse_warm_request(
+    payload: Any, max_items: int
+) -> Tuple[List[Item], Optional[float]]:
+    """
+    解析 POST /warm 请求体，返回 (条目列表, 速率)
+        {"keys": ["晴天 周杰伦"], "songmids": ["002w3cVJ4baewp"], "rate": 5}
+    重复条目只保留一次；格式不对时抛出 ValueError
+    """
+    if not isinstance(payload, dict):
+        raise ValueError("请求体必须是 JSON 对象")
+
+    items: List[Item] = []
+    for kind, field in ITEM_KINDS.items():
+        values = payload.get(field) or []
+        if not isinstance(values, list) or not all(
+            isinstance(value, str) for value in values
+        ):
+            raise ValueError(f"{field} 必须是字符串数组")
+        items.extend((kind, value.strip()) for value in values if value.strip())
+    items = list(dict.fromkeys(items))
+
+    if not items:
+        raise ValueError("缺少 keys 或 songmids")
+    if len(items) > max_items:
+        raise ValueError(f"单个任务最多 {max_items} 个条目")
+
+    rate = payload.get("rate")
+    if rate is not None:
+        if isinstance(rate, bool) or not isinstance(rate, (int, float)) or rate <= 0:
+            raise ValueError("rate 必须是正数")
+        rate = float(rate)
+    return items, rate
+
+
+class WarmJob:
+    """一个预热任务的进度（线程安全）"""
+
+    def __init__(self, items: List[Item], rate: float, clock: Callable[[], float]):
+        self.id = uuid.uuid4().hex[:12]
+        self.items = items
+        self.rate = rate
+        self.clock = clock
+        self.state = QUEUED
+        self.created_at = clock()
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+        # 请求了上游 / 已在缓存中 / 失败
+        self.fetched = 0
+        self.cached = 0
+        self.failed = 0
+        self.errors: deque = deque(maxlen=10)
+        # 上次写入共享存储的时间（monotonic）
+        self.persisted_at = float("-inf")
+        self._cancelled = threading.Event()
+        self._lock = threading.Lock()
+
+    @property
+    def cancelled(self) -> bool:
+        return self._cancelled.is_set()
+
+    @property
+    def finished(self) -> bool:
+        return self.state in (DONE, CANCELLED)
+
+    def cancel(self) -> None:
+        self._cancelled.set()
+        with self._lock:
+            if self.state == QUEUED:
+                self._finish(CANCELLED)
+
+    def start(self) -> None:
+        with self._lock:
+            self.state = RUNNING
+            self.started_at = self.clock()
+
+    def record(self, item: Item, fetched: bool, error: Optional[BaseException]) -> None:
+        with self._lock:
+            if error is not None:
+                self.failed += 1
+                self.errors.append({"item": list(item), "error": str(error)})
+            elif fetched:
+                self.fetched += 1
+            else:
+                self.cached += 1
+
+    def finish(self) -> None:
+        with self._lock:
+            self._finish(CANCELLED if self.cancelled else DONE)
+
+    def _finish(self, state: str) -> None:
+        self.state = state
+        self.finished_at = self.clock()
+
+    def status(self) -> Dict[str, Any]:
+        with self._lock:
+            completed = self.fetched + self.cached + self.failed
+            total = len(self.items)
+            return {
+                "id": self.id,
+                "state": self.state,
+                "total": total,
+                "completed": completed,
+                "fetched": self.fetched,
+                "cached": self.cached,
+                "failed": self.failed,
+                "progress": completed / total if total else 1.0,
+                "rate": self.rate,
+                "created_at": self.created_at,
+                "started_at": self.started_at,
+                "finished_at": self.finished_at,
+                "errors": list(self.errors),
+            }
+
+
+class _WarmerBase:
+    """
+    任务登记和配置，线程模式和 asyncio 模式共用
+    store: 共享的任务状态存储（DiskCache），未启用时状态只在本进程中
+    """
+
+    def __init__(
+        self,
+        rate: Optional[float] = None,
+        max_items: Optional[int] = None,
+        max_jobs: Optional[int] = None,
+        clock: Callable[[], float] = time.time,
+        store: Optional[Any] = None,
+    ):
+        self.rate = rate or float(os.getenv("WARM_RATE", 2))
+        self.max_items = max_items or int(os.getenv("WARM_MAX_ITEMS", 5000))
+        self.max_jobs = max_jobs or int(os.getenv("WARM_MAX_JOBS", 20))
+        self.clock = clock
+        self.store = store
+        self._jobs: "OrderedDict[str, WarmJob]" = OrderedDict()
+        self._jobs_lock = threading.Lock()
+
+    def parse(self, payload: Any) -> Tuple[List[Item], Optional[float]]:
+        return parse_warm_request(payload, self.max_items)
+
+    def _register(self, items: List[Item], rate: Optional[float]) -> WarmJob:
+        job = WarmJob(items, rate or self.rate, self.clock)
+        with self._jobs_lock:
+            self._jobs[job.id] = job
+            for job_id in [j.id for j in self._jobs.values() if j.finished]:
+                if len(self._jobs) <= self.max_jobs:
+                    break
+                del self._jobs[job_id]
+        return job
+
+    @property
+    def shared(self) -> bool:
+        return self.store is not None and self.store.enabled
+
+    def _persist(self, job: WarmJob, force: bool = False) -> None:
+        """
+        把任务状态写入共享存储（距上次写入不足 PERSIST_INTERVAL 秒时跳过，force 除外）
+        同时检查其他 worker 是否请求了取消
+        """
+        if not self.shared:
+            return
+        now = time.monotonic()
+        if not force and now - job.persisted_at < PERSIST_INTERVAL:
+            return
+        job.persisted_at = now
+        if not job.finished and self.store.warm_cancel_requested(job.id):
+            job.cancel()
+        self.store.save_warm_job(
+            job.status(), keep=self.max_jobs, stale_after=ABANDON_AFTER
+        )
+        # 排队中的任务状态不变，只更新心跳
+        with self._jobs_lock:
+            queued = [j.id for j in self._jobs.values() if j.state == QUEUED]
+        self.store.touch_warm_jobs([job_id for job_id in queued if job_id != job.id])
+
+    def get(self, job_id: str) -> Optional[WarmJob]:
+        """本进程中的任务"""
+        with self._jobs_lock:
+            return self._jobs.get(job_id)
+
+    def cancel(self, job_id: str) -> Optional[WarmJob]:
+        """取消本进程中的任务"""
+        job = self.get(job_id)
+        if job is not None:
+            job.cancel()
+            self._persist(job, force=True)
+        return job
+
+    def lookup(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """任务状态：本进程的任务返回实时进度，其他 worker 的任务从共享存储读取"""
+        job = self.get(job_id)
+        if job is not None:
+            return job.status()
+        if self.shared:
+            return self.store.load_warm_job(job_id, stale_after=ABANDON_AFTER)
+        return None
+
+    def request_cancel(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """取消任务并返回状态；其他 worker 的任务只做标记"""
+        job = self.cancel(job_id)
+        if job is not None:
+            return job.status()
+        if self.shared and self.store.request_warm_cancel(job_id):
+            return self.store.load_warm_job(job_id, stale_after=ABANDON_AFTER)
+        return None
+
+    def stats(self) -> Dict[str, Any]:
+        """所有 worker 的最近任务（未启用共享存储时只有本进程的）"""
+        with self._jobs_lock:
+            local = {job.id: job.status() for job in self._jobs.values()}
+        jobs = local
+        if self.shared:
+            stored = self.store.recent_warm_jobs(
+                self.max_jobs, stale_after=ABANDON_AFTER
+            )
+            jobs = {job["id"]: job for job in stored}
+            jobs.update(local)
+        return {
+            "rate": self.rate,
+            "jobs": sorted(jobs.values(), key=lambda job: job["created_at"]),
+        }
+
+    def _next_job(self) -> Optional[WarmJob]:
+        with self._jobs_lock:
+            for job in self._jobs.values():
+                if job.state == QUEUED:
+                    return job
+        return None
+
+
+class CacheWarmer(_WarmerBase):
+    """
+    线程模式（Flask）：后台线程逐个执行任务
+    handlers: 条目类型 → 预热函数，返回 True 表示请求了上游，False 表示已在缓存中
+    """
+
+    def __init__(
+        self,
+        handlers: Dict[str, Callable[[str], bool]],
+        sleep: Callable[[float], None] = time.sleep,
+        **options,
+    ):
+        super().__init__(**options)
+        self.handlers = handlers
+        self.sleep = sleep
+        self._worker: Optional[threading.Thread] = None
+        self._worker_lock = threading.Lock()
+
+    def submit(self, items: List[Item], rate: Optional[float] = None) -> WarmJob:
+        job = self._register(items, rate)
+        self._persist(job, force=True)
+        with self._worker_lock:
+            if self._worker is None or not self._worker.is_alive():
+                self._worker = threading.Thread(
+                    target=self._run, name="cache-warmer", daemon=True
+                )
+                self._worker.start()
+        return job
+
+    def _run(self) -> None:
+        while True:
+            with self._worker_lock:
+                job = self._next_job()
+                if job is None:
+                    self._worker = None
+                    return
+                job.start()
+            self._persist(job, force=True)
+            self._run_job(job)
+
+    def _run_job(self, job: WarmJob) -> None:
+        interval = 1.0 / job.rate
+        for item in job.items:
+            if job.cancelled:
+                break
+            start = time.monotonic()
+            fetched, error = False, None
+            try:
+                fetched = self.handlers[item[0]](item[1])
+            except Exception as e:
+                fetched, error = True, e
+            job.record(item, fetched, error)
+            self._persist(job)
+            if fetched:
+                remaining = interval - (time.monotonic() - start)
+                while remaining > 0 and not job.cancelled:
+                    step = min(remaining, PACE_STEP)
+                    self.sleep(step)
+                    remaining -= step
+                    self._persist(job)
+        job.finish()
+        self._persist(job, force=True)
+
+
+class AsyncCacheWarmer(_WarmerBase):
+    """
+    asyncio 模式（ASGI）：后台任务逐个执行，handlers 为协程函数
+    共享存储的读写在线程池中执行，不阻塞事件循环
+    """
+
+    def __init__(
+        self,
+        handlers: Dict[str, Callable[[str], Awaitable[bool]]],
+        **options,
+    ):
+        super().__init__(**options)
+        self.handlers = handlers
+        self._worker: Optional["asyncio.Task"] = None
+
+    async def submit(self, items: List[Item], rate: Optional[float] = None) -> WarmJob:
+        job = self._register(items, rate)
+        await asyncio.to_thread(self._persist, job, True)
+        if self._worker is None or self._worker.done():
+            self._worker = asyncio.ensure_future(self._run())
+        return job
+
+    async def _run(self) -> None:
+        while True:
+            job = self._next_job()
+            if job is None:
+                return
+            job.start()
+            await asyncio.to_thread(self._persist, job, True)
+            await self._run_job(job)
+
+    async def _run_job(self, job: WarmJob) -> None:
+        loop = asyncio.get_running_loop()
+        interval = 1.0 / job.rate
+        for item in job.items:
+            if job.cancelled:
+                break
+            start = loop.time()
+            fetched, error = False, None
+            try:
+                fetched = await self.handlers[item[0]](item[1])
+            except Exception as e:
+                fetched, error = True, e
+            job.record(item, fetched, error)
+            await self._heartbeat(job)
+            if fetched:
+                remaining = interval - (loop.time() - start)
+                while remaining > 0 and not job.cancelled:
+                    step = min(remaining, PACE_STEP)
+                    await asyncio.sleep(step)
+                    remaining -= step
+                    await self._heartbeat(job)
+        job.finish()
+        await asyncio.to_thread(self._persist, job, True)
+
+    async def _heartbeat(self, job: WarmJob) -> None:
+        """到了写入间隔才切到线程池写入，避免每个条目都切换线程"""
+        if self.shared and time.monotonic() - job.persisted_at >= PERSIST_INTERVAL:
+            await asyncio.to_thread(self._persist, job)
+
+    async def close(self) -> None:
+        if self._worker is not None and not self._worker.done():
+            self._worker.cancel()
@@ -0,0 +1,32 @@
+"""
+与 Dify 工作流代码节点共用的模块
+/track 选优和本地搜索索引使用与 find_qqmusic_match 节点相同的文本规范化和候选评分，
+两边只保留一份实现（dify-workflow/nodes/code-nodes 下的 text_normalize.py、candidate_ranking.py）
+
+镜像构建时这两个文件被复制到应用目录（见 Dockerfile）；
+在源码目录中运行（本地开发、测试）时从代码节点目录导入
+"""
+
+import importlib
+import sys
+from pathlib import Path
+
+CODE_NODES_DIR = (
+    Path(__file__).resolve().parent.parent.parent
+    / "dify-workflow"
+    / "nodes"
+    / "code-nodes"
+)
+
+
+def _load(name: str):
+    try:
+        return importlib.import_module(name)
+    except ModuleNotFoundError:
+        if str(CODE_NODES_DIR) not in sys.path:
+            sys.path.append(str(CODE_NODES_DIR))
+        return importlib.import_module(name)
+
+
+text_normalize = _load("text_normalize")
+candidate_ranking = _load("candidate_ranking")
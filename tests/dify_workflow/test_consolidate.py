@@ -57,6 +57,34 @@ class TestConsolidate:
         assert result["success"] is True
         assert result["final_report"]["fields"]["title"]["status"] == "未查到"
 
+    def test_version_tag_mismatch(self):
+        """测试版本说明不同的标题和专辑不算确认，写法差异仍然确认"""
+        netease_data = {
+            "song_id": "123",
+            "song_title": "晴天",
+            "artists": [],
+            "album": "叶惠美",
+            "duration": 0,
+            "lyrics": {},
+            "cover_url": "",
+        }
+
+        live = main(
+            netease_data=netease_data,
+            qqmusic_track_name="晴天 (Live)",
+            qqmusic_album_name="叶惠美 (Live)",
+        )
+        feat = main(
+            netease_data=netease_data,
+            qqmusic_track_name="晴天 feat. 某人",
+            qqmusic_album_name="葉惠美",
+        )
+
+        assert live["final_report"]["fields"]["title"]["status"] == "未查到"
+        assert live["final_report"]["fields"]["album"]["status"] == "未查到"
+        assert feat["final_report"]["fields"]["title"]["status"] == "确认"
+        assert feat["final_report"]["fields"]["album"]["status"] == "确认"
+
     def test_duration_within_tolerance(self):
         """测试时长在容差范围内"""
         netease_data = {
@@ -235,3 +263,31 @@ class TestConsolidate:
 
         assert result["success"] is True
         assert result["final_report"]["fields"]["artists"]["status"] == "确认"
+
+    def test_normalized_comparison(self):
+        """测试繁简、全角、feat. 后缀和合并书写的艺术家规范化后仍能确认"""
+        netease_data = {
+            "song_id": "123",
+            "song_title": "後來的我們 (feat. 某人)",
+            "artists": ["五月天/陳綺貞"],
+            "album": "ＬＩＦＥ 人生",
+            "duration": 0,
+            "lyrics": {},
+            "cover_url": "",
+        }
+
+        qqmusic_parsed_data = {
+            "track_info": {"singer": [{"name": "陈绮贞"}, {"name": "五月天"}]}
+        }
+
+        result = main(
+            netease_data=netease_data,
+            qqmusic_track_name="后来的我们",
+            qqmusic_album_name="Life人生",
+            qqmusic_parsed_data=qqmusic_parsed_data,
+        )
+
+        fields = result["final_report"]["fields"]
+        assert fields["title"]["status"] == "确认"
+        assert fields["artists"]["status"] == "确认"
+        assert fields["album"]["status"] == "确认"
@@ -87,7 +87,7 @@ class TestFindQQMusicMatch:
         assert "搜索无结果" in result["error"]
 
     def test_find_match_multiple_results(self):
-        """测试多个搜索结果（应返回第一个）"""
+        """测试多个搜索结果（返回得分最高的，同分时返回靠前的）"""
         search_results = {
             "song": {
                 "list": [
@@ -97,8 +97,111 @@ class TestFindQQMusicMatch:
             }
         }
 
-        result = main(json.dumps(search_results), "歌曲", "歌手")
+        result = main(json.dumps(search_results), "第二首", "歌手")
+        tie = main(json.dumps(search_results), "歌曲", "歌手")
 
         assert result["match_found"] is True
-        assert result["match_id"] == "first"
-        assert result["match_name"] == "第一首"
+        assert result["match_id"] == "second"
+        assert result["match_name"] == "第二首"
+        assert tie["match_id"] == "first"
+
+
+def candidate(songmid, songname, singers, interval=240):
+    return {
+        "songmid": songmid,
+        "songname": songname,
+        "albumname": "专辑",
+        "interval": interval,
+        "singer": [{"name": name} for name in singers],
+    }
+
+
+class TestScoredMatch:
+    """测试候选过滤和评分"""
+
+    def test_skips_version_and_duration_mismatches(self):
+        """测试 Live / 伴奏版本和时长不符的候选被过滤"""
+        search_results = {
+            "song": {
+                "list": [
+                    candidate("live", "晴天 (Live)", ["周杰伦"]),
+                    candidate("karaoke", "晴天（伴奏）", ["周杰伦"]),
+                    candidate("long", "晴天", ["周杰伦"], interval=300),
+                    candidate("studio", "晴天", ["周杰伦"], interval=269),
+                ]
+            }
+        }
+
+        result = main(search_results, "晴天", ["周杰伦"], 269000)
+
+        assert result["match_id"] == "studio"
+        assert result["match_score"] == 1.0
+        assert result["match_margin"] == 1.0
+
+    def test_keeps_version_when_target_has_it(self):
+        """测试目标本身是 Live 版时匹配 Live 候选"""
+        search_results = {
+            "song": {
+                "list": [
+                    candidate("studio", "晴天", ["周杰伦"]),
+                    candidate("live", "晴天 - Live", ["周杰伦"]),
+                ]
+            }
+        }
+
+        result = main(search_results, "晴天 (Live)", "周杰伦")
+
+        assert result["match_id"] == "live"
+
+    def test_ranks_by_title_and_artist_similarity(self):
+        """测试按规范化后的标题和艺术家相似度排序，并给出领先分数"""
+        search_results = {
+            "song": {
+                "list": [
+                    candidate("other", "晴天", ["翻唱歌手"]),
+                    candidate("close", "晴 天", ["周杰"]),
+                    candidate("exact", "ＢＵＴＴＥＲ－ＦＬＹ", ["和田光司"]),
+                ]
+            }
+        }
+
+        result = main(search_results, "晴天", "周杰伦")
+        fullwidth = main(search_results, "Butter-Fly", "和田光司")
+
+        assert result["match_id"] == "close"
+        assert 0 < result["match_margin"] < result["match_score"] < 1
+        assert fullwidth["match_id"] == "exact"
+        assert fullwidth["match_score"] == 1.0
+
+    def test_exact_hit_stops_early(self):
+        """测试标题和艺术家完全一致时不再比较后面的候选"""
+
+        class Guard(dict):
+            def get(self, key, default=None):
+                raise AssertionError("不应再评分")
+
+        search_results = {
+            "song": {
+                "list": [
+                    candidate("exact", "不将就", ["李荣浩"]),
+                    Guard(),
+                ]
+            }
+        }
+
+        result = main(search_results, "不将就", "李荣浩", 240000)
+
+        assert result["match_id"] == "exact"
+        assert result["error"] == ""
+
+    def test_all_candidates_filtered(self):
+        """测试没有候选通过过滤"""
+        search_results = {
+            "song": {"list": [candidate("live", "晴天 (Live)", ["周杰伦"])]}
+        }
+
+        result = main(search_results, "晴天", "周杰伦")
+
+        assert result["match_found"] is False
+        assert result["match_id"] == ""
+        assert "版本" in result["error"]
@@ -0,0 +1,71 @@
+"""
+测试 instrumentation 共用模块（节点计时和日志）
+"""
+
+import logging
+import sys
+from pathlib import Path
+
+sys.path.insert(
+    0,
+    str(Path(__file__).parent.parent.parent / "dify-workflow" / "nodes" / "code-nodes"),
+)
+
+from instrumentation import get_logger, instrumented, payload_size
+from parse_url import main as parse_url_main
+
+
+class TestInstrumented:
+    """测试 @instrumented 装饰器"""
+
+    def test_disabled_by_default(self, monkeypatch):
+        """测试默认不输出 _timings"""
+        monkeypatch.delenv("NODE_INSTRUMENT", raising=False)
+        result = parse_url_main("https://music.163.com/song?id=12345")
+
+        assert "_timings" not in result
+        assert result["song_id"] == "12345"
+
+    def test_timings_on_request(self, monkeypatch):
+        """测试传入 _instrument=True 时输出耗时、数据大小和内存峰值"""
+        monkeypatch.delenv("NODE_INSTRUMENT", raising=False)
+        url = "https://music.163.com/song?id=12345"
+        result = parse_url_main(url, _instrument=True)
+
+        timings = result["_timings"]
+        assert result["song_id"] == "12345"
+        assert timings["node"] == "parse_url"
+        assert timings["wall_ms"] >= 0
+        assert timings["input_bytes"] == len(url)
+        assert timings["output_bytes"] > 0
+        assert timings["peak_alloc_bytes"] >= 0
+
+    def test_env_enables_and_measures_allocations(self, monkeypatch):
+        """测试 NODE_INSTRUMENT=1 全局启用，并统计调用期间的内存分配峰值"""
+        monkeypatch.setenv("NODE_INSTRUMENT", "1")
+
+        @instrumented("allocate")
+        def main(size: int) -> dict:
+            buffer = bytearray(size)
+            return {"length": len(buffer)}
+
+        result = main(1_000_000)
+
+        assert result["length"] == 1_000_000
+        assert result["_timings"]["node"] == "allocate"
+        assert result["_timings"]["peak_alloc_bytes"] >= 1_000_000
+
+    def test_payload_size(self):
+        """测试按 UTF-8 JSON 计算数据大小"""
+        assert payload_size(None) == 0
+        assert payload_size("晴天") == 6
+        assert payload_size({"a": 1}) == len('{"a": 1}')
+
+
+def test_logger_level_from_env(monkeypatch):
+    """测试日志级别由 NODE_LOG_LEVEL 控制"""
+    monkeypatch.setenv("NODE_LOG_LEVEL", "debug")
+    assert get_logger("test_node").isEnabledFor(logging.DEBUG)
+
+    monkeypatch.delenv("NODE_LOG_LEVEL")
+    assert not get_logger("test_node").isEnabledFor(logging.DEBUG)
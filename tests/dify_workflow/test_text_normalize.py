@@ -0,0 +1,73 @@
+"""
+测试 text_normalize 共用模块
+"""
+
+import sys
+from pathlib import Path
+
+sys.path.insert(
+    0,
+    str(Path(__file__).parent.parent.parent / "dify-workflow" / "nodes" / "code-nodes"),
+)
+
+from text_normalize import (
+    fold,
+    normalize_text,
+    normalize_title,
+    normalize_title_strict,
+    same_artists,
+    split_artists,
+)
+
+
+class TestNormalize:
+    """测试文本规范化"""
+
+    def test_traditional_and_fullwidth(self):
+        """测试繁体转简体、全角转半角"""
+        assert fold("後來的我們") == "后来的我们"
+        assert fold("ＡＢＣ　１２３") == "abc 123"
+        assert normalize_text("ＢＵＴＴＥＲ－ＦＬＹ") == "butterfly"
+
+    def test_title_strips_versions_and_feat(self):
+        """测试标题去掉括号说明、feat. 后缀和 " - " 后缀"""
+        assert normalize_title("晴天 (Live)") == "晴天"
+        assert normalize_title("晴天（伴奏）") == "晴天"
+        assert normalize_title("晴天【官方版】") == "晴天"
+        assert normalize_title("晴天 - 钢琴版") == "晴天"
+        assert normalize_title("Love Song feat. Someone") == "lovesong"
+        # 整个标题都在括号里时保留内容
+        assert normalize_title("(Intro)") == "intro"
+
+    def test_strict_title_keeps_versions(self):
+        """测试核验用的标题只去掉 feat.，保留版本说明"""
+        assert normalize_title_strict("晴天 feat. 某人") == "晴天"
+        assert normalize_title_strict("晴天（feat. 某人）") == "晴天"
+        assert normalize_title_strict("晴天（Live）") == normalize_title_strict(
+            "晴天 (Live)"
+        )
+        assert normalize_title_strict("晴天 (Live)") != normalize_title_strict("晴天")
+        assert normalize_title_strict("晴天 feat. 某人 (Live)") == "晴天live"
+        assert normalize_title_strict("晴天 - 钢琴版") != normalize_title_strict("晴天")
+
+    def test_split_artists(self):
+        """测试拆分、规范化并去重艺术家"""
+        assert split_artists("周杰倫/費玉清") == ("周杰伦", "费玉清")
+        assert split_artists("陈奕迅、Eason & 某某") == ("陈奕迅", "eason", "某某")
+        assert split_artists(["A feat. B", "a", None]) == ("a", "b")
+        assert split_artists("Within Temptation") == ("withintemptation",)
+        assert split_artists("") == ()
+
+    def test_same_artists(self):
+        """测试忽略顺序和写法比较艺术家"""
+        assert same_artists(["周杰倫", "費玉清"], "费玉清, 周杰伦")
+        assert not same_artists(["周杰伦"], ["周杰伦", "费玉清"])
+        assert not same_artists([], [])
+
+    def test_results_are_cached(self):
+        """测试重复输入命中缓存"""
+        normalize_title.cache_clear()
+        normalize_title("稻香")
+        normalize_title("稻香")
+
+        assert normalize_title.cache_info().hits == 1
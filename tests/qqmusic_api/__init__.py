@@ -0,0 +1,3 @@
+"""
+QQ 音乐 API 代理服务单元测试
+"""
@@ -0,0 +1,201 @@
+"""
+测试 TTL + 字节上限 LRU 缓存
+"""
+
+import sys
+import threading
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(
+    0, str(Path(__file__).parent.parent.parent / "services" / "qqmusic-api")
+)
+
+from cache import DISK, HIT, MISS, STALE, TTLCache
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class TestTTLCache:
+    """测试进程内响应缓存"""
+
+    def test_hit_and_miss(self):
+        """测试命中和未命中计数"""
+        cache = TTLCache(ttl=60, clock=FakeClock())
+
+        assert cache.lookup("a") == (None, MISS)
+        cache.set("a", {"x": 1})
+        assert cache.lookup("a") == ({"x": 1}, HIT)
+
+        stats = cache.stats()
+        assert stats["hits"] == 1
+        assert stats["misses"] == 1
+        assert stats["entries"] == 1
+
+    def test_ttl_expiry(self):
+        """测试超出 TTL 后过期"""
+        clock = FakeClock()
+        cache = TTLCache(ttl=10, clock=clock)
+        cache.set("a", "value")
+
+        clock.now = 11
+        assert cache.lookup("a") == (None, MISS)
+        assert cache.stats()["expirations"] == 1
+        assert cache.stats()["entries"] == 0
+
+    def test_evicts_lru_by_bytes(self):
+        """测试超出字节上限时按 LRU 淘汰"""
+        cache = TTLCache(ttl=60, max_bytes=10, sizeof=len, clock=FakeClock())
+        cache.set("a", "aaaa")
+        cache.set("b", "bbbb")
+        cache.lookup("a")  # a 变为最近使用
+        cache.set("c", "cccc")
+
+        assert cache.lookup("b") == (None, MISS)
+        assert cache.lookup("a")[1] == HIT
+        assert cache.lookup("c")[1] == HIT
+        assert cache.stats()["evictions"] == 1
+        assert cache.stats()["bytes"] == 8
+
+    def test_oversized_entry_not_cached(self):
+        """测试单条超过上限时不缓存"""
+        cache = TTLCache(ttl=60, max_bytes=4, sizeof=len, clock=FakeClock())
+        cache.set("a", "too large")
+
+        assert cache.lookup("a") == (None, MISS)
+
+    def test_disabled_when_ttl_zero(self):
+        """测试 TTL 为 0 时禁用缓存"""
+        cache = TTLCache(ttl=0)
+        calls = []
+
+        cache.get_or_load("a", lambda: calls.append(1) or "v")
+        cache.get_or_load("a", lambda: calls.append(1) or "v")
+
+        assert len(calls) == 2
+        assert cache.stats()["entries"] == 0
+
+    def test_get_or_load_caches_result(self):
+        """测试 get_or_load 只调用一次 loader"""
+        cache = TTLCache(ttl=60, clock=FakeClock())
+        calls = []
+
+        def loader():
+            calls.append(1)
+            return {"songmid": "a"}
+
+        assert cache.get_or_load("a", loader) == ({"songmid": "a"}, MISS)
+        assert cache.get_or_load("a", loader) == ({"songmid": "a"}, HIT)
+        assert len(calls) == 1
+
+    def test_loader_error_propagates(self):
+        """测试同步加载失败时抛出异常且不缓存"""
+        cache = TTLCache(ttl=60, clock=FakeClock())
+
+        def loader():
+            raise RuntimeError("upstream down")
+
+        with pytest.raises(RuntimeError):
+            cache.get_or_load("a", loader)
+        assert cache.stats()["entries"] == 0
+
+    def test_stale_while_revalidate(self):
+        """测试过期窗口内返回旧值并后台刷新"""
+        clock = FakeClock()
+        cache = TTLCache(ttl=10, stale_ttl=100, clock=clock)
+        cache.set("a", "old")
+        clock.now = 20
+
+        refreshed = threading.Event()
+
+        def loader():
+            refreshed.set()
+            return "new"
+
+        value, state = cache.get_or_load("a", loader)
+
+        assert (value, state) == ("old", STALE)
+        assert refreshed.wait(timeout=2)
+        # 等待后台线程写入
+        for _ in range(100):
+            if cache.lookup("a") == ("new", HIT):
+                break
+            threading.Event().wait(0.01)
+        assert cache.lookup("a") == ("new", HIT)
+        assert cache.stats()["stale_hits"] == 1
+
+    def test_refresh_bounded_and_once_per_key(self):
+        """测试后台刷新最多占用 refresh_workers 个线程，同一 key 排队或刷新中时不重复提交"""
+        clock = FakeClock()
+        cache = TTLCache(ttl=10, stale_ttl=100, clock=clock, refresh_workers=2)
+        for key in "abcde":
+            cache.set(key, "old")
+        clock.now = 20
+
+        lock = threading.Lock()
+        running, peak, calls = [0], [0], []
+        release = threading.Event()
+
+        def loader(key):
+            def load():
+                with lock:
+                    calls.append(key)
+                    running[0] += 1
+                    peak[0] = max(peak[0], running[0])
+                release.wait(2)
+                with lock:
+                    running[0] -= 1
+                return "new"
+
+            return load
+
+        for key in "abcde" * 3:
+            assert cache.get_or_load(key, loader(key)) == ("old", STALE)
+        threading.Event().wait(0.05)
+        release.set()
+        cache._refresh_executor.shutdown(wait=True)
+
+        assert sorted(calls) == list("abcde")
+        assert peak[0] == 2
+        assert all(cache.lookup(key) == ("new", HIT) for key in "abcde")
+
+
+class DictBacking:
+    def __init__(self):
+        self.data = {}
+
+    def get(self, key):
+        return self.data.get(key)
+
+    def set(self, key, value):
+        self.data[key] = value
+
+
+class TestBackingTier:
+    """测试 backing 层（磁盘缓存）"""
+
+    def test_loads_write_through_and_read_back(self):
+        """测试加载结果写入 backing，内存清空后从 backing 读取"""
+        backing = DictBacking()
+        cache = TTLCache(ttl=60, clock=FakeClock(), backing=backing)
+        calls = []
+
+        def loader():
+            calls.append(1)
+            return {"x": 1}
+
+        assert cache.get_or_load("a", loader) == ({"x": 1}, MISS)
+        assert backing.data == {"a": {"x": 1}}
+
+        cache.clear()
+
+        assert cache.get_or_load("a", loader) == ({"x": 1}, DISK)
+        assert cache.get_or_load("a", loader) == ({"x": 1}, HIT)
+        assert len(calls) == 1
@@ -0,0 +1,133 @@
+"""
+测试网易云 → QQ 音乐对照表
+"""
+
+import sys
+from pathlib import Path
+
+sys.path.insert(
+    0, str(Path(__file__).parent.parent.parent / "services" / "qqmusic-api")
+)
+
+import crosswalk as crosswalk_module
+from crosswalk import Crosswalk
+from track import detail_candidate, score_candidate
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1_000_000.0
+
+    def __call__(self):
+        return self.now
+
+
+MATCH = {
+    "songmid": "original",
+    "songname": "不将就",
+    "albumname": "不将就",
+    "albummid": "album1",
+    "singer": [{"name": "李荣浩"}],
+    "lyric": "搜索结果中的其他字段不保存",
+    "score": 0.95,
+}
+
+
+def make_crosswalk(tmp_path, clock=None, **kwargs):
+    return Crosswalk(
+        path=str(tmp_path / "data" / "crosswalk.sqlite3"),
+        clock=clock or FakeClock(),
+        **{"min_score": 0.9, "max_age": 60, **kwargs},
+    )
+
+
+class TestCrosswalk:
+    """测试对照表"""
+
+    def test_roundtrip_survives_reopen(self, tmp_path):
+        """测试记录后重新打开仍能命中，只保存需要的字段"""
+        clock = FakeClock()
+        assert make_crosswalk(tmp_path, clock).record("42", MATCH) is True
+
+        match = make_crosswalk(tmp_path, clock).get("42")
+
+        assert match["songmid"] == "original"
+        assert match["score"] == 0.95
+        assert "lyric" not in match
+
+    def test_low_score_ignored(self, tmp_path):
+        """测试低于阈值的匹配不记录"""
+        crosswalk = make_crosswalk(tmp_path)
+
+        assert crosswalk.record("42", {**MATCH, "score": 0.5}) is False
+        assert crosswalk.get("42") is None
+        assert crosswalk.stats()["misses"] == 1
+
+    def test_expired_entry_not_used(self, tmp_path):
+        """测试超过有效期的条目不再直接使用，但仍可查看"""
+        clock = FakeClock()
+        crosswalk = make_crosswalk(tmp_path, clock)
+        crosswalk.record("42", MATCH)
+
+        clock.now += 61
+
+        assert crosswalk.get("42") is None
+        assert crosswalk.lookup("42")["songmid"] == "original"
+
+    def test_invalidate(self, tmp_path):
+        """测试作废条目"""
+        crosswalk = make_crosswalk(tmp_path)
+        crosswalk.record("42", MATCH)
+
+        assert crosswalk.invalidate("42") is True
+        assert crosswalk.invalidate("42") is False
+        assert crosswalk.get("42") is None
+        assert crosswalk.stats()["invalidations"] == 1
+
+    def test_entries_count_cached(self, tmp_path, monkeypatch):
+        """测试 stats() 的条目数最多每 ENTRIES_COUNT_TTL 秒统计一次，作废时扣减"""
+        crosswalk = make_crosswalk(tmp_path)
+        crosswalk.record("42", MATCH)
+        assert crosswalk.stats()["entries"] == 1
+
+        crosswalk.record("43", MATCH)
+        crosswalk.record("44", MATCH)
+        assert crosswalk.stats()["entries"] == 1
+        crosswalk.invalidate("42")
+        assert crosswalk.stats()["entries"] == 0
+
+        monkeypatch.setattr(crosswalk_module, "ENTRIES_COUNT_TTL", 0)
+        assert crosswalk.stats()["entries"] == 2
+
+    def test_disabled_without_path(self):
+        """测试未配置路径时禁用"""
+        crosswalk = Crosswalk(path="")
+
+        assert not crosswalk.enabled
+        assert crosswalk.record("42", MATCH) is False
+        assert crosswalk.get("42") is None
+
+
+def test_detail_candidate_scores_like_search_result():
+    """测试歌曲详情转换为搜索结果格式后按相同规则打分"""
+    song_data = {
+        "track_info": {
+            "mid": "original",
+            "name": "不将就",
+            "title": "不将就",
+            "interval": 260,
+            "singer": [{"name": "李荣浩"}],
+            "album": {"mid": "album1", "name": "不将就"},
+        }
+    }
+
+    candidate = detail_candidate(song_data)
+
+    assert candidate["songmid"] == "original"
+    assert candidate["albummid"] == "album1"
+    assert score_candidate(candidate, "不将就", ["李荣浩"], 260) == 1.0
+    assert score_candidate(candidate, "不将就", ["别人"], 260) < 0.9
+    # 对照表指向的歌曲变成了 Live 版或时长不一致时核验不通过
+    live = {**candidate, "songname": "不将就 (Live)"}
+    assert score_candidate(live, "不将就", ["李荣浩"], 260) == 0.0
+    assert score_candidate(candidate, "不将就", ["李荣浩"], 300) == 0.0
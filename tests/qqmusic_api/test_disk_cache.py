@@ -0,0 +1,169 @@
+"""
+测试 SQLite 磁盘缓存层
+"""
+
+import sqlite3
+import sys
+from pathlib import Path
+
+sys.path.insert(
+    0, str(Path(__file__).parent.parent.parent / "services" / "qqmusic-api")
+)
+
+import disk_cache
+from disk_cache import DiskCache
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1_000_000.0
+
+    def __call__(self):
+        return self.now
+
+
+def make_cache(tmp_path, clock=None, **ttls):
+    return DiskCache(
+        path=str(tmp_path / "cache" / "proxy.sqlite3"),
+        ttls={"getSongInfo": 60, "getSearchByKey": 10, **ttls},
+        clock=clock or FakeClock(),
+    )
+
+
+class TestDiskCache:
+    """测试磁盘缓存"""
+
+    def test_roundtrip_with_normalized_params(self, tmp_path):
+        """测试读写，参数顺序和大小写不影响命中"""
+        cache = make_cache(tmp_path)
+
+        cache.set("getSearchByKey", {"key": "周杰伦 晴天", "pageNo": 1}, {"n": 1})
+
+        assert cache.get("getSearchByKey", {"pageNo": 1, "key": "周杰伦  晴天"}) == {
+            "n": 1
+        }
+        assert cache.get("getSongInfo", {"songmid": "x"}) is None
+        assert cache.stats()["hits"] == 1
+        assert cache.stats()["misses"] == 1
+
+    def test_survives_reopen(self, tmp_path):
+        """测试重新打开后仍能命中（模拟容器重启）"""
+        clock = FakeClock()
+        make_cache(tmp_path, clock).set("getSongInfo", {"songmid": "a"}, {"mid": "a"})
+
+        reopened = make_cache(tmp_path, clock)
+
+        assert reopened.get("getSongInfo", {"songmid": "a"}) == {"mid": "a"}
+
+    def test_identifiers_case_sensitive(self, tmp_path):
+        """测试大小写不同的 songmid 是不同的条目"""
+        cache = make_cache(tmp_path)
+
+        cache.set("getSongInfo", {"songmid": "002w3c"}, {"mid": "002w3c"})
+
+        assert cache.get("getSongInfo", {"songmid": "002W3C"}) is None
+        assert cache.get("getSongInfo", {"songmid": "002w3c"}) == {"mid": "002w3c"}
+
+    def test_old_key_format_cleared(self, tmp_path):
+        """测试打开旧键格式的数据库时清空条目（旧键把 songmid 转成了小写）"""
+        clock = FakeClock()
+        cache = make_cache(tmp_path, clock)
+        cache.set("getSongInfo", {"songmid": "abc"}, {"mid": "ABC"})
+        cache.close()
+        conn = sqlite3.connect(cache.path)
+        conn.execute("PRAGMA user_version = 1")
+        conn.commit()
+        conn.close()
+
+        reopened = make_cache(tmp_path, clock)
+
+        assert reopened.get("getSongInfo", {"songmid": "abc"}) is None
+        assert reopened.stats()["entries"] == 0
+
+    def test_wal_mode(self, tmp_path):
+        cache = make_cache(tmp_path)
+        conn = sqlite3.connect(cache.path)
+
+        assert conn.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+
+    def test_ttl_per_endpoint(self, tmp_path):
+        """测试每个端点独立的 TTL"""
+        clock = FakeClock()
+        cache = make_cache(tmp_path, clock, getImageUrl=0)
+        cache.set("getSongInfo", {"songmid": "a"}, 1)
+        cache.set("getSearchByKey", {"key": "a"}, 2)
+        cache.set("getImageUrl", {"id": "a"}, 3)
+
+        clock.now += 30
+
+        assert cache.get("getSongInfo", {"songmid": "a"}) == 1
+        assert cache.get("getSearchByKey", {"key": "a"}) is None
+        assert cache.get("getImageUrl", {"id": "a"}) is None
+
+    def test_compact_removes_expired(self, tmp_path):
+        """测试清理过期条目"""
+        clock = FakeClock()
+        cache = make_cache(tmp_path, clock)
+        cache.set("getSongInfo", {"songmid": "a"}, 1)
+        cache.set("getSearchByKey", {"key": "a"}, 2)
+
+        clock.now += 30
+
+        assert cache.compact() == 1
+        assert cache.stats()["entries"] == 1
+
+    def test_entries_count_cached(self, tmp_path, monkeypatch):
+        """测试 stats() 的条目数最多每 ENTRIES_COUNT_TTL 秒统计一次，清理时扣减"""
+        clock = FakeClock()
+        cache = make_cache(tmp_path, clock)
+        cache.set("getSongInfo", {"songmid": "a"}, 1)
+        cache.set("getSearchByKey", {"key": "a"}, 2)
+        assert cache.stats()["entries"] == 2
+
+        cache.set("getSongInfo", {"songmid": "b"}, 3)
+        assert cache.stats()["entries"] == 2
+        clock.now += 30
+        assert cache.compact() == 1
+        assert cache.stats()["entries"] == 1
+
+        monkeypatch.setattr(disk_cache, "ENTRIES_COUNT_TTL", 0)
+        assert cache.stats()["entries"] == 2
+
+    def test_tier_view(self, tmp_path):
+        """测试以 songmid 为键的视图"""
+        cache = make_cache(tmp_path)
+        tier = cache.tier("getSongInfo", lambda mid: {"songmid": mid})
+
+        tier.set("a", {"mid": "a"})
+
+        assert tier.get("a") == {"mid": "a"}
+        assert cache.get("getSongInfo", {"songmid": "a"}) == {"mid": "a"}
+
+    def test_after_fork_reopens_connection(self, tmp_path):
+        """测试 fork 后重新打开连接并重启清理线程（gunicorn 预加载）"""
+        cache = make_cache(tmp_path)
+        cache.set("getSongInfo", {"songmid": "a"}, {"mid": "a"})
+        cache.start_compaction(interval=3600)
+        parent_conn = cache._conn
+
+        cache.after_fork()
+
+        assert cache._conn is not parent_conn
+        assert cache._compactor.is_alive()
+        assert cache.get("getSongInfo", {"songmid": "a"}) == {"mid": "a"}
+        cache.close()
+
+    def test_disabled_without_path(self):
+        cache = DiskCache(path="")
+        cache.set("getSongInfo", {"songmid": "a"}, 1)
+
+        assert cache.enabled is False
+        assert cache.get("getSongInfo", {"songmid": "a"}) is None
+
+    def test_closed_database_counts_errors(self, tmp_path):
+        """测试 SQLite 出错时按未命中处理"""
+        cache = make_cache(tmp_path)
+        cache._conn.close()
+
+        assert cache.get("getSongInfo", {"songmid": "a"}) is None
+        assert cache.stats()["errors"] == 1
@@ -0,0 +1,66 @@
+"""
+测试 JSON 快速路径
+"""
+
+import json
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(
+    0, str(Path(__file__).parent.parent.parent / "services" / "qqmusic-api")
+)
+
+import fastjson
+
+SEARCH_BODY = json.dumps(
+    {
+        "response": {
+            "code": 0,
+            "data": {"song": {"list": [{"songmid": "m1", "songname": "晴天"}]}},
+        }
+    },
+    ensure_ascii=False,
+).encode("utf-8")
+
+
+class TestFastJSON:
+    """测试编码、解码和子树提取"""
+
+    def test_extract_subtree(self):
+        data = fastjson.extract(SEARCH_BODY, ("response", "data"))
+
+        assert data["song"]["list"][0]["songname"] == "晴天"
+
+    def test_extract_missing_path(self):
+        with pytest.raises(KeyError):
+            fastjson.extract(SEARCH_BODY, ("response", "songinfo", "data"))
+
+    def test_dumps_keeps_unicode(self):
+        encoded = fastjson.dumps({"name": "晴天"})
+
+        assert isinstance(encoded, bytes)
+        assert "晴天".encode("utf-8") in encoded
+        assert json.loads(encoded) == {"name": "晴天"}
+
+    def test_stdlib_fallback(self, monkeypatch):
+        """测试未安装 orjson / ijson 时回退到标准库"""
+        monkeypatch.setattr(fastjson, "orjson", None)
+        monkeypatch.setattr(fastjson, "ijson_backend", None)
+
+        assert fastjson.backend() == "json"
+        assert fastjson.extract(SEARCH_BODY, ("response", "code")) == 0
+        assert fastjson.loads(fastjson.dumps([1, "a"])) == [1, "a"]
+
+    def test_streaming_extract(self, monkeypatch):
+        """测试大响应体使用增量解析"""
+        if fastjson.ijson_backend is None:
+            pytest.skip("ijson C 后端未安装")
+        monkeypatch.setattr(fastjson, "STREAM_MIN_BYTES", 0)
+
+        data = fastjson.extract(SEARCH_BODY, ("response", "data"))
+
+        assert data["song"]["list"][0]["songmid"] == "m1"
+        with pytest.raises(KeyError):
+            fastjson.extract(SEARCH_BODY, ("response", "missing"))
@@ -0,0 +1,179 @@
+"""
+测试上游对冲请求
+"""
+
+import asyncio
+import sys
+import time
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(
+    0, str(Path(__file__).parent.parent.parent / "services" / "qqmusic-api")
+)
+
+from hedging import HedgeBudget, HedgePolicy, LatencyWindow
+from upstream import AsyncUpstreamClient, UpstreamClient
+
+
+class FakeResponse:
+    def __init__(self, tag):
+        self.tag = tag
+        self.status_code = 200
+
+    def raise_for_status(self):
+        pass
+
+
+def warmed_policy(endpoint="getSongInfo", delay=0.01, **options):
+    """样本已足够、对冲延迟约为 delay 秒的策略"""
+    options.setdefault("budget_ratio", 1.0)
+    policy = HedgePolicy(endpoints=[endpoint], min_samples=5, min_delay=0, **options)
+    for _ in range(5):
+        policy.record_latency(endpoint, delay)
+    return policy
+
+
+class TestHedgePolicy:
+    """测试对冲延迟和预算"""
+
+    def test_percentile(self):
+        window = LatencyWindow(size=100)
+        for i in range(1, 101):
+            window.record(i / 100)
+
+        assert window.percentile(95) == 0.95
+        assert window.percentile(50) == 0.5
+        assert LatencyWindow(size=10).percentile(95) is None
+
+    def test_no_delay_until_enough_samples(self):
+        policy = HedgePolicy(endpoints=["getSongInfo"], min_samples=3, min_delay=0.2)
+        policy.record_latency("getSongInfo", 0.01)
+
+        assert policy.delay_for("getSongInfo") is None
+        assert policy.delay_for("getSearchByKey") is None
+
+        policy.record_latency("getSongInfo", 0.01)
+        policy.record_latency("getSongInfo", 0.01)
+        # 不低于下限
+        assert policy.delay_for("getSongInfo") == 0.2
+
+    def test_budget_limits_hedge_ratio(self):
+        """测试每 20 个主请求最多对冲一次"""
+        budget = HedgeBudget(ratio=0.05, burst=10)
+        granted = 0
+        for _ in range(100):
+            budget.deposit()
+            granted += budget.withdraw()
+
+        assert granted == 5
+
+    def test_disabled_by_default(self, monkeypatch):
+        monkeypatch.delenv("QQMUSIC_HEDGE_ENDPOINTS", raising=False)
+
+        assert HedgePolicy().stats()["enabled"] is False
+
+
+class SlowSession:
+    def __init__(self):
+        self.calls = 0
+
+    def get(self, url, params=None, timeout=None):
+        self.calls += 1
+        time.sleep(0.01)
+        return FakeResponse(self.calls)
+
+    def close(self):
+        pass
+
+
+class TestSyncClient:
+    """测试同步客户端不做对冲"""
+
+    def test_slow_call_not_hedged(self, monkeypatch):
+        """同步请求无法取消落败方，即使配置了对冲端点也只发一次请求"""
+        monkeypatch.setenv("QQMUSIC_HEDGE_ENDPOINTS", "getSongInfo")
+        client = UpstreamClient("http://upstream:3200")
+        client.session = SlowSession()
+        for _ in range(25):
+            client.get("getSongInfo", {"songmid": "a"})
+
+        assert client.session.calls == 25
+        client.close()
+
+
+class SlowFirstAsyncClient:
+    """第一个请求挂起 delay 秒（或直到被取消），之后的请求立即返回"""
+
+    def __init__(self, delay=5):
+        self.calls = 0
+        self.cancelled = 0
+        self.delay = delay
+
+    async def get(self, url, params=None, timeout=None):
+        self.calls += 1
+        call = self.calls
+        if call == 1:
+            try:
+                await asyncio.sleep(self.delay)
+            except asyncio.CancelledError:
+                self.cancelled += 1
+                raise
+        return FakeResponse(call)
+
+    async def aclose(self):
+        pass
+
+
+class TestAsyncHedging:
+    """测试异步客户端对冲"""
+
+    def test_hedge_wins_and_primary_cancelled(self):
+        pytest.importorskip("httpx")
+        policy = warmed_policy()
+
+        async def run():
+            client = AsyncUpstreamClient("http://upstream:3200", hedge=policy)
+            fake = SlowFirstAsyncClient()
+            client.client = fake
+            response = await client.get("getSongInfo", {"songmid": "a"})
+            # 让被取消的主请求完成清理
+            await asyncio.sleep(0)
+            return client, fake, response
+
+        client, fake, response = asyncio.run(run())
+
+        assert response.tag == 2
+        assert fake.cancelled == 1
+        assert policy.stats()["hedge_wins"] == 1
+        # 被取消的主请求释放并发名额，不计入熔断统计
+        assert client.guard.limiter.stats()["in_flight"] == 0
+        assert len(client.guard.breaker("getSongInfo")._outcomes) == 1
+
+    def test_rate_limited_hedge_keeps_budget(self, monkeypatch):
+        """出站限流拒绝对冲时退回预算令牌，不计入 hedged"""
+        pytest.importorskip("httpx")
+        monkeypatch.setenv("QQMUSIC_RATE_DETAIL", "0.001")
+        monkeypatch.setenv("QQMUSIC_BURST_DETAIL", "1")
+        policy = warmed_policy()
+        before = policy.stats()
+
+        async def run():
+            client = AsyncUpstreamClient("http://upstream:3200", hedge=policy)
+            fake = SlowFirstAsyncClient(delay=0.05)
+            client.client = fake
+            response = await client.get("getSongInfo", {"songmid": "a"})
+            return fake, response
+
+        fake, response = asyncio.run(run())
+        stats = policy.stats()
+
+        assert response.tag == 1
+        assert fake.calls == 1
+        # 主请求存入的一个令牌之外预算不变
+        assert stats["budget_tokens"] == pytest.approx(
+            before["budget_tokens"] + policy.budget.ratio
+        )
+        assert stats["hedged"] == before["hedged"] == 0
+        assert stats["rate_limited"] == 1
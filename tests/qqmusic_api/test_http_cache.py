@@ -0,0 +1,99 @@
+"""
+测试 HTTP 压缩与 ETag 协商
+"""
+
+import gzip
+import sys
+from pathlib import Path
+
+sys.path.insert(
+    0, str(Path(__file__).parent.parent.parent / "services" / "qqmusic-api")
+)
+
+import http_cache
+from http_cache import (
+    cache_control_for,
+    choose_encoding,
+    compute_etag,
+    etag_matches,
+    negotiate,
+)
+
+LARGE_BODY = b'{"lyric": "' + "歌词".encode() * 2000 + b'"}'
+
+
+class TestEtag:
+    """测试 ETag 计算与匹配"""
+
+    def test_same_content_same_etag(self):
+        assert compute_etag(b"{}") == compute_etag(b"{}")
+        assert compute_etag(b"{}") != compute_etag(b"[]")
+        assert compute_etag(b"{}").startswith('"')
+
+    def test_if_none_match(self):
+        etag = compute_etag(b"{}")
+
+        assert etag_matches(etag, etag)
+        assert etag_matches(f'"other", W/{etag}', etag)
+        assert etag_matches("*", etag)
+        assert not etag_matches('"other"', etag)
+        assert not etag_matches(None, etag)
+
+
+class TestChooseEncoding:
+    """测试 Accept-Encoding 协商"""
+
+    def test_gzip(self, monkeypatch):
+        monkeypatch.setattr(http_cache, "brotli", None)
+
+        assert choose_encoding("gzip, deflate, br") == "gzip"
+        assert choose_encoding("gzip;q=0, deflate") is None
+        assert choose_encoding("*") == "gzip"
+        assert choose_encoding("") is None
+
+    def test_prefers_brotli_when_available(self, monkeypatch):
+        monkeypatch.setattr(http_cache, "brotli", object())
+
+        assert choose_encoding("gzip, br") == "br"
+        assert choose_encoding("gzip, br;q=0") == "gzip"
+
+
+class TestNegotiate:
+    """测试缓存协商与压缩"""
+
+    def test_compresses_large_body(self, monkeypatch):
+        monkeypatch.setattr(http_cache, "brotli", None)
+
+        status, body, headers = negotiate(LARGE_BODY, "/song", "gzip", None)
+
+        assert status == 200
+        assert headers["Content-Encoding"] == "gzip"
+        assert headers["ETag"].endswith('-gzip"')
+        assert headers["Vary"] == "Accept-Encoding"
+        assert gzip.decompress(body) == LARGE_BODY
+
+    def test_small_body_not_compressed(self):
+        status, body, headers = negotiate(b"{}", "/song", "gzip", None)
+
+        assert body == b"{}"
+        assert "Content-Encoding" not in headers
+        assert headers["ETag"] == compute_etag(b"{}")
+
+    def test_not_modified(self, monkeypatch):
+        monkeypatch.setattr(http_cache, "brotli", None)
+        _, _, headers = negotiate(LARGE_BODY, "/song", "gzip", None)
+
+        status, body, _ = negotiate(LARGE_BODY, "/song", "gzip", headers["ETag"])
+        # 换了 Accept-Encoding 的客户端用未压缩版本的 ETag 也能命中
+        identity_status, _, _ = negotiate(
+            LARGE_BODY, "/song", "gzip", compute_etag(LARGE_BODY)
+        )
+
+        assert status == 304
+        assert body == b""
+        assert identity_status == 304
+
+    def test_cache_control(self):
+        assert cache_control_for("/song", 200).startswith("public, max-age=")
+        assert cache_control_for("/song", 502) == "no-store"
+        assert cache_control_for("/metrics", 200) == "no-store"
@@ -0,0 +1,161 @@
+"""
+测试内容寻址的封面图片缓存
+"""
+
+import hashlib
+import os
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(
+    0, str(Path(__file__).parent.parent.parent / "services" / "qqmusic-api")
+)
+
+from image_cache import (
+    ImageCache,
+    ImageRedirectError,
+    is_allowed_image_url,
+    redirect_target,
+)
+
+
+def store(cache, key, data, content_type="image/jpeg"):
+    writer = cache.writer(key, content_type)
+    for i in range(0, len(data), 4):
+        writer.write(data[i : i + 4])
+    return writer.commit()
+
+
+def temp_files(cache):
+    return [
+        name
+        for name in os.listdir(os.path.join(cache.directory, "blobs"))
+        if name.startswith(".")
+    ]
+
+
+class TestImageCache:
+    """测试图片缓存"""
+
+    def test_store_and_lookup(self, tmp_path):
+        """测试按内容 SHA-256 存储"""
+        cache = ImageCache(str(tmp_path))
+
+        digest = store(cache, "http://y.gtimg.cn/a.jpg", b"image-bytes")
+        cached = cache.lookup("http://y.gtimg.cn/a.jpg")
+
+        assert digest == hashlib.sha256(b"image-bytes").hexdigest()
+        assert cached["digest"] == digest
+        assert cached["content_type"] == "image/jpeg"
+        assert Path(cached["path"]).read_bytes() == b"image-bytes"
+        assert cache.lookup("http://y.gtimg.cn/b.jpg") is None
+
+    def test_same_content_shares_blob(self, tmp_path):
+        """测试相同内容的不同 URL 共用一个文件"""
+        cache = ImageCache(str(tmp_path))
+
+        store(cache, "http://a/1.jpg", b"same")
+        store(cache, "http://a/2.jpg", b"same")
+
+        assert cache.stats()["entries"] == 1
+        assert cache.stats()["bytes"] == 4
+        assert cache.lookup("http://a/2.jpg") is not None
+
+    def test_lru_eviction_by_bytes(self, tmp_path):
+        """测试超过总字节上限时淘汰最久未使用的图片"""
+        cache = ImageCache(str(tmp_path), max_bytes=20)
+        store(cache, "a", b"a" * 8)
+        store(cache, "b", b"b" * 8)
+        cache.lookup("a")
+
+        store(cache, "c", b"c" * 8)
+
+        assert cache.lookup("b") is None
+        assert cache.lookup("a") is not None
+        assert cache.lookup("c") is not None
+        assert cache.stats()["evictions"] == 1
+
+    def test_survives_restart(self, tmp_path):
+        """测试重新创建后从磁盘恢复"""
+        store(ImageCache(str(tmp_path)), "a", b"data")
+
+        reloaded = ImageCache(str(tmp_path))
+
+        assert reloaded.lookup("a")["size"] == 4
+        assert reloaded.stats()["bytes"] == 4
+
+    def test_oversized_image_not_cached(self, tmp_path):
+        """测试超过单张上限时不缓存"""
+        cache = ImageCache(str(tmp_path), max_item_bytes=5)
+
+        assert store(cache, "a", b"0123456789") is None
+        assert cache.lookup("a") is None
+        assert temp_files(cache) == []
+
+    def test_abort_discards_partial_download(self, tmp_path):
+        """测试下载中断时删除临时文件"""
+        cache = ImageCache(str(tmp_path))
+        writer = cache.writer("a", "image/jpeg")
+        writer.write(b"partial")
+
+        writer.abort()
+
+        assert temp_files(cache) == []
+        assert cache.lookup("a") is None
+
+    def test_workers_share_directory(self, tmp_path):
+        """测试另一个 worker 写入的图片可以命中，ref 不会被当作失效删除"""
+        writer_worker = ImageCache(str(tmp_path))
+        reader_worker = ImageCache(str(tmp_path))
+
+        store(writer_worker, "a", b"data")
+
+        assert reader_worker.lookup("a")["size"] == 4
+        assert writer_worker.lookup("a") is not None
+
+    def test_eviction_counts_other_workers_blobs(self, tmp_path):
+        """测试重新扫描后按磁盘上所有 worker 的 blob 计算总字节数"""
+        first = ImageCache(str(tmp_path), max_bytes=20, rescan_interval=0)
+        second = ImageCache(str(tmp_path), max_bytes=20, rescan_interval=0)
+        store(first, "a", b"a" * 8)
+        store(second, "b", b"b" * 8)
+        second.lookup("a")
+
+        store(first, "c", b"c" * 8)
+
+        assert first.lookup("b") is None
+        assert second.lookup("a") is not None
+        assert second.lookup("c") is not None
+
+    def test_disabled_without_directory(self):
+        cache = ImageCache("")
+        writer = cache.writer("a", "image/jpeg")
+        writer.write(b"data")
+
+        assert writer.commit() is None
+        assert cache.lookup("a") is None
+
+
+class TestAllowedImageUrl:
+    """测试图片域名白名单"""
+
+    def test_allowed_hosts(self):
+        assert is_allowed_image_url("https://y.gtimg.cn/music/photo_new/T002.jpg")
+        assert is_allowed_image_url("http://p1.music.126.net/abc.jpg")
+
+    def test_rejected(self):
+        assert not is_allowed_image_url("http://169.254.169.254/latest/meta-data")
+        assert not is_allowed_image_url("file:///etc/passwd")
+        assert not is_allowed_image_url("http://evilmusic.126.net.example.com/a.jpg")
+
+    def test_redirect_target(self):
+        assert (
+            redirect_target("https://y.gtimg.cn/a/1.jpg", "2.jpg")
+            == "https://y.gtimg.cn/a/2.jpg"
+        )
+        with pytest.raises(ImageRedirectError):
+            redirect_target("https://y.gtimg.cn/a.jpg", "http://127.0.0.1/")
+        with pytest.raises(ImageRedirectError):
+            redirect_target("https://y.gtimg.cn/a.jpg", "")
@@ -0,0 +1,147 @@
+"""
+测试 Prometheus 指标
+"""
+
+import os
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(
+    0, str(Path(__file__).parent.parent.parent / "services" / "qqmusic-api")
+)
+
+import metrics
+from metrics import Counter, Gauge, Histogram, Registry
+
+
+class TestMetrics:
+    """测试指标类型和文本格式"""
+
+    def test_counter_render(self):
+        """测试计数器按标签输出"""
+        counter = Counter("requests_total", "Requests", ("route", "status"))
+        counter.inc(route="/song", status="200")
+        counter.inc(route="/song", status="200")
+        counter.inc(route="/song", status="502")
+
+        lines = counter.render()
+
+        assert "# TYPE requests_total counter" in lines
+        assert 'requests_total{route="/song",status="200"} 2' in lines
+        assert 'requests_total{route="/song",status="502"} 1' in lines
+
+    def test_gauge(self):
+        """测试 gauge 增减"""
+        gauge = Gauge("in_flight", "In flight")
+        gauge.inc()
+        gauge.inc()
+        gauge.dec()
+
+        assert gauge.value() == 1
+        assert "in_flight 1" in gauge.render()
+
+    def test_histogram_buckets_cumulative(self):
+        """测试直方图桶为累计计数"""
+        histogram = Histogram("latency", "Latency", ("route",), buckets=(0.1, 1.0))
+        histogram.observe(0.05, route="/song")
+        histogram.observe(0.5, route="/song")
+        histogram.observe(3.0, route="/song")
+
+        lines = histogram.render()
+
+        assert 'latency_bucket{route="/song",le="0.1"} 1' in lines
+        assert 'latency_bucket{route="/song",le="1"} 2' in lines
+        assert 'latency_bucket{route="/song",le="+Inf"} 3' in lines
+        assert 'latency_count{route="/song"} 3' in lines
+        assert 'latency_sum{route="/song"} 3.55' in lines
+
+    def test_registry_collectors(self):
+        """测试导出组件统计"""
+        registry = Registry()
+        registry.add_collector(
+            "cache",
+            metrics.stats_collector("cache", lambda: {"hits": 3, "enabled": True}),
+        )
+
+        text = registry.render()
+
+        assert "cache_hits 3" in text
+        assert "cache_enabled" not in text
+
+    def test_track_upstream(self):
+        """测试上游调用记录耗时和结果"""
+        before = metrics.UPSTREAM_REQUESTS.value(endpoint="test", outcome="error")
+
+        with pytest.raises(RuntimeError):
+            with metrics.track_upstream("test"):
+                assert metrics.UPSTREAM_IN_FLIGHT.value(endpoint="test") == 1
+                raise RuntimeError("timeout")
+
+        assert metrics.UPSTREAM_IN_FLIGHT.value(endpoint="test") == 0
+        assert (
+            metrics.UPSTREAM_REQUESTS.value(endpoint="test", outcome="error")
+            == before + 1
+        )
+        assert metrics.UPSTREAM_LATENCY.count(endpoint="test") >= 1
+
+
+def worker_registry(requests, in_flight):
+    """模拟一个 worker 的指标"""
+    registry = Registry()
+    counter = registry.register(Counter("mp_requests_total", "Requests", ("route",)))
+    counter.inc(requests, route="/song")
+    histogram = registry.register(Histogram("mp_latency", "Latency", buckets=(1.0,)))
+    histogram.observe(0.5)
+    registry.register(Gauge("mp_in_flight", "In flight")).set(in_flight)
+    registry.add_collector(
+        "cache", metrics.stats_collector("mp_cache", lambda: {"size": in_flight})
+    )
+    return registry
+
+
+class TestMultiprocess:
+    """测试多 worker 指标汇总"""
+
+    @pytest.fixture
+    def directory(self, tmp_path):
+        (tmp_path / "101.prom").write_text(worker_registry(3, 1).render())
+        (tmp_path / "102.prom").write_text(worker_registry(4, 2).render())
+        return str(tmp_path)
+
+    def test_counters_summed_gauges_per_worker(self, directory):
+        """测试 counter / histogram 跨 worker 相加，gauge 按 worker 标签分别输出"""
+        lines = metrics.render_multiprocess(directory).splitlines()
+
+        assert 'mp_requests_total{route="/song"} 7' in lines
+        assert lines.count("# TYPE mp_requests_total counter") == 1
+        assert 'mp_latency_bucket{le="1"} 2' in lines
+        assert "mp_latency_count 2" in lines
+        assert 'mp_in_flight{worker="101"} 1' in lines
+        assert 'mp_in_flight{worker="102"} 2' in lines
+        assert 'mp_cache_size{worker="102"} 2' in lines
+        # 处理抓取的 worker 自己的指标也在其中
+        assert (Path(directory) / f"{os.getpid()}.prom").exists()
+
+    def test_dead_worker_counts_archived(self, directory):
+        """测试 worker 退出后计数不回退，它的 gauge 不再输出"""
+        metrics.mark_process_dead(101, directory)
+        lines = metrics.render_multiprocess(directory).splitlines()
+
+        assert not (Path(directory) / "101.prom").exists()
+        assert 'mp_requests_total{route="/song"} 7' in lines
+        assert "mp_latency_count 2" in lines
+        assert 'mp_in_flight{worker="101"} 1' not in lines
+        assert 'mp_in_flight{worker="102"} 2' in lines
+
+        # 同一 pid 的新 worker 从 0 开始计数，与归档相加
+        (Path(directory) / "101.prom").write_text(worker_registry(1, 0).render())
+        lines = metrics.render_multiprocess(directory).splitlines()
+        assert 'mp_requests_total{route="/song"} 8' in lines
+
+    def test_render_without_directory(self, monkeypatch):
+        """测试未设置目录时只输出本进程"""
+        monkeypatch.delenv("METRICS_MULTIPROC_DIR", raising=False)
+
+        assert metrics.render() == metrics.REGISTRY.render()
@@ -0,0 +1,136 @@
+"""
+测试 Rain120 上游替身
+"""
+
+import random
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(
+    0, str(Path(__file__).parent.parent.parent / "services" / "qqmusic-api")
+)
+
+import fastjson
+from mock_upstream import Catalog, LatencyDistribution, MockConfig, create_app
+
+
+@pytest.fixture
+def catalog():
+    return Catalog(size=200, seed=7)
+
+
+def make_client(catalog, sleeps=None, **settings):
+    config = MockConfig({"latency": "none", **settings})
+    sleep = sleeps.append if sleeps is not None else (lambda seconds: None)
+    return create_app(config=config, catalog=catalog, sleep=sleep).test_client()
+
+
+class TestCatalog:
+    """测试曲库生成"""
+
+    def test_deterministic_by_seed(self, catalog):
+        again = Catalog(size=200, seed=7)
+
+        assert [s["mid"] for s in catalog.songs] == [s["mid"] for s in again.songs]
+        assert catalog.songs != Catalog(size=200, seed=8).songs
+
+    def test_search_ranks_title_and_artist(self, catalog):
+        song = catalog.songs[10]
+        keyword = f"{song['name']} {song['singer'][0]['name']}"
+
+        page, total = catalog.search(keyword, 5, 1)
+
+        assert page[0]["mid"] == song["mid"]
+        assert total >= 1
+
+    def test_unknown_mid_is_stable(self, catalog):
+        first = catalog.get("00unknownmid00")
+
+        assert first == catalog.get("00unknownmid00")
+        assert first["mid"] == "00unknownmid00"
+
+
+class TestLatencyDistribution:
+    """测试延迟分布解析"""
+
+    def test_kinds(self):
+        rng = random.Random(1)
+
+        assert LatencyDistribution("fixed:seconds=0.2").sample(rng) == 0.2
+        assert LatencyDistribution("none").sample(rng) == 0.0
+        assert 0.1 <= LatencyDistribution("uniform:low=0.1,high=0.3").sample(rng) <= 0.3
+        assert LatencyDistribution("lognormal:median=0.05,sigma=0.1").sample(rng) > 0
+
+    def test_invalid(self):
+        with pytest.raises(ValueError):
+            LatencyDistribution("pareto:alpha=1")
+
+
+class TestMockRoutes:
+    """测试响应结构和故障注入"""
+
+    def test_response_nesting_matches_upstream(self, catalog):
+        """测试代理使用的提取路径在 mock 响应上都能取到数据"""
+        client = make_client(catalog)
+        song = catalog.songs[0]
+
+        search = client.get(f"/getSearchByKey?key={song['name']}&pageSize=3")
+        detail = client.get(f"/getSongInfo?songmid={song['mid']}")
+        cover = client.get(f"/getImageUrl?id={song['album']['mid']}&size=500x500")
+
+        data = fastjson.extract(search.data, ("response", "data"))
+        assert data["song"]["list"][0]["songmid"] == song["mid"]
+        assert len(data["song"]["list"]) <= 3
+        track = fastjson.extract(detail.data, ("response", "songinfo", "data"))
+        assert track["track_info"]["album"]["pmid"] == song["album"]["mid"]
+        image = fastjson.extract(cover.data, ("response", "data"))
+        assert image["imageUrl"].endswith(f"R500x500M000{song['album']['mid']}.jpg")
+
+    def test_error_and_slow_injection(self, catalog):
+        sleeps = []
+        client = make_client(
+            catalog, sleeps, error_rate=1, error_status=503, slow_rate=1, slow_seconds=2
+        )
+
+        response = client.get("/getSongInfo?songmid=x")
+        stats = client.get("/__mock/stats").get_json()["endpoints"]["song"]
+
+        assert response.status_code == 503
+        assert sleeps == [2]
+        assert stats == {"requests": 1, "errors": 1, "slow": 1}
+
+    def test_payload_padding(self, catalog):
+        client = make_client(catalog, song_payload_bytes=20000)
+
+        response = client.get(f"/getSongInfo?songmid={catalog.songs[0]['mid']}")
+
+        assert len(response.data) >= 20000
+
+    def test_runtime_config(self, catalog):
+        client = make_client(catalog)
+
+        updated = client.post(
+            "/__mock/config", json={"latency_song": "fixed:seconds=1"}
+        )
+
+        assert updated.get_json()["latency_song"] == "fixed:seconds=1"
+        assert client.post("/__mock/config", json={"nope": 1}).status_code == 400
+        assert client.post("/__mock/config", json={"latency": "bad"}).status_code == 400
+
+    def test_local_cover_images(self, catalog):
+        """测试封面图地址指向 mock 自身时可完全离线"""
+        client = make_client(
+            catalog, image_base="http://mock/__mock/image/", image_bytes=500
+        )
+        album_mid = catalog.songs[0]["album"]["mid"]
+
+        cover = client.get(f"/getImageUrl?id={album_mid}")
+        url = fastjson.extract(cover.data, ("response", "data"))["imageUrl"]
+        image = client.get(url.replace("http://mock", ""))
+
+        assert url == f"http://mock/__mock/image/T002R300x300M000{album_mid}.jpg"
+        assert image.content_type == "image/jpeg"
+        assert len(image.data) == 500
+        assert image.data == client.get(url.replace("http://mock", "")).data
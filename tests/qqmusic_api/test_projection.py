@@ -0,0 +1,84 @@
+"""
+测试响应字段投影
+"""
+
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(
+    0, str(Path(__file__).parent.parent.parent / "services" / "qqmusic-api")
+)
+
+from projection import SONG_PROFILES, parse_fields, project
+
+SONG = {
+    "track_info": {
+        "mid": "m1",
+        "name": "不将就",
+        "file": {"size_128mp3": 4000000},
+        "album": {"mid": "album1", "pmid": "album1", "time_public": "2015-01-01"},
+        "singer": [
+            {"mid": "s1", "name": "李荣浩", "type": 0},
+            {"mid": "s2", "name": "某歌手", "type": 0},
+        ],
+    },
+    "extras": {"foo": 1},
+}
+
+
+class TestParseFields:
+    """测试 fields 参数解析"""
+
+    def test_empty_or_all(self):
+        assert parse_fields(None) is None
+        assert parse_fields("") is None
+        assert parse_fields("all") is None
+
+    def test_paths(self):
+        paths = parse_fields("track_info.name, track_info.album.pmid")
+
+        assert paths == [("track_info", "name"), ("track_info", "album", "pmid")]
+
+    def test_profile(self):
+        paths = parse_fields("workflow", SONG_PROFILES)
+
+        assert ("track_info", "album", "pmid") in paths
+
+    def test_invalid_path(self):
+        with pytest.raises(ValueError):
+            parse_fields("track_info..name")
+
+
+class TestProject:
+    """测试按路径投影"""
+
+    def test_nested_and_lists(self):
+        paths = parse_fields(
+            "track_info.name,track_info.album.pmid,track_info.singer.name"
+        )
+
+        assert project(SONG, paths) == {
+            "track_info": {
+                "name": "不将就",
+                "album": {"pmid": "album1"},
+                "singer": [{"name": "李荣浩"}, {"name": "某歌手"}],
+            }
+        }
+
+    def test_prefix_keeps_subtree(self):
+        """测试较短的路径保留整个子树，覆盖更深的路径"""
+        paths = parse_fields("track_info.album.pmid,track_info.album")
+
+        album = project(SONG, paths)["track_info"]["album"]
+
+        assert album == SONG["track_info"]["album"]
+
+    def test_missing_paths_ignored(self):
+        assert project(SONG, parse_fields("track_info.lyric,nope.x")) == {
+            "track_info": {}
+        }
+
+    def test_no_projection(self):
+        assert project(SONG, None) is SONG
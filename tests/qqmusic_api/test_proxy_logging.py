@@ -0,0 +1,72 @@
+"""
+测试代理日志
+"""
+
+import logging
+import sys
+from pathlib import Path
+
+sys.path.insert(
+    0, str(Path(__file__).parent.parent.parent / "services" / "qqmusic-api")
+)
+
+from proxy_logging import log_payload
+
+
+class RecordingHandler(logging.Handler):
+    def __init__(self):
+        super().__init__()
+        self.messages = []
+
+    def emit(self, record):
+        self.messages.append(record.getMessage())
+
+
+def make_logger(level):
+    logger = logging.getLogger(f"test_proxy_logging.{level}")
+    logger.setLevel(level)
+    logger.propagate = False
+    logger.handlers = []
+    handler = RecordingHandler()
+    logger.addHandler(handler)
+    return logger, handler
+
+
+class TestLogPayload:
+    """测试上游响应体日志"""
+
+    def test_skipped_above_debug(self):
+        """测试 INFO 级别不记录响应体"""
+        logger, handler = make_logger(logging.INFO)
+
+        log_payload(logger, "Response", "{}")
+
+        assert handler.messages == []
+
+    def test_truncates_payload(self, monkeypatch):
+        """测试响应体截断"""
+        monkeypatch.setenv("LOG_PAYLOAD_MAX_CHARS", "10")
+        logger, handler = make_logger(logging.DEBUG)
+
+        log_payload(logger, "Response", "x" * 100)
+
+        assert handler.messages == ["Response: xxxxxxxxxx... (100 chars)"]
+
+    def test_truncates_bytes_payload(self, monkeypatch):
+        """测试字节响应体只解码截断后的部分"""
+        monkeypatch.setenv("LOG_PAYLOAD_MAX_CHARS", "3")
+        logger, handler = make_logger(logging.DEBUG)
+
+        log_payload(logger, "Response", "歌词歌词歌词".encode("utf-8"))
+
+        assert handler.messages == ["Response: 歌词歌... (18 bytes)"]
+
+    def test_sampling(self, monkeypatch):
+        """测试采样比例为 0 时不记录"""
+        monkeypatch.setenv("LOG_PAYLOAD_SAMPLE_RATE", "0")
+        logger, handler = make_logger(logging.DEBUG)
+
+        for _ in range(20):
+            log_payload(logger, "Response", "{}")
+
+        assert handler.messages == []
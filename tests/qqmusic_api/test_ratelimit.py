@@ -0,0 +1,168 @@
+"""
+测试上游出站令牌桶限流
+"""
+
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(
+    0, str(Path(__file__).parent.parent.parent / "services" / "qqmusic-api")
+)
+
+from disk_cache import DiskCache
+from ratelimit import RateLimited, TokenBucket, UpstreamRateLimiter
+from resilience import UpstreamUnavailable
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class TestTokenBucket:
+    """测试令牌桶"""
+
+    def test_burst_then_wait(self):
+        """测试突发容量用完后按速率排队"""
+        bucket = TokenBucket(rate=2, burst=3, clock=FakeClock())
+
+        waits = [bucket.reserve(max_wait=10)[1] for _ in range(5)]
+
+        assert waits[:3] == [0.0, 0.0, 0.0]
+        assert waits[3] == pytest.approx(0.5)
+        assert waits[4] == pytest.approx(1.0)
+
+    def test_refill_over_time(self):
+        """测试令牌按时间补充且不超过突发容量"""
+        clock = FakeClock()
+        bucket = TokenBucket(rate=1, burst=2, clock=clock)
+        bucket.reserve(10)
+        bucket.reserve(10)
+
+        clock.now = 100.0
+
+        assert bucket.reserve(10) == (True, 0.0)
+        assert bucket.reserve(10) == (True, 0.0)
+        assert bucket.reserve(10)[1] == pytest.approx(1.0)
+
+    def test_rejects_beyond_max_wait(self):
+        """测试预计等待超过上限时拒绝且不占用令牌"""
+        bucket = TokenBucket(rate=1, burst=1, clock=FakeClock())
+        bucket.reserve(10)
+
+        granted, wait = bucket.reserve(max_wait=0.5)
+
+        assert granted is False
+        assert wait == pytest.approx(1.0)
+        assert bucket.reserve(max_wait=1.0) == (True, pytest.approx(1.0))
+        assert bucket.stats()["rejected"] == 1
+
+    def test_zero_rate_is_unlimited(self):
+        """测试速率为 0 表示不限流"""
+        bucket = TokenBucket(rate=0, burst=1, clock=FakeClock())
+
+        assert all(bucket.reserve(0) == (True, 0.0) for _ in range(100))
+
+
+class TestUpstreamRateLimiter:
+    """测试按端点分桶的限流器"""
+
+    def test_endpoints_share_bucket_by_kind(self, monkeypatch):
+        """测试搜索和详情分别计数"""
+        monkeypatch.setenv("QQMUSIC_RATE_SEARCH", "1")
+        monkeypatch.setenv("QQMUSIC_BURST_SEARCH", "1")
+        limiter = UpstreamRateLimiter(max_wait=0)
+
+        assert limiter.reserve("getSearchByKey") == 0.0
+        assert limiter.reserve("getSongInfo") == 0.0
+        with pytest.raises(RateLimited) as exc_info:
+            limiter.reserve("getSearchByKey")
+
+        assert isinstance(exc_info.value, UpstreamUnavailable)
+        assert exc_info.value.reason == "rate_limited"
+        assert exc_info.value.retry_after > 0
+
+    def test_unknown_endpoint_not_limited(self):
+        """测试未分桶的端点不限流"""
+        limiter = UpstreamRateLimiter(max_wait=0)
+
+        assert limiter.reserve("getLyric") == 0.0
+
+    def test_configure_at_runtime(self):
+        """测试运行时调整速率"""
+        limiter = UpstreamRateLimiter()
+
+        limiter.configure({"cover": {"rate": 1, "burst": 2}, "max_wait": 3})
+
+        stats = limiter.stats()
+        assert stats["max_wait"] == 3.0
+        assert stats["buckets"]["cover"]["rate"] == 1.0
+        assert stats["buckets"]["cover"]["burst"] == 2.0
+
+    def test_configure_rejects_unknown_bucket(self):
+        """测试未知的桶名"""
+        limiter = UpstreamRateLimiter()
+
+        with pytest.raises(ValueError):
+            limiter.configure({"lyric": {"rate": 1}})
+
+    def test_configure_is_all_or_nothing(self):
+        """测试配置中有无效项时不应用任何修改"""
+        limiter = UpstreamRateLimiter(max_wait=10)
+        before = limiter.stats()
+
+        with pytest.raises(ValueError):
+            limiter.configure(
+                {"search": {"rate": 1}, "max_wait": 2, "lyric": {"rate": 1}}
+            )
+        with pytest.raises(ValueError):
+            limiter.configure({"detail": {"rate": "fast"}})
+
+        assert limiter.stats() == before
+
+
+class TestSharedRateLimit:
+    """测试通过磁盘缓存在多个 worker 之间共享限流配置"""
+
+    def test_other_worker_syncs_within_interval(self, tmp_path):
+        """测试其他 worker 在同步间隔后应用新配置"""
+        path = str(tmp_path / "cache.sqlite3")
+        clock = FakeClock()
+        first = UpstreamRateLimiter(store=DiskCache(path), clock=clock)
+        second = UpstreamRateLimiter(store=DiskCache(path), clock=clock)
+        second.reserve("getSongInfo")
+
+        first.configure({"detail": {"rate": 1, "burst": 2}, "max_wait": 3})
+        second.reserve("getSongInfo")
+        assert second.stats()["buckets"]["detail"]["rate"] == 10.0
+
+        clock.now += 1
+        second.reserve("getSongInfo")
+        stats = second.stats()
+        assert stats["max_wait"] == 3.0
+        assert stats["buckets"]["detail"]["rate"] == 1.0
+        assert stats["buckets"]["detail"]["burst"] == 2.0
+
+    def test_new_worker_picks_up_settings(self, tmp_path):
+        """测试重启后的 worker 使用已保存的配置"""
+        path = str(tmp_path / "cache.sqlite3")
+        UpstreamRateLimiter(store=DiskCache(path)).configure({"cover": {"rate": 4}})
+
+        restarted = UpstreamRateLimiter(store=DiskCache(path))
+        restarted.reserve("getImageUrl")
+
+        assert restarted.stats()["buckets"]["cover"]["rate"] == 4.0
+
+    def test_without_store_only_local(self):
+        """测试未启用磁盘缓存时只修改当前进程"""
+        limiter = UpstreamRateLimiter(store=DiskCache(path=""))
+
+        limiter.configure({"search": {"rate": 1}})
+
+        assert limiter.stats()["shared"] is False
+        assert limiter.stats()["buckets"]["search"]["rate"] == 1.0
@@ -0,0 +1,197 @@
+"""
+测试上游熔断器和自适应并发上限
+"""
+
+import sys
+from pathlib import Path
+
+import pytest
+import requests
+
+sys.path.insert(
+    0, str(Path(__file__).parent.parent.parent / "services" / "qqmusic-api")
+)
+
+from resilience import (
+    CLOSED,
+    HALF_OPEN,
+    OPEN,
+    AdaptiveLimiter,
+    CircuitBreaker,
+    UpstreamGuard,
+    UpstreamUnavailable,
+    is_upstream_failure,
+)
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def make_breaker(clock=None):
+    return CircuitBreaker(
+        "getSongInfo",
+        window=10,
+        min_calls=4,
+        error_rate=0.5,
+        slow_call_seconds=1.0,
+        slow_rate=0.8,
+        open_seconds=30,
+        clock=clock or FakeClock(),
+    )
+
+
+class TestCircuitBreaker:
+    """测试熔断器"""
+
+    def test_opens_on_error_rate(self):
+        """测试错误率超过阈值时打开"""
+        breaker = make_breaker()
+        for failed in (False, True, False, True):
+            breaker.allow()
+            breaker.record(0.1, failed)
+
+        assert breaker.state == OPEN
+        with pytest.raises(UpstreamUnavailable) as exc_info:
+            breaker.allow()
+        assert exc_info.value.reason == "circuit_open"
+        assert exc_info.value.retry_after == 30
+
+    def test_opens_on_slow_calls(self):
+        """测试慢调用比例超过阈值时打开"""
+        breaker = make_breaker()
+        for _ in range(4):
+            breaker.allow()
+            breaker.record(2.0, failed=False)
+
+        assert breaker.state == OPEN
+
+    def test_stays_closed_below_min_calls(self):
+        """测试调用数不足时不打开"""
+        breaker = make_breaker()
+        for _ in range(3):
+            breaker.allow()
+            breaker.record(0.1, failed=True)
+
+        assert breaker.state == CLOSED
+
+    def test_half_open_probe(self):
+        """测试到期后只放行一个探测请求，成功后关闭"""
+        clock = FakeClock()
+        breaker = make_breaker(clock)
+        for _ in range(4):
+            breaker.allow()
+            breaker.record(0.1, failed=True)
+
+        clock.now = 31
+        breaker.allow()
+        assert breaker.state == HALF_OPEN
+        with pytest.raises(UpstreamUnavailable):
+            breaker.allow()
+
+        breaker.record(0.1, failed=False)
+        assert breaker.state == CLOSED
+
+    def test_half_open_probe_failure_reopens(self):
+        """测试探测失败重新打开"""
+        clock = FakeClock()
+        breaker = make_breaker(clock)
+        for _ in range(4):
+            breaker.allow()
+            breaker.record(0.1, failed=True)
+
+        clock.now = 31
+        breaker.allow()
+        breaker.record(0.1, failed=True)
+
+        assert breaker.state == OPEN
+        assert breaker.stats()["opened"] == 2
+
+    def test_client_errors_not_counted(self):
+        """测试上游 4xx 不计为故障"""
+        response = requests.Response()
+        response.status_code = 404
+        client_error = requests.HTTPError(response=response)
+        response_5xx = requests.Response()
+        response_5xx.status_code = 503
+
+        assert is_upstream_failure(client_error) is False
+        assert is_upstream_failure(requests.HTTPError(response=response_5xx)) is True
+        assert is_upstream_failure(requests.Timeout()) is True
+
+
+class TestAdaptiveLimiter:
+    """测试 AIMD 自适应并发上限"""
+
+    def test_rejects_at_limit(self):
+        """测试达到上限时拒绝"""
+        limiter = AdaptiveLimiter(initial=2, minimum=1, maximum=10)
+        limiter.acquire("getSongInfo")
+        limiter.acquire("getSongInfo")
+
+        with pytest.raises(UpstreamUnavailable) as exc_info:
+            limiter.acquire("getSongInfo")
+        assert exc_info.value.reason == "concurrency_limit"
+
+    def test_additive_increase(self):
+        """测试成功时缓慢增加"""
+        limiter = AdaptiveLimiter(initial=4, minimum=1, maximum=10, latency_target=1)
+        for _ in range(4):
+            limiter.acquire("e")
+            limiter.release(0.1, failed=False)
+
+        assert limiter.stats()["limit"] == 4
+        assert limiter.limit > 4.9
+
+    def test_multiplicative_decrease(self):
+        """测试失败或变慢时减半，冷却期内只减一次"""
+        clock = FakeClock()
+        limiter = AdaptiveLimiter(
+            initial=16, minimum=2, maximum=32, latency_target=1, clock=clock
+        )
+        limiter.acquire("e")
+        limiter.release(0.1, failed=True)
+        limiter.acquire("e")
+        limiter.release(5.0, failed=False)
+
+        assert limiter.stats()["limit"] == 8
+
+        clock.now = 2
+        limiter.acquire("e")
+        limiter.release(5.0, failed=False)
+        assert limiter.stats()["limit"] == 4
+
+
+class TestUpstreamGuard:
+    """测试组合的上游保护"""
+
+    def test_call_records_outcome(self):
+        """测试包裹调用后释放并发名额"""
+        guard = UpstreamGuard(
+            limiter=AdaptiveLimiter(initial=4, minimum=1, maximum=8),
+            window=10,
+            min_calls=2,
+            error_rate=0.5,
+        )
+
+        with pytest.raises(requests.ConnectionError):
+            with guard.call("getSongInfo"):
+                raise requests.ConnectionError("refused")
+        with pytest.raises(requests.ConnectionError):
+            with guard.call("getSongInfo"):
+                raise requests.ConnectionError("refused")
+
+        stats = guard.stats()
+        assert stats["limiter"]["in_flight"] == 0
+        assert stats["breakers"]["getSongInfo"]["state"] == OPEN
+        with pytest.raises(UpstreamUnavailable):
+            with guard.call("getSongInfo"):
+                pass
+
+        # 其他端点不受影响
+        with guard.call("getImageUrl"):
+            pass
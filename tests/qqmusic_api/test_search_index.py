@@ -0,0 +1,118 @@
+"""
+测试本地搜索索引
+"""
+
+import sys
+from pathlib import Path
+
+sys.path.insert(
+    0, str(Path(__file__).parent.parent.parent / "services" / "qqmusic-api")
+)
+
+from search_index import (
+    LOCAL,
+    LOCAL_PARTIAL,
+    UPSTREAM,
+    SearchIndex,
+    index_terms,
+    search_source,
+)
+
+
+def song(songmid, name, *singers):
+    return {
+        "songmid": songmid,
+        "songname": name,
+        "singer": [{"name": s} for s in singers],
+    }
+
+
+def search_data(*items):
+    return {"song": {"list": list(items)}}
+
+
+class TestSearchIndex:
+    """测试倒排索引"""
+
+    def test_terms_include_bigrams(self):
+        """测试索引项包含规范化后的词和字符二元组"""
+        assert index_terms("周杰伦 ＬＩＶＥ") == {
+            "周杰伦",
+            "周杰",
+            "杰伦",
+            "live",
+            "li",
+            "iv",
+            "ve",
+        }
+        assert index_terms("(晴)") == {"晴"}
+
+    def test_traditional_and_simplified_match(self):
+        """测试繁体 / 全角写法与简体查询命中同一条目"""
+        index = SearchIndex(max_entries=10, min_score=0.8)
+        index.add(search_data(song("a", "後來", "劉若英")))
+
+        ranked = index.search("后来 刘若英")
+
+        assert ranked[0][0] == 1.0
+        assert index_terms("後來，劉若英") == index_terms("后来,刘若英")
+
+    def test_exact_title_ranks_above_versions(self):
+        """测试版本说明降低置信度，原版排在前面"""
+        index = SearchIndex(max_entries=10, min_score=0.8)
+        index.add(
+            search_data(
+                song("live", "晴天 (Live)", "周杰伦"),
+                song("original", "晴天", "周杰伦"),
+            )
+        )
+
+        ranked = index.search("周杰伦 晴天")
+
+        assert [item["songmid"] for _, item in ranked] == ["original", "live"]
+        assert ranked[0][0] == 1.0
+        assert ranked[1][0] < 0.8
+
+    def test_lookup_requires_confidence(self):
+        """测试置信度不足时返回 None，达标时返回 response.data 结构"""
+        index = SearchIndex(max_entries=10, min_score=0.8)
+        index.add(search_data(song("a", "晴天", "周杰伦")))
+
+        assert index.lookup("晴天") is None
+        data = index.lookup("晴天 周杰伦")
+        assert data["song"]["list"] == [song("a", "晴天", "周杰伦")]
+        assert data["song"]["totalnum"] == 1
+        assert index.lookup("晴天 周杰伦", page_no=2) is None
+        assert index.stats()["hits"] == 1
+        assert index.stats()["partial_hits"] == 1
+        assert index.stats()["misses"] == 2
+
+    def test_partial_page(self):
+        """测试达标条目不足一页时 search_source 为 LOCAL-PARTIAL，full_page 时返回 None"""
+        index = SearchIndex(max_entries=10, min_score=0.8)
+        index.add(search_data(song("a", "晴天", "周杰伦")))
+
+        assert search_source(index.lookup("晴天 周杰伦", page_size=1), 1) == LOCAL
+        assert search_source(index.lookup("晴天 周杰伦"), 10) == LOCAL_PARTIAL
+        assert index.lookup("晴天 周杰伦", full_page=True) is None
+        assert search_source(None, 10) == UPSTREAM
+
+    def test_update_and_eviction(self):
+        """测试同一 songmid 更新后旧索引项失效，超过上限淘汰最久未见的条目"""
+        index = SearchIndex(max_entries=2, min_score=0.8)
+        index.add(search_data(song("a", "晴天", "周杰伦"), song("b", "稻香", "周杰伦")))
+        index.add(search_data(song("a", "七里香", "周杰伦")))
+        index.add(search_data(song("c", "夜曲", "周杰伦")))
+
+        assert index.lookup("晴天 周杰伦") is None
+        assert index.lookup("七里香 周杰伦")["song"]["list"][0]["songmid"] == "a"
+        assert index.lookup("稻香 周杰伦") is None
+        assert index.stats()["entries"] == 2
+        assert index.stats()["evictions"] == 1
+
+    def test_disabled(self):
+        """测试上限为 0 时禁用"""
+        index = SearchIndex(max_entries=0)
+
+        assert index.add(search_data(song("a", "晴天", "周杰伦"))) == 0
+        assert index.lookup("晴天 周杰伦") is None
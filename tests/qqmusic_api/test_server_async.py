@@ -0,0 +1,326 @@
+"""
+测试 QQ 音乐 API 代理服务器异步 (ASGI) 模式
+"""
+
+import asyncio
+import json
+import sys
+import time
+from pathlib import Path
+
+import pytest
+
+httpx = pytest.importorskip("httpx")
+pytest.importorskip("starlette")
+
+sys.path.insert(
+    0, str(Path(__file__).parent.parent.parent / "services" / "qqmusic-api")
+)
+
+from starlette.testclient import TestClient
+
+import server_async
+
+
+class FakeResponse:
+    def __init__(self, payload):
+        self.payload = payload
+        self.text = json.dumps(payload)
+        self._content = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        self.content_reads = 0
+        self.json_calls = 0
+
+    @property
+    def content(self):
+        self.content_reads += 1
+        return self._content
+
+    def json(self):
+        self.json_calls += 1
+        return self.payload
+
+
+class FakeAsyncUpstream:
+    """记录调用次数的假异步上游"""
+
+    def __init__(self, delay=0.0, fail=False):
+        self.calls = []
+        self.delay = delay
+        self.fail = fail
+
+    async def get(self, endpoint, params):
+        self.calls.append((endpoint, dict(params)))
+        await asyncio.sleep(self.delay)
+        if self.fail:
+            raise httpx.ConnectError("connection refused")
+        if endpoint == "getSongInfo":
+            return FakeResponse(
+                {
+                    "response": {
+                        "songinfo": {"data": {"track_info": {"mid": params["songmid"]}}}
+                    }
+                }
+            )
+        if endpoint == "getSearchByKey":
+            return FakeResponse(
+                {"response": {"data": {"song": {"list": [{"songmid": "m1"}]}}}}
+            )
+        return FakeResponse({"response": {"data": {"imageUrl": "http://img/x.jpg"}}})
+
+    def pool_info(self):
+        return {}
+
+    async def close(self):
+        pass
+
+
+@pytest.fixture
+def fake_upstream(monkeypatch):
+    fake = FakeAsyncUpstream()
+    monkeypatch.setattr(server_async, "upstream", fake)
+    server_async.song_cache.clear()
+    return fake
+
+
+@pytest.fixture
+def client(fake_upstream):
+    return TestClient(server_async.app)
+
+
+class TestAsyncRoutes:
+    """测试异步模式路由与同步模式保持一致"""
+
+    def test_index(self, client):
+        """测试健康检查"""
+        body = client.get("/").json()
+
+        assert body["status"] == "ok"
+        assert body["mode"] == "asgi"
+
+    def test_search(self, client):
+        """测试搜索返回 response.data"""
+        response = client.get("/search?key=不将就")
+
+        assert response.status_code == 200
+        assert response.json()["song"]["list"][0]["songmid"] == "m1"
+
+    def test_fields_projection(self, client):
+        """测试 fields 投影与同步模式一致"""
+        song = client.get("/song?songmid=abc&fields=track_info.mid").json()
+        search = client.get("/search?key=不将就&fields=song.list.songmid").json()
+        batch = client.get("/songs?songmids=a&fields=track_info.mid").json()
+
+        assert song == {"track_info": {"mid": "abc"}}
+        assert search == {"song": {"list": [{"songmid": "m1"}]}}
+        assert batch["songs"]["a"]["data"] == {"track_info": {"mid": "a"}}
+        assert client.get("/song?songmid=abc&fields=.").status_code == 400
+
+    def test_search_local(self, monkeypatch, fake_upstream, client):
+        """测试 local=1 时命中本地索引不请求上游"""
+        monkeypatch.setattr(server_async, "search_index", server_async.SearchIndex())
+        server_async.search_index.add(
+            {"song": {"list": [{"songmid": "m1", "songname": "不将就"}]}}
+        )
+
+        response = client.get("/search?key=不将就&local=1&pageSize=1")
+
+        assert response.headers["X-Search-Source"] == "LOCAL"
+        assert response.json()["song"]["list"][0]["songmid"] == "m1"
+        assert fake_upstream.calls == []
+        # 不足一页：local=1 标明 LOCAL-PARTIAL，local=full 请求上游
+        partial = client.get("/search?key=不将就&local=1")
+        assert partial.headers["X-Search-Source"] == "LOCAL-PARTIAL"
+        assert fake_upstream.calls == []
+        full = client.get("/search?key=不将就&local=full")
+        assert full.headers["X-Search-Source"] == "UPSTREAM"
+        assert len(fake_upstream.calls) == 1
+
+    def test_disk_cache_off_event_loop(self, monkeypatch, client):
+        """测试磁盘缓存（SQLite）读写不在事件循环线程中执行"""
+        calls = []
+
+        class RecordingDiskCache:
+            enabled = True
+
+            def _record(self, name):
+                try:
+                    asyncio.get_running_loop()
+                    calls.append((name, "loop"))
+                except RuntimeError:
+                    calls.append((name, "thread"))
+
+            def get(self, endpoint, params):
+                self._record("get")
+
+            def set(self, endpoint, params, value):
+                self._record("set")
+
+        monkeypatch.setattr(server_async, "disk_cache", RecordingDiskCache())
+
+        assert client.get("/search?key=不将就").status_code == 200
+        assert calls == [("get", "thread"), ("set", "thread")]
+
+    def test_search_missing_key(self, client):
+        """测试缺少搜索关键词"""
+        assert client.get("/search").status_code == 400
+
+    def test_song_cached(self, fake_upstream, client):
+        """测试歌曲详情缓存"""
+        first = client.get("/song?songmid=abc")
+        second = client.get("/song?songmid=abc")
+
+        assert first.headers["X-Cache"] == "MISS"
+        assert second.headers["X-Cache"] == "HIT"
+        assert second.json()["track_info"]["mid"] == "abc"
+        assert len(fake_upstream.calls) == 1
+
+    def test_cover(self, client):
+        """测试封面图 URL"""
+        assert client.get("/cover?id=pmid").json()["imageUrl"] == "http://img/x.jpg"
+
+    def test_upstream_error(self, monkeypatch, client):
+        """测试上游失败返回 502"""
+        monkeypatch.setattr(server_async, "upstream", FakeAsyncUpstream(fail=True))
+
+        response = client.get("/song?songmid=abc")
+
+        assert response.status_code == 502
+        assert "上游 API 调用失败" in response.json()["error"]
+
+    def test_track(self, fake_upstream, client):
+        """测试组合接口并发获取详情和封面"""
+        body = client.get("/track?title=不将就&artists=李荣浩").json()
+
+        assert body["match_found"] is True
+        assert body["match_id"] == "m1"
+        assert body["cover_url"] == ""
+        assert [e for e, _ in fake_upstream.calls] == ["getSearchByKey", "getSongInfo"]
+
+    def test_track_crosswalk(self, monkeypatch, fake_upstream, client, tmp_path):
+        """测试对照表命中时跳过搜索"""
+        crosswalk = server_async.Crosswalk(path=str(tmp_path / "crosswalk.sqlite3"))
+        monkeypatch.setattr(server_async, "crosswalk", crosswalk)
+        crosswalk.record("42", {"songmid": "m1", "songname": "不将就", "score": 1.0})
+        monkeypatch.setattr(
+            server_async,
+            "detail_candidate",
+            lambda song_data: {"songname": "不将就", "singer": [{"name": "李荣浩"}]},
+        )
+
+        response = client.get("/track?title=不将就&artists=李荣浩&netease_id=42")
+
+        assert response.headers["X-Crosswalk"] == "HIT"
+        assert response.json()["match_id"] == "m1"
+        assert [e for e, _ in fake_upstream.calls] == ["getSongInfo"]
+        assert client.get("/crosswalk/42").json()["songmid"] == "m1"
+
+    def test_etag_not_modified(self, client):
+        """测试 ETag / 304 协商"""
+        etag = client.get("/song?songmid=abc").headers["ETag"]
+
+        response = client.get("/song?songmid=abc", headers={"If-None-Match": etag})
+
+        assert response.status_code == 304
+        assert response.headers["ETag"] == etag
+        assert response.headers["Cache-Control"].startswith("public, max-age=")
+
+    def test_cover_image_cached(self, monkeypatch, tmp_path, client):
+        """测试封面图片流式转发并写入本地缓存"""
+        requested = []
+
+        def handler(request):
+            requested.append(str(request.url))
+            return httpx.Response(
+                200, content=b"image-bytes", headers={"content-type": "image/jpeg"}
+            )
+
+        monkeypatch.setattr(
+            server_async,
+            "image_client",
+            httpx.AsyncClient(transport=httpx.MockTransport(handler)),
+        )
+        monkeypatch.setattr(
+            server_async, "image_cache", server_async.ImageCache(str(tmp_path))
+        )
+        url = "/cover/image?url=https://y.gtimg.cn/a.jpg"
+
+        first = client.get(url)
+        second = client.get(url)
+
+        assert first.headers["x-cache"] == "MISS"
+        assert second.headers["x-cache"] == "HIT"
+        assert second.content == b"image-bytes"
+        assert requested == ["https://y.gtimg.cn/a.jpg"]
+
+    def test_cover_image_redirect_checked(self, monkeypatch, tmp_path, client):
+        """测试重定向逐跳校验域名白名单"""
+        requested = []
+
+        def handler(request):
+            requested.append(str(request.url))
+            if request.url.path == "/a.jpg":
+                return httpx.Response(302, headers={"location": "/b.jpg"})
+            if request.url.path == "/b.jpg":
+                return httpx.Response(
+                    302, headers={"location": "http://169.254.169.254/latest"}
+                )
+            return httpx.Response(200, content=b"secret")
+
+        monkeypatch.setattr(
+            server_async,
+            "image_client",
+            httpx.AsyncClient(transport=httpx.MockTransport(handler)),
+        )
+        monkeypatch.setattr(
+            server_async, "image_cache", server_async.ImageCache(str(tmp_path))
+        )
+
+        response = client.get("/cover/image?url=https://y.gtimg.cn/a.jpg")
+
+        assert response.status_code == 502
+        assert requested == ["https://y.gtimg.cn/a.jpg", "https://y.gtimg.cn/b.jpg"]
+
+    def test_songs_batch(self, client):
+        """测试批量接口"""
+        body = client.get("/songs?songmids=a,b").json()
+
+        assert body["success_count"] == 2
+        assert body["songs"]["b"]["data"]["track_info"]["mid"] == "b"
+
+    def test_warm(self, fake_upstream, client):
+        """测试预热任务在后台执行"""
+        with client:
+            job = client.post("/warm", json={"songmids": ["a"], "rate": 1000}).json()
+            for _ in range(100):
+                status = client.get(f"/warm/{job['id']}").json()
+                if status["state"] == "done":
+                    break
+                time.sleep(0.01)
+
+            assert status["fetched"] == 1
+            assert client.get("/song?songmid=a").headers["X-Cache"] == "HIT"
+
+    def test_metrics(self, client):
+        """测试指标中间件记录请求"""
+        client.get("/song?songmid=abc")
+
+        text = client.get("/metrics").text
+
+        assert 'qqmusic_proxy_requests_total{route="/song",status="200"}' in text
+        assert "qqmusic_proxy_in_flight_requests 0" in text
+
+    def test_concurrent_requests_coalesced(self, monkeypatch):
+        """测试并发的相同请求只调用一次上游"""
+        fake = FakeAsyncUpstream(delay=0.05)
+        monkeypatch.setattr(server_async, "upstream", fake)
+        server_async.song_cache.clear()
+
+        async def run():
+            return await asyncio.gather(
+                *(server_async.load_song("same") for _ in range(20))
+            )
+
+        results = asyncio.run(run())
+
+        assert len(fake.calls) == 1
+        assert all(data["track_info"]["mid"] == "same" for data, _ in results)
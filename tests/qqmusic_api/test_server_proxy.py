@@ -0,0 +1,802 @@
+"""
+测试 QQ 音乐 API 代理服务器路由
+"""
+
+import gzip
+import importlib.util
+import json
+import sys
+from pathlib import Path
+
+import pytest
+import requests
+
+SERVICE_DIR = Path(__file__).parent.parent.parent / "services" / "qqmusic-api"
+sys.path.insert(0, str(SERVICE_DIR))
+
+from resilience import UpstreamUnavailable
+
+
+def load_proxy_module():
+    """加载 server-proxy.py（文件名含连字符，无法直接 import）"""
+    spec = importlib.util.spec_from_file_location(
+        "server_proxy", SERVICE_DIR / "server-proxy.py"
+    )
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+class FakeResponse:
+    def __init__(self, payload):
+        self.payload = payload
+        self.text = json.dumps(payload)
+        self._content = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        self.content_reads = 0
+        self.json_calls = 0
+
+    @property
+    def content(self):
+        self.content_reads += 1
+        return self._content
+
+    def json(self):
+        self.json_calls += 1
+        return self.payload
+
+
+class FakeUpstream:
+    """记录调用次数的假上游"""
+
+    def __init__(
+        self,
+        fail=False,
+        fail_songmids=(),
+        unavailable=False,
+        search_results=None,
+        singers=None,
+    ):
+        self.calls = []
+        self.singers = singers
+        self.search_results = (
+            search_results if search_results is not None else [{"songmid": "m1"}]
+        )
+        self.fail = fail
+        self.unavailable = unavailable
+        self.fail_songmids = set(fail_songmids)
+        self.responses = []
+
+    def get(self, endpoint, params):
+        self.calls.append((endpoint, dict(params)))
+        if self.unavailable:
+            raise UpstreamUnavailable(endpoint, "circuit_open", 12.5)
+        if self.fail or params.get("songmid") in self.fail_songmids:
+            raise requests.ConnectionError("connection refused")
+        response = self._respond(endpoint, params)
+        self.responses.append(response)
+        return response
+
+    def _respond(self, endpoint, params):
+        if endpoint == "getSongInfo":
+            track_info = {
+                "mid": params["songmid"],
+                "name": "不将就",
+                "interval": 260,
+                "album": {
+                    "id": 1,
+                    "mid": "album1",
+                    "name": "不将就",
+                    "pmid": "album1",
+                },
+            }
+            if self.singers is not None:
+                track_info["singer"] = [{"name": name} for name in self.singers]
+            return FakeResponse(
+                {"response": {"songinfo": {"data": {"track_info": track_info}}}}
+            )
+        if endpoint == "getSearchByKey":
+            return FakeResponse(
+                {"response": {"data": {"song": {"list": self.search_results}}}}
+            )
+        return FakeResponse(
+            {"response": {"data": {"imageUrl": f"http://img/{params['id']}.jpg"}}}
+        )
+
+    def pool_info(self):
+        return {}
+
+
+@pytest.fixture
+def proxy():
+    module = load_proxy_module()
+    module.upstream = FakeUpstream()
+    module.song_cache.clear()
+    return module
+
+
+@pytest.fixture
+def client(proxy):
+    return proxy.app.test_client()
+
+
+class TestSongRoute:
+    """测试 /song 路由"""
+
+    def test_song_cached_by_songmid(self, proxy, client):
+        """测试相同 songmid 只请求一次上游"""
+        first = client.get("/song?songmid=abc")
+        second = client.get("/song?songmid=abc")
+
+        assert first.status_code == 200
+        assert first.headers["X-Cache"] == "MISS"
+        assert second.headers["X-Cache"] == "HIT"
+        assert second.get_json()["track_info"]["mid"] == "abc"
+        assert len(proxy.upstream.calls) == 1
+
+    def test_disk_cache_survives_memory_clear(self, proxy, client, tmp_path):
+        """测试内存缓存清空（模拟重启）后从磁盘缓存返回"""
+        proxy.disk_cache = proxy.DiskCache(path=str(tmp_path / "proxy.sqlite3"))
+        proxy.song_cache.backing = proxy.disk_cache.tier(
+            "getSongInfo", lambda songmid: {"songmid": songmid}
+        )
+        client.get("/song?songmid=abc")
+        proxy.song_cache.clear()
+
+        response = client.get("/song?songmid=abc")
+
+        assert response.headers["X-Cache"] == "DISK"
+        assert response.get_json()["track_info"]["mid"] == "abc"
+        assert len(proxy.upstream.calls) == 1
+
+    def test_upstream_body_decoded_once(self, proxy, client):
+        """测试每个请求只读取一次上游响应体，直接从字节中提取子树"""
+        client.get("/song?songmid=abc")
+        client.get("/search?key=abc")
+        client.get("/cover?id=abc")
+
+        assert [r.content_reads for r in proxy.upstream.responses] == [1, 1, 1]
+        assert [r.json_calls for r in proxy.upstream.responses] == [0, 0, 0]
+
+    def test_song_fields_projection(self, proxy, client):
+        """测试 fields 只返回请求的字段，缓存仍保存完整数据"""
+        response = client.get(
+            "/song?songmid=abc&fields=track_info.name,track_info.album.pmid"
+        )
+        full = client.get("/song?songmid=abc")
+
+        assert response.get_json() == {
+            "track_info": {"name": "不将就", "album": {"pmid": "album1"}}
+        }
+        assert full.headers["X-Cache"] == "HIT"
+        assert full.get_json()["track_info"]["interval"] == 260
+
+    def test_song_fields_profile(self, client):
+        """测试 workflow 预设和无效路径"""
+        body = client.get("/song?songmid=abc&fields=workflow").get_json()
+
+        assert set(body["track_info"]) == {"mid", "name", "interval", "album"}
+        assert client.get("/song?songmid=abc&fields=a..b").status_code == 400
+
+    def test_search_fields_profile(self, proxy, client):
+        """测试搜索结果按 workflow 预设投影"""
+        proxy.upstream = FakeUpstream(search_results=TRACK_SEARCH_RESULTS)
+
+        body = client.get("/search?key=不将就&fields=workflow").get_json()
+
+        assert body["song"]["list"][0]["singer"] == [{"name": "某歌手"}]
+        assert "albumname" not in body["song"]["list"][0]
+        assert body["song"]["list"][1]["albumname"] == "不将就"
+
+    def test_song_missing_songmid(self, client):
+        """测试缺少 songmid 参数"""
+        response = client.get("/song")
+
+        assert response.status_code == 400
+
+    def test_song_upstream_error(self, proxy, client):
+        """测试上游失败返回 502 且不缓存"""
+        proxy.upstream = FakeUpstream(fail=True)
+
+        response = client.get("/song?songmid=abc")
+
+        assert response.status_code == 502
+        assert proxy.song_cache.stats()["entries"] == 0
+
+    def test_song_circuit_open(self, proxy, client):
+        """测试熔断打开时快速返回 503"""
+        proxy.upstream = FakeUpstream(unavailable=True)
+
+        response = client.get("/song?songmid=abc")
+
+        assert response.status_code == 503
+        assert response.headers["Retry-After"] == "13"
+        assert response.get_json()["reason"] == "circuit_open"
+
+    def test_cache_stats(self, client):
+        """测试缓存统计端点"""
+        client.get("/song?songmid=abc")
+        client.get("/song?songmid=abc")
+
+        stats = client.get("/cache/stats").get_json()["song"]
+
+        assert stats["hits"] == 1
+        assert stats["misses"] == 1
+
+
+class TestHTTPCaching:
+    """测试 ETag / 304 和压缩"""
+
+    def test_etag_and_not_modified(self, proxy, client):
+        """测试相同内容返回 304"""
+        first = client.get("/song?songmid=abc")
+        etag = first.headers["ETag"]
+
+        second = client.get("/song?songmid=abc", headers={"If-None-Match": etag})
+
+        assert first.headers["Cache-Control"].startswith("public, max-age=")
+        assert second.status_code == 304
+        assert second.get_data() == b""
+        assert second.headers["ETag"] == etag
+
+    def test_gzip_large_response(self, proxy, client, monkeypatch):
+        """测试大响应按 Accept-Encoding 压缩"""
+        monkeypatch.setattr(proxy.http_cache, "COMPRESS_MIN_BYTES", 10)
+        monkeypatch.setattr(proxy.http_cache, "brotli", None)
+
+        response = client.get("/song?songmid=abc", headers={"Accept-Encoding": "gzip"})
+
+        assert response.headers["Content-Encoding"] == "gzip"
+        assert (
+            json.loads(gzip.decompress(response.get_data()))["track_info"]["mid"]
+            == "abc"
+        )
+
+    def test_errors_not_cached(self, client):
+        """测试错误响应不缓存"""
+        response = client.get("/song")
+
+        assert response.headers["Cache-Control"] == "no-store"
+        assert "ETag" not in response.headers
+
+
+class FakeImageResponse:
+    def __init__(self, data, location=None, status_code=200):
+        self.data = data
+        self.status_code = status_code
+        self.ok = status_code < 400
+        self.headers = {"Content-Type": "image/png", "Content-Length": str(len(data))}
+        self.is_redirect = location is not None
+        if location is not None:
+            self.headers["Location"] = location
+        self.closed = False
+
+    def raise_for_status(self):
+        if not self.ok:
+            raise requests.HTTPError(f"{self.status_code} Error", response=self)
+
+    def iter_content(self, chunk_size):
+        for i in range(0, len(self.data), 3):
+            yield self.data[i : i + 3]
+
+    def close(self):
+        self.closed = True
+
+
+class FakeImageSession:
+    def __init__(self, data=b"\x89PNG-cover-bytes", redirects=None, status_code=200):
+        self.data = data
+        self.redirects = redirects or {}
+        self.status_code = status_code
+        self.urls = []
+        self.responses = []
+
+    def get(self, url, stream=False, timeout=None, allow_redirects=True):
+        assert allow_redirects is False
+        self.urls.append(url)
+        response = FakeImageResponse(
+            self.data, location=self.redirects.get(url), status_code=self.status_code
+        )
+        self.responses.append(response)
+        return response
+
+
+class TestCoverImageRoute:
+    """测试 /cover/image 路由"""
+
+    @pytest.fixture
+    def image_proxy(self, proxy, tmp_path):
+        proxy.image_cache = proxy.ImageCache(str(tmp_path))
+        proxy.image_session = FakeImageSession()
+        return proxy
+
+    def test_streams_then_serves_from_cache(self, image_proxy, client):
+        """测试首次从 CDN 转发，之后从本地缓存返回"""
+        url = "https://y.gtimg.cn/music/photo_new/T002R300x300M000album1.jpg"
+
+        first = client.get(f"/cover/image?url={url}")
+        assert first.headers["X-Cache"] == "MISS"
+        assert first.get_data() == b"\x89PNG-cover-bytes"
+
+        second = client.get(f"/cover/image?url={url}")
+
+        assert second.headers["X-Cache"] == "HIT"
+        assert second.get_data() == b"\x89PNG-cover-bytes"
+        assert second.headers["Content-Type"] == "image/png"
+        assert image_proxy.image_session.urls == [url]
+
+    def test_not_modified(self, image_proxy, client):
+        """测试 ETag 为内容 SHA-256，命中时返回 304"""
+        url = "https://y.gtimg.cn/a.jpg"
+        client.get(f"/cover/image?url={url}").get_data()
+        etag = client.get(f"/cover/image?url={url}").headers["ETag"]
+
+        response = client.get(
+            f"/cover/image?url={url}", headers={"If-None-Match": etag}
+        )
+
+        assert response.status_code == 304
+
+    def test_resolves_cover_id(self, image_proxy, client, monkeypatch):
+        """测试按封面 ID 和尺寸解析图片地址"""
+        monkeypatch.setenv("COVER_IMAGE_HOSTS", "img")
+
+        response = client.get("/cover/image?id=album1&size=300x300")
+
+        assert response.status_code == 200
+        assert image_proxy.upstream.calls == [
+            ("getImageUrl", {"id": "album1", "size": "300x300"})
+        ]
+        assert image_proxy.image_session.urls == ["http://img/album1.jpg"]
+
+    def test_validation(self, image_proxy, client):
+        """测试参数校验和域名白名单"""
+        assert client.get("/cover/image").status_code == 400
+        assert client.get("/cover/image?url=http://169.254.169.254/").status_code == 400
+
+    def test_follows_allowed_redirect(self, image_proxy, client):
+        """测试跟随白名单内的重定向（相对地址按当前地址补全）"""
+        url = "https://y.gtimg.cn/a.jpg"
+        image_proxy.image_session = FakeImageSession(redirects={url: "/b.jpg"})
+
+        response = client.get(f"/cover/image?url={url}")
+
+        assert response.status_code == 200
+        assert image_proxy.image_session.urls == [url, "https://y.gtimg.cn/b.jpg"]
+
+    def test_rejects_redirect_outside_allowlist(self, image_proxy, client):
+        """测试重定向到白名单以外的地址时不发起请求"""
+        url = "https://y.gtimg.cn/a.jpg"
+        image_proxy.image_session = FakeImageSession(
+            redirects={url: "http://169.254.169.254/latest/meta-data"}
+        )
+
+        response = client.get(f"/cover/image?url={url}")
+
+        assert response.status_code == 502
+        assert image_proxy.image_session.urls == [url]
+        assert image_proxy.image_cache.lookup(url) is None
+
+    def test_error_status_closes_response(self, image_proxy, client):
+        """测试 CDN 返回错误状态时关闭流式响应（归还连接池），返回 502 且不缓存"""
+        url = "https://y.gtimg.cn/a.jpg"
+        image_proxy.image_session = FakeImageSession(status_code=404)
+
+        response = client.get(f"/cover/image?url={url}")
+
+        assert response.status_code == 502
+        assert image_proxy.image_session.responses[0].closed is True
+        assert image_proxy.image_cache.lookup(url) is None
+
+    def test_rejects_redirect_loop(self, image_proxy, client):
+        """测试重定向次数超过上限时返回 502"""
+        url = "https://y.gtimg.cn/a.jpg"
+        image_proxy.image_session = FakeImageSession(redirects={url: url})
+
+        response = client.get(f"/cover/image?url={url}")
+
+        assert response.status_code == 502
+        assert (
+            len(image_proxy.image_session.urls) == image_proxy.MAX_IMAGE_REDIRECTS + 1
+        )
+
+
+class TestSongsBatchRoute:
+    """测试 /songs 批量路由"""
+
+    def test_batch_returns_map(self, proxy, client):
+        """测试返回以 songmid 为键的结果"""
+        response = client.get("/songs?songmids=a,b,a, c")
+        body = response.get_json()
+
+        assert response.status_code == 200
+        assert list(body["songs"]) == ["a", "b", "c"]
+        assert body["songs"]["b"]["data"]["track_info"]["mid"] == "b"
+        assert body["success_count"] == 3
+        assert len(proxy.upstream.calls) == 3
+
+    def test_batch_partial_failure(self, proxy, client):
+        """测试单个歌曲失败不影响其他歌曲"""
+        proxy.upstream = FakeUpstream(fail_songmids={"bad"})
+
+        body = client.get("/songs?songmids=good,bad").get_json()
+
+        assert body["songs"]["good"]["success"] is True
+        assert body["songs"]["bad"]["success"] is False
+        assert "上游 API 调用失败" in body["songs"]["bad"]["error"]
+        assert body["error_count"] == 1
+
+    def test_batch_uses_song_cache(self, proxy, client):
+        """测试批量接口复用 /song 缓存"""
+        client.get("/song?songmid=a")
+
+        body = client.get("/songs?songmids=a,b").get_json()
+
+        assert body["songs"]["a"]["cache"] == "HIT"
+        assert len(proxy.upstream.calls) == 2
+
+    def test_batch_validation(self, proxy, client):
+        """测试参数校验"""
+        assert client.get("/songs").status_code == 400
+
+        too_many = ",".join(f"m{i}" for i in range(proxy.SONGS_BATCH_MAX + 1))
+        assert client.get(f"/songs?songmids={too_many}").status_code == 400
+
+
+TRACK_SEARCH_RESULTS = [
+    {
+        "songmid": "cover_version",
+        "songname": "不将就 (Live)",
+        "singer": [{"name": "某歌手"}],
+        "albummid": "album0",
+        "interval": 300,
+    },
+    {
+        "songmid": "original",
+        "songname": "不将就",
+        "singer": [{"name": "李荣浩"}],
+        "albumname": "不将就",
+        "albummid": "album1",
+        "interval": 260,
+    },
+]
+
+
+class TestTrackRoute:
+    """测试 /track 组合路由"""
+
+    def test_returns_flat_fields(self, proxy, client):
+        """测试选出最佳匹配并平铺详情和封面字段"""
+        proxy.upstream = FakeUpstream(search_results=TRACK_SEARCH_RESULTS)
+
+        response = client.get("/track?title=不将就&artists=李荣浩&duration=260")
+        body = response.get_json()
+
+        assert response.status_code == 200
+        assert body["match_found"] is True
+        assert body["match_id"] == "original"
+        assert body["track_name"] == "不将就"
+        assert body["album_pmid"] == "album1"
+        assert body["interval"] == 260
+        assert body["cover_url"] == "http://img/album1.jpg"
+        assert body["success"] is True
+
+    def test_refetches_cover_when_pmid_differs(self, proxy, client):
+        """测试详情的 pmid 与搜索结果不同时使用详情的 pmid"""
+        results = [dict(TRACK_SEARCH_RESULTS[1], albummid="other")]
+        proxy.upstream = FakeUpstream(search_results=results)
+
+        body = client.get("/track?title=不将就&artists=李荣浩").get_json()
+
+        assert body["cover_url"] == "http://img/album1.jpg"
+        cover_ids = [p["id"] for e, p in proxy.upstream.calls if e == "getImageUrl"]
+        assert sorted(cover_ids) == ["album1", "other"]
+
+    def test_parsed_data_projection(self, proxy, client):
+        """测试 fields 只作用于 parsed_data，平铺字段不受影响"""
+        proxy.upstream = FakeUpstream(search_results=TRACK_SEARCH_RESULTS)
+
+        body = client.get("/track?title=不将就&fields=track_info.name").get_json()
+
+        assert body["parsed_data"] == {"track_info": {"name": "不将就"}}
+        assert body["album_pmid"] == "album1"
+
+    def test_no_results(self, proxy, client):
+        """测试搜索无结果"""
+        proxy.upstream = FakeUpstream(search_results=[])
+
+        body = client.get("/track?title=不存在的歌").get_json()
+
+        assert body["match_found"] is False
+        assert body["error"] == "搜索无结果"
+
+    def test_validation(self, client):
+        """测试参数校验"""
+        assert client.get("/track").status_code == 400
+        assert client.get("/track?title=a&duration=abc").status_code == 400
+
+    def test_upstream_error(self, proxy, client):
+        """测试上游失败返回 502"""
+        proxy.upstream = FakeUpstream(fail=True)
+
+        assert client.get("/track?title=不将就").status_code == 502
+
+
+class TestLocalSearch:
+    """测试 /search?local=1 使用本地索引"""
+
+    def upstream_searches(self, proxy):
+        return [p["key"] for e, p in proxy.upstream.calls if e == "getSearchByKey"]
+
+    def test_serves_seen_entries_locally(self, proxy, client):
+        """测试搜索过的歌曲换一种关键词也能从本地索引返回"""
+        proxy.upstream = FakeUpstream(search_results=TRACK_SEARCH_RESULTS)
+
+        first = client.get("/search?key=不将就 李荣浩&local=1")
+        second = client.get("/search?key=李荣浩  不将就&local=1&fields=workflow")
+
+        assert first.headers["X-Search-Source"] == "UPSTREAM"
+        # 达标的只有一首，不足默认的 pageSize=10
+        assert second.headers["X-Search-Source"] == "LOCAL-PARTIAL"
+        assert second.get_json()["song"]["list"][0]["songmid"] == "original"
+        assert self.upstream_searches(proxy) == ["不将就 李荣浩"]
+
+    def test_full_page_required(self, proxy, client):
+        """测试 local=full 时本地结果足够一页才直接返回，否则请求上游"""
+        proxy.upstream = FakeUpstream(search_results=TRACK_SEARCH_RESULTS)
+        client.get("/search?key=不将就 李荣浩")
+
+        full = client.get("/search?key=李荣浩 不将就&local=full&pageSize=1")
+        partial = client.get("/search?key=李荣浩 不将就&local=full")
+
+        assert full.headers["X-Search-Source"] == "LOCAL"
+        assert partial.headers["X-Search-Source"] == "UPSTREAM"
+        assert self.upstream_searches(proxy) == ["不将就 李荣浩", "李荣浩 不将就"]
+
+    def test_low_confidence_goes_upstream(self, proxy, client):
+        """测试本地置信度不足（只有标题）时请求上游"""
+        proxy.upstream = FakeUpstream(search_results=TRACK_SEARCH_RESULTS)
+        client.get("/search?key=不将就 李荣浩")
+
+        response = client.get("/search?key=不将就&local=1")
+
+        assert response.headers["X-Search-Source"] == "UPSTREAM"
+        assert self.upstream_searches(proxy) == ["不将就 李荣浩", "不将就"]
+
+    def test_default_mode_always_upstream(self, proxy, client):
+        """测试不传 local 时行为不变"""
+        proxy.upstream = FakeUpstream(search_results=TRACK_SEARCH_RESULTS)
+        client.get("/search?key=不将就 李荣浩")
+
+        response = client.get("/search?key=李荣浩 不将就")
+
+        assert "X-Search-Source" not in response.headers
+        assert len(self.upstream_searches(proxy)) == 2
+
+
+class TestTrackCrosswalk:
+    """测试 /track 使用网易云 → QQ 音乐对照表"""
+
+    @pytest.fixture
+    def crosswalk(self, proxy, tmp_path):
+        proxy.crosswalk = proxy.Crosswalk(path=str(tmp_path / "crosswalk.sqlite3"))
+        return proxy.crosswalk
+
+    def search_calls(self, proxy):
+        return [e for e, _ in proxy.upstream.calls if e == "getSearchByKey"]
+
+    def test_confident_match_skips_search(self, proxy, client, crosswalk):
+        """测试高置信度匹配写入对照表，下次直接获取详情"""
+        proxy.upstream = FakeUpstream(
+            search_results=TRACK_SEARCH_RESULTS, singers=["李荣浩"]
+        )
+        url = "/track?title=不将就&artists=李荣浩&duration=260&netease_id=42"
+
+        first = client.get(url)
+        second = client.get(url)
+
+        assert first.headers["X-Crosswalk"] == "MISS"
+        assert second.headers["X-Crosswalk"] == "HIT"
+        assert second.get_json()["match_id"] == "original"
+        assert second.get_json()["match_name"] == "不将就"
+        assert second.get_json()["cover_url"] == "http://img/album1.jpg"
+        assert len(self.search_calls(proxy)) == 1
+        assert client.get("/crosswalk/42").get_json()["songmid"] == "original"
+
+    def test_low_score_not_recorded(self, proxy, client, crosswalk):
+        """测试低分匹配不写入对照表"""
+        proxy.upstream = FakeUpstream(search_results=TRACK_SEARCH_RESULTS)
+
+        client.get("/track?title=不将就&artists=别人&netease_id=42")
+
+        assert crosswalk.stats()["entries"] == 0
+        assert client.get("/crosswalk/42").status_code == 404
+
+    def test_mismatch_invalidates(self, proxy, client, crosswalk):
+        """测试详情核验不通过时作废条目并重新搜索"""
+        crosswalk.record("42", {"songmid": "stale", "songname": "不将就", "score": 1.0})
+        proxy.upstream = FakeUpstream(
+            search_results=TRACK_SEARCH_RESULTS, singers=["某歌手"]
+        )
+
+        response = client.get("/track?title=不将就&artists=李荣浩&netease_id=42")
+
+        assert response.headers["X-Crosswalk"] == "INVALIDATED"
+        assert response.get_json()["match_id"] == "original"
+        assert len(self.search_calls(proxy)) == 1
+        assert crosswalk.stats()["invalidations"] == 1
+
+    def test_delete_entry(self, proxy, client, crosswalk):
+        """测试通过 DELETE 作废条目（需要管理令牌）"""
+        crosswalk.record("42", {"songmid": "original", "score": 1.0})
+        proxy.ADMIN_TOKEN = "secret"
+
+        assert client.delete("/crosswalk/42").status_code == 403
+        response = client.delete("/crosswalk/42", headers={"X-Admin-Token": "secret"})
+
+        assert response.status_code == 200
+        assert crosswalk.get("42") is None
+        assert (
+            client.delete(
+                "/crosswalk/42", headers={"X-Admin-Token": "secret"}
+            ).status_code
+            == 404
+        )
+
+
+class TestWarmRoute:
+    """测试 /warm 缓存预热"""
+
+    def wait_job(self, proxy, job_id):
+        worker = proxy.warmer._worker
+        if worker is not None:
+            worker.join(5)
+        return proxy.warmer.lookup(job_id)
+
+    def test_warms_song_cache(self, proxy, client):
+        """测试预热后 /song 直接命中缓存"""
+        response = client.post("/warm", json={"songmids": ["a", "b"], "rate": 1000})
+        body = response.get_json()
+
+        assert response.status_code == 202
+        assert response.headers["Location"] == f"/warm/{body['id']}"
+        assert self.wait_job(proxy, body["id"])["fetched"] == 2
+
+        status = client.get(f"/warm/{body['id']}").get_json()
+        assert status["state"] == "done"
+        assert client.get("/song?songmid=a").headers["X-Cache"] == "HIT"
+        assert len(proxy.upstream.calls) == 2
+
+    def test_warms_search_into_disk_cache(self, proxy, client, tmp_path):
+        """测试预热搜索写入磁盘缓存"""
+        proxy.disk_cache = proxy.DiskCache(path=str(tmp_path / "proxy.sqlite3"))
+
+        job = client.post("/warm", json={"keys": ["不将就"]}).get_json()
+        self.wait_job(proxy, job["id"])
+        client.get("/search?key=不将就")
+
+        assert len(proxy.upstream.calls) == 1
+
+    def test_validation(self, proxy, client):
+        """测试参数校验、未启用磁盘缓存时拒绝预热搜索、任务不存在"""
+        proxy.disk_cache = proxy.DiskCache(path="")
+
+        assert client.post("/warm", json={"songmids": "a"}).status_code == 400
+        assert client.post("/warm", json={"keys": ["x"]}).status_code == 400
+        assert client.get("/warm/unknown").status_code == 404
+
+    def test_requires_token_when_configured(self, proxy, client):
+        """测试提交预热需要管理令牌"""
+        proxy.ADMIN_TOKEN = "secret"
+
+        assert client.post("/warm", json={"songmids": ["a"]}).status_code == 403
+        assert client.get("/warm").status_code == 200
+
+
+class TestAdminRateLimitRoute:
+    """测试 /admin/ratelimit 路由"""
+
+    def test_get_and_update(self, proxy, client):
+        """测试查看和运行时调整限流"""
+        response = client.post(
+            "/admin/ratelimit", json={"search": {"rate": 2, "burst": 4}}
+        )
+
+        assert response.status_code == 200
+        assert response.get_json()["buckets"]["search"]["rate"] == 2.0
+        assert (
+            client.get("/admin/ratelimit").get_json()["buckets"]["search"]["burst"]
+            == 4.0
+        )
+
+    def test_invalid_settings(self, client):
+        """测试非法配置返回 400"""
+        assert client.post("/admin/ratelimit", json={"lyric": {}}).status_code == 400
+        assert client.post("/admin/ratelimit", json=[1]).status_code == 400
+
+    def test_requires_token_when_configured(self, proxy, client):
+        """测试设置 ADMIN_TOKEN 后需要令牌"""
+        proxy.ADMIN_TOKEN = "secret"
+
+        assert client.get("/admin/ratelimit").status_code == 403
+        assert (
+            client.get(
+                "/admin/ratelimit", headers={"X-Admin-Token": "secret"}
+            ).status_code
+            == 200
+        )
+
+    def test_rate_limited_returns_503(self, proxy, client):
+        """测试排队超时返回 503 和 Retry-After"""
+        fake_get = proxy.upstream.get
+
+        def limited_get(endpoint, params):
+            proxy.rate_limiter.reserve(endpoint)
+            return fake_get(endpoint, params)
+
+        proxy.upstream.get = limited_get
+        proxy.rate_limiter.configure(
+            {"detail": {"rate": 0.001, "burst": 1}, "max_wait": 0}
+        )
+
+        assert client.get("/song?songmid=a").status_code == 200
+        response = client.get("/song?songmid=b")
+
+        assert response.status_code == 503
+        assert response.get_json()["reason"] == "rate_limited"
+        assert "Retry-After" in response.headers
+
+
+class TestPreforkState:
+    """测试预加载多 worker 部署时的进程状态"""
+
+    def test_compaction_starts_after_fork_only(self, monkeypatch, tmp_path):
+        """测试导入（主进程）时不启动清理线程，worker 中启动"""
+        monkeypatch.setenv("DISK_CACHE_PATH", str(tmp_path / "cache.sqlite3"))
+        module = load_proxy_module()
+        try:
+            assert module.disk_cache.enabled
+            assert module.disk_cache._compactor is None
+
+            module.after_fork()
+
+            assert module.disk_cache._compactor.is_alive()
+        finally:
+            module.disk_cache.close()
+
+    def test_ratelimit_shared_between_workers(self, monkeypatch, tmp_path):
+        """测试一个 worker 调整的限流配置在另一个 worker 中生效"""
+        monkeypatch.setenv("DISK_CACHE_PATH", str(tmp_path / "cache.sqlite3"))
+        first, second = load_proxy_module(), load_proxy_module()
+        try:
+            response = first.app.test_client().post(
+                "/admin/ratelimit", json={"search": {"rate": 2}}
+            )
+
+            assert response.get_json()["shared"] is True
+            stats = second.app.test_client().get("/admin/ratelimit").get_json()
+            assert stats["buckets"]["search"]["rate"] == 2.0
+        finally:
+            first.disk_cache.close()
+            second.disk_cache.close()
+
+
+class TestMetricsRoute:
+    """测试 /metrics 路由"""
+
+    def test_records_requests_by_route_and_status(self, proxy, client):
+        """测试按路由和状态码记录请求"""
+        before = proxy.metrics.REQUEST_ERRORS.value(route="/song", status="400")
+
+        client.get("/song?songmid=abc")
+        client.get("/song")
+
+        text = client.get("/metrics").get_data(as_text=True)
+
+        assert 'qqmusic_proxy_requests_total{route="/song",status="200"}' in text
+        assert 'qqmusic_proxy_request_duration_seconds_count{route="/song"}' in text
+        assert "qqmusic_proxy_in_flight_requests 0" in text
+        assert "qqmusic_proxy_song_cache_misses" in text
+        assert (
+            proxy.metrics.REQUEST_ERRORS.value(route="/song", status="400")
+            == before + 1
+        )
@@ -0,0 +1,200 @@
+"""
+测试 single-flight 请求合并
+"""
+
+import asyncio
+import sys
+import threading
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(
+    0, str(Path(__file__).parent.parent.parent / "services" / "qqmusic-api")
+)
+
+from singleflight import AsyncSingleFlight, SingleFlight, normalize_key
+
+
+def run_concurrently(flight, key, fn, count):
+    """并发调用 flight.do，返回每个线程的结果或异常"""
+    results = [None] * count
+    threads = []
+
+    def worker(index):
+        try:
+            results[index] = flight.do(key, fn)
+        except Exception as e:
+            results[index] = e
+
+    for i in range(count):
+        thread = threading.Thread(target=worker, args=(i,))
+        threads.append(thread)
+        thread.start()
+    return threads, results
+
+
+class TestSingleFlight:
+    """测试进行中请求去重"""
+
+    def test_normalize_key(self):
+        """测试参数顺序、空白和大小写不影响 key"""
+        a = normalize_key("getSearchByKey", {"key": " Jay  Chou ", "pageNo": 1})
+        b = normalize_key("getSearchByKey", {"pageNo": 1, "key": "jay chou"})
+
+        assert a == b
+        assert a != normalize_key("getSearchByKey", {"pageNo": 2, "key": "jay chou"})
+
+    def test_normalize_key_keeps_identifiers_exact(self):
+        """测试 songmid 等标识参数区分大小写和空白"""
+        assert normalize_key("getSongInfo", {"songmid": "002w3cVJ"}) != normalize_key(
+            "getSongInfo", {"songmid": "002W3CVJ"}
+        )
+        assert normalize_key("getImageUrl", {"id": "abc"}) != normalize_key(
+            "getImageUrl", {"id": " abc"}
+        )
+
+    def test_concurrent_calls_share_result(self):
+        """测试并发的相同调用只执行一次"""
+        flight = SingleFlight()
+        release = threading.Event()
+        calls = []
+
+        def fn():
+            calls.append(1)
+            release.wait(timeout=2)
+            return {"songmid": "abc"}
+
+        threads, results = run_concurrently(flight, "k", fn, 5)
+        # 等待所有跟随者进入等待
+        for _ in range(200):
+            if flight.stats()["coalesced"] == 4:
+                break
+            threading.Event().wait(0.01)
+        release.set()
+        for thread in threads:
+            thread.join(timeout=2)
+
+        assert len(calls) == 1
+        assert all(result[0] == {"songmid": "abc"} for result in results)
+        assert sorted(result[1] for result in results) == [
+            False,
+            True,
+            True,
+            True,
+            True,
+        ]
+        assert flight.stats() == {"in_flight": 0, "executed": 1, "coalesced": 4}
+
+    def test_error_shared_with_waiters(self):
+        """测试异常传递给所有等待者"""
+        flight = SingleFlight()
+        release = threading.Event()
+
+        def fn():
+            release.wait(timeout=2)
+            raise ValueError("upstream failed")
+
+        threads, results = run_concurrently(flight, "k", fn, 3)
+        for _ in range(200):
+            if flight.stats()["coalesced"] == 2:
+                break
+            threading.Event().wait(0.01)
+        release.set()
+        for thread in threads:
+            thread.join(timeout=2)
+
+        assert all(isinstance(result, ValueError) for result in results)
+
+    def test_sequential_calls_not_coalesced(self):
+        """测试完成后的调用重新执行"""
+        flight = SingleFlight()
+        calls = []
+
+        flight.do("k", lambda: calls.append(1))
+        flight.do("k", lambda: calls.append(1))
+
+        assert len(calls) == 2
+
+    def test_leader_error_raised(self):
+        """测试单个调用的异常正常抛出"""
+        flight = SingleFlight()
+
+        def fn():
+            raise RuntimeError("upstream failed")
+
+        with pytest.raises(RuntimeError):
+            flight.do("k", fn)
+        assert flight.stats()["in_flight"] == 0
+
+
+class TestAsyncSingleFlight:
+    """测试 asyncio 版本的请求合并"""
+
+    def test_leader_cancelled_follower_gets_result(self):
+        """测试发起调用的请求被取消时，合并的等待者仍拿到结果"""
+        flight = AsyncSingleFlight()
+        calls = []
+
+        async def fn():
+            calls.append(1)
+            await asyncio.sleep(0.05)
+            return {"songmid": "abc"}
+
+        async def run():
+            leader = asyncio.ensure_future(flight.do("k", fn))
+            await asyncio.sleep(0)
+            follower = asyncio.ensure_future(flight.do("k", fn))
+            await asyncio.sleep(0)
+            leader.cancel()
+            result = await follower
+            return leader, result
+
+        leader, result = asyncio.run(run())
+
+        assert leader.cancelled()
+        assert result == ({"songmid": "abc"}, True)
+        assert len(calls) == 1
+        assert flight.stats() == {"in_flight": 0, "executed": 1, "coalesced": 1}
+
+    def test_load_cancelled_when_all_callers_cancelled(self):
+        """测试所有调用方都取消后取消共享的任务"""
+        flight = AsyncSingleFlight()
+        cancelled = []
+
+        async def fn():
+            try:
+                await asyncio.sleep(5)
+            except asyncio.CancelledError:
+                cancelled.append(1)
+                raise
+
+        async def run():
+            callers = [asyncio.ensure_future(flight.do("k", fn)) for _ in range(2)]
+            await asyncio.sleep(0)
+            for caller in callers:
+                caller.cancel()
+            await asyncio.gather(*callers, return_exceptions=True)
+            await asyncio.sleep(0)
+
+        asyncio.run(run())
+
+        assert cancelled == [1]
+        assert flight.stats()["in_flight"] == 0
+
+    def test_error_shared_with_waiters(self):
+        """测试异常传递给所有等待者"""
+        flight = AsyncSingleFlight()
+
+        async def fn():
+            await asyncio.sleep(0.01)
+            raise ValueError("upstream failed")
+
+        async def run():
+            return await asyncio.gather(
+                flight.do("k", fn), flight.do("k", fn), return_exceptions=True
+            )
+
+        results = asyncio.run(run())
+
+        assert all(isinstance(result, ValueError) for result in results)
@@ -0,0 +1,207 @@
+"""
+测试 /track 组合端点的匹配和字段平铺
+"""
+
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(
+    0, str(Path(__file__).parent.parent.parent / "services" / "qqmusic-api")
+)
+sys.path.insert(
+    0,
+    str(Path(__file__).parent.parent.parent / "dify-workflow" / "nodes" / "code-nodes"),
+)
+
+import find_qqmusic_match
+from track import (
+    empty_track,
+    flatten_track,
+    pick_best_match,
+    score_candidate,
+    split_artists,
+)
+
+
+def candidate(songmid, songname, singers, interval=0):
+    return {
+        "songmid": songmid,
+        "songname": songname,
+        "singer": [{"name": name} for name in singers],
+        "interval": interval,
+    }
+
+
+class TestSplitArtists:
+    """测试艺术家参数拆分"""
+
+    def test_separators(self):
+        assert split_artists("周杰伦, 费玉清") == ["周杰伦", "费玉清"]
+        assert split_artists("A/B&C、D") == ["A", "B", "C", "D"]
+        assert split_artists("") == []
+
+
+class TestPickBestMatch:
+    """测试搜索结果选优"""
+
+    def test_prefers_title_and_artist(self):
+        """测试标题和艺术家都匹配的结果优先于排序靠前的结果"""
+        results = [
+            candidate("a", "晴天", ["翻唱歌手"]),
+            candidate("b", "晴天", ["周杰伦"]),
+        ]
+
+        match = pick_best_match(results, "晴天", ["周杰伦"])
+
+        assert match["songmid"] == "b"
+        assert match["score"] == 1.0
+
+    def test_ignores_case_and_bracket_notes(self):
+        """测试忽略大小写和括号内不是版本标签的说明"""
+        results = [
+            candidate("a", "Other", ["X"]),
+            candidate("b", "HELLO (2015 Remaster)", ["Adele"]),
+        ]
+
+        assert pick_best_match(results, "hello", ["adele"])["songmid"] == "b"
+
+    def test_traditional_and_fullwidth_titles(self):
+        """测试繁体、全角写法与简体目标视为同一首歌"""
+        results = [
+            candidate("other", "后来的我们", ["五月天"]),
+            candidate("hit", "後來（ＬＩＶＥ）", ["劉若英"]),
+        ]
+
+        match = pick_best_match(results, "后来 (Live)", ["刘若英"])
+
+        assert match["songmid"] == "hit"
+        assert match["score"] == 1.0
+
+    def test_skips_live_version_ranked_first(self):
+        """测试搜索排序靠前的 Live 版不会被选中"""
+        results = [
+            candidate("live", "晴天 (Live)", ["周杰伦"], interval=290),
+            candidate("studio", "晴天", ["周杰伦"], interval=269),
+        ]
+
+        match = pick_best_match(results, "晴天", ["周杰伦"])
+
+        assert match["songmid"] == "studio"
+        assert score_candidate(results[0], "晴天", ["周杰伦"]) == 0.0
+        assert pick_best_match(results, "晴天 (Live)", ["周杰伦"])["songmid"] == "live"
+
+    def test_filters_duration_mismatch(self):
+        """测试时长相差超过容差的候选被淘汰，全部淘汰时返回 None"""
+        results = [candidate("long", "晴天", ["周杰伦"], interval=320)]
+
+        assert pick_best_match(results, "晴天", ["周杰伦"], 270) is None
+        assert pick_best_match(results, "晴天", ["周杰伦"], 323)["songmid"] == "long"
+
+    def test_duration_breaks_tie(self):
+        """测试时长接近的版本优先"""
+        results = [
+            candidate("long", "晴天", ["周杰伦"], interval=320),
+            candidate("short", "晴天", ["周杰伦"], interval=269),
+        ]
+
+        assert pick_best_match(results, "晴天", ["周杰伦"], 270)["songmid"] == "short"
+
+    def test_keeps_search_order_on_tie(self):
+        """测试同分时保留搜索排序"""
+        results = [candidate("a", "晴天", []), candidate("b", "晴天", [])]
+
+        assert pick_best_match(results, "晴天", [])["songmid"] == "a"
+
+    def test_empty_results(self):
+        assert pick_best_match([], "晴天", ["周杰伦"]) is None
+
+
+# (搜索结果, 标题, 艺术家, 时长秒)：/track 与工作流节点应选出同一首歌、给出同一得分
+PARITY_CASES = [
+    (
+        [
+            candidate("cover", "晴天", ["翻唱歌手"], 269),
+            candidate("orig", "晴天", ["周杰伦"], 269),
+        ],
+        "晴天",
+        ["周杰伦"],
+        269,
+    ),
+    (
+        [
+            candidate("live", "晴天 (Live)", ["周杰伦"], 290),
+            candidate("studio", "晴天", ["周杰伦"], 269),
+        ],
+        "晴天",
+        ["周杰伦"],
+        0,
+    ),
+    (
+        [
+            candidate("a", "後來", ["劉若英"], 341),
+            candidate("b", "后来的我们", ["五月天"], 341),
+        ],
+        "后来",
+        ["刘若英"],
+        340,
+    ),
+    (
+        [
+            candidate("x", "Love Song feat. Someone", ["Singer A", "Someone"]),
+            candidate("y", "Love Songs", ["Singer A"]),
+        ],
+        "Love Song",
+        ["Singer A"],
+        0,
+    ),
+    ([candidate("long", "晴天", ["周杰伦"], 320)], "晴天", ["周杰伦"], 270),
+]
+
+
+class TestWorkflowParity:
+    """测试 /track 选优与 find_qqmusic_match 节点使用同一个评分器"""
+
+    @pytest.mark.parametrize("results,title,artists,duration", PARITY_CASES)
+    def test_same_match_and_score(self, results, title, artists, duration):
+        node = find_qqmusic_match.main(
+            {"song": {"list": results}}, title, artists, duration * 1000
+        )
+        match = pick_best_match(results, title, artists, duration)
+
+        if match is None:
+            assert node["match_found"] is False
+        else:
+            assert node["match_id"] == match["songmid"]
+            assert node["match_score"] == match["score"]
+            assert score_candidate(match, title, artists, duration) == match["score"]
+
+
+class TestFlattenTrack:
+    """测试字段平铺"""
+
+    def test_flatten(self):
+        song_data = {
+            "track_info": {
+                "name": "晴天",
+                "title": "晴天",
+                "interval": 269,
+                "album": {"id": 8220, "mid": "m", "name": "叶惠美", "pmid": "p"},
+            }
+        }
+        match = {
+            "songmid": "s",
+            "songname": "晴天",
+            "albumname": "叶惠美",
+            "score": 1.0,
+        }
+
+        result = flatten_track(match, song_data, "http://img/p.jpg")
+
+        assert result["match_id"] == "s"
+        assert result["album_id"] == 8220
+        assert result["album_pmid"] == "p"
+        assert result["cover_url"] == "http://img/p.jpg"
+        assert result["parsed_data"] is song_data
+        assert set(result) == set(empty_track(""))
@@ -0,0 +1,99 @@
+"""
+测试上游 API 客户端
+"""
+
+import sys
+from pathlib import Path
+
+import pytest
+import requests
+
+sys.path.insert(
+    0, str(Path(__file__).parent.parent.parent / "services" / "qqmusic-api")
+)
+
+from ratelimit import UpstreamRateLimiter
+from resilience import UpstreamGuard, UpstreamUnavailable
+from upstream import UpstreamClient
+
+
+class FakeResponse:
+    def __init__(self, status_code=200):
+        self.status_code = status_code
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise requests.HTTPError(f"{self.status_code} Error")
+
+
+class TestUpstreamClient:
+    """测试上游客户端"""
+
+    def test_pool_size_from_env(self, monkeypatch):
+        """测试连接池大小从环境变量读取"""
+        monkeypatch.setenv("QQMUSIC_POOL_MAXSIZE", "64")
+        monkeypatch.setenv("QQMUSIC_POOL_CONNECTIONS", "2")
+
+        client = UpstreamClient("http://upstream:3200/")
+
+        adapter = client.session.get_adapter("http://upstream:3200")
+        assert client.base_url == "http://upstream:3200"
+        assert adapter._pool_maxsize == 64
+        assert adapter._pool_connections == 2
+
+    def test_per_endpoint_timeouts(self, monkeypatch):
+        """测试每个端点独立的超时配置"""
+        monkeypatch.setenv("QQMUSIC_TIMEOUT_SEARCH", "4")
+        monkeypatch.setenv("QQMUSIC_CONNECT_TIMEOUT", "1.5")
+
+        client = UpstreamClient("http://upstream:3200", timeouts={"getSongInfo": 8})
+
+        assert client.timeout_for("getSearchByKey") == (1.5, 4.0)
+        assert client.timeout_for("getSongInfo") == (1.5, 8)
+        assert client.timeout_for("getImageUrl") == (1.5, 5.0)
+
+    def test_get_reuses_session(self, monkeypatch):
+        """测试请求复用同一个 session"""
+        client = UpstreamClient("http://upstream:3200")
+        calls = []
+
+        def fake_get(url, params=None, timeout=None):
+            calls.append((url, params, timeout))
+            return FakeResponse()
+
+        monkeypatch.setattr(client.session, "get", fake_get)
+
+        client.get("getSongInfo", {"songmid": "a"})
+        client.get("getSongInfo", {"songmid": "b"})
+
+        assert len(calls) == 2
+        assert calls[0][0] == "http://upstream:3200/getSongInfo"
+        assert calls[1][1] == {"songmid": "b"}
+        assert calls[0][2] == client.timeout_for("getSongInfo")
+
+    def test_get_raises_on_http_error(self, monkeypatch):
+        """测试非 2xx 响应抛出异常"""
+        client = UpstreamClient("http://upstream:3200")
+        monkeypatch.setattr(
+            client.session, "get", lambda *a, **kw: FakeResponse(status_code=500)
+        )
+
+        with pytest.raises(requests.HTTPError):
+            client.get("getSearchByKey", {"key": "x"})
+
+    def test_open_breaker_rejects_before_rate_limit_wait(self, monkeypatch):
+        """测试熔断打开时直接拒绝，不排队等待限流令牌"""
+        guard = UpstreamGuard(min_calls=1, window=1)
+        guard.breaker("getSongInfo").record(0.1, failed=True)
+        rate_limiter = UpstreamRateLimiter()
+        waited = []
+        monkeypatch.setattr(rate_limiter, "wait", waited.append)
+        client = UpstreamClient(
+            "http://upstream:3200", guard=guard, rate_limiter=rate_limiter
+        )
+
+        with pytest.raises(UpstreamUnavailable) as exc_info:
+            client.get("getSongInfo", {"songmid": "a"})
+
+        assert exc_info.value.reason == "circuit_open"
+        assert waited == []
@@ -0,0 +1,257 @@
+"""
+测试缓存预热
+"""
+
+import asyncio
+import json
+import sqlite3
+import sys
+import threading
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(
+    0, str(Path(__file__).parent.parent.parent / "services" / "qqmusic-api")
+)
+
+import warmer as warmer_module
+from disk_cache import DiskCache
+from warmer import (
+    ABANDONED,
+    ABANDON_AFTER,
+    CANCELLED,
+    DONE,
+    RUNNING,
+    AsyncCacheWarmer,
+    CacheWarmer,
+    parse_warm_request,
+)
+
+
+class TestParseWarmRequest:
+    """测试请求体解析"""
+
+    def test_keys_and_songmids(self):
+        items, rate = parse_warm_request(
+            {"keys": ["晴天 周杰伦", " "], "songmids": ["a", "b", "a"], "rate": 5},
+            max_items=10,
+        )
+
+        assert items == [("search", "晴天 周杰伦"), ("song", "a"), ("song", "b")]
+        assert rate == 5.0
+
+    @pytest.mark.parametrize(
+        "payload",
+        [
+            None,
+            [],
+            {},
+            {"songmids": "abc"},
+            {"songmids": [1]},
+            {"songmids": ["a"], "rate": 0},
+            {"songmids": ["a", "b", "c"]},
+        ],
+    )
+    def test_invalid(self, payload):
+        with pytest.raises(ValueError):
+            parse_warm_request(payload, max_items=2)
+
+
+def wait_finished(warmer, job, timeout=5):
+    worker = warmer._worker
+    if worker is not None:
+        worker.join(timeout)
+    assert job.finished
+
+
+class TestCacheWarmer:
+    """测试线程模式预热"""
+
+    def test_runs_items_and_paces_upstream_fetches(self):
+        calls, sleeps = [], []
+
+        def warm_song(songmid):
+            calls.append(songmid)
+            return songmid != "cached"
+
+        def warm_search(key):
+            raise RuntimeError("上游失败")
+
+        warmer = CacheWarmer(
+            {"song": warm_song, "search": warm_search}, sleep=sleeps.append, rate=10
+        )
+        job = warmer.submit([("song", "a"), ("song", "cached"), ("search", "x")])
+        wait_finished(warmer, job)
+
+        status = job.status()
+        assert calls == ["a", "cached"]
+        assert status["state"] == DONE
+        assert (status["fetched"], status["cached"], status["failed"]) == (1, 1, 1)
+        assert status["progress"] == 1.0
+        assert status["errors"][0]["item"] == ["search", "x"]
+        # 只有请求上游的条目（包括失败的）占用速率
+        assert len(sleeps) == 2
+        assert all(0 < s <= 0.1 for s in sleeps)
+
+    def test_long_pacing_wait_is_split(self):
+        """测试低速率下的长时间等待按 PACE_STEP 分段（期间更新心跳、检查取消）"""
+        sleeps = []
+        warmer = CacheWarmer({"song": lambda mid: True}, sleep=sleeps.append, rate=0.2)
+        job = warmer.submit([("song", "a")])
+        wait_finished(warmer, job)
+
+        assert len(sleeps) == 5
+        assert sum(sleeps) <= 5
+
+    def test_jobs_run_in_order_and_can_be_cancelled(self):
+        started, release = threading.Event(), threading.Event()
+        calls = []
+
+        def warm_song(songmid):
+            calls.append(songmid)
+            started.set()
+            release.wait(5)
+            return False
+
+        warmer = CacheWarmer({"song": warm_song})
+        first = warmer.submit([("song", "a"), ("song", "b")])
+        second = warmer.submit([("song", "c")])
+        started.wait(5)
+        warmer.cancel(second.id)
+        warmer.cancel(first.id)
+        release.set()
+        wait_finished(warmer, first)
+
+        assert calls == ["a"]
+        assert first.state == CANCELLED
+        assert second.state == CANCELLED
+
+    def test_keeps_limited_job_history(self):
+        warmer = CacheWarmer({"song": lambda mid: False}, max_jobs=2)
+        jobs = []
+        for mid in "abcd":
+            jobs.append(warmer.submit([("song", mid)]))
+            wait_finished(warmer, jobs[-1])
+
+        assert [j["id"] for j in warmer.stats()["jobs"]] == [
+            jobs[2].id,
+            jobs[3].id,
+        ]
+        assert warmer.get(jobs[0].id) is None
+
+
+class TestSharedJobStatus:
+    """测试通过磁盘缓存在 worker 之间共享任务状态"""
+
+    def test_other_worker_sees_status(self, tmp_path):
+        """测试另一个 worker 可以查询任务进度和任务列表"""
+        path = str(tmp_path / "cache.sqlite3")
+        owner = CacheWarmer(
+            {"song": lambda mid: True}, rate=1000, store=DiskCache(path)
+        )
+        other = CacheWarmer({"song": lambda mid: True}, store=DiskCache(path))
+
+        job = owner.submit([("song", "a"), ("song", "b")])
+        wait_finished(owner, job)
+
+        status = other.lookup(job.id)
+        assert status["state"] == DONE
+        assert status["fetched"] == 2
+        assert [j["id"] for j in other.stats()["jobs"]] == [job.id]
+        assert other.lookup("unknown") is None
+
+    def test_cancel_from_other_worker(self, tmp_path, monkeypatch):
+        """测试另一个 worker 取消任务：标记后由执行任务的 worker 停止"""
+        monkeypatch.setattr(warmer_module, "PERSIST_INTERVAL", 0)
+        path = str(tmp_path / "cache.sqlite3")
+        started, release = threading.Event(), threading.Event()
+
+        def warm_song(songmid):
+            started.set()
+            release.wait(5)
+            return False
+
+        owner = CacheWarmer({"song": warm_song}, store=DiskCache(path))
+        other = CacheWarmer({"song": warm_song}, store=DiskCache(path))
+        job = owner.submit([("song", "a"), ("song", "b"), ("song", "c")])
+        started.wait(5)
+
+        assert other.request_cancel(job.id)["cancel_requested"] is True
+        release.set()
+        wait_finished(owner, job)
+
+        assert job.state == CANCELLED
+        assert job.status()["completed"] == 1
+        assert other.lookup(job.id)["state"] == CANCELLED
+        assert other.request_cancel("unknown") is None
+
+    def test_stale_heartbeat_reported_as_abandoned(self, tmp_path):
+        """测试执行任务的 worker 退出后（心跳不再更新），其他 worker 查询到 abandoned"""
+        path = str(tmp_path / "cache.sqlite3")
+        now = [1000.0]
+
+        def clock():
+            return now[0]
+
+        owner = CacheWarmer(
+            {"song": lambda mid: True}, store=DiskCache(path, clock=clock)
+        )
+        other = CacheWarmer(
+            {"song": lambda mid: True}, store=DiskCache(path, clock=clock)
+        )
+        # 模拟任务开始执行后 worker 被回收：状态停留在 running，不再写入
+        job = owner._register([("song", "a")], None)
+        job.start()
+        owner._persist(job, force=True)
+
+        assert other.lookup(job.id)["state"] == RUNNING
+
+        now[0] += ABANDON_AFTER + 1
+        assert other.lookup(job.id)["state"] == ABANDONED
+        assert other.stats()["jobs"][0]["state"] == ABANDONED
+        assert "cancel_requested" not in other.request_cancel(job.id)
+
+    def test_old_table_gets_heartbeat_column(self, tmp_path):
+        """测试旧版本的 warm_jobs 表补上心跳列，其中未结束的任务视为 abandoned"""
+        path = str(tmp_path / "cache.sqlite3")
+        conn = sqlite3.connect(path)
+        conn.execute(
+            "CREATE TABLE warm_jobs (id TEXT PRIMARY KEY, state TEXT NOT NULL, "
+            "status TEXT NOT NULL, created_at REAL NOT NULL, "
+            "cancel_requested INTEGER NOT NULL DEFAULT 0)"
+        )
+        conn.execute(
+            "INSERT INTO warm_jobs (id, state, status, created_at) VALUES (?, ?, ?, ?)",
+            ("old", RUNNING, json.dumps({"id": "old", "state": RUNNING}), 1.0),
+        )
+        conn.commit()
+        conn.close()
+
+        warmer = CacheWarmer({"song": lambda mid: True}, store=DiskCache(path))
+
+        assert warmer.lookup("old")["state"] == ABANDONED
+
+
+class TestAsyncCacheWarmer:
+    """测试 asyncio 模式预热"""
+
+    def test_runs_in_background(self):
+        calls = []
+
+        async def warm_song(songmid):
+            calls.append(songmid)
+            return True
+
+        async def run():
+            warmer = AsyncCacheWarmer({"song": warm_song}, rate=1000)
+            job = await warmer.submit([("song", "a"), ("song", "b")])
+            assert job.state != DONE
+            await warmer._worker
+            return job
+
+        job = asyncio.run(run())
+
+        assert calls == ["a", "b"]
+        assert job.status()["fetched"] == 2
+        assert job.state == DONE
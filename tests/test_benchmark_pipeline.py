@@ -0,0 +1,56 @@
+"""
+测试核验链路基准测试脚本（小规模冒烟测试）
+"""
+
+import json
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent / "scripts"))
+
+import benchmark_pipeline
+
+
+def run(*argv):
+    args = benchmark_pipeline.build_parser().parse_args(
+        [
+            "--latency",
+            "none",
+            "--netease-latency",
+            "none",
+            "--catalog-size",
+            "50",
+            *argv,
+        ]
+    )
+    return benchmark_pipeline.run_benchmark(args)
+
+
+def test_cold_and_warm_passes():
+    """测试 cold / warm 两轮都跑完整条链路，warm 轮歌曲详情命中代理缓存"""
+    report = run("--songs", "6", "--concurrency", "3")
+
+    cold, warm = report["passes"]
+    assert [cold["name"], warm["name"]] == ["cold", "warm"]
+    for summary in (cold, warm):
+        assert summary["succeeded"] == 6
+        assert summary["match_accuracy"] == 1.0
+        assert summary["overall_ms"]["count"] == 6
+        assert set(summary["stages_ms"]) == set(benchmark_pipeline.STAGES["nodes"])
+        assert {"p50", "p95", "p99"} <= set(summary["stages_ms"]["qq_detail"])
+    assert cold["upstream_requests"]["song"] == 6
+    assert warm["upstream_requests"]["song"] == 0
+    # 结果可以直接写成 JSON
+    json.dumps(report)
+
+
+def test_track_mode_with_song_limit():
+    """测试 /track 模式按歌曲数结束"""
+    report = run(
+        "--songs", "4", "--concurrency", "2", "--mode", "track", "--passes", "cold"
+    )
+
+    (cold,) = report["passes"]
+    assert cold["songs"] == 4
+    assert cold["failed"] == 0
+    assert "qq_track" in cold["stages_ms"]
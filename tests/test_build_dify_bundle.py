@@ -0,0 +1,102 @@
+"""
+测试 Dify 打包脚本的本地模块内联
+"""
+
+import re
+import sys
+from pathlib import Path
+
+import pytest
+
+pytest.importorskip("yaml")
+
+sys.path.insert(0, str(Path(__file__).parent.parent / "scripts"))
+
+from build_dify_bundle import LOCAL_MODULES, inline_local_imports
+
+CODE_DIR = Path(__file__).parent.parent / "dify-workflow" / "nodes" / "code-nodes"
+LOCAL_IMPORT = re.compile(rf"^from ({'|'.join(LOCAL_MODULES)}) import", re.MULTILINE)
+
+
+@pytest.mark.parametrize(
+    "node",
+    sorted(p.name for p in CODE_DIR.glob("*.py") if p.stem not in LOCAL_MODULES),
+)
+def test_inlined_node_is_self_contained(node):
+    """测试内联后的节点代码不再导入本地模块，且可以独立执行"""
+    code = inline_local_imports((CODE_DIR / node).read_text(encoding="utf-8"), CODE_DIR)
+
+    assert not LOCAL_IMPORT.search(code)
+    namespace = {}
+    exec(compile(code, node, "exec"), namespace)
+    assert callable(namespace["main"])
+
+
+def test_inlined_matcher_uses_normalization():
+    """测试内联后的匹配节点仍按规范化结果匹配"""
+    code = inline_local_imports(
+        (CODE_DIR / "find_qqmusic_match.py").read_text(encoding="utf-8"), CODE_DIR
+    )
+    namespace = {}
+    exec(code, namespace)
+
+    result = namespace["main"](
+        {
+            "song": {
+                "list": [
+                    {"songmid": "x", "songname": "晴天", "singer": [{"name": "周杰倫"}]}
+                ]
+            }
+        },
+        "晴天",
+        "周杰伦",
+    )
+
+    assert result["match_score"] == 1.0
+
+
+def test_inlined_node_keeps_instrumentation():
+    """测试内联后的节点仍可按需输出 _timings"""
+    code = inline_local_imports(
+        (CODE_DIR / "parse_url.py").read_text(encoding="utf-8"), CODE_DIR
+    )
+    namespace = {}
+    exec(code, namespace)
+
+    result = namespace["main"]("https://music.163.com/song?id=1", _instrument=True)
+
+    assert result["_timings"]["node"] == "parse_url"
+
+
+def test_inlines_multiline_import():
+    """测试带括号的多行导入也被内联，重复导入被删除"""
+    code = inline_local_imports(
+        "from text_normalize import (\n"
+        "    normalize_text,\n"
+        "    same_artists,\n"
+        ")\n"
+        "from text_normalize import fold\n"
+        "\n"
+        "def main(a, b):\n"
+        "    return same_artists(a, b) and fold(a) == fold(b)\n",
+        CODE_DIR,
+    )
+
+    assert not LOCAL_IMPORT.search(code)
+    namespace = {}
+    exec(code, namespace)
+    assert namespace["main"]("周杰倫", "周杰伦") is True
+    assert namespace["normalize_text"]("ＡＢＣ") == "abc"
+
+
+@pytest.mark.parametrize(
+    "code",
+    [
+        "import text_normalize\n",
+        "def main():\n    from instrumentation import instrumented\n",
+    ],
+)
+def test_uninlined_import_raises(code):
+    """测试无法内联的本地模块导入直接报错，而不是打包出导入失败的节点"""
+    with pytest.raises(ValueError):
+        inline_local_imports(code, CODE_DIR)